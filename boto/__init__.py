@@ -29,11 +29,9 @@ from boto.storage_uri import BucketStorageUri, FileStorageUri
 import boto.plugin
 import datetime
 import os
-import platform
 import re
 import sys
 import logging
-import logging.config
 
 from boto.compat import urlparse
 from boto.exception import InvalidUriError
@@ -44,12 +42,27 @@ Version = __version__  # for backware compatibility
 # http://bugs.python.org/issue7980
 datetime.datetime.strptime('', '')
 
-UserAgent = 'Boto/%s Python/%s %s/%s' % (
-    __version__,
-    platform.python_version(),
-    platform.system(),
-    platform.release()
-)
+
+def _get_user_agent():
+    # ``os.uname`` gives the same system & release as the ``platform``
+    # module, without the cost of importing it.
+    if hasattr(os, 'uname'):
+        uname = os.uname()
+        system, release = uname[0], uname[2]
+    else:
+        import platform
+        system, release = platform.system(), platform.release()
+    # Built from ``sys.version_info`` rather than ``sys.version``, which
+    # has suffixes such as ``+`` on development builds.
+    return 'Boto/%s Python/%s %s/%s' % (
+        __version__,
+        '.'.join(str(part) for part in sys.version_info[:3]),
+        system,
+        release
+    )
+
+
+UserAgent = _get_user_agent()
 config = Config()
 
 # Regex to disallow buckets violating charset or not [3..255] chars total.
@@ -63,6 +76,12 @@ ENDPOINTS_PATH = os.path.join(os.path.dirname(__file__), 'endpoints.json')
 
 
 def init_logging():
+    # Only a config file with a ``[formatters]`` section can configure
+    # logging, so ``logging.config`` is only imported if there is one.
+    if not config.has_section('formatters'):
+        return
+
+    import logging.config
     for file in BotoConfigLocations:
         try:
             logging.config.fileConfig(os.path.expanduser(file))
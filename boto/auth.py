@@ -295,6 +295,21 @@ class HmacAuthV4Handler(AuthHandler, HmacKeys):
 
     capability = ['hmac-v4']
 
+    # Upper bound on the number of derived signing keys kept per handler.
+    # Keys change daily, so only a handful are ever live at once.
+    SIGNING_KEY_CACHE_SIZE = 16
+
+    # Canonical (lower cased, stripped) forms of header names, shared by
+    # all handlers since the set of header names in use is small.
+    _canonical_header_names = {}
+
+    # Canonical lines of headers whose values rarely change (host,
+    # content type, security token...), likewise shared.  Headers whose
+    # values differ on every request aren't worth keeping.
+    _canonical_header_lines = {}
+    _per_request_headers = frozenset(['x-amz-date', 'x-amz-content-sha256',
+                                      'content-md5', 'content-length'])
+
     def __init__(self, host, config, provider,
                  service_name=None, region_name=None):
         AuthHandler.__init__(self, host, config, provider)
@@ -305,6 +320,15 @@ class HmacAuthV4Handler(AuthHandler, HmacKeys):
         self.service_name = service_name
         self.region_name = region_name
 
+    def update_provider(self, provider):
+        super(HmacAuthV4Handler, self).update_provider(provider)
+        self._signing_keys = {}
+
+    def __getstate__(self):
+        pickled_dict = super(HmacAuthV4Handler, self).__getstate__()
+        del pickled_dict['_signing_keys']
+        return pickled_dict
+
     def _sign(self, key, msg, hex=False):
         if not isinstance(key, bytes):
             key = key.encode('utf-8')
@@ -351,12 +375,26 @@ class HmacAuthV4Handler(AuthHandler, HmacKeys):
         # http_request.body field.
         if http_request.method == 'POST':
             return ""
+        return self._canonical_params(http_request)
+
+    def _canonical_params(self, http_request):
+        """
+        Return the sorted & quoted params of the request.  The result is
+        kept on the request, so signing it again with the same params (as
+        _mexe does on every retry) skips the sorting and quoting.
+        """
+        params = http_request.params
+        cached = getattr(http_request, '_canonical_params', None)
+        if cached is not None and cached[0] == params:
+            return cached[1]
         l = []
-        for param in sorted(http_request.params):
-            value = boto.utils.get_utf8_value(http_request.params[param])
+        for param in sorted(params):
+            value = boto.utils.get_utf8_value(params[param])
             l.append('%s=%s' % (urllib.parse.quote(param, safe='-_.~'),
                                 urllib.parse.quote(value, safe='-_.~')))
-        return '&'.join(l)
+        canonical = '&'.join(l)
+        http_request._canonical_params = (dict(params), canonical)
+        return canonical
 
     def canonical_headers(self, headers_to_sign):
         """
@@ -368,20 +406,43 @@ class HmacAuthV4Handler(AuthHandler, HmacKeys):
         canonical = []
 
         for header in headers_to_sign:
-            c_name = header.lower().strip()
+            c_name = self._canonical_header_name(header)
             raw_value = str(headers_to_sign[header])
-            if '"' in raw_value:
-                c_value = raw_value.strip()
-            else:
-                c_value = ' '.join(raw_value.strip().split())
-            canonical.append('%s:%s' % (c_name, c_value))
+            if c_name in self._per_request_headers:
+                canonical.append(self._canonical_header(c_name, raw_value))
+                continue
+            lines = self._canonical_header_lines
+            key = (c_name, raw_value)
+            line = lines.get(key)
+            if line is None:
+                line = self._canonical_header(c_name, raw_value)
+                if len(lines) < 1024:
+                    lines[key] = line
+            canonical.append(line)
         return '\n'.join(sorted(canonical))
 
+    def _canonical_header(self, c_name, raw_value):
+        if '"' in raw_value:
+            c_value = raw_value.strip()
+        else:
+            c_value = ' '.join(raw_value.strip().split())
+        return '%s:%s' % (c_name, c_value)
+
     def signed_headers(self, headers_to_sign):
-        l = ['%s' % n.lower().strip() for n in headers_to_sign]
+        l = [self._canonical_header_name(n) for n in headers_to_sign]
         l = sorted(l)
         return ';'.join(l)
 
+    def _canonical_header_name(self, name):
+        names = self._canonical_header_names
+        try:
+            return names[name]
+        except KeyError:
+            c_name = '%s' % name.lower().strip()
+            if len(names) < 1024:
+                names[name] = c_name
+            return c_name
+
     def canonical_uri(self, http_request):
         path = http_request.auth_path
         # Normalize the path
@@ -410,7 +471,10 @@ class HmacAuthV4Handler(AuthHandler, HmacKeys):
         cr.append(self.canonical_query_string(http_request))
         headers_to_sign = self.headers_to_sign(http_request)
         cr.append(self.canonical_headers(headers_to_sign) + '\n')
-        cr.append(self.signed_headers(headers_to_sign))
+        # Keep the signed headers around so add_auth doesn't have to
+        # select and sort them a second time.
+        http_request.signed_headers = self.signed_headers(headers_to_sign)
+        cr.append(http_request.signed_headers)
         cr.append(self.payload(http_request))
         return '\n'.join(cr)
 
@@ -479,13 +543,30 @@ class HmacAuthV4Handler(AuthHandler, HmacKeys):
         sts.append(sha256(canonical_request.encode('utf-8')).hexdigest())
         return '\n'.join(sts)
 
-    def signature(self, http_request, string_to_sign):
+    def signing_key(self, timestamp, region_name, service_name):
+        """
+        Return the key derived from the secret key for the given date,
+        region and service.  Derived keys are cached; the secret key is
+        part of the cache key, so rotated credentials never reuse a key
+        derived from the old secret.
+        """
         key = self._provider.secret_key
-        k_date = self._sign(('AWS4' + key).encode('utf-8'),
-                            http_request.timestamp)
-        k_region = self._sign(k_date, http_request.region_name)
-        k_service = self._sign(k_region, http_request.service_name)
-        k_signing = self._sign(k_service, 'aws4_request')
+        cache_key = (timestamp, region_name, service_name, key)
+        k_signing = self._signing_keys.get(cache_key)
+        if k_signing is None:
+            k_date = self._sign(('AWS4' + key).encode('utf-8'), timestamp)
+            k_region = self._sign(k_date, region_name)
+            k_service = self._sign(k_region, service_name)
+            k_signing = self._sign(k_service, 'aws4_request')
+            if len(self._signing_keys) >= self.SIGNING_KEY_CACHE_SIZE:
+                self._signing_keys.clear()
+            self._signing_keys[cache_key] = k_signing
+        return k_signing
+
+    def signature(self, http_request, string_to_sign):
+        k_signing = self.signing_key(http_request.timestamp,
+                                     http_request.region_name,
+                                     http_request.service_name)
         return self._sign(k_signing, string_to_sign, hex=True)
 
     def add_auth(self, req, **kwargs):
@@ -539,9 +620,11 @@ class HmacAuthV4Handler(AuthHandler, HmacKeys):
         boto.log.debug('StringToSign:\n%s' % string_to_sign)
         signature = self.signature(req, string_to_sign)
         boto.log.debug('Signature:\n%s' % signature)
-        headers_to_sign = self.headers_to_sign(req)
+        signed_headers = getattr(req, 'signed_headers', None)
+        if signed_headers is None:
+            signed_headers = self.signed_headers(self.headers_to_sign(req))
         l = ['AWS4-HMAC-SHA256 Credential=%s' % self.scope(req)]
-        l.append('SignedHeaders=%s' % self.signed_headers(headers_to_sign))
+        l.append('SignedHeaders=%s' % signed_headers)
         l.append('Signature=%s' % signature)
         req.headers['Authorization'] = ','.join(l)
 
@@ -578,12 +661,7 @@ class S3HmacAuthV4Handler(HmacAuthV4Handler, AuthHandler):
         # Note that we just do not return an empty string for
         # POST request. Query strings in url are included in canonical
         # query string.
-        l = []
-        for param in sorted(http_request.params):
-            value = boto.utils.get_utf8_value(http_request.params[param])
-            l.append('%s=%s' % (urllib.parse.quote(param, safe='-_.~'),
-                                urllib.parse.quote(value, safe='-_.~')))
-        return '&'.join(l)
+        return self._canonical_params(http_request)
 
     def host_header(self, host, http_request):
         port = http_request.port
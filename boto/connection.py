@@ -45,13 +45,14 @@ Handles basic connections to AWS
 from datetime import datetime
 import errno
 import os
-import random
 import re
 import socket
 import sys
 import time
 import xml.sax
 import copy
+import weakref
+from collections import deque
 
 from boto import auth
 from boto import auth_handler
@@ -59,15 +60,20 @@ import boto
 import boto.utils
 import boto.handler
 import boto.cacerts
+import boto.instrumentation
+import boto.ratelimit
+import boto.retry
 
 from boto import config, UserAgent
 from boto.compat import six, http_client, urlparse, quote, encodebytes
 from boto.exception import AWSConnectionError
 from boto.exception import BotoClientError
 from boto.exception import BotoServerError
+from boto.exception import CircuitOpenError
+from boto.exception import ConnectionPoolTimeoutError
 from boto.exception import PleaseRetryException
 from boto.provider import Provider
-from boto.resultset import ResultSet
+from boto.resultset import ResultSet, StreamingResultSet
 
 HAVE_HTTPS_CONNECTION = False
 try:
@@ -81,8 +87,10 @@ except ImportError:
 
 try:
     import threading
+    HAVE_THREADS = True
 except ImportError:
     import dummy_threading as threading
+    HAVE_THREADS = False
 
 ON_APP_ENGINE = all(key in os.environ for key in (
     'USER_IS_ADMIN', 'CURRENT_VERSION_ID', 'APPLICATION_ID'))
@@ -103,24 +111,54 @@ class HostConnectionPool(object):
     before the response body has been read, so they connections aren't
     ready to send another request yet.  They stay in the pending queue
     until they are ready for another request, at which point they are
-    returned to the pool of ready connections.
-
-    The pool of ready connections is an ordered list of
-    (connection,time) pairs, where the time is the time the connection
-    was returned from _mexe.  After a certain period of time,
-    connections are considered stale, and discarded rather than being
-    reused.  This saves having to wait for the connection to time out
-    if AWS has decided to close it on the other end because of
-    inactivity.
+    moved to the queue of ready connections.
+
+    Both queues are deques of (connection,time) pairs, where the time
+    is the time the connection was returned from _mexe.  Ready
+    connections are handed out most-recently-used first, so the least
+    recently used connections collect at the left end of the queue
+    where they are evicted once they become stale, or when the pool
+    is over its size limit.  Evicting stale connections saves having
+    to wait for the connection to time out if AWS has decided to close
+    it on the other end because of inactivity.
+
+    If ``max_size`` is set, at most that many connections (pooled plus
+    checked out) are handed out for this host.  Once the limit is
+    reached, ``get`` blocks until a connection is returned, released or
+    becomes ready, or until ``timeout`` seconds have passed.
 
     Thread Safety:
 
-        This class is used only from ConnectionPool while it's mutex
-        is held.
+        Each host pool has its own lock, so threads talking to
+        different hosts never contend with each other.
     """
 
-    def __init__(self):
-        self.queue = []
+    #
+    # How often a blocked checkout re-examines the pending queue.
+    # Responses are read (and closed) without the pool being told, so
+    # a waiter has to poll for pending connections becoming ready.
+    #
+
+    WAIT_POLL_INTERVAL = 0.1
+
+    def __init__(self, max_size=None):
+        self.ready = deque()
+        self.pending = deque()
+        self.max_size = max_size
+        # Connections handed out by get() that haven't been put back
+        # or released yet.
+        self.checked_out = 0
+        # Set by ConnectionPool.clean when this pool is dropped from
+        # the host mapping, so racing callers can look it up again.
+        self.removed = False
+        self.lock = threading.Lock()
+        self.available = threading.Condition(self.lock)
+        self.waiters = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.timeouts = 0
+        self.wait_time = 0.0
 
     def size(self):
         """
@@ -128,35 +166,136 @@ class HostConnectionPool(object):
         Some of the connections may still be in use, and may not be
         ready to be returned by get().
         """
-        return len(self.queue)
+        return len(self.ready) + len(self.pending)
 
     def put(self, conn):
         """
         Adds a connection to the pool, along with the time it was
         added.
         """
-        self.queue.append((conn, time.time()))
+        with self.lock:
+            if self.checked_out > 0:
+                self.checked_out -= 1
+            pair = (conn, time.time())
+            if self._conn_ready(conn):
+                self.ready.append(pair)
+            else:
+                self.pending.append(pair)
+            self._evict_overflow()
+            self.available.notify()
 
-    def get(self):
+    def release(self):
+        """
+        Gives back the slot of a checked out connection that was closed
+        or abandoned rather than returned to the pool.
+        """
+        with self.lock:
+            if self.checked_out > 0:
+                self.checked_out -= 1
+            self.available.notify()
+
+    def get(self, timeout=None):
         """
         Returns the next connection in this pool that is ready to be
-        reused.  Returns None if there aren't any.
+        reused.  Returns None if there aren't any, in which case the
+        caller is expected to create a new connection and hand it back
+        with put() (or release() if it's discarded).
+
+        If the pool is at ``max_size`` this blocks for up to ``timeout``
+        seconds (forever if ``timeout`` is None) and raises
+        :class:`boto.exception.ConnectionPoolTimeoutError` if no
+        connection became available.
         """
-        # Discard ready connections that are too old.
-        self.clean()
-
-        # Return the first connection that is ready, and remove it
-        # from the queue.  Connections that aren't ready are returned
-        # to the end of the queue with an updated time, on the
-        # assumption that somebody is actively reading the response.
-        for _ in range(len(self.queue)):
-            (conn, _) = self.queue.pop(0)
-            if self._conn_ready(conn):
-                return conn
-            else:
-                self.put(conn)
+        with self.lock:
+            start = None
+            while True:
+                conn = self._pop_ready()
+                if conn is not None:
+                    self.hits += 1
+                    break
+                if self.max_size is None or \
+                        self.checked_out + self.size() < self.max_size:
+                    self.misses += 1
+                    break
+                now = time.time()
+                if start is None:
+                    start = now
+                remaining = None
+                if timeout is not None:
+                    remaining = start + timeout - now
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        self.wait_time += now - start
+                        raise ConnectionPoolTimeoutError(
+                            'Timed out after %s seconds waiting for one of '
+                            '%d connections' % (timeout, self.max_size))
+                wait = self.WAIT_POLL_INTERVAL
+                if remaining is not None:
+                    wait = min(wait, remaining)
+                self.waiters += 1
+                try:
+                    self.available.wait(wait)
+                finally:
+                    self.waiters -= 1
+            if start is not None:
+                self.wait_time += time.time() - start
+            self.checked_out += 1
+            return conn
+
+    def get_stats(self):
+        """
+        Returns a dict with the counters for this host pool.
+        """
+        with self.lock:
+            return {
+                'size': self.size(),
+                'checked_out': self.checked_out,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'timeouts': self.timeouts,
+                'wait_time': self.wait_time,
+            }
+
+    def _pop_ready(self):
+        """
+        Returns the most recently used ready connection, or None.
+        Pending connections are only examined when there are no ready
+        ones, and every pending connection that turns out to be ready
+        is promoted in the same pass.
+        """
+        if not self.ready:
+            for _ in range(len(self.pending)):
+                pair = self.pending.popleft()
+                if self._conn_ready(pair[0]):
+                    self.ready.append(pair)
+                else:
+                    self.pending.append(pair)
+        if self.ready:
+            return self.ready.pop()[0]
         return None
 
+    def _evict_idle(self):
+        """
+        Closes and drops the least recently used ready connection.
+        Returns False if there was nothing to evict.
+        """
+        if not self.ready:
+            return False
+        (conn, _) = self.ready.popleft()
+        self.evictions += 1
+        conn.close()
+        return True
+
+    def _evict_overflow(self):
+        # Connections created outside of get() (a reconnect after an
+        # error, for instance) can push the pool past its limit.
+        if self.max_size is None:
+            return
+        while self.checked_out + self.size() > self.max_size:
+            if not self._evict_idle():
+                break
+
     def _conn_ready(self, conn):
         """
         There is a nice state diagram at the top of http_client.py.  It
@@ -184,10 +323,17 @@ class HostConnectionPool(object):
         """
         Get rid of stale connections.
         """
-        # Note that we do not close the connection here -- somebody
-        # may still be reading from it.
-        while len(self.queue) > 0 and self._pair_stale(self.queue[0]):
-            self.queue.pop(0)
+        with self.lock:
+            # Ready connections are idle, so they can safely be closed.
+            while self.ready and self._pair_stale(self.ready[0]):
+                (conn, _) = self.ready.popleft()
+                self.evictions += 1
+                conn.close()
+            # Note that we do not close pending connections -- somebody
+            # may still be reading from them.
+            while self.pending and self._pair_stale(self.pending[0]):
+                self.pending.popleft()
+                self.evictions += 1
 
     def _pair_stale(self, pair):
         """
@@ -206,6 +352,11 @@ class ConnectionPool(object):
     time.  This saves time spent waiting for a connection that AWS has
     timed out on the other end.
 
+    Stale connections are evicted by a background reaper thread shared
+    by all pools in the process, so checking out a connection never has
+    to walk every host pool.  Where threads aren't available the pools
+    are cleaned inline, at most once every ``CLEAN_INTERVAL`` seconds.
+
     This class is thread-safe.
     """
 
@@ -228,16 +379,42 @@ class ConnectionPool(object):
 
     STALE_DURATION = 60.0
 
-    def __init__(self):
+    def __init__(self, max_connections_per_host=None, timeout=None):
+        """
+        :type max_connections_per_host: int
+        :param max_connections_per_host: The maximum number of
+            connections to open to any one host.  If None (the default)
+            the number of connections is unbounded.  Can also be set
+            with the ``max_connections_per_host`` option in the Boto
+            config section.
+
+        :type timeout: float
+        :param timeout: How many seconds to wait for a connection when
+            a host is at ``max_connections_per_host``.  If None (the
+            default) wait indefinitely.  Can also be set with the
+            ``connection_pool_timeout`` option in the Boto config
+            section.
+        """
         # Mapping from (host,port,is_secure) to HostConnectionPool.
         # If a pool becomes empty, it is removed.
         self.host_to_pool = {}
         # The last time the pool was cleaned.
         self.last_clean_time = 0.0
+        # Only guards host_to_pool; each host pool has its own lock.
         self.mutex = threading.Lock()
         ConnectionPool.STALE_DURATION = \
             config.getfloat('Boto', 'connection_stale_duration',
                             ConnectionPool.STALE_DURATION)
+        if max_connections_per_host is None:
+            max_connections_per_host = config.getint(
+                'Boto', 'max_connections_per_host', 0) or None
+        self.max_connections_per_host = max_connections_per_host
+        if timeout is None:
+            timeout = config.get('Boto', 'connection_pool_timeout', None)
+            if timeout is not None:
+                timeout = float(timeout)
+        self.timeout = timeout
+        self._reaped = _PoolReaper.register(self)
 
     def __getstate__(self):
         pickled_dict = copy.copy(self.__dict__)
@@ -246,58 +423,138 @@ class ConnectionPool(object):
         return pickled_dict
 
     def __setstate__(self, dct):
-        self.__init__()
+        self.__init__(dct.get('max_connections_per_host'),
+                      dct.get('timeout'))
 
     def size(self):
         """
         Returns the number of connections in the pool.
         """
-        return sum(pool.size() for pool in self.host_to_pool.values())
+        return sum(pool.size() for pool in list(self.host_to_pool.values()))
+
+    def get_stats(self):
+        """
+        Returns a dict of counters summed over all of the host pools:
+        ``size``, ``checked_out``, ``hits``, ``misses``, ``evictions``,
+        ``timeouts`` and ``wait_time`` (total seconds spent blocked
+        waiting for a connection).
+        """
+        stats = {'size': 0, 'checked_out': 0, 'hits': 0, 'misses': 0,
+                 'evictions': 0, 'timeouts': 0, 'wait_time': 0.0}
+        for pool in list(self.host_to_pool.values()):
+            for name, value in pool.get_stats().items():
+                stats[name] += value
+        return stats
 
     def get_http_connection(self, host, port, is_secure):
         """
         Gets a connection from the pool for the named host.  Returns
         None if there is no connection that can be reused. It's the caller's
         responsibility to call close() on the connection when it's no longer
-        needed.
+        needed, and to hand it back with put_http_connection or
+        release_http_connection.
         """
-        self.clean()
-        with self.mutex:
-            key = (host, port, is_secure)
-            if key not in self.host_to_pool:
-                return None
-            return self.host_to_pool[key].get()
+        if not self._reaped:
+            self.clean()
+        while True:
+            pool = self._get_host_pool((host, port, is_secure))
+            conn = pool.get(self.timeout)
+            if conn is not None or not pool.removed:
+                return conn
+            # The pool was dropped by clean() while we were waiting on
+            # it; give the slot back and try again with a fresh one.
+            pool.release()
 
     def put_http_connection(self, host, port, is_secure, conn):
         """
         Adds a connection to the pool of connections that can be
         reused for the named host.
         """
-        with self.mutex:
-            key = (host, port, is_secure)
-            if key not in self.host_to_pool:
-                self.host_to_pool[key] = HostConnectionPool()
-            self.host_to_pool[key].put(conn)
+        self._get_host_pool((host, port, is_secure)).put(conn)
+
+    def release_http_connection(self, host, port, is_secure):
+        """
+        Tells the pool that a connection checked out for the named host
+        was closed or abandoned instead of being put back.
+        """
+        pool = self.host_to_pool.get((host, port, is_secure))
+        if pool is not None:
+            pool.release()
+
+    def _get_host_pool(self, key):
+        pool = self.host_to_pool.get(key)
+        if pool is None:
+            with self.mutex:
+                pool = self.host_to_pool.get(key)
+                if pool is None:
+                    pool = HostConnectionPool(self.max_connections_per_host)
+                    self.host_to_pool[key] = pool
+        return pool
 
     def clean(self):
         """
         Clean up the stale connections in all of the pools, and then
-        get rid of empty pools.  Pools clean themselves every time a
-        connection is fetched; this cleaning takes care of pools that
-        aren't being used any more, so nothing is being gotten from
-        them.
+        get rid of empty pools.  This is called periodically by the
+        reaper thread (or inline from get_http_connection when there
+        is no reaper).
         """
         with self.mutex:
             now = time.time()
-            if self.last_clean_time + self.CLEAN_INTERVAL < now:
-                to_remove = []
-                for (host, pool) in self.host_to_pool.items():
+            if self.last_clean_time + self.CLEAN_INTERVAL > now:
+                return
+            self.last_clean_time = now
+            pools = list(self.host_to_pool.items())
+        for (host, pool) in pools:
+            pool.clean()
+        with self.mutex:
+            for (host, pool) in pools:
+                with pool.lock:
+                    if pool.size() == 0 and pool.checked_out == 0 and \
+                            pool.waiters == 0:
+                        pool.removed = True
+                        if self.host_to_pool.get(host) is pool:
+                            del self.host_to_pool[host]
+
+
+class _PoolReaper(threading.Thread):
+
+    """
+    A daemon thread that periodically cleans every live ConnectionPool
+    in the process.  Pools are held by weak reference, so a pool going
+    away with its connection object needs no unregistering.
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self):
+        super(_PoolReaper, self).__init__(name='boto-connection-reaper')
+        self.daemon = True
+        self.pools = weakref.WeakValueDictionary()
+
+    @classmethod
+    def register(cls, pool):
+        """
+        Adds a pool to the reaper, starting the reaper if needed.
+        Returns False if pools have to clean themselves instead.
+        """
+        if ON_APP_ENGINE or not HAVE_THREADS:
+            return False
+        with cls._lock:
+            if cls._instance is None or not cls._instance.is_alive():
+                cls._instance = cls()
+                cls._instance.start()
+            cls._instance.pools[id(pool)] = pool
+        return True
+
+    def run(self):
+        while True:
+            time.sleep(ConnectionPool.CLEAN_INTERVAL)
+            for pool in list(self.pools.values()):
+                try:
                     pool.clean()
-                    if pool.size() == 0:
-                        to_remove.append(host)
-                for host in to_remove:
-                    del self.host_to_pool[host]
-                self.last_clean_time = now
+                except Exception:
+                    boto.log.exception('Error cleaning connection pool')
 
 
 class HTTPRequest(object):
@@ -386,6 +643,10 @@ class HTTPRequest(object):
 
 class HTTPResponse(http_client.HTTPResponse):
 
+    # The boto.instrumentation.RequestMetrics of the request, while the
+    # body is being read.
+    metrics = None
+
     def __init__(self, *args, **kwargs):
         http_client.HTTPResponse.__init__(self, *args, **kwargs)
         self._cached_response = ''
@@ -407,10 +668,62 @@ class HTTPResponse(http_client.HTTPResponse):
             # will return the full body.  Note that this behavior only
             # happens if the amt arg is not specified.
             if not self._cached_response:
-                self._cached_response = http_client.HTTPResponse.read(self)
+                self._cached_response = self._read()
             return self._cached_response
         else:
+            return self._read(amt)
+
+    def _read(self, amt=None):
+        metrics = self.metrics
+        if metrics is None:
             return http_client.HTTPResponse.read(self, amt)
+        # Reading to the end closes the response, which mustn't finish the
+        # metrics before this read is counted.
+        self.metrics = None
+        started = time.time()
+        try:
+            data = http_client.HTTPResponse.read(self, amt)
+        except Exception as e:
+            metrics.finish(e)
+            raise
+        metrics.body_read(time.time() - started, len(data))
+        if not data or amt is None or self.isclosed():
+            metrics.finish()
+        else:
+            self.metrics = metrics
+        return data
+
+    def close(self):
+        http_client.HTTPResponse.close(self)
+        metrics = self.metrics
+        if metrics is not None:
+            self.metrics = None
+            metrics.finish()
+
+
+def _get_body_size(request):
+    if isinstance(request.body, bytes):
+        return len(request.body)
+    for name, value in request.headers.items():
+        if name.lower() == 'content-length':
+            try:
+                return int(value)
+            except ValueError:
+                break
+    return 0
+
+
+def _track_response_body(request, response, metrics):
+    """
+    Has the response finish the request's metrics once its body is read,
+    or finishes them now if there's no body left to read.
+    """
+    if isinstance(response, HTTPResponse) and request.method != 'HEAD' and \
+            not response.isclosed() and getattr(response, 'length', None) != 0:
+        response.metrics = metrics
+    else:
+        metrics.bytes_in += len(getattr(response, '_cached_response', ''))
+        metrics.finish()
 
 
 class AWSAuthConnection(object):
@@ -472,7 +785,16 @@ class AWSAuthConnection(object):
             file to use a named set of keys instead.
         """
         self.suppress_consec_slashes = suppress_consec_slashes
-        self.num_retries = 6
+        self.num_retries = config.getint('Boto', 'num_retries', 6)
+        # Decides whether & when failed requests are retried. The default
+        # policy, & its per-host state, is shared by every connection.
+        self.retry_policy = boto.retry.get_default_policy()
+        # Makes requests wait for actions with a configured rate limit. The
+        # default limiter is shared by every connection.
+        self.rate_limiter = boto.ratelimit.get_default_limiter()
+        # Times the phases of each request. ``None`` falls back on the
+        # default instrumentation, if any.
+        self.instrumentation = None
         # Override passed-in is_secure setting if value was defined in config.
         if config.has_option('Boto', 'is_secure'):
             is_secure = config.getboolean('Boto', 'is_secure')
@@ -595,7 +917,11 @@ class AWSAuthConnection(object):
     auth_region_name = property(_get_auth_region_name, _set_auth_region_name)
 
     def connection(self):
-        return self.get_http_connection(*self._connection)
+        # Callers of this property never hand the connection back, so it
+        # mustn't hold on to a slot in the pool.
+        conn = self.get_http_connection(*self._connection)
+        self.release_http_connection(*self._connection)
+        return conn
     connection = property(connection)
 
     def aws_access_key_id(self):
@@ -775,11 +1101,24 @@ class AWSAuthConnection(object):
         # Set the response class of the http connection to use our custom
         # class.
         connection.response_class = HTTPResponse
+        if self._get_instrumentation() is not None and \
+                hasattr(connection, 'connect'):
+            boto.instrumentation.time_connect(connection, is_secure)
         return connection
 
     def put_http_connection(self, host, port, is_secure, connection):
         self._pool.put_http_connection(host, port, is_secure, connection)
 
+    def release_http_connection(self, host, port, is_secure):
+        self._pool.release_http_connection(host, port, is_secure)
+
+    def get_pool_stats(self):
+        """
+        Returns the connection pool counters for this connection.  See
+        :meth:`ConnectionPool.get_stats`.
+        """
+        return self._pool.get_stats()
+
     def proxy_ssl(self, host=None, port=None):
         if host and port:
             host = '%s:%d' % (host, port)
@@ -883,6 +1222,18 @@ class AWSAuthConnection(object):
     def set_request_hook(self, hook):
         self.request_hook = hook
 
+    def set_instrumentation(self, instrumentation):
+        """
+        Sets the :class:`boto.instrumentation.Instrumentation` timing this
+        connection's requests.
+        """
+        self.instrumentation = instrumentation
+
+    def _get_instrumentation(self):
+        if self.instrumentation is not None:
+            return self.instrumentation
+        return boto.instrumentation.get_default_instrumentation()
+
     def _mexe(self, request, sender=None, override_num_retries=None,
               retry_handler=None):
         """
@@ -905,131 +1256,270 @@ class AWSAuthConnection(object):
         body = None
         ex = None
         if override_num_retries is None:
-            num_retries = config.getint('Boto', 'num_retries', self.num_retries)
+            num_retries = self.num_retries
         else:
             num_retries = override_num_retries
+        policy = self.retry_policy
+        if not policy.allow_request(request.host):
+            raise CircuitOpenError(
+                'Not sending the request, as the last requests to %s all '
+                'failed' % request.host)
         i = 0
-        connection = self.get_http_connection(request.host, request.port,
-                                              self.is_secure)
-
-        # Convert body to bytes if needed
-        if not isinstance(request.body, bytes) and hasattr(request.body,
-                                                           'encode'):
-            request.body = request.body.encode('utf-8')
-
-        while i <= num_retries:
-            # Use binary exponential backoff to desynchronize client requests.
-            next_sleep = min(random.random() * (2 ** i),
-                             boto.config.get('Boto', 'max_retry_delay', 60))
-            try:
-                # we now re-sign each request before it is retried
-                boto.log.debug('Token: %s' % self.provider.security_token)
-                request.authorize(connection=self)
-                # Only force header for non-s3 connections, because s3 uses
-                # an older signing method + bucket resource URLs that include
-                # the port info. All others should be now be up to date and
-                # not include the port.
-                if 's3' not in self._required_auth_capability():
-                    if not getattr(self, 'anon', False):
-                        self.set_host_header(request)
-                boto.log.debug('Final headers: %s' % request.headers)
-                request.start_time = datetime.now()
-                if callable(sender):
-                    response = sender(connection, request.method, request.path,
-                                      request.body, request.headers)
+        next_sleep = 0
+        # What the last retry took from the host's retry quota.
+        retry_cost = None
+        service, action = boto.ratelimit.get_request_action(request)
+        metrics = None
+        instrumentation = self._get_instrumentation()
+        if instrumentation is not None:
+            metrics = instrumentation.start(service, action, request.host,
+                                            request.method)
+        # Whether the connection still holds a slot in the pool, which has
+        # to be given back however the request ends.
+        checked_out = False
+        is_secure = self.is_secure
+        error = None
+        try:
+            connection = self.get_http_connection(request.host, request.port,
+                                                  is_secure)
+            checked_out = True
+            if metrics is not None:
+                metrics.pool_wait = time.time() - metrics.start_time
+
+            # Convert body to bytes if needed
+            if not isinstance(request.body, bytes) and hasattr(request.body,
+                                                               'encode'):
+                request.body = request.body.encode('utf-8')
+
+            while i <= num_retries:
+                # Back off with jitter to desynchronize client requests.
+                next_sleep = policy.compute_delay(i, next_sleep)
+                # Every attempt counts towards the service's rate limit.
+                if metrics is not None:
+                    started = time.time()
+                    self.rate_limiter.acquire(service, action)
+                    metrics.add('rate_limit_wait', time.time() - started)
                 else:
-                    connection.request(request.method, request.path,
-                                       request.body, request.headers)
-                    response = connection.getresponse()
-                boto.log.debug('Response headers: %s' % response.getheaders())
-                location = response.getheader('location')
-                # -- gross hack --
-                # http_client gets confused with chunked responses to HEAD requests
-                # so I have to fake it out
-                if request.method == 'HEAD' and getattr(response,
-                                                        'chunked', False):
-                    response.chunked = 0
-                if callable(retry_handler):
-                    status = retry_handler(response, i, next_sleep)
-                    if status:
-                        msg, i, next_sleep = status
-                        if msg:
+                    self.rate_limiter.acquire(service, action)
+                try:
+                    # we now re-sign each request before it is retried
+                    boto.log.debug('Token: %s' % self.provider.security_token)
+                    if metrics is not None:
+                        started = time.time()
+                    request.authorize(connection=self)
+                    # Only force header for non-s3 connections, because s3
+                    # uses an older signing method + bucket resource URLs that
+                    # include the port info. All others should be now be up to
+                    # date and not include the port.
+                    if 's3' not in self._required_auth_capability():
+                        if not getattr(self, 'anon', False):
+                            self.set_host_header(request)
+                    boto.log.debug('Final headers: %s' % request.headers)
+                    if metrics is not None:
+                        metrics.add('signing', time.time() - started)
+                        metrics.attempt_started(_get_body_size(request))
+                    request.start_time = datetime.now()
+                    if callable(sender):
+                        response = sender(connection, request.method,
+                                          request.path, request.body,
+                                          request.headers)
+                    else:
+                        connection.request(request.method, request.path,
+                                           request.body, request.headers)
+                        if metrics is not None:
+                            metrics.request_sent()
+                        response = connection.getresponse()
+                    if metrics is not None:
+                        metrics.response_received(connection, response.status)
+                    boto.log.debug('Response headers: %s' %
+                                   response.getheaders())
+                    location = response.getheader('location')
+                    # -- gross hack --
+                    # http_client gets confused with chunked responses to HEAD
+                    # requests so I have to fake it out
+                    if request.method == 'HEAD' and getattr(response,
+                                                            'chunked', False):
+                        response.chunked = 0
+                    kind = None
+                    # Set for a throttling error that won't be retried, which
+                    # says nothing about whether the host is healthy.
+                    throttled = False
+                    if callable(retry_handler):
+                        # The handler decides which error responses are
+                        # retried, other than server errors.
+                        status = retry_handler(response, i, next_sleep)
+                        if status:
+                            msg, i, next_sleep = status
+                            if response.status >= 500:
+                                handled = boto.retry.TRANSIENT
+                            else:
+                                handled = boto.retry.THROTTLED
+                            policy.record_failure(request.host, handled)
+                            retry_cost = policy.acquire_retry(request.host,
+                                                              handled)
+                            if retry_cost is not None:
+                                if msg:
+                                    boto.log.debug(msg)
+                                if metrics is not None:
+                                    metrics.retrying(str(response.status))
+                                    metrics.add('backoff', next_sleep)
+                                time.sleep(next_sleep)
+                                continue
+                            # Out of retries; only client errors are handed to
+                            # the caller below.
+                            if not 400 <= response.status < 500:
+                                body = response.read()
+                                if isinstance(body, bytes):
+                                    body = body.decode('utf-8')
+                                break
+                            throttled = True
+                        elif response.status >= 500:
+                            kind = boto.retry.TRANSIENT
+                    else:
+                        error_body = None
+                        if response.status in \
+                                boto.retry.THROTTLING_STATUS_CODES:
+                            # The body is cached, so the caller can still read
+                            # it.
+                            error_body = response.read()
+                        kind = policy.classify_response(response, error_body)
+                    if kind is not None:
+                        body = response.read()
+                        if isinstance(body, bytes):
+                            body = body.decode('utf-8')
+                        policy.record_failure(request.host, kind)
+                        if i < num_retries:
+                            retry_cost = policy.acquire_retry(request.host,
+                                                              kind)
+                        else:
+                            retry_cost = None
+                        if retry_cost is not None:
+                            msg = 'Received %d response.  ' % response.status
+                            msg += 'Retrying in %3.1f seconds' % next_sleep
                             boto.log.debug(msg)
-                        time.sleep(next_sleep)
-                        continue
-                if response.status in [500, 502, 503, 504]:
-                    msg = 'Received %d response.  ' % response.status
-                    msg += 'Retrying in %3.1f seconds' % next_sleep
-                    boto.log.debug(msg)
-                    body = response.read()
-                    if isinstance(body, bytes):
-                        body = body.decode('utf-8')
-                elif response.status < 300 or response.status >= 400 or \
-                        not location:
-                    # don't return connection to the pool if response contains
-                    # Connection:close header, because the connection has been
-                    # closed and default reconnect behavior may do something
-                    # different than new_http_connection. Also, it's probably
-                    # less efficient to try to reuse a closed connection.
-                    conn_header_value = response.getheader('connection')
-                    if conn_header_value == 'close':
-                        connection.close()
+                            if metrics is not None:
+                                metrics.retrying(
+                                    boto.retry.get_error_code(body) or
+                                    str(response.status))
+                                metrics.add('backoff', next_sleep)
+                            time.sleep(next_sleep)
+                            i += 1
+                            continue
+                        if response.status >= 500:
+                            break
+                        # Hand client errors (throttling that can't be retried
+                        # any more) to the caller, to raise its own exception.
+                        throttled = True
+                    if response.status < 300 or response.status >= 400 or \
+                            not location:
+                        if not throttled:
+                            policy.record_success(request.host, retry_cost)
+                        # don't return connection to the pool if response
+                        # contains Connection:close header, because the
+                        # connection has been closed and default reconnect
+                        # behavior may do something different than
+                        # new_http_connection. Also, it's probably less
+                        # efficient to try to reuse a closed connection.
+                        conn_header_value = response.getheader('connection')
+                        if conn_header_value == 'close':
+                            connection.close()
+                            self.release_http_connection(request.host,
+                                                         request.port,
+                                                         is_secure)
+                        else:
+                            self.put_http_connection(request.host,
+                                                     request.port, is_secure,
+                                                     connection)
+                        checked_out = False
+                        if self.request_hook is not None:
+                            self.request_hook.handle_request_data(request,
+                                                                  response)
+                        if metrics is not None:
+                            _track_response_body(request, response, metrics)
+                            # Finished once the body has been read.
+                            metrics = None
+                        return response
                     else:
-                        self.put_http_connection(request.host, request.port,
-                                                 self.is_secure, connection)
-                    if self.request_hook is not None:
-                        self.request_hook.handle_request_data(request, response)
-                    return response
-                else:
-                    scheme, request.host, request.path, \
-                        params, query, fragment = urlparse(location)
-                    if query:
-                        request.path += '?' + query
-                    # urlparse can return both host and port in netloc, so if
-                    # that's the case we need to split them up properly
-                    if ':' in request.host:
-                        request.host, request.port = request.host.split(':', 1)
-                    msg = 'Redirecting: %s' % scheme + '://'
-                    msg += request.host + request.path
-                    boto.log.debug(msg)
-                    connection = self.get_http_connection(request.host,
+                        self.release_http_connection(request.host,
+                                                     request.port, is_secure)
+                        checked_out = False
+                        scheme, request.host, request.path, \
+                            params, query, fragment = urlparse(location)
+                        if query:
+                            request.path += '?' + query
+                        # urlparse can return both host and port in netloc,
+                        # so if that's the case we need to split them up
+                        # properly
+                        if ':' in request.host:
+                            request.host, request.port = \
+                                request.host.split(':', 1)
+                        msg = 'Redirecting: %s' % scheme + '://'
+                        msg += request.host + request.path
+                        boto.log.debug(msg)
+                        is_secure = scheme == 'https'
+                        connection = self.get_http_connection(request.host,
+                                                              request.port,
+                                                              is_secure)
+                        checked_out = True
+                        response = None
+                        continue
+                except PleaseRetryException as e:
+                    boto.log.debug('encountered a retry exception: %s' % e)
+                    connection = self.new_http_connection(request.host,
                                                           request.port,
-                                                          scheme == 'https')
-                    response = None
-                    continue
-            except PleaseRetryException as e:
-                boto.log.debug('encountered a retry exception: %s' % e)
-                connection = self.new_http_connection(request.host, request.port,
-                                                      self.is_secure)
-                response = e.response
-                ex = e
-            except self.http_exceptions as e:
-                for unretryable in self.http_unretryable_exceptions:
-                    if isinstance(e, unretryable):
-                        boto.log.debug(
-                            'encountered unretryable %s exception, re-raising' %
-                            e.__class__.__name__)
-                        raise
-                boto.log.debug('encountered %s exception, reconnecting' %
-                               e.__class__.__name__)
-                connection = self.new_http_connection(request.host, request.port,
-                                                      self.is_secure)
-                ex = e
-            time.sleep(next_sleep)
-            i += 1
-        # If we made it here, it's because we have exhausted our retries
-        # and stil haven't succeeded.  So, if we have a response object,
-        # use it to raise an exception.
-        # Otherwise, raise the exception that must have already happened.
-        if self.request_hook is not None:
-            self.request_hook.handle_request_data(request, response, error=True)
-        if response:
-            raise BotoServerError(response.status, response.reason, body)
-        elif ex:
-            raise ex
-        else:
-            msg = 'Please report this exception as a Boto Issue!'
-            raise BotoClientError(msg)
+                                                          is_secure)
+                    response = e.response
+                    ex = e
+                    kind = boto.retry.TRANSIENT
+                except self.http_exceptions as e:
+                    for unretryable in self.http_unretryable_exceptions:
+                        if isinstance(e, unretryable):
+                            boto.log.debug(
+                                'encountered unretryable %s exception, '
+                                're-raising' % e.__class__.__name__)
+                            raise
+                    boto.log.debug('encountered %s exception, reconnecting' %
+                                   e.__class__.__name__)
+                    connection = self.new_http_connection(request.host,
+                                                          request.port,
+                                                          is_secure)
+                    ex = e
+                    kind = policy.classify_exception(e)
+                policy.record_failure(request.host, kind)
+                if i >= num_retries:
+                    break
+                retry_cost = policy.acquire_retry(request.host, kind)
+                if retry_cost is None:
+                    break
+                if metrics is not None:
+                    metrics.retrying(ex.__class__.__name__)
+                    metrics.add('backoff', next_sleep)
+                time.sleep(next_sleep)
+                i += 1
+            # If we made it here, it's because we have exhausted our retries
+            # and stil haven't succeeded.  So, if we have a response object,
+            # use it to raise an exception.
+            # Otherwise, raise the exception that must have already happened.
+            if self.request_hook is not None:
+                self.request_hook.handle_request_data(request, response,
+                                                      error=True)
+            if response:
+                error = BotoServerError(response.status, response.reason, body)
+            elif ex:
+                error = ex
+            else:
+                msg = 'Please report this exception as a Boto Issue!'
+                error = BotoClientError(msg)
+            raise error
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            if checked_out:
+                self.release_http_connection(request.host, request.port,
+                                             is_secure)
+            if metrics is not None:
+                metrics.finish(error)
 
     def build_base_http_request(self, method, path, auth_path,
                                 params=None, headers=None, data='', host=None):
@@ -1163,10 +1653,22 @@ class AWSQueryConnection(AWSAuthConnection):
     # generics
 
     def get_list(self, action, params, markers, path='/',
-                 parent=None, verb='GET'):
+                 parent=None, verb='GET', stream=False):
+        """
+        Makes a request and parses the list of ``markers`` objects out of
+        the response.
+
+        If ``stream`` is True, a
+        :class:`boto.resultset.StreamingResultSet` is returned instead of a
+        :class:`boto.resultset.ResultSet`.  It parses the response body
+        while it is being downloaded and yields the objects one at a
+        time, so very large responses never have to be held in memory.
+        """
         if not parent:
             parent = self
         response = self.make_request(action, params, path, verb)
+        if stream and response.status == 200:
+            return StreamingResultSet(response, markers, parent)
         body = response.read()
         boto.log.debug(body)
         if not body:
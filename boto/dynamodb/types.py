@@ -27,9 +27,12 @@ Python types and vice-versa.
 import base64
 from decimal import (Decimal, DecimalException, Context,
                      Clamped, Overflow, Inexact, Underflow, Rounded)
-from collections import Mapping
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
 from boto.dynamodb.exceptions import DynamoDBNumberError
-from boto.compat import filter, map, six, long_type
+from boto.compat import map, six, long_type
 
 
 DYNAMODB_CONTEXT = Context(
@@ -99,6 +102,31 @@ def convert_binary(n):
     return Binary(base64.b64decode(n))
 
 
+# The DynamoDB types for values whose exact Python type is enough to tell
+# them apart. Sets (whose type depends on their members) & subclasses take
+# the slower path through ``get_dynamodb_type``.
+if six.PY2:
+    _SIMPLE_TYPES = {
+        str: 'S', unicode: 'S', int: 'N', long_type: 'N', float: 'N',
+        Decimal: 'N', bool: 'BOOL', type(None): 'NULL', dict: 'M',
+        list: 'L',
+    }
+else:  # PY3
+    _SIMPLE_TYPES = {
+        str: 'S', int: 'N', float: 'N', Decimal: 'N', bool: 'BOOL',
+        type(None): 'NULL', bytes: 'B', dict: 'M', list: 'L',
+    }
+
+_SIMPLE_NON_BOOLEAN_TYPES = dict(_SIMPLE_TYPES)
+_SIMPLE_NON_BOOLEAN_TYPES[bool] = 'N'
+
+DYNAMODB_TYPES = ('S', 'N', 'B', 'SS', 'NS', 'BS', 'NULL', 'BOOL', 'M', 'L')
+
+# Integers with fewer digits than the context's precision convert to the
+# same string with or without going through a Decimal.
+_MAX_EXACT_INT = 10 ** DYNAMODB_CONTEXT.prec
+
+
 def get_dynamodb_type(val, use_boolean=True):
     """
     Take a scalar Python value and return a string representing
@@ -205,6 +233,10 @@ else:
             return 'Binary(%r)' % self.value
 
 
+_SIMPLE_TYPES[Binary] = 'B'
+_SIMPLE_NON_BOOLEAN_TYPES[Binary] = 'B'
+
+
 def item_object_hook(dct):
     """
     A custom object hook for use when decoding JSON item bodys.
@@ -260,9 +292,36 @@ class Dynamizer(object):
             v
         'foo'     (Python type)
 
+    The ``_encode_*``/``_decode_*`` methods are looked up once per
+    instance & kept in dispatch tables, as is the DynamoDB type of each
+    plain Python type, so encoding & decoding don't search for them on
+    every value.
+
     """
+    _use_boolean = True
+    _simple_types = _SIMPLE_TYPES
+
     def _get_dynamodb_type(self, attr):
-        return get_dynamodb_type(attr)
+        dynamodb_type = self._simple_types.get(type(attr))
+        if dynamodb_type is None:
+            dynamodb_type = get_dynamodb_type(attr,
+                                              use_boolean=self._use_boolean)
+        return dynamodb_type
+
+    def _build_dispatch_table(self, prefix):
+        table = {}
+        for dynamodb_type in DYNAMODB_TYPES:
+            method = getattr(self, prefix + dynamodb_type.lower(), None)
+            if method is not None:
+                table[dynamodb_type] = method
+        return table
+
+    def __getstate__(self):
+        # The dispatch tables hold bound methods, so rebuild them instead.
+        state = self.__dict__.copy()
+        state.pop('_encoders', None)
+        state.pop('_decoders', None)
+        return state
 
     def encode(self, attr):
         """
@@ -272,13 +331,33 @@ class Dynamizer(object):
         """
         dynamodb_type = self._get_dynamodb_type(attr)
         try:
-            encoder = getattr(self, '_encode_%s' % dynamodb_type.lower())
+            encoders = self._encoders
         except AttributeError:
-            raise ValueError("Unable to encode dynamodb type: %s" %
-                             dynamodb_type)
+            encoders = self._encoders = self._build_dispatch_table('_encode_')
+        encoder = encoders.get(dynamodb_type)
+        if encoder is None:
+            try:
+                encoder = getattr(self, '_encode_%s' % dynamodb_type.lower())
+            except AttributeError:
+                raise ValueError("Unable to encode dynamodb type: %s" %
+                                 dynamodb_type)
         return {dynamodb_type: encoder(attr)}
 
+    def encode_item(self, item):
+        """
+        Encodes every value of a dictionary of attribute names to python
+        types, returning a dictionary of attribute names to the format
+        expected by DynamoDB.
+
+        """
+        encode = self.encode
+        return dict([(key, encode(value)) for key, value in item.items()])
+
     def _encode_n(self, attr):
+        if type(attr) in six.integer_types and \
+                -_MAX_EXACT_INT < attr < _MAX_EXACT_INT:
+            # Fits the context exactly, so there's nothing to check.
+            return str(attr)
         try:
             if isinstance(attr, float) and not hasattr(Decimal, 'from_float'):
                 # python2.6 does not support creating Decimals directly
@@ -286,7 +365,7 @@ class Dynamizer(object):
                 n = str(float_to_decimal(attr))
             else:
                 n = str(DYNAMODB_CONTEXT.create_decimal(attr))
-            if list(filter(lambda x: x in n, ('Infinity', 'NaN'))):
+            if 'Infinity' in n or 'NaN' in n:
                 raise TypeError('Infinity and NaN not supported')
             return n
         except (TypeError, DecimalException) as e:
@@ -335,7 +414,14 @@ class Dynamizer(object):
         """
         if len(attr) > 1 or not attr:
             return attr
-        dynamodb_type = list(attr.keys())[0]
+        dynamodb_type = next(iter(attr))
+        try:
+            decoders = self._decoders
+        except AttributeError:
+            decoders = self._decoders = self._build_dispatch_table('_decode_')
+        decoder = decoders.get(dynamodb_type)
+        if decoder is not None:
+            return decoder(attr[dynamodb_type])
         if dynamodb_type.lower() == dynamodb_type:
             # It's not an actual type, just a single character attr that
             # overlaps with the DDB types. Return it.
@@ -346,6 +432,16 @@ class Dynamizer(object):
             return attr
         return decoder(attr[dynamodb_type])
 
+    def decode_item(self, item):
+        """
+        Decodes every value of a dictionary of attribute names to the
+        format returned by DynamoDB, returning a dictionary of attribute
+        names to python types.
+
+        """
+        decode = self.decode
+        return dict([(key, decode(value)) for key, value in item.items()])
+
     def _decode_n(self, attr):
         return DYNAMODB_CONTEXT.create_decimal(attr)
 
@@ -382,8 +478,8 @@ class NonBooleanDynamizer(Dynamizer):
 
     This class is provided for backward compatibility.
     """
-    def _get_dynamodb_type(self, attr):
-        return get_dynamodb_type(attr, use_boolean=False)
+    _use_boolean = False
+    _simple_types = _SIMPLE_NON_BOOLEAN_TYPES
 
 
 class LossyFloatDynamizer(NonBooleanDynamizer):
@@ -0,0 +1,194 @@
+import logging
+import random
+import threading
+import time
+import weakref
+
+from boto.vendored.six.moves.queue import Empty, Full
+
+
+_END_SENTINEL = object()
+log = logging.getLogger('boto.dynamodb2.concurrent')
+
+# The base & cap (in seconds) for the backoff between retries of
+# unprocessed items.
+BACKOFF_BASE = 0.05
+BACKOFF_CAP = 20
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    """
+    Returns how long to sleep before retry number ``attempt`` (starting at
+    0), using exponential backoff with full jitter so that many writers
+    retrying at once don't stay in lock step.
+    """
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class CapacityLimiter(object):
+    """
+    A token bucket that limits the capacity units consumed per second.
+
+    Callers ``consume`` an estimate of the capacity a request will use
+    before sending it, then ``adjust`` by the difference once DynamoDB
+    reports the ``ConsumedCapacity`` actually used. The bucket may go into
+    debt, in which case the next caller sleeps until it has been repaid.
+
+    Instances are safe to share between threads.
+    """
+    def __init__(self, units_per_second):
+        if units_per_second <= 0:
+            raise ValueError('units_per_second must be positive.')
+        self.units_per_second = float(units_per_second)
+        # Allow up to one second's worth of burst.
+        self._tokens = self.units_per_second
+        self._last = time.time()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.time()
+        self._tokens = min(
+            self.units_per_second,
+            self._tokens + (now - self._last) * self.units_per_second
+        )
+        self._last = now
+
+    def consume(self, units):
+        """
+        Takes ``units`` from the bucket, sleeping until the bucket is out of
+        debt.
+        """
+        with self._lock:
+            self._refill()
+            self._tokens -= units
+            wait = -self._tokens / self.units_per_second
+
+        if wait > 0:
+            time.sleep(wait)
+
+    def adjust(self, units):
+        """
+        Corrects an earlier estimate by ``units`` (positive if more capacity
+        was consumed than estimated).
+        """
+        with self._lock:
+            self._tokens -= units
+
+
+def consumed_capacity_units(response, table_name):
+    """
+    Sums the ``CapacityUnits`` reported for ``table_name`` in a response.
+
+    Returns ``None`` if the response doesn't include any.
+    """
+    consumed = response.get('ConsumedCapacity')
+
+    if consumed is None:
+        return None
+
+    if isinstance(consumed, dict):
+        consumed = [consumed]
+
+    return sum(
+        entry.get('CapacityUnits', 0) for entry in consumed
+        if entry.get('TableName', table_name) == table_name
+    )
+
+
+def _weak_owner(owner):
+    """
+    Returns a weak reference to ``owner``, or if it's ``None``, a callable
+    that always returns True (as if the owner were never collected).
+    """
+    if owner is None:
+        return lambda: True
+
+    return weakref.ref(owner)
+
+
+class WorkerThread(threading.Thread):
+    """
+    A daemon thread that calls ``handler`` with each item from
+    ``worker_queue`` until it sees the end sentinel.
+
+    Exceptions raised by ``handler`` are passed to ``on_error`` (the thread
+    keeps going), so the thread that owns the pool can re-raise them.
+
+    If ``owner`` is given, the thread also stops once it has been garbage
+    collected, so an owner that's dropped without being closed doesn't
+    leave the thread behind. ``handler`` & ``on_error`` mustn't refer to
+    it, or it never will be collected.
+    """
+    def __init__(self, worker_queue, handler, on_error, owner=None):
+        super(WorkerThread, self).__init__()
+        self.daemon = True
+        self._worker_queue = worker_queue
+        self._handler = handler
+        self._on_error = on_error
+        self._owner = _weak_owner(owner)
+        # This value can be set externally by other objects
+        # to indicate that the thread should be shut down.
+        self.should_continue = True
+
+    def run(self):
+        while self.should_continue and self._owner() is not None:
+            try:
+                work = self._worker_queue.get(timeout=1)
+            except Empty:
+                continue
+
+            try:
+                if work is _END_SENTINEL:
+                    return
+
+                self._handler(work)
+            except Exception as e:
+                log.error("Exception caught in worker: %s, msg: %s",
+                          e.__class__, e)
+                self._on_error(e)
+            finally:
+                self._worker_queue.task_done()
+
+
+class PrefetchThread(threading.Thread):
+    """
+    A daemon thread that walks ``pages`` (any iterable, typically a
+    generator making one request per page) & puts each page on
+    ``page_queue``.
+
+    The queue should be bounded; once it's full the thread waits for the
+    consumer, so only a fixed number of pages are ever buffered. If the
+    iterable raises, the exception is put on the queue instead.
+
+    As with :class:`WorkerThread`, if ``owner`` is given the thread stops
+    once it has been garbage collected; ``pages`` mustn't refer to it.
+    """
+    def __init__(self, pages, page_queue, owner=None):
+        super(PrefetchThread, self).__init__()
+        self.daemon = True
+        self._pages = pages
+        self._page_queue = page_queue
+        self._owner = _weak_owner(owner)
+        # This value can be set externally by other objects
+        # to indicate that the thread should be shut down.
+        self.should_continue = True
+
+    def run(self):
+        try:
+            for page in self._pages:
+                if not self._put(page):
+                    return
+        except Exception as e:
+            log.error("Exception caught prefetching: %s, msg: %s",
+                      e.__class__, e)
+            self._put(e)
+
+    def _put(self, page):
+        while self.should_continue and self._owner() is not None:
+            try:
+                self._page_queue.put(page, timeout=1)
+                return True
+            except Full:
+                continue
+
+        return False
@@ -215,10 +215,7 @@ class Item(object):
         Largely internal, unless you know what you're doing or are trying to
         mix the low-level & high-level APIs.
         """
-        self._data = {}
-
-        for field_name, field_value in data.get('Item', {}).items():
-            self[field_name] = self._dynamizer.decode(field_value)
+        self._data = self._dynamizer.decode_item(data.get('Item', {}))
 
         self._loaded = True
         self._orig_data = deepcopy(self._data)
@@ -243,12 +240,7 @@ class Item(object):
 
         Largely internal.
         """
-        raw_key_data = {}
-
-        for key, value in self.get_keys().items():
-            raw_key_data[key] = self._dynamizer.encode(value)
-
-        return raw_key_data
+        return self._dynamizer.encode_item(self.get_keys())
 
     def build_expects(self, fields=None):
         """
@@ -320,15 +312,11 @@ class Item(object):
         """
         # This doesn't save on it's own. Rather, we prepare the datastructure
         # and hand-off to the table to handle creation/update.
-        final_data = {}
-
-        for key, value in self._data.items():
-            if not self._is_storable(value):
-                continue
-
-            final_data[key] = self._dynamizer.encode(value)
-
-        return final_data
+        storable = dict([
+            (key, value) for key, value in self._data.items()
+            if self._is_storable(value)
+        ])
+        return self._dynamizer.encode_item(storable)
 
     def prepare_partial(self):
         """
@@ -1,3 +1,67 @@
+import weakref
+from functools import partial
+
+from boto.compat import Queue
+from boto.dynamodb2.concurrent import (PrefetchThread, WorkerThread,
+                                       _END_SENTINEL)
+from boto.vendored.six.moves.queue import Full
+
+
+def _iter_pages(the_callable, call_args, call_kwargs, first_key, last_key,
+                limit, max_page_size):
+    """
+    Fetches pages one after the other, yielding a tuple of the results, the
+    last key & whether there are more pages for each.
+
+    This follows the same paging & limit rules as ``ResultSet.fetch_more``,
+    but keeps its own count of the results left, as it runs ahead of the
+    consumer.
+    """
+    while True:
+        kwargs = call_kwargs.copy()
+
+        if last_key is not None:
+            kwargs[first_key] = last_key
+
+        if limit and max_page_size and max_page_size > limit:
+            max_page_size = limit
+
+        if max_page_size is not None:
+            kwargs['limit'] = max_page_size
+        elif limit is not None:
+            kwargs['limit'] = limit
+
+        results = the_callable(*call_args[:], **kwargs)
+        new_results = results.get('results', [])
+        last_key = results.get('last_key', None)
+        more = last_key is not None
+
+        if limit is not None and limit >= 0:
+            limit -= len(new_results)
+
+            if limit <= 0:
+                more = False
+
+        yield new_results, last_key, more
+
+        if not more:
+            return
+
+
+def _get_batch(the_callable, call_args, call_kwargs, page_queue, keys):
+    """
+    Fetches a single batch for a ``BatchGetResultSet``. Runs on the worker
+    threads.
+    """
+    kwargs = call_kwargs.copy()
+    kwargs['keys'] = keys
+    results = the_callable(*call_args[:], **kwargs)
+    page_queue.put((
+        results.get('results', []),
+        results.get('unprocessed_keys', []),
+    ))
+
+
 class ResultSet(object):
     """
     A class used to lazily handle page-to-page navigation through a set of
@@ -19,8 +83,14 @@ class ResultSet(object):
         >>> for res in results:
         ...     print res['username']
 
+    Optionally accepts a ``prefetch`` parameter. If it's greater than zero,
+    pages are fetched by a background thread, which requests the next page
+    as soon as the previous one arrives rather than when the iterator runs
+    out. At most ``prefetch`` fetched pages are buffered; once that many are
+    waiting, the thread pauses until they're consumed.
+
     """
-    def __init__(self, max_page_size=None):
+    def __init__(self, max_page_size=None, prefetch=None):
         super(ResultSet, self).__init__()
         self.the_callable = None
         self.call_args = []
@@ -32,6 +102,9 @@ class ResultSet(object):
         self._fetches = 0
         self._max_page_size = max_page_size
         self._limit = None
+        self._prefetch = prefetch or 0
+        self._page_queue = None
+        self._prefetcher = None
 
     @property
     def first_key(self):
@@ -122,6 +195,9 @@ class ResultSet(object):
 
         Largely internal.
         """
+        if self._prefetch:
+            return self._fetch_prefetched()
+
         self._reset()
 
         args = self.call_args[:]
@@ -163,14 +239,69 @@ class ResultSet(object):
         if self._last_key_seen is None:
             self._results_left = False
 
+    def _fetch_prefetched(self):
+        """
+        Takes the next page from the background thread, starting it if
+        needed.
+        """
+        self._reset()
+
+        if self._prefetcher is None:
+            self._page_queue = Queue(maxsize=self._prefetch)
+            # The thread mustn't refer to the result set, so it can tell
+            # when it's been dropped without being closed.
+            pages = _iter_pages(
+                self.the_callable, self.call_args, self.call_kwargs,
+                self.first_key, self._last_key_seen, self._limit,
+                self._max_page_size
+            )
+            self._prefetcher = PrefetchThread(pages, self._page_queue,
+                                              owner=self)
+            self._prefetcher.start()
+
+        page = self._page_queue.get()
+
+        if isinstance(page, Exception):
+            self._results_left = False
+            raise page
+
+        results, self._last_key_seen, more = page
+        self._fetches += 1
+        self._results.extend(results)
+
+        if not more:
+            self._results_left = False
+
+    def close(self):
+        """
+        Stops any background fetching. Only needed if you stop iterating
+        over a ``ResultSet`` created with ``prefetch`` before the end (it
+        also stops once the ``ResultSet`` is garbage collected).
+        """
+        if self._prefetcher is not None:
+            self._prefetcher.should_continue = False
+
 
 class BatchGetResultSet(ResultSet):
+    """
+    A ``ResultSet`` for ``Table.batch_get``, which fetches the items for
+    the keys it's given ``max_batch_get`` keys at a time.
+
+    With ``prefetch`` greater than zero, up to that many batches are
+    requested concurrently by a pool of threads.
+    """
     def __init__(self, *args, **kwargs):
         self._keys_left = kwargs.pop('keys', [])
         self._max_batch_get = kwargs.pop('max_batch_get', 100)
         super(BatchGetResultSet, self).__init__(*args, **kwargs)
+        self._workers = []
+        self._work_queue = None
+        self._in_flight = 0
 
     def fetch_more(self):
+        if self._prefetch:
+            return self._fetch_concurrently()
+
         self._reset()
 
         args = self.call_args[:]
@@ -202,3 +333,259 @@ class BatchGetResultSet(ResultSet):
         # Decrease the limit, if it's present.
         if self.call_kwargs.get('limit'):
             self.call_kwargs['limit'] -= len(results['results'])
+
+    def _fetch_concurrently(self):
+        """
+        Takes the next batch to complete, keeping up to ``prefetch`` batches
+        in flight.
+        """
+        self._reset()
+
+        if not self._workers:
+            self._page_queue = Queue()
+            self._work_queue = Queue()
+
+            for i in range(self._prefetch):
+                # The workers mustn't refer to the result set, so they can
+                # tell when it's been dropped without being closed.
+                get_batch = partial(_get_batch, self.the_callable,
+                                    self.call_args, self.call_kwargs,
+                                    self._page_queue)
+                worker = WorkerThread(self._work_queue, get_batch,
+                                      self._page_queue.put, owner=self)
+                worker.start()
+                self._workers.append(worker)
+
+        self._submit_batches()
+
+        if not self._in_flight:
+            self._results_left = False
+            self.close()
+            return
+
+        page = self._page_queue.get()
+        self._in_flight -= 1
+
+        if isinstance(page, Exception):
+            self._results_left = False
+            self.close()
+            raise page
+
+        results, unprocessed_keys = page
+        self._fetches += 1
+        self._results.extend(results)
+        # Retry the unprocessed keys first, as ``fetch_more`` does.
+        self._keys_left[0:0] = unprocessed_keys
+        self._submit_batches()
+
+        if not self._in_flight:
+            self._results_left = False
+            self.close()
+
+    def _submit_batches(self):
+        while self._in_flight < self._prefetch and len(self._keys_left):
+            keys = self._keys_left[:self._max_batch_get]
+            self._keys_left = self._keys_left[self._max_batch_get:]
+            self._work_queue.put(keys)
+            self._in_flight += 1
+
+    def close(self):
+        for worker in self._workers:
+            self._work_queue.put(_END_SENTINEL)
+
+        self._workers = []
+
+
+class ParallelScanResultSet(object):
+    """
+    Iterates over the results of a scan that's split into segments, which
+    are scanned concurrently by a pool of threads.
+
+    Each thread scans one segment at a time, page by page, and queues each
+    page as soon as it arrives, so the next pages are being fetched while
+    the consumer works through the current one. At most
+    ``max_buffered_pages`` pages are queued; once that many are waiting,
+    the threads block until the consumer catches up, keeping memory use
+    bounded.
+
+    Items from different segments are interleaved, in no particular order.
+
+    This is used by the ``Table.parallel_scan`` method.
+
+    Example::
+
+        >>> results = ParallelScanResultSet(users._scan, total_segments=8)
+        >>> for res in results:
+        ...     print res['username']
+
+    """
+    def __init__(self, the_callable, total_segments, workers=None,
+                 max_page_size=None, max_buffered_pages=None, limit=None,
+                 **call_kwargs):
+        super(ParallelScanResultSet, self).__init__()
+        if total_segments < 1:
+            raise ValueError('total_segments must be at least 1.')
+
+        self.the_callable = the_callable
+        self.call_kwargs = call_kwargs
+        self.total_segments = total_segments
+        self._workers = min(workers or total_segments, total_segments)
+        self._max_page_size = max_page_size
+        self._max_buffered_pages = max_buffered_pages or self._workers * 2
+        self._limit = limit
+        self._results = []
+        self._offset = 0
+        self._segments_done = 0
+        self._fetches = 0
+        self._threads = []
+        self._page_queue = None
+        self._scanner = None
+        self._closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._limit is not None and self._limit <= 0:
+            self.close()
+            raise StopIteration()
+
+        while self._offset >= len(self._results):
+            self._next_page()
+
+        result = self._results[self._offset]
+        self._offset += 1
+
+        if self._limit is not None:
+            self._limit -= 1
+
+        return result
+
+    next = __next__
+
+    def _next_page(self):
+        if self._closed:
+            raise StopIteration()
+
+        if not self._threads:
+            self._start_threads()
+
+        while True:
+            page = self._page_queue.get()
+
+            if page is _END_SENTINEL:
+                # A segment is done.
+                self._segments_done += 1
+
+                if self._segments_done >= self.total_segments:
+                    self.close()
+                    raise StopIteration()
+
+                continue
+
+            if isinstance(page, Exception):
+                self.close()
+                raise page
+
+            self._fetches += 1
+            self._results = page
+            self._offset = 0
+            return
+
+    def _start_threads(self):
+        self._page_queue = Queue(maxsize=self._max_buffered_pages)
+        self._scanner = _SegmentScanner(
+            self, self.the_callable, self.call_kwargs, self.total_segments,
+            self._max_page_size, self._page_queue
+        )
+        segment_queue = Queue()
+
+        for segment in range(self.total_segments):
+            segment_queue.put(segment)
+
+        for i in range(self._workers):
+            segment_queue.put(_END_SENTINEL)
+
+        for i in range(self._workers):
+            thread = WorkerThread(segment_queue, self._scanner.scan_segment,
+                                  self._scanner.put_page, owner=self)
+            thread.start()
+            self._threads.append(thread)
+
+    def close(self):
+        """
+        Stops the worker threads. Called automatically once all segments
+        have been read, but should be called if you stop iterating early.
+        (The threads also stop once the result set is garbage collected.)
+        """
+        self._closed = True
+
+        if self._scanner is not None:
+            self._scanner.closed = True
+
+        for thread in self._threads:
+            thread.should_continue = False
+
+        self._results = []
+        self._offset = 0
+
+
+class _SegmentScanner(object):
+    """
+    Scans segments for a ``ParallelScanResultSet`` on its worker threads.
+
+    The threads only refer to this, never to the result set, so a result
+    set that's dropped without being closed is still garbage collected, &
+    the threads give up once it is.
+    """
+    def __init__(self, owner, the_callable, call_kwargs, total_segments,
+                 max_page_size, page_queue):
+        self._owner = weakref.ref(owner)
+        self.the_callable = the_callable
+        self.call_kwargs = call_kwargs
+        self.total_segments = total_segments
+        self._max_page_size = max_page_size
+        self._page_queue = page_queue
+        self.closed = False
+
+    def scan_segment(self, segment):
+        """
+        Scans every page of ``segment``, queueing each one.
+        """
+        last_key = None
+
+        while True:
+            kwargs = self.call_kwargs.copy()
+            kwargs['segment'] = segment
+            kwargs['total_segments'] = self.total_segments
+
+            if last_key is not None:
+                kwargs['exclusive_start_key'] = last_key
+
+            if self._max_page_size is not None:
+                kwargs['limit'] = self._max_page_size
+
+            results = self.the_callable(**kwargs)
+
+            if results.get('results'):
+                if not self.put_page(results['results']):
+                    return
+
+            last_key = results.get('last_key', None)
+
+            if last_key is None:
+                break
+
+        self.put_page(_END_SENTINEL)
+
+    def put_page(self, page):
+        # Block while the buffer is full, but give up if the consumer goes
+        # away.
+        while not self.closed and self._owner() is not None:
+            try:
+                self._page_queue.put(page, timeout=1)
+                return True
+            except Full:
+                continue
+
+        return False
@@ -1,12 +1,21 @@
+import threading
+import time
+
 import boto
+from boto.compat import Queue
 from boto.dynamodb2 import exceptions
+from boto.dynamodb2.concurrent import (CapacityLimiter, WorkerThread,
+                                       backoff_delay,
+                                       consumed_capacity_units,
+                                       _END_SENTINEL)
 from boto.dynamodb2.fields import (HashKey, RangeKey,
                                    AllIndex, KeysOnlyIndex, IncludeIndex,
                                    GlobalAllIndex, GlobalKeysOnlyIndex,
                                    GlobalIncludeIndex)
 from boto.dynamodb2.items import Item
 from boto.dynamodb2.layer1 import DynamoDBConnection
-from boto.dynamodb2.results import ResultSet, BatchGetResultSet
+from boto.dynamodb2.results import (ResultSet, BatchGetResultSet,
+                                    ParallelScanResultSet)
 from boto.dynamodb2.types import (NonBooleanDynamizer, Dynamizer, FILTER_OPERATORS,
                                   QUERY_OPERATORS, STRING)
 from boto.exception import JSONResponseError
@@ -480,12 +489,7 @@ class Table(object):
             }
 
         """
-        raw_key = {}
-
-        for key, value in keys.items():
-            raw_key[key] = self._dynamizer.encode(value)
-
-        return raw_key
+        return self._dynamizer.encode_item(keys)
 
     def get_item(self, consistent=False, attributes=None, **kwargs):
         """
@@ -778,7 +782,8 @@ class Table(object):
 
         return [field.name for field in self.schema]
 
-    def batch_write(self):
+    def batch_write(self, workers=None, write_capacity=None,
+                    max_retries=10):
         """
         Allows the batching of writes to DynamoDB.
 
@@ -818,9 +823,30 @@ class Table(object):
             ...     # Nothing yet, but once we leave the context, the
             ...     # put/deletes will be sent.
 
+        For bulk loads, optionally accepts a ``workers`` parameter. If it's
+        greater than zero, batches are sent by that many background threads,
+        so several ``BatchWriteItem`` calls are in flight at once. In this
+        mode, items DynamoDB leaves unprocessed are retried straight away
+        (with exponential backoff & jitter, up to ``max_retries`` times) and
+        a later write to the same key within a batch replaces the earlier
+        one, as DynamoDB rejects batches with duplicate keys. Any error
+        raised by a worker is re-raised on the calling thread.
+
+        Optionally accepts a ``write_capacity`` parameter, the number of
+        write capacity units per second to stay under. It's enforced using
+        the ``ConsumedCapacity`` DynamoDB returns for each batch.
+
+        Example::
+
+            >>> with users.batch_write(workers=8, write_capacity=500) as batch:
+            ...     for data in lots_of_users:
+            ...         batch.put_item(data=data)
+
         """
         # PHENOMENAL COSMIC DOCS!!! itty-bitty code.
-        return BatchTable(self)
+        return BatchTable(self, workers=workers,
+                          write_capacity=write_capacity,
+                          max_retries=max_retries)
 
     def _build_filters(self, filter_kwargs, using=QUERY_OPERATORS):
         """
@@ -902,7 +928,7 @@ class Table(object):
     def query_2(self, limit=None, index=None, reverse=False,
                 consistent=False, attributes=None, max_page_size=None,
                 query_filter=None, conditional_operator=None,
-                **filter_kwargs):
+                prefetch=None, **filter_kwargs):
         """
         Queries for a set of matching items in a DynamoDB table.
 
@@ -954,6 +980,11 @@ class Table(object):
         + `AND` - True if all filter conditions evaluate to true (default)
         + `OR` - True if at least one filter condition evaluates to true
 
+        Optionally accepts a ``prefetch`` parameter, which should be an
+        integer count of pages to fetch ahead in a background thread while
+        you iterate over the current one. (Default: ``None`` - fetch each
+        page when the previous one is used up)
+
         Returns a ``ResultSet``, which transparently handles the pagination of
         results you get back.
 
@@ -1022,7 +1053,8 @@ class Table(object):
             select = None
 
         results = ResultSet(
-            max_page_size=max_page_size
+            max_page_size=max_page_size,
+            prefetch=prefetch
         )
         kwargs = filter_kwargs.copy()
         kwargs.update({
@@ -1163,11 +1195,9 @@ class Table(object):
             kwargs['scan_index_forward'] = False
 
         if exclusive_start_key:
-            kwargs['exclusive_start_key'] = {}
-
-            for key, value in exclusive_start_key.items():
-                kwargs['exclusive_start_key'][key] = \
-                    self._dynamizer.encode(value)
+            kwargs['exclusive_start_key'] = self._dynamizer.encode_item(
+                exclusive_start_key
+            )
 
         # Convert the filters into something we can actually use.
         kwargs['key_conditions'] = self._build_filters(
@@ -1195,10 +1225,9 @@ class Table(object):
             results.append(item)
 
         if raw_results.get('LastEvaluatedKey', None):
-            last_key = {}
-
-            for key, value in raw_results['LastEvaluatedKey'].items():
-                last_key[key] = self._dynamizer.decode(value)
+            last_key = self._dynamizer.decode_item(
+                raw_results['LastEvaluatedKey']
+            )
 
         return {
             'results': results,
@@ -1207,7 +1236,7 @@ class Table(object):
 
     def scan(self, limit=None, segment=None, total_segments=None,
              max_page_size=None, attributes=None, conditional_operator=None,
-             **filter_kwargs):
+             prefetch=None, **filter_kwargs):
         """
         Scans across all items within a DynamoDB table.
 
@@ -1243,6 +1272,11 @@ class Table(object):
         from DynamoDB. This uses the ``AttributesToGet`` and set's
         ``Select`` to ``SPECIFIC_ATTRIBUTES`` API.
 
+        Optionally accepts a ``prefetch`` parameter, which should be an
+        integer count of pages to fetch ahead in a background thread while
+        you iterate over the current one. (Default: ``None`` - fetch each
+        page when the previous one is used up)
+
         Returns a ``ResultSet``, which transparently handles the pagination of
         results you get back.
 
@@ -1270,7 +1304,8 @@ class Table(object):
 
         """
         results = ResultSet(
-            max_page_size=max_page_size
+            max_page_size=max_page_size,
+            prefetch=prefetch
         )
         kwargs = filter_kwargs.copy()
         kwargs.update({
@@ -1283,6 +1318,63 @@ class Table(object):
         results.to_call(self._scan, **kwargs)
         return results
 
+    def parallel_scan(self, total_segments, workers=None, limit=None,
+                      max_page_size=None, max_buffered_pages=None,
+                      attributes=None, conditional_operator=None,
+                      **filter_kwargs):
+        """
+        Scans across all items in the table, splitting the table into
+        ``total_segments`` segments that are scanned concurrently.
+
+        Accepts the same filters as ``Table.scan``.
+
+        Requires a ``total_segments`` parameter, which should be an integer
+        count of number of segments to divide the table into.
+
+        Optionally accepts a ``workers`` parameter, which should be an integer
+        count of the threads used to scan the segments. Each thread scans one
+        segment at a time. (Default: ``None`` - one thread per segment)
+
+        Optionally accepts a ``limit`` parameter, which should be an integer
+        count of the total number of items to return. (Default: ``None`` -
+        all results)
+
+        Optionally accepts a ``max_page_size`` parameter, which should be an
+        integer count of the maximum number of items to retrieve
+        **per-request**. (Default: ``None`` - fetch as many as DynamoDB will
+        return)
+
+        Optionally accepts a ``max_buffered_pages`` parameter, which should be
+        an integer count of how many fetched pages may wait to be iterated
+        over before the threads pause. (Default: ``None`` - twice the number
+        of workers)
+
+        Optionally accepts an ``attributes`` parameter, which should be a
+        tuple. If you provide any attributes only these will be fetched
+        from DynamoDB.
+
+        Returns a ``ParallelScanResultSet``, which yields the items of all
+        segments in no particular order. If you stop iterating early, call
+        its ``close`` method to stop the threads.
+
+        Example::
+
+            >>> for res in users.parallel_scan(total_segments=16, workers=8):
+            ...     export(res)
+
+        """
+        return ParallelScanResultSet(
+            self._scan,
+            total_segments=total_segments,
+            workers=workers,
+            max_page_size=max_page_size,
+            max_buffered_pages=max_buffered_pages,
+            limit=limit,
+            attributes=attributes,
+            conditional_operator=conditional_operator,
+            **filter_kwargs
+        )
+
     def _scan(self, limit=None, exclusive_start_key=None, segment=None,
               total_segments=None, attributes=None, conditional_operator=None,
               **filter_kwargs):
@@ -1299,11 +1391,9 @@ class Table(object):
         }
 
         if exclusive_start_key:
-            kwargs['exclusive_start_key'] = {}
-
-            for key, value in exclusive_start_key.items():
-                kwargs['exclusive_start_key'][key] = \
-                    self._dynamizer.encode(value)
+            kwargs['exclusive_start_key'] = self._dynamizer.encode_item(
+                exclusive_start_key
+            )
 
         # Convert the filters into something we can actually use.
         kwargs['scan_filter'] = self._build_filters(
@@ -1326,17 +1416,17 @@ class Table(object):
             results.append(item)
 
         if raw_results.get('LastEvaluatedKey', None):
-            last_key = {}
-
-            for key, value in raw_results['LastEvaluatedKey'].items():
-                last_key[key] = self._dynamizer.decode(value)
+            last_key = self._dynamizer.decode_item(
+                raw_results['LastEvaluatedKey']
+            )
 
         return {
             'results': results,
             'last_key': last_key,
         }
 
-    def batch_get(self, keys, consistent=False, attributes=None):
+    def batch_get(self, keys, consistent=False, attributes=None,
+                  prefetch=None):
         """
         Fetches many specific items in batch from a table.
 
@@ -1351,6 +1441,10 @@ class Table(object):
         tuple. If you provide any attributes only these will be fetched
         from DynamoDB.
 
+        Optionally accepts a ``prefetch`` parameter, which should be an
+        integer count of batches of keys to fetch concurrently.
+        (Default: ``None`` - fetch one batch at a time)
+
         Returns a ``ResultSet``, which transparently handles the pagination of
         results you get back.
 
@@ -1376,7 +1470,8 @@ class Table(object):
         """
         # We pass the keys to the constructor instead, so it can maintain it's
         # own internal state as to what keys have been processed.
-        results = BatchGetResultSet(keys=keys, max_batch_get=self.max_batch_get)
+        results = BatchGetResultSet(keys=keys, max_batch_get=self.max_batch_get,
+                                    prefetch=prefetch)
         results.to_call(self._batch_get, consistent=consistent, attributes=attributes)
         return results
 
@@ -1398,12 +1493,9 @@ class Table(object):
             items[self.table_name]['AttributesToGet'] = attributes
 
         for key_data in keys:
-            raw_key = {}
-
-            for key, value in key_data.items():
-                raw_key[key] = self._dynamizer.encode(value)
-
-            items[self.table_name]['Keys'].append(raw_key)
+            items[self.table_name]['Keys'].append(
+                self._dynamizer.encode_item(key_data)
+            )
 
         raw_results = self.connection.batch_get_item(request_items=items)
         results = []
@@ -1419,12 +1511,7 @@ class Table(object):
         raw_unproccessed = raw_results.get('UnprocessedKeys', {})
 
         for raw_key in raw_unproccessed.get('Keys', []):
-            py_key = {}
-
-            for key, value in raw_key.items():
-                py_key[key] = self._dynamizer.decode(value)
-
-            unprocessed_keys.append(py_key)
+            unprocessed_keys.append(self._dynamizer.decode_item(raw_key))
 
         return {
             'results': results,
@@ -1458,43 +1545,81 @@ class BatchTable(object):
 
     You likely don't want to try to use this object directly.
     """
-    def __init__(self, table):
+    def __init__(self, table, workers=None, write_capacity=None,
+                 max_retries=10):
         self.table = table
         self._to_put = []
         self._to_delete = []
         self._unprocessed = []
+        self._workers = workers or 0
+        self._max_retries = max_retries
+        self._limiter = None
+
+        if write_capacity:
+            self._limiter = CapacityLimiter(write_capacity)
+
+        # Only used when sending batches from background threads.
+        self._pending = {}
+        self._threads = []
+        self._worker_queue = None
+        self._errors = []
+        self._lock = threading.Lock()
 
     def __enter__(self):
         return self
 
     def __exit__(self, type, value, traceback):
-        if self._to_put or self._to_delete:
+        if self._to_put or self._to_delete or self._pending:
             # Flush anything that's left.
             self.flush()
 
+        if self._threads:
+            self._shutdown_threads()
+            self._raise_worker_errors()
+
         if self._unprocessed:
             # Finally, handle anything that wasn't processed.
             self.resend_unprocessed()
 
     def put_item(self, data, overwrite=False):
+        if self._workers:
+            item = Item(self.table, data=data)
+            self._add_pending(self._key_for(data), {
+                'PutRequest': {
+                    'Item': item.prepare_full(),
+                }
+            })
+            return
+
         self._to_put.append(data)
 
         if self.should_flush():
             self.flush()
 
     def delete_item(self, **kwargs):
+        if self._workers:
+            self._add_pending(self._key_for(kwargs), {
+                'DeleteRequest': {
+                    'Key': self.table._encode_keys(kwargs),
+                }
+            })
+            return
+
         self._to_delete.append(kwargs)
 
         if self.should_flush():
             self.flush()
 
     def should_flush(self):
-        if len(self._to_put) + len(self._to_delete) == 25:
+        if len(self._to_put) + len(self._to_delete) + len(self._pending) == 25:
             return True
 
         return False
 
     def flush(self):
+        if self._workers:
+            return self._flush_pending()
+
         batch_data = {
             self.table.table_name: [
                 # We'll insert data here shortly.
@@ -1532,7 +1657,9 @@ class BatchTable(object):
             # re-attempt processing on ``__exit__``.
             msg = "%s items were unprocessed. Storing for later."
             boto.log.info(msg % len(unprocessed))
-            self._unprocessed.extend(unprocessed)
+
+            with self._lock:
+                self._unprocessed.extend(unprocessed)
 
     def resend_unprocessed(self):
         # If there are unprocessed records (for instance, the user was over
@@ -1541,6 +1668,7 @@ class BatchTable(object):
         boto.log.info(
             "Re-sending %s unprocessed items." % len(self._unprocessed)
         )
+        attempt = 0
 
         while len(self._unprocessed):
             # Again, do 25 at a time.
@@ -1556,3 +1684,118 @@ class BatchTable(object):
             boto.log.info(
                 "%s unprocessed items left" % len(self._unprocessed)
             )
+
+            if len(resp.get('UnprocessedItems', {}).get(
+                    self.table.table_name, [])):
+                # Still over the limit. Back off rather than hammering
+                # DynamoDB with requests that will be throttled too.
+                time.sleep(backoff_delay(attempt))
+                attempt += 1
+            else:
+                attempt = 0
+
+    def _key_for(self, data):
+        return tuple(data.get(field) for field in self.table.get_key_fields())
+
+    def _add_pending(self, key, request):
+        self._raise_worker_errors()
+
+        # DynamoDB rejects a batch with two requests for the same key, so a
+        # later write replaces the earlier one.
+        self._pending[key] = request
+
+        if self.should_flush():
+            self.flush()
+
+    def _flush_pending(self):
+        self._raise_worker_errors()
+
+        if not self._pending:
+            return True
+
+        requests = list(self._pending.values())
+        self._pending = {}
+
+        if not self._threads:
+            self._start_threads()
+
+        # The queue is bounded, so this blocks once every worker is busy &
+        # a few batches are waiting, rather than buffering without limit.
+        self._worker_queue.put(requests)
+        return True
+
+    def _start_threads(self):
+        self._worker_queue = Queue(maxsize=self._workers * 2)
+
+        for i in range(self._workers):
+            thread = WorkerThread(
+                self._worker_queue, self._send_batch, self._errors.append
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def _shutdown_threads(self):
+        for i in range(len(self._threads)):
+            self._worker_queue.put(_END_SENTINEL)
+
+        for thread in self._threads:
+            thread.join()
+
+        self._threads = []
+
+    def _raise_worker_errors(self):
+        if self._errors:
+            error = self._errors[0]
+            self._errors[:] = []
+            raise error
+
+    def _send_batch(self, requests):
+        """
+        Writes a batch, retrying unprocessed items with backoff.
+
+        Items still unprocessed after ``max_retries`` retries are stowed
+        for ``resend_unprocessed`` on ``__exit__``.
+
+        Runs on the worker threads.
+        """
+        table_name = self.table.table_name
+        kwargs = {}
+
+        if self._limiter is not None:
+            kwargs['return_consumed_capacity'] = 'TOTAL'
+
+        attempt = 0
+
+        while requests:
+            if self._limiter is not None:
+                # Each write costs at least one unit.
+                self._limiter.consume(len(requests))
+
+            resp = self.table.connection.batch_write_item(
+                {table_name: requests}, **kwargs
+            )
+
+            if self._limiter is not None:
+                consumed = consumed_capacity_units(resp, table_name)
+
+                if consumed is not None:
+                    self._limiter.adjust(consumed - len(requests))
+
+            requests = resp.get('UnprocessedItems', {}).get(table_name, [])
+
+            if not requests:
+                break
+
+            if attempt >= self._max_retries:
+                boto.log.info(
+                    "%s items still unprocessed after %s retries. Storing "
+                    "for later." % (len(requests), attempt)
+                )
+
+                with self._lock:
+                    self._unprocessed.extend(requests)
+
+                break
+
+            time.sleep(backoff_delay(attempt))
+            attempt += 1
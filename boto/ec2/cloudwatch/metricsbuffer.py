@@ -0,0 +1,282 @@
+# Copyright (c) 2013 Amazon.com, Inc. or its affiliates.  All Rights Reserved
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish, dis-
+# tribute, sublicense, and/or sell copies of the Software, and to permit
+# persons to whom the Software is furnished to do so, subject to the fol-
+# lowing conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABIL-
+# ITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT
+# SHALL THE AUTHOR BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+"""
+Aggregates metric observations into statistic sets & publishes them to
+CloudWatch in batches from a background thread.
+"""
+import datetime
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from boto.compat import json
+
+
+log = logging.getLogger('boto.ec2.cloudwatch.metricsbuffer')
+
+# The most datums a PutMetricData request may contain.
+MAX_DATUMS_PER_CALL = 20
+
+
+def _freeze_dimensions(dimensions):
+    if not dimensions:
+        return ()
+
+    frozen = []
+    for name, value in dimensions.items():
+        if isinstance(value, (list, tuple)):
+            value = tuple(value)
+        frozen.append((name, value))
+    return tuple(sorted(frozen))
+
+
+class MetricsBuffer(object):
+    """
+    Aggregates observations per (namespace, name, dimensions, unit) into
+    statistic sets (minimum, maximum, sum & sample count) & publishes them
+    every ``flush_interval`` seconds from a background thread, packing up
+    to 20 metrics into each ``PutMetricData`` call.
+
+    Calls that can't be sent (because CloudWatch is failing or slow) are
+    kept & retried on the next flush. Once ``max_pending_calls`` are
+    waiting, further calls are appended to ``spill_file`` if one was given,
+    to be sent once the backlog clears, otherwise they're dropped. The
+    number of datums lost that way is kept in ``dropped_datums``.
+
+    Example::
+
+        metrics = MetricsBuffer(cloudwatch)
+        metrics.put('MyApp', 'Latency', elapsed, unit='Milliseconds',
+                    dimensions={'Operation': 'GetItem'})
+        ...
+        metrics.close()
+
+    """
+    def __init__(self, connection, flush_interval=60,
+                 max_datums_per_call=MAX_DATUMS_PER_CALL,
+                 max_pending_calls=1000, spill_file=None):
+        """
+        :type connection: :class:`boto.ec2.cloudwatch.CloudWatchConnection`
+        :param connection: The connection to publish metrics with.
+
+        :type flush_interval: float
+        :param flush_interval: How often (in seconds) to publish the
+            aggregated metrics. CloudWatch stores data with a resolution of
+            one minute.
+
+        :type max_datums_per_call: int
+        :param max_datums_per_call: The most metrics (up to 20) per call.
+
+        :type max_pending_calls: int
+        :param max_pending_calls: How many calls can wait to be sent before
+            they're spilled or dropped.
+
+        :type spill_file: str
+        :param spill_file: The path of a file to append calls to when too
+            many are waiting.
+        """
+        if not 0 < max_datums_per_call <= MAX_DATUMS_PER_CALL:
+            raise ValueError('max_datums_per_call must be between 1 & %s.' %
+                             MAX_DATUMS_PER_CALL)
+
+        self.connection = connection
+        self.dropped_datums = 0
+        self.spilled_datums = 0
+        self._flush_interval = flush_interval
+        self._max_datums_per_call = max_datums_per_call
+        self._max_pending_calls = max_pending_calls
+        self._spill_file = spill_file
+        self._stats = {}
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def put(self, namespace, name, value, unit=None, dimensions=None):
+        """
+        Records an observation of ``value`` for a metric.
+
+        :type dimensions: dict
+        :param dimensions: Name value pairs to associate with the metric,
+            as for :meth:`CloudWatchConnection.put_metric_data`.
+        """
+        key = (namespace, name, _freeze_dimensions(dimensions), unit)
+
+        with self._lock:
+            stats = self._stats.get(key)
+
+            if stats is None:
+                self._stats[key] = [value, value, value, 1]
+                return
+
+            if value < stats[0]:
+                stats[0] = value
+            if value > stats[1]:
+                stats[1] = value
+            stats[2] += value
+            stats[3] += 1
+
+    def flush(self):
+        """
+        Publishes the metrics aggregated so far, along with any calls still
+        waiting to be sent.
+        """
+        self._take_stats()
+        self._send_pending()
+
+    def close(self):
+        """
+        Stops the background thread & publishes any remaining metrics.
+        """
+        self._stopped.set()
+        self._thread.join()
+        self.flush()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._stopped.wait(self._flush_interval)
+            if self._stopped.is_set():
+                return
+            try:
+                self.flush()
+            except Exception as e:
+                log.error("Exception caught publishing metrics: %s, msg: %s",
+                          e.__class__, e)
+
+    def _take_stats(self):
+        with self._lock:
+            stats, self._stats = self._stats, {}
+
+        if not stats:
+            return
+
+        timestamp = time.time()
+        by_namespace = {}
+
+        for key, (minimum, maximum, total, count) in stats.items():
+            namespace, name, dimensions, unit = key
+            by_namespace.setdefault(namespace, []).append({
+                'name': name,
+                'unit': unit,
+                'dimensions': dict(dimensions),
+                'statistics': {
+                    'minimum': minimum,
+                    'maximum': maximum,
+                    'sum': total,
+                    'samplecount': count,
+                },
+                'timestamp': timestamp,
+            })
+
+        for namespace, datums in by_namespace.items():
+            for i in range(0, len(datums), self._max_datums_per_call):
+                self._add_pending({
+                    'namespace': namespace,
+                    'datums': datums[i:i + self._max_datums_per_call],
+                })
+
+    def _add_pending(self, call):
+        with self._lock:
+            if len(self._pending) < self._max_pending_calls:
+                self._pending.append(call)
+                return
+
+            if self._spill_file is None:
+                self.dropped_datums += len(call['datums'])
+                log.warning("Dropped %s metrics; too many are waiting to be "
+                            "published.", len(call['datums']))
+                return
+
+            try:
+                with open(self._spill_file, 'a') as fp:
+                    fp.write(json.dumps(call) + '\n')
+                self.spilled_datums += len(call['datums'])
+            except (IOError, OSError) as e:
+                self.dropped_datums += len(call['datums'])
+                log.error("Couldn't spill metrics to %s: %s",
+                          self._spill_file, e)
+
+    def _load_spilled(self):
+        """
+        Moves spilled calls back into the queue, as far as there's room.
+        """
+        with self._lock:
+            if self._spill_file is None or \
+                    not os.path.exists(self._spill_file):
+                return
+
+            with open(self._spill_file) as fp:
+                lines = fp.readlines()
+
+            room = self._max_pending_calls - len(self._pending)
+            for line in lines[:room]:
+                self._pending.append(json.loads(line))
+            remaining = lines[room:]
+
+            if remaining:
+                with open(self._spill_file, 'w') as fp:
+                    fp.writelines(remaining)
+            else:
+                os.remove(self._spill_file)
+
+    def _send_pending(self):
+        # Keep the background thread & explicit flushes from sending the
+        # same calls.
+        with self._send_lock:
+            while True:
+                with self._lock:
+                    if not self._pending:
+                        break
+                    call = self._pending[0]
+
+                try:
+                    self._send(call)
+                except Exception as e:
+                    log.error("Exception caught publishing metrics: %s, "
+                              "msg: %s", e.__class__, e)
+                    # Try again at the next flush.
+                    return
+
+                with self._lock:
+                    self._pending.popleft()
+
+                if not self._pending:
+                    self._load_spilled()
+
+    def _send(self, call):
+        datums = call['datums']
+        self.connection.put_metric_data(
+            call['namespace'],
+            [datum['name'] for datum in datums],
+            # Every datum needs a unit & timestamp when they're sent
+            # together.
+            unit=[datum['unit'] or 'None' for datum in datums],
+            dimensions=[datum['dimensions'] for datum in datums],
+            statistics=[datum['statistics'] for datum in datums],
+            timestamp=[datetime.datetime.utcfromtimestamp(datum['timestamp'])
+                       for datum in datums],
+        )
@@ -430,6 +430,21 @@ class AWSConnectionError(BotoClientError):
     pass
 
 
+class ConnectionPoolTimeoutError(AWSConnectionError):
+    """
+    Timed out waiting for a connection from a full connection pool.
+    """
+    pass
+
+
+class CircuitOpenError(AWSConnectionError):
+    """
+    A request wasn't sent because recent requests to the host have all
+    failed.
+    """
+    pass
+
+
 class StorageDataError(BotoClientError):
     """
     Error receiving data from a storage service.
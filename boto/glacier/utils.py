@@ -22,6 +22,10 @@
 import hashlib
 import math
 import binascii
+import mmap
+import os
+import stat
+import threading
 
 from boto.compat import six
 
@@ -71,54 +75,98 @@ def minimum_part_size(size_in_bytes, default_part_size=DEFAULT_PART_SIZE):
     return part_size
 
 
-def chunk_hashes(bytestring, chunk_size=_MEGABYTE):
+def chunk_hashes(bytestring, chunk_size=_MEGABYTE, num_threads=None):
+    """Compute the SHA-256 of each ``chunk_size`` chunk of ``bytestring``.
+
+    Chunks are hashed through a memoryview, so no chunk is copied.  If
+    ``num_threads`` is greater than 1 the chunks are split between that
+    many threads; hashlib releases the GIL while hashing, so this scales
+    with the number of cores.
+    """
     chunk_count = int(math.ceil(len(bytestring) / float(chunk_size)))
-    hashes = []
-    for i in range(chunk_count):
-        start = i * chunk_size
-        end = (i + 1) * chunk_size
-        hashes.append(hashlib.sha256(bytestring[start:end]).digest())
-    if not hashes:
+    if not chunk_count:
         return [hashlib.sha256(b'').digest()]
+    data = _as_view(bytestring)
+    hashes = [None] * chunk_count
+    if num_threads is None or num_threads <= 1 or chunk_count == 1:
+        _hash_chunks_into(data, chunk_size, hashes, 0, chunk_count)
+        return hashes
+    _run_threads(_chunk_hash_jobs(data, chunk_size, hashes, num_threads))
     return hashes
 
 
+def _as_view(bytestring):
+    try:
+        return memoryview(bytestring)
+    except (NameError, TypeError):
+        # There's no memoryview on Python 2.6, and none of text on 3.
+        return bytestring
+
+
+def _hash_chunks_into(data, chunk_size, hashes, first, last):
+    for i in range(first, last):
+        start = i * chunk_size
+        hashes[i] = hashlib.sha256(data[start:start + chunk_size]).digest()
+
+
+def _chunk_hash_jobs(data, chunk_size, hashes, num_threads):
+    # Each thread hashes a contiguous run of chunks, which keeps its reads
+    # sequential.
+    per_thread = int(math.ceil(len(hashes) / float(num_threads)))
+    jobs = []
+    for first in range(0, len(hashes), per_thread):
+        last = min(first + per_thread, len(hashes))
+        jobs.append((_hash_chunks_into,
+                     (data, chunk_size, hashes, first, last)))
+    return jobs
+
+
+def _run_threads(jobs):
+    threads = [threading.Thread(target=target, args=args)
+               for target, args in jobs]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
 def tree_hash(fo):
     """
     Given a hash of each 1MB chunk (from chunk_hashes) this will hash
     together adjacent hashes until it ends up with one big one. So a
     tree of hashes.
     """
-    hashes = []
-    hashes.extend(fo)
+    hashes = list(fo)
     while len(hashes) > 1:
-        new_hashes = []
-        while True:
-            if len(hashes) > 1:
-                first = hashes.pop(0)
-                second = hashes.pop(0)
-                new_hashes.append(hashlib.sha256(first + second).digest())
-            elif len(hashes) == 1:
-                only = hashes.pop(0)
-                new_hashes.append(only)
-            else:
-                break
-        hashes.extend(new_hashes)
+        new_hashes = [hashlib.sha256(hashes[i] + hashes[i + 1]).digest()
+                      for i in range(0, len(hashes) - 1, 2)]
+        if len(hashes) % 2:
+            # An odd hash out is promoted to the next level unchanged.
+            new_hashes.append(hashes[-1])
+        hashes = new_hashes
     return hashes[0]
 
 
-def compute_hashes_from_fileobj(fileobj, chunk_size=1024 * 1024):
+def compute_hashes_from_fileobj(fileobj, chunk_size=1024 * 1024,
+                                num_threads=None):
     """Compute the linear and tree hash from a fileobj.
 
     This function will compute the linear/tree hash of a fileobj
     in a single pass through the fileobj.
 
+    If ``fileobj`` is a regular file it is memory mapped and hashed in
+    place rather than read into memory chunk by chunk.
+
     :param fileobj: A file like object.
 
     :param chunk_size: The size of the chunks to use for the tree
         hash.  This is also the buffer size used to read from
         `fileobj`.
 
+    :param num_threads: If greater than 1, the tree hash chunks of a
+        memory mapped file are hashed on this many threads while another
+        thread computes the linear hash.
+
     :rtype: tuple
     :return: A tuple of (linear_hash, tree_hash).  Both hashes
         are returned in hex.
@@ -128,6 +176,11 @@ def compute_hashes_from_fileobj(fileobj, chunk_size=1024 * 1024):
     if six.PY3 and hasattr(fileobj, 'mode') and 'b' not in fileobj.mode:
         raise ValueError('File-like object must be opened in binary mode!')
 
+    hashes = _compute_hashes_from_mapped_file(fileobj, chunk_size,
+                                              num_threads)
+    if hashes is not None:
+        return hashes
+
     linear_hash = hashlib.sha256()
     chunks = []
     chunk = fileobj.read(chunk_size)
@@ -145,6 +198,60 @@ def compute_hashes_from_fileobj(fileobj, chunk_size=1024 * 1024):
     return linear_hash.hexdigest(), bytes_to_hex(tree_hash(chunks))
 
 
+def _compute_hashes_from_mapped_file(fileobj, chunk_size, num_threads):
+    """Hash the rest of ``fileobj`` through a memory map.
+
+    Returns None if ``fileobj`` isn't a non-empty regular file that can
+    be mapped, in which case the caller falls back to reading it.
+    """
+    try:
+        fileno = fileobj.fileno()
+        start = fileobj.tell()
+        file_stat = os.fstat(fileno)
+    except (AttributeError, EnvironmentError, ValueError):
+        return None
+    size = file_stat.st_size
+    if not stat.S_ISREG(file_stat.st_mode) or size <= start:
+        return None
+    if hasattr(fileobj, 'flush'):
+        fileobj.flush()
+    try:
+        mapped = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+    except (EnvironmentError, ValueError):
+        return None
+    try:
+        try:
+            data = memoryview(mapped)
+        except (NameError, TypeError):
+            # mmap doesn't support memoryview on Python 2.
+            return None
+        view = data[start:]
+        try:
+            linear_hash, hashes = _compute_linear_and_chunk_hashes(
+                view, chunk_size, num_threads)
+        finally:
+            if hasattr(view, 'release'):
+                view.release()
+                data.release()
+    finally:
+        mapped.close()
+    # Leave the file positioned as if it had been read.
+    fileobj.seek(size)
+    return linear_hash.hexdigest(), bytes_to_hex(tree_hash(hashes))
+
+
+def _compute_linear_and_chunk_hashes(data, chunk_size, num_threads):
+    linear_hash = hashlib.sha256()
+    if num_threads is None or num_threads <= 1:
+        linear_hash.update(data)
+        return linear_hash, chunk_hashes(data, chunk_size)
+    hashes = [None] * int(math.ceil(len(data) / float(chunk_size)))
+    jobs = _chunk_hash_jobs(data, chunk_size, hashes, num_threads)
+    jobs.append((linear_hash.update, (data,)))
+    _run_threads(jobs)
+    return linear_hash, hashes
+
+
 def bytes_to_hex(str_as_bytes):
     return binascii.hexlify(str_as_bytes)
 
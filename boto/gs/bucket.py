@@ -34,6 +34,7 @@ from boto.gs.bucketlistresultset import VersionedBucketListResultSet
 from boto.gs.cors import Cors
 from boto.gs.lifecycle import LifecycleConfig
 from boto.gs.key import Key as GSKey
+from boto.gs.keyrecord import KeyRecord as GSKeyRecord
 from boto.s3.acl import Policy
 from boto.s3.bucket import Bucket as S3Bucket
 from boto.utils import get_utf8_value
@@ -57,6 +58,8 @@ class Bucket(S3Bucket):
     WebsiteMainPageFragment = '<MainPageSuffix>%s</MainPageSuffix>'
     WebsiteErrorFragment = '<NotFoundPage>%s</NotFoundPage>'
 
+    record_class = GSKeyRecord
+
     def __init__(self, connection=None, name=None, key_class=GSKey):
         super(Bucket, self).__init__(connection, name, key_class)
 
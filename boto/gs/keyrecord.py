@@ -0,0 +1,52 @@
+# Copyright 2015 Google Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish, dis-
+# tribute, sublicense, and/or sell copies of the Software, and to permit
+# persons to whom the Software is furnished to do so, subject to the fol-
+# lowing conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABIL-
+# ITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT
+# SHALL THE AUTHOR BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+
+from boto.s3.keyrecord import KeyRecord as S3KeyRecord
+
+
+class KeyRecord(S3KeyRecord):
+    """
+    A lightweight record of an object in a Google Cloud Storage bucket
+    listing, which also keeps the object's generation & metageneration.
+    """
+    __slots__ = ('generation', 'metageneration')
+
+    def __init__(self, bucket=None, name=None, size=None, etag=None,
+                 last_modified=None, storage_class=None, generation=None,
+                 metageneration=None):
+        super(KeyRecord, self).__init__(bucket, name, size, etag,
+                                        last_modified, storage_class)
+        self.generation = generation
+        self.metageneration = metageneration
+
+    def endElement(self, name, value, connection):
+        if name == 'Generation':
+            self.generation = value
+        elif name == 'MetaGeneration':
+            self.metageneration = value
+        else:
+            super(KeyRecord, self).endElement(name, value, connection)
+
+    def to_key(self):
+        key = super(KeyRecord, self).to_key()
+        key.generation = self.generation
+        key.metageneration = self.metageneration
+        return key
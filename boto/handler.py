@@ -58,3 +58,26 @@ class XmlHandlerWrapper(object):
 
     def parseString(self, content):
         return self.parser.parse(StringIO(content))
+
+    def feed(self, data):
+        """
+        Parses the next chunk of a document.  The parser keeps its state
+        between calls, so a response body can be parsed as it arrives
+        rather than after it has been read into memory.
+        """
+        self.parser.feed(data)
+
+    def close(self):
+        """
+        Signals the end of the document fed in with ``feed``.
+        """
+        self.parser.close()
+
+    def is_open(self, node):
+        """
+        Returns True if ``node`` is still waiting for its end tag.
+        """
+        for _, open_node in self.handler.nodes:
+            if open_node is node:
+                return True
+        return False
@@ -115,10 +115,14 @@ class CertValidatingHTTPSConnection(http_client.HTTPConnection):
 
     def connect(self):
         "Connect to a host on a given (SSL) port."
+        # Python 3 connections (& boto.instrumentation) open the socket with
+        # _create_connection.
+        create_connection = getattr(self, '_create_connection',
+                                    socket.create_connection)
         if hasattr(self, "timeout"):
-            sock = socket.create_connection((self.host, self.port), self.timeout)
+            sock = create_connection((self.host, self.port), self.timeout)
         else:
-            sock = socket.create_connection((self.host, self.port))
+            sock = create_connection((self.host, self.port))
         msg = "wrapping ssl socket; "
         if self.ca_certs:
             msg += "CA certificate file=%s" % self.ca_certs
@@ -0,0 +1,448 @@
+# Copyright (c) 2015 Amazon.com, Inc. or its affiliates.  All Rights Reserved
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish, dis-
+# tribute, sublicense, and/or sell copies of the Software, and to permit
+# persons to whom the Software is furnished to do so, subject to the fol-
+# lowing conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABIL-
+# ITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT
+# SHALL THE AUTHOR BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+
+"""
+Times the phases of each request & sends the timings to sinks, such as an
+in-process histogram registry or a statsd server.
+
+Example::
+
+    registry = HistogramRegistry()
+    boto.instrumentation.set_default_instrumentation(
+        Instrumentation([registry, StatsdSink('localhost', 8125)]))
+    ...
+    print(registry.get_histogram('ec2', 'DescribeInstances', 'ttfb')
+          .percentile(99))
+
+"""
+import bisect
+import logging
+import re
+import socket
+import threading
+import time
+
+
+log = logging.getLogger('boto.instrumentation')
+
+# The phases of a request that are timed, in seconds. Those a request
+# didn't go through (e.g. ``connect`` on a reused connection) are ``None``.
+TIMING_PHASES = ('pool_wait', 'rate_limit_wait', 'signing', 'connect', 'tls',
+                 'send', 'ttfb', 'body', 'backoff', 'total')
+
+
+class RequestMetrics(object):
+    """
+    The timings & sizes of one request, including any retries.
+
+    ``pool_wait``
+        Getting a connection from the pool.
+    ``rate_limit_wait``
+        Waiting on the connection's rate limiter.
+    ``signing``
+        Signing the request.
+    ``connect``
+        Opening new connections, including the DNS lookup.
+    ``tls``
+        TLS handshakes.
+    ``send``
+        Sending the last attempt's request, once connected.
+    ``ttfb``
+        From the last attempt's request being sent to its response
+        headers arriving.
+    ``body``
+        Reading the response body.
+    ``backoff``
+        Sleeping between attempts.
+    ``total``
+        From the start of the request to the end of the response body.
+
+    ``retry_reasons`` holds why each retried attempt failed: the error code
+    or HTTP status of a response, or the name of an exception.
+    """
+    __slots__ = ('service', 'action', 'host', 'method', 'status', 'error',
+                 'attempts', 'retry_reasons', 'bytes_out', 'bytes_in',
+                 'start_time', '_attempt_start', '_sent_at', '_instrumentation',
+                 '_finished') + TIMING_PHASES
+
+    def __init__(self, service, action, host, method, instrumentation=None):
+        self.service = service
+        self.action = action
+        self.host = host
+        self.method = method
+        self.status = None
+        self.error = None
+        self.attempts = 0
+        self.retry_reasons = []
+        self.bytes_out = 0
+        self.bytes_in = 0
+        for phase in TIMING_PHASES:
+            setattr(self, phase, None)
+        self.start_time = time.time()
+        self._attempt_start = None
+        self._sent_at = None
+        self._instrumentation = instrumentation
+        self._finished = False
+
+    def __repr__(self):
+        return '<RequestMetrics: %s %s %s>' % (self.service, self.action,
+                                              self.status)
+
+    @property
+    def retries(self):
+        return max(self.attempts - 1, 0)
+
+    def add(self, phase, seconds):
+        """
+        Adds to the time spent in a phase.
+        """
+        value = getattr(self, phase)
+        setattr(self, phase, seconds if value is None else value + seconds)
+
+    def attempt_started(self, bytes_out=0):
+        self.attempts += 1
+        self.bytes_out += bytes_out
+        self._attempt_start = time.time()
+        self._sent_at = None
+
+    def request_sent(self):
+        self._sent_at = time.time()
+
+    def response_received(self, connection, status):
+        """
+        Records the arrival of an attempt's response headers, & picks up
+        the times of any connection it opened from ``time_connect``.
+        """
+        now = time.time()
+        self.status = status
+        connect_time, tls_time = 0, 0
+        connect_times = getattr(connection, '_boto_connect_times', None)
+        if connect_times is not None:
+            connection._boto_connect_times = None
+            connect_time, tls_time = connect_times
+            self.add('connect', connect_time)
+            if tls_time is not None:
+                self.add('tls', tls_time)
+        sent_at = self._sent_at
+        if sent_at is not None:
+            self.send = max(sent_at - self._attempt_start - connect_time -
+                            (tls_time or 0), 0)
+            self.ttfb = now - sent_at
+        else:
+            # The request was sent by a ``sender``, so there's no telling
+            # when it finished.
+            self.ttfb = max(now - self._attempt_start - connect_time -
+                            (tls_time or 0), 0)
+
+    def retrying(self, reason):
+        self.retry_reasons.append(reason)
+
+    def body_read(self, seconds, size):
+        self.add('body', seconds)
+        self.bytes_in += size
+
+    def finish(self, error=None):
+        """
+        Completes the metrics & sends them to the instrumentation's sinks.
+        Only the first call has any effect.
+        """
+        if self._finished:
+            return
+        self._finished = True
+        if error is not None:
+            self.error = error.__class__.__name__
+        self.total = time.time() - self.start_time
+        if self._instrumentation is not None:
+            self._instrumentation.emit(self)
+
+
+class Instrumentation(object):
+    """
+    Sends the :class:`RequestMetrics` of each request to its sinks, which
+    are objects with a ``record(metrics)`` method.
+
+    Give it to a connection with ``set_instrumentation``, or to every
+    connection with :func:`set_default_instrumentation`.
+    """
+    def __init__(self, sinks=None):
+        self.sinks = list(sinks or [])
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+
+    def start(self, service, action, host, method):
+        return RequestMetrics(service, action, host, method, self)
+
+    def emit(self, metrics):
+        for sink in self.sinks:
+            try:
+                sink.record(metrics)
+            except Exception as e:
+                log.error("Exception caught recording request metrics: "
+                          "%s, msg: %s", e.__class__, e)
+
+
+def time_connect(connection, is_secure):
+    """
+    Wraps ``connect`` of an ``http_client`` connection to time it. The
+    ``(connect, tls)`` times of the last connect are left in the
+    connection's ``_boto_connect_times`` until :class:`RequestMetrics`
+    picks them up.
+
+    The connect time is split from the TLS handshake where the connection
+    opens its socket with ``_create_connection``, as Python 3's do; elsewhere
+    all of it counts as connecting.
+    """
+    connect = connection.connect
+    create_connection = getattr(connection, '_create_connection',
+                                socket.create_connection)
+    socket_times = []
+
+    def timed_create_connection(*args, **kwargs):
+        start = time.time()
+        try:
+            return create_connection(*args, **kwargs)
+        finally:
+            socket_times.append(time.time() - start)
+
+    def timed_connect():
+        del socket_times[:]
+        start = time.time()
+        try:
+            connect()
+        finally:
+            elapsed = time.time() - start
+            if socket_times:
+                connect_time = socket_times[-1]
+                tls_time = elapsed - connect_time if is_secure else None
+            else:
+                connect_time, tls_time = elapsed, None
+            connection._boto_connect_times = (connect_time, tls_time)
+
+    connection._create_connection = timed_create_connection
+    connection.connect = timed_connect
+
+
+class Histogram(object):
+    """
+    Counts values in fixed buckets, which are enough to estimate
+    percentiles without keeping every value.
+    """
+    # Bucket upper bounds, in milliseconds.
+    DEFAULT_BOUNDS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000,
+                      10000, 30000, 60000)
+
+    def __init__(self, bounds=None):
+        self.bounds = tuple(bounds or self.DEFAULT_BOUNDS)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def mean(self):
+        if not self.count:
+            return None
+        return self.sum / float(self.count)
+
+    def percentile(self, percent):
+        """
+        Returns the upper bound of the bucket holding the given percentile,
+        or the largest value if it's beyond the last bucket.
+        """
+        if not self.count:
+            return None
+        rank = self.count * percent / 100.0
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                if i == len(self.bounds):
+                    return self.max
+                return min(self.bounds[i], self.max)
+        return self.max
+
+
+class HistogramRegistry(object):
+    """
+    A sink keeping a :class:`Histogram` of each phase's time (in
+    milliseconds) per ``(service, action)``, & counters of requests,
+    errors, retries & bytes.
+    """
+    def __init__(self, bounds=None):
+        self.bounds = bounds
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def record(self, metrics):
+        key = (metrics.service, metrics.action)
+        with self._lock:
+            for phase in TIMING_PHASES:
+                value = getattr(metrics, phase)
+                if value is None:
+                    continue
+                histogram = self._histograms.get(key + (phase,))
+                if histogram is None:
+                    histogram = self._histograms[key + (phase,)] = \
+                        Histogram(self.bounds)
+                histogram.add(value * 1000)
+
+            counters = self._counters.get(key)
+            if counters is None:
+                counters = self._counters[key] = {
+                    'requests': 0, 'errors': 0, 'retries': 0,
+                    'bytes_in': 0, 'bytes_out': 0, 'retry_reasons': {},
+                }
+            counters['requests'] += 1
+            if metrics.error is not None:
+                counters['errors'] += 1
+            counters['retries'] += metrics.retries
+            counters['bytes_in'] += metrics.bytes_in
+            counters['bytes_out'] += metrics.bytes_out
+            for reason in metrics.retry_reasons:
+                reasons = counters['retry_reasons']
+                reasons[reason] = reasons.get(reason, 0) + 1
+
+    def get_histogram(self, service, action, phase):
+        """
+        Returns the histogram of a phase's times, or ``None``.
+        """
+        return self._histograms.get((service, action, phase))
+
+    def get_counters(self, service, action):
+        """
+        Returns a copy of the counters of a ``(service, action)``.
+        """
+        with self._lock:
+            counters = dict(self._counters.get((service, action), {}))
+            if counters:
+                counters['retry_reasons'] = dict(counters['retry_reasons'])
+            return counters
+
+    def summary(self, percentiles=(50, 90, 99)):
+        """
+        Returns a dict mapping ``(service, action, phase)`` to a dict of
+        the count, mean & percentiles of its times, in milliseconds.
+        """
+        result = {}
+        with self._lock:
+            for key, histogram in self._histograms.items():
+                stats = {'count': histogram.count, 'mean': histogram.mean(),
+                         'max': histogram.max}
+                for percent in percentiles:
+                    stats['p%s' % percent] = histogram.percentile(percent)
+                result[key] = stats
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+_UNSAFE_NAME_RE = re.compile(r'[^A-Za-z0-9_-]')
+
+
+class StatsdSink(object):
+    """
+    A sink sending each request's timings (in milliseconds) & counters to
+    a statsd server over UDP, as
+    ``<prefix>.<service>.<action>.<phase>``.
+
+    Sending never blocks or raises; lost packets are simply lost.
+    """
+    # Keeps packets within a typical MTU.
+    MAX_PACKET_SIZE = 1432
+
+    def __init__(self, host='127.0.0.1', port=8125, prefix='boto'):
+        self.address = (host, port)
+        self.prefix = prefix
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.setblocking(False)
+
+    def format(self, metrics):
+        """
+        Returns the statsd lines for a request's metrics.
+        """
+        name = '.'.join(_UNSAFE_NAME_RE.sub('_', str(part)) for part in
+                        (self.prefix, metrics.service, metrics.action))
+        lines = ['%s.requests:1|c' % name]
+        for phase in TIMING_PHASES:
+            value = getattr(metrics, phase)
+            if value is not None:
+                lines.append('%s.%s:%.3f|ms' % (name, phase, value * 1000))
+        if metrics.error is not None:
+            lines.append('%s.errors:1|c' % name)
+        if metrics.retries:
+            lines.append('%s.retries:%d|c' % (name, metrics.retries))
+        for reason in metrics.retry_reasons:
+            lines.append('%s.retry_reasons.%s:1|c' % (
+                name, _UNSAFE_NAME_RE.sub('_', reason)))
+        if metrics.bytes_out:
+            lines.append('%s.bytes_out:%d|c' % (name, metrics.bytes_out))
+        if metrics.bytes_in:
+            lines.append('%s.bytes_in:%d|c' % (name, metrics.bytes_in))
+        return lines
+
+    def record(self, metrics):
+        packet = ''
+        for line in self.format(metrics):
+            if packet and len(packet) + len(line) + 1 > self.MAX_PACKET_SIZE:
+                self._send(packet)
+                packet = ''
+            packet = packet + '\n' + line if packet else line
+        if packet:
+            self._send(packet)
+
+    def _send(self, packet):
+        try:
+            self._socket.sendto(packet.encode('utf-8'), self.address)
+        except socket.error:
+            pass
+
+    def close(self):
+        self._socket.close()
+
+
+_default_instrumentation = None
+
+
+def set_default_instrumentation(instrumentation):
+    """
+    Sets the :class:`Instrumentation` used by connections that haven't been
+    given one. ``None`` turns it off.
+    """
+    global _default_instrumentation
+    _default_instrumentation = instrumentation
+
+
+def get_default_instrumentation():
+    return _default_instrumentation
@@ -0,0 +1,83 @@
+# Copyright (c) 2015 Amazon.com, Inc. or its affiliates.  All Rights Reserved
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish, dis-
+# tribute, sublicense, and/or sell copies of the Software, and to permit
+# persons to whom the Software is furnished to do so, subject to the fol-
+# lowing conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABIL-
+# ITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT
+# SHALL THE AUTHOR BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+"""
+Threading & backoff helpers shared by the Kinesis producer & consumer.
+"""
+import logging
+import random
+import threading
+
+from boto.vendored.six.moves.queue import Empty
+
+
+_END_SENTINEL = object()
+log = logging.getLogger('boto.kinesis.concurrent')
+
+# The base & cap (in seconds) for the backoff between retries.
+BACKOFF_BASE = 0.1
+BACKOFF_CAP = 10
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    """
+    Returns how long to sleep before retry number ``attempt`` (starting at
+    0), using exponential backoff with full jitter.
+    """
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class WorkerThread(threading.Thread):
+    """
+    A daemon thread that calls ``handler`` with each item from
+    ``worker_queue`` until it sees the end sentinel.
+
+    Exceptions raised by ``handler`` are passed to ``on_error`` (the thread
+    keeps going), so the thread that owns the pool can re-raise them.
+    """
+    def __init__(self, worker_queue, handler, on_error):
+        super(WorkerThread, self).__init__()
+        self.daemon = True
+        self._worker_queue = worker_queue
+        self._handler = handler
+        self._on_error = on_error
+        # This value can be set externally by other objects
+        # to indicate that the thread should be shut down.
+        self.should_continue = True
+
+    def run(self):
+        while self.should_continue:
+            try:
+                work = self._worker_queue.get(timeout=1)
+            except Empty:
+                continue
+
+            try:
+                if work is _END_SENTINEL:
+                    return
+
+                self._handler(work)
+            except Exception as e:
+                log.error("Exception caught in worker: %s, msg: %s",
+                          e.__class__, e)
+                self._on_error(e)
+            finally:
+                self._worker_queue.task_done()
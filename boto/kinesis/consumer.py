@@ -0,0 +1,334 @@
+# Copyright (c) 2013 Amazon.com, Inc. or its affiliates.  All Rights Reserved
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish, dis-
+# tribute, sublicense, and/or sell copies of the Software, and to permit
+# persons to whom the Software is furnished to do so, subject to the fol-
+# lowing conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABIL-
+# ITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT
+# SHALL THE AUTHOR BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+import binascii
+import logging
+import threading
+
+from boto.compat import Queue
+from boto.kinesis.concurrent import backoff_delay
+from boto.kinesis.exceptions import ExpiredIteratorException, \
+                                    ProvisionedThroughputExceededException
+from boto.kinesis.producer import deaggregate
+from boto.vendored.six.moves.queue import Empty, Full
+
+
+log = logging.getLogger('boto.kinesis.consumer')
+
+# Passed to the checkpoint callback once every record in a shard has been
+# consumed. Shards checkpointed with it are skipped.
+SHARD_END = 'SHARD_END'
+
+# A shard supports 5 GetRecords calls per second.
+MIN_POLL_INTERVAL = 0.2
+
+
+def describe_shards(connection, stream_name):
+    """
+    Returns every shard in ``stream_name``, following ``HasMoreShards``
+    through as many ``DescribeStream`` calls as needed.
+    """
+    shards = []
+    last_shard_id = None
+
+    while True:
+        description = connection.describe_stream(
+            stream_name, exclusive_start_shard_id=last_shard_id
+        )['StreamDescription']
+        shards.extend(description['Shards'])
+
+        if not description.get('HasMoreShards') or not shards:
+            return shards
+
+        last_shard_id = shards[-1]['ShardId']
+
+
+def _is_closed(shard):
+    return 'EndingSequenceNumber' in shard.get('SequenceNumberRange', {})
+
+
+class KinesisConsumer(object):
+    """
+    Reads every shard of a stream concurrently.
+
+    Iterating over the consumer yields records (dicts with ``Data`` as a
+    byte string, ``PartitionKey``, ``SequenceNumber`` & ``ShardId``).
+
+    Each open shard is polled by its own thread, which backs off when the
+    shard's throughput is exceeded & decodes the ``Data`` of a whole
+    batch before putting it on a bounded queue; once
+    ``max_buffered_batches`` are waiting, the threads wait for the
+    consumer to catch up.
+
+    Shards created by splits & merges are only read once their parents
+    have been read to the end, so records with the same partition key
+    are yielded in order. Iteration stops once every shard is closed &
+    read.
+
+    Once every record in a batch has been yielded, ``checkpoint`` is
+    called with the shard ID & the batch's last sequence number (or
+    ``SHARD_END`` once a shard has been read to the end). The same values
+    are kept in ``checkpoints``; pass them back in to carry on where a
+    previous consumer stopped.
+
+    Example::
+
+        consumer = KinesisConsumer(conn, 'my-stream')
+        for record in consumer:
+            process(record['Data'])
+
+    """
+    def __init__(self, connection, stream_name,
+                 iterator_type='TRIM_HORIZON', checkpoints=None,
+                 checkpoint=None, limit=None, poll_interval=1.0,
+                 max_buffered_batches=10, deaggregate=False):
+        """
+        :type connection: :class:`boto.kinesis.layer1.KinesisConnection`
+        :param connection: The connection to read with. It's shared by the
+            polling threads.
+
+        :type stream_name: string
+        :param stream_name: The stream to read.
+
+        :type iterator_type: string
+        :param iterator_type: Where to start reading shards that have no
+            checkpoint, either ``TRIM_HORIZON`` or ``LATEST``. With
+            ``LATEST``, shards that are already closed are skipped.
+
+        :type checkpoints: dict
+        :param checkpoints: A mapping of shard IDs to the sequence number to
+            carry on reading after (or ``SHARD_END``).
+
+        :type checkpoint: callable
+        :param checkpoint: Called with a shard ID & sequence number once the
+            records up to it have been consumed.
+
+        :type limit: int
+        :param limit: The maximum number of records per ``GetRecords`` call.
+
+        :type poll_interval: float
+        :param poll_interval: How long (in seconds) to wait before polling a
+            shard again after it returned no records.
+
+        :type max_buffered_batches: int
+        :param max_buffered_batches: How many batches of records can be
+            waiting to be consumed.
+
+        :type deaggregate: bool
+        :param deaggregate: Whether to split up records aggregated by
+            :class:`boto.kinesis.producer.KinesisProducer`.
+        """
+        self.connection = connection
+        self.stream_name = stream_name
+        self.checkpoints = dict(checkpoints or {})
+        self._iterator_type = iterator_type
+        self._checkpoint = checkpoint
+        self._limit = limit
+        self._poll_interval = max(poll_interval, MIN_POLL_INTERVAL)
+        self._deaggregate = deaggregate
+        self._record_queue = Queue(maxsize=max_buffered_batches)
+        self._stopped = threading.Event()
+        self._pollers = {}
+        self._finished = set()
+
+    def __iter__(self):
+        self._start_shards(describe_shards(self.connection, self.stream_name),
+                           self._iterator_type)
+        try:
+            while self._pollers or not self._record_queue.empty():
+                try:
+                    item = self._record_queue.get(timeout=1)
+                except Empty:
+                    continue
+
+                if isinstance(item, Exception):
+                    raise item
+
+                shard_id, records = item
+
+                if records is None:
+                    self._shard_finished(shard_id)
+                    continue
+
+                for record in records:
+                    yield record
+
+                self._set_checkpoint(shard_id, records[-1]['SequenceNumber'])
+        finally:
+            self.close()
+
+    def close(self):
+        """
+        Stops the polling threads.
+        """
+        self._stopped.set()
+        for poller in list(self._pollers.values()):
+            poller.join()
+        self._pollers = {}
+
+    def _set_checkpoint(self, shard_id, sequence_number):
+        self.checkpoints[shard_id] = sequence_number
+
+        if self._checkpoint is not None:
+            self._checkpoint(shard_id, sequence_number)
+
+    def _shard_finished(self, shard_id):
+        log.debug("Finished reading shard %s.", shard_id)
+        self._pollers.pop(shard_id).join()
+        self._finished.add(shard_id)
+        self._set_checkpoint(shard_id, SHARD_END)
+        # The children of a closed shard may now be ready.
+        self._start_shards(describe_shards(self.connection, self.stream_name),
+                           'TRIM_HORIZON')
+
+    def _start_shards(self, shards, iterator_type):
+        shard_ids = set(shard['ShardId'] for shard in shards)
+
+        for shard in shards:
+            shard_id = shard['ShardId']
+
+            if self.checkpoints.get(shard_id) == SHARD_END or \
+                    (iterator_type == 'LATEST' and _is_closed(shard)):
+                self._finished.add(shard_id)
+
+        for shard in shards:
+            shard_id = shard['ShardId']
+
+            if shard_id in self._finished or shard_id in self._pollers:
+                continue
+
+            # Parents that have expired from the stream can't be read.
+            parents = [shard.get('ParentShardId'),
+                       shard.get('AdjacentParentShardId')]
+            if any(parent in shard_ids and parent not in self._finished
+                   for parent in parents if parent is not None):
+                continue
+
+            log.debug("Starting to read shard %s.", shard_id)
+            poller = _ShardPoller(self, shard_id,
+                                  self.checkpoints.get(shard_id),
+                                  iterator_type)
+            poller.start()
+            self._pollers[shard_id] = poller
+
+    def _get_shard_iterator(self, shard_id, sequence_number, iterator_type):
+        if sequence_number is not None:
+            response = self.connection.get_shard_iterator(
+                self.stream_name, shard_id, 'AFTER_SEQUENCE_NUMBER',
+                starting_sequence_number=sequence_number
+            )
+        else:
+            response = self.connection.get_shard_iterator(
+                self.stream_name, shard_id, iterator_type
+            )
+        return response['ShardIterator']
+
+    def _decode(self, shard_id, records):
+        a2b_base64 = binascii.a2b_base64
+        decoded = []
+
+        for record in records:
+            record['ShardId'] = shard_id
+            data = a2b_base64(record['Data'])
+
+            if not self._deaggregate:
+                record['Data'] = data
+                decoded.append(record)
+                continue
+
+            for payload in deaggregate(data):
+                part = dict(record)
+                part['Data'] = payload
+                decoded.append(part)
+
+        return decoded
+
+    def _put(self, item):
+        while not self._stopped.is_set():
+            try:
+                self._record_queue.put(item, timeout=1)
+                return True
+            except Full:
+                continue
+
+        return False
+
+
+class _ShardPoller(threading.Thread):
+    def __init__(self, consumer, shard_id, sequence_number, iterator_type):
+        super(_ShardPoller, self).__init__()
+        self.daemon = True
+        self._consumer = consumer
+        self._shard_id = shard_id
+        self._sequence_number = sequence_number
+        self._iterator_type = iterator_type
+
+    def run(self):
+        consumer = self._consumer
+        try:
+            self._poll()
+        except Exception as e:
+            log.error("Exception caught polling shard %s: %s, msg: %s",
+                      self._shard_id, e.__class__, e)
+            consumer._put(e)
+        else:
+            if not consumer._stopped.is_set():
+                consumer._put((self._shard_id, None))
+
+    def _poll(self):
+        consumer = self._consumer
+        connection = consumer.connection
+        stopped = consumer._stopped
+        shard_iterator = consumer._get_shard_iterator(
+            self._shard_id, self._sequence_number, self._iterator_type
+        )
+        attempt = 0
+
+        while shard_iterator is not None and not stopped.is_set():
+            try:
+                response = connection.get_records(
+                    shard_iterator, limit=consumer._limit, b64_decode=False
+                )
+            except ProvisionedThroughputExceededException:
+                stopped.wait(backoff_delay(attempt, base=MIN_POLL_INTERVAL))
+                attempt += 1
+                continue
+            except ExpiredIteratorException:
+                shard_iterator = consumer._get_shard_iterator(
+                    self._shard_id, self._sequence_number,
+                    self._iterator_type
+                )
+                continue
+
+            attempt = 0
+            shard_iterator = response.get('NextShardIterator')
+            records = response.get('Records')
+
+            if records:
+                self._sequence_number = records[-1]['SequenceNumber']
+                batch = consumer._decode(self._shard_id, records)
+
+                if batch and not consumer._put((self._shard_id, batch)):
+                    return
+
+                stopped.wait(MIN_POLL_INTERVAL)
+            elif shard_iterator is not None:
+                stopped.wait(consumer._poll_interval)
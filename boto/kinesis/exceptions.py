@@ -20,7 +20,7 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
 # IN THE SOFTWARE.
 #
-from boto.exception import BotoServerError
+from boto.exception import BotoClientError, BotoServerError
 
 
 class ProvisionedThroughputExceededException(BotoServerError):
@@ -49,3 +49,17 @@ class InvalidArgumentException(BotoServerError):
 
 class SubscriptionRequiredException(BotoServerError):
     pass
+
+
+class PutRecordsError(BotoClientError):
+    """
+    Raised by :class:`boto.kinesis.producer.KinesisProducer` when records
+    could not be put even after retrying.
+
+    ``failed_records`` is a list of ``(stream_name, record, error_code)``
+    tuples, where ``record`` is the ``PutRecords`` entry (with its
+    Base64-encoded ``Data``) that failed.
+    """
+    def __init__(self, reason, failed_records=None):
+        super(PutRecordsError, self).__init__(reason)
+        self.failed_records = failed_records or []
@@ -27,7 +27,7 @@ from boto.connection import AWSQueryConnection
 from boto.regioninfo import RegionInfo
 from boto.exception import JSONResponseError
 from boto.kinesis import exceptions
-from boto.compat import json
+from boto.compat import json, six
 
 
 class KinesisConnection(AWSQueryConnection):
@@ -596,6 +596,49 @@ class KinesisConnection(AWSQueryConnection):
         return self.make_request(action='PutRecord',
                                  body=json.dumps(params))
 
+    def put_records(self, records, stream_name, b64_encode=True):
+        """
+        This operation puts multiple data records into an Amazon
+        Kinesis stream from a producer in a single call. Each
+        `PutRecords` request can support up to 500 records, and the
+        entire request, including partition keys, can be up to 5 MB.
+
+        Records are not applied atomically: the response contains a
+        `Records` list in the same order as the request, where each
+        failed entry has an `ErrorCode` and `ErrorMessage` instead of a
+        `ShardId` and `SequenceNumber`, along with a `FailedRecordCount`.
+        Failed records (typically `ProvisionedThroughputExceededException`
+        or `InternalFailure`) can be resent on their own.
+
+        :type records: list
+        :param records: The records to put. Each record is a dictionary with
+            a `Data` blob, a `PartitionKey` and optionally an
+            `ExplicitHashKey`.
+
+        :type stream_name: string
+        :param stream_name: The name of the stream to put the data records
+            into.
+
+        :type b64_encode: boolean
+        :param b64_encode: Whether to Base64 encode the `Data` of each record.
+            Can be set to ``False`` if it is already encoded to prevent
+            double encoding.
+
+        """
+        if b64_encode:
+            encoded = []
+            for record in records:
+                record = dict(record)
+                data = record['Data']
+                if not isinstance(data, six.binary_type):
+                    data = data.encode('utf-8')
+                record['Data'] = base64.b64encode(data).decode('utf-8')
+                encoded.append(record)
+            records = encoded
+        params = {'Records': records, 'StreamName': stream_name, }
+        return self.make_request(action='PutRecords',
+                                 body=json.dumps(params))
+
     def split_shard(self, stream_name, shard_to_split, new_starting_hash_key):
         """
         This operation splits a shard into two new shards in the
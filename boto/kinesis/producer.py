@@ -0,0 +1,498 @@
+# Copyright (c) 2013 Amazon.com, Inc. or its affiliates.  All Rights Reserved
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish, dis-
+# tribute, sublicense, and/or sell copies of the Software, and to permit
+# persons to whom the Software is furnished to do so, subject to the fol-
+# lowing conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABIL-
+# ITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT
+# SHALL THE AUTHOR BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+import base64
+import logging
+import struct
+import threading
+import time
+
+from boto.compat import six, Queue
+from boto.exception import BotoServerError
+from boto.kinesis.concurrent import WorkerThread, backoff_delay, \
+    _END_SENTINEL
+from boto.kinesis.exceptions import PutRecordsError
+
+
+log = logging.getLogger('boto.kinesis.producer')
+
+# Limits of the ``PutRecords`` API. Sizes count the data blob (before
+# Base64 encoding) plus the partition key.
+MAX_BATCH_RECORDS = 500
+MAX_BATCH_BYTES = 5 * 1024 * 1024
+MAX_RECORD_BYTES = 1024 * 1024
+MAX_PARTITION_KEY_BYTES = 256
+
+# Per-record error codes that are worth resending.
+RETRYABLE_ERRORS = ('ProvisionedThroughputExceededException',
+                    'InternalFailure')
+
+# Aggregated records start with this marker, followed by each payload
+# prefixed with its length as a 4 byte big-endian integer.
+AGGREGATION_MAGIC = b'\x00bka'
+_LENGTH = struct.Struct('>I')
+
+
+def aggregate(payloads):
+    """
+    Packs a list of byte strings into a single record's data.
+
+    Use :func:`deaggregate` to split it up again.
+    """
+    parts = [AGGREGATION_MAGIC]
+    for payload in payloads:
+        parts.append(_LENGTH.pack(len(payload)))
+        parts.append(payload)
+    return b''.join(parts)
+
+
+def deaggregate(data):
+    """
+    Splits the data of a record built by :func:`aggregate` back into a
+    list of payloads.
+
+    Data that wasn't aggregated is returned as a one item list, so
+    consumers can call this on every record they read. Records need to be
+    read with ``b64_decode=False`` & decoded to bytes first, since
+    aggregated data isn't valid UTF-8.
+    """
+    if not data.startswith(AGGREGATION_MAGIC):
+        return [data]
+
+    payloads = []
+    offset = len(AGGREGATION_MAGIC)
+    end = len(data)
+
+    while offset < end:
+        if offset + _LENGTH.size > end:
+            return [data]
+
+        length = _LENGTH.unpack_from(data, offset)[0]
+        offset += _LENGTH.size
+
+        if offset + length > end:
+            return [data]
+
+        payloads.append(data[offset:offset + length])
+        offset += length
+
+    return payloads
+
+
+class _StreamBuffer(object):
+    """
+    The records waiting to be put to one stream.
+
+    Each record is a dict holding its partition key, optional explicit
+    hash key & a list of payloads. With aggregation enabled, small records
+    with the same partition key are appended to the same entry.
+    """
+    def __init__(self, max_records, max_bytes, max_aggregate_bytes):
+        self.records = []
+        self.size = 0
+        self.created = time.time()
+        self._max_records = max_records
+        self._max_bytes = max_bytes
+        self._max_aggregate_bytes = max_aggregate_bytes
+        self._aggregates = {}
+
+    def add(self, data, partition_key, key_size, explicit_hash_key=None):
+        """
+        Adds a record, returning ``False`` if it doesn't fit within the
+        batch limits.
+        """
+        if self._max_aggregate_bytes and explicit_hash_key is None:
+            added = _LENGTH.size + len(data)
+            record = self._aggregates.get(partition_key)
+
+            if record is not None and \
+                    record['size'] + added <= self._max_aggregate_bytes:
+                if self.size + added > self._max_bytes:
+                    return False
+
+                record['payloads'].append(data)
+                record['size'] += added
+                self.size += added
+                return True
+
+            if len(AGGREGATION_MAGIC) + added <= self._max_aggregate_bytes:
+                record = self._new_record(
+                    data, partition_key, key_size,
+                    len(AGGREGATION_MAGIC) + added
+                )
+
+                if record is not None:
+                    self._aggregates[partition_key] = record
+                    return True
+
+                return False
+
+        # Anything put after this record for the same partition key has to
+        # go after it as well.
+        self._aggregates.pop(partition_key, None)
+        record = self._new_record(
+            data, partition_key, key_size, len(data), explicit_hash_key
+        )
+        return record is not None
+
+    def _new_record(self, data, partition_key, key_size, size,
+                    explicit_hash_key=None):
+        if self.records:
+            if len(self.records) >= self._max_records:
+                return None
+
+            if self.size + size + key_size > self._max_bytes:
+                return None
+
+        record = {
+            'PartitionKey': partition_key,
+            'payloads': [data],
+            'size': size,
+        }
+
+        if explicit_hash_key is not None:
+            record['ExplicitHashKey'] = explicit_hash_key
+
+        self.records.append(record)
+        self.size += size + key_size
+        return record
+
+    def is_full(self):
+        return len(self.records) >= self._max_records or \
+            self.size >= self._max_bytes
+
+
+class KinesisProducer(object):
+    """
+    Buffers records per stream & puts them in batches with ``PutRecords``.
+
+    A batch is handed to a pool of background threads once it reaches
+    ``max_batch_records`` records or ``max_batch_bytes`` bytes, or once its
+    oldest record has waited ``linger`` seconds. Entries that fail with a
+    retryable error are resent on their own (with backoff) up to
+    ``max_retries`` times.
+
+    Records that still fail are passed to ``on_failure(stream_name,
+    record, error_code)`` if it was given (it's called from a worker
+    thread), otherwise they're collected & raised as a
+    :class:`boto.kinesis.exceptions.PutRecordsError` by the next
+    ``flush`` or ``close``.
+
+    With ``aggregate=True``, small records with the same partition key
+    are packed together into records of up to ``max_aggregate_bytes``.
+    Consumers must then split them up with
+    :func:`boto.kinesis.producer.deaggregate`.
+
+    Example::
+
+        producer = KinesisProducer(conn)
+        for event in events:
+            producer.put('my-stream', json.dumps(event), event['user'])
+        producer.close()
+
+    """
+    def __init__(self, connection, max_batch_records=MAX_BATCH_RECORDS,
+                 max_batch_bytes=MAX_BATCH_BYTES, linger=0.1, num_threads=4,
+                 max_retries=5, aggregate=False, max_aggregate_bytes=50 * 1024,
+                 on_failure=None):
+        """
+        :type connection: :class:`boto.kinesis.layer1.KinesisConnection`
+        :param connection: The connection to put records with.
+
+        :type max_batch_records: int
+        :param max_batch_records: The number of records (at most 500) that
+            triggers a flush of a stream's buffer.
+
+        :type max_batch_bytes: int
+        :param max_batch_bytes: The size in bytes (at most 5MB) that triggers
+            a flush of a stream's buffer.
+
+        :type linger: float
+        :param linger: The longest (in seconds) a record is buffered before
+            being flushed. ``None`` disables time-based flushing.
+
+        :type num_threads: int
+        :param num_threads: The number of threads putting batches.
+
+        :type max_retries: int
+        :param max_retries: How many times failed entries are resent.
+
+        :type aggregate: bool
+        :param aggregate: Whether to pack small records into larger ones.
+
+        :type max_aggregate_bytes: int
+        :param max_aggregate_bytes: The largest aggregated record, in bytes.
+
+        :type on_failure: callable
+        :param on_failure: Called with each record that couldn't be put.
+        """
+        if not 0 < max_batch_records <= MAX_BATCH_RECORDS:
+            raise ValueError('max_batch_records must be between 1 & %s.' %
+                             MAX_BATCH_RECORDS)
+        if not 0 < max_batch_bytes <= MAX_BATCH_BYTES:
+            raise ValueError('max_batch_bytes must be between 1 & %s.' %
+                             MAX_BATCH_BYTES)
+
+        self.connection = connection
+        self._max_batch_records = max_batch_records
+        self._max_batch_bytes = max_batch_bytes
+        self._linger = linger
+        self._max_retries = max_retries
+        self._max_aggregate_bytes = 0
+        if aggregate:
+            self._max_aggregate_bytes = min(
+                max_aggregate_bytes, MAX_RECORD_BYTES - MAX_PARTITION_KEY_BYTES
+            )
+        self._on_failure = on_failure
+        self._buffers = {}
+        self._failed = []
+        self._errors = []
+        self._lock = threading.Lock()
+        self._closed = False
+        # Bounded, so ``put`` blocks once the threads fall behind.
+        self._batch_queue = Queue(maxsize=num_threads * 2)
+        self._threads = []
+
+        for i in range(num_threads):
+            thread = WorkerThread(
+                self._batch_queue, self._send_batch, self._errors.append
+            )
+            thread.start()
+            self._threads.append(thread)
+
+        self._linger_thread = None
+
+        if linger is not None:
+            self._linger_thread = _LingerThread(self, max(linger / 2.0, 0.01))
+            self._linger_thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def put(self, stream_name, data, partition_key, explicit_hash_key=None):
+        """
+        Buffers a record to put to ``stream_name``.
+
+        ``data`` may be a byte string or a unicode string, which is UTF-8
+        encoded. This may block while the background threads catch up.
+        """
+        if self._closed:
+            raise ValueError('Cannot put records to a closed producer.')
+
+        if not isinstance(data, six.binary_type):
+            data = data.encode('utf-8')
+
+        key_size = len(partition_key.encode('utf-8'))
+
+        if len(data) + key_size > MAX_RECORD_BYTES:
+            raise ValueError('Records can be at most %s bytes, including '
+                             'the partition key.' % MAX_RECORD_BYTES)
+
+        batches = []
+
+        with self._lock:
+            buf = self._buffers.get(stream_name)
+
+            if buf is None:
+                buf = self._new_buffer(stream_name)
+
+            if not buf.add(data, partition_key, key_size, explicit_hash_key):
+                batches.append(buf.records)
+                buf = self._new_buffer(stream_name)
+                buf.add(data, partition_key, key_size, explicit_hash_key)
+
+            if buf.is_full():
+                batches.append(buf.records)
+                del self._buffers[stream_name]
+
+        for records in batches:
+            self._batch_queue.put((stream_name, records))
+
+    def _new_buffer(self, stream_name):
+        buf = _StreamBuffer(self._max_batch_records, self._max_batch_bytes,
+                            self._max_aggregate_bytes)
+        self._buffers[stream_name] = buf
+        return buf
+
+    def _take_buffers(self, older_than=None):
+        batches = []
+
+        with self._lock:
+            for stream_name, buf in list(self._buffers.items()):
+                if older_than is None or buf.created <= older_than:
+                    batches.append((stream_name, buf.records))
+                    del self._buffers[stream_name]
+
+        return batches
+
+    def _flush_expired(self):
+        for batch in self._take_buffers(time.time() - self._linger):
+            self._batch_queue.put(batch)
+
+    def flush(self):
+        """
+        Puts every buffered record & waits for all of them to be sent.
+
+        Raises the first exception hit by a background thread, or a
+        ``PutRecordsError`` if records failed & no ``on_failure`` callback
+        was given.
+        """
+        for batch in self._take_buffers():
+            self._batch_queue.put(batch)
+
+        self._batch_queue.join()
+        self._raise_errors()
+
+    def close(self):
+        """
+        Flushes any buffered records & stops the background threads.
+        """
+        if self._closed:
+            return
+
+        try:
+            self.flush()
+        finally:
+            self._closed = True
+            self._shutdown_threads()
+
+    def _shutdown_threads(self):
+        log.debug("Shutting down threads.")
+        if self._linger_thread is not None:
+            self._linger_thread.stop()
+            self._linger_thread.join()
+        for thread in self._threads:
+            self._batch_queue.put(_END_SENTINEL)
+        for thread in self._threads:
+            thread.join()
+        log.debug("Threads have exited.")
+
+    def _raise_errors(self):
+        with self._lock:
+            errors = list(self._errors)
+            del self._errors[:]
+            failed, self._failed = self._failed, []
+
+        if errors:
+            raise errors[0]
+
+        if failed:
+            raise PutRecordsError(
+                '%s records could not be put.' % len(failed), failed
+            )
+
+    def _encode(self, record):
+        payloads = record['payloads']
+
+        if len(payloads) == 1 and not (self._max_aggregate_bytes and
+                                       payloads[0].startswith(
+                                           AGGREGATION_MAGIC)):
+            data = payloads[0]
+        else:
+            data = aggregate(payloads)
+
+        entry = {
+            'Data': base64.b64encode(data).decode('ascii'),
+            'PartitionKey': record['PartitionKey'],
+        }
+
+        if 'ExplicitHashKey' in record:
+            entry['ExplicitHashKey'] = record['ExplicitHashKey']
+
+        return entry
+
+    def _send_batch(self, batch):
+        stream_name, records = batch
+        entries = [self._encode(record) for record in records]
+        attempt = 0
+
+        while True:
+            try:
+                response = self.connection.put_records(
+                    entries, stream_name, b64_encode=False
+                )
+            except BotoServerError as e:
+                # The whole request was rejected; throttling is the only
+                # failure that's worth retrying.
+                code = e.error_code
+                if code is None and hasattr(e.body, 'get'):
+                    code = e.body.get('__type')
+                code = code or e.__class__.__name__
+                results = [{'ErrorCode': code}] * len(entries)
+            else:
+                if not response.get('FailedRecordCount'):
+                    return
+                results = response['Records']
+
+            retries = []
+
+            for entry, result in zip(entries, results):
+                code = result.get('ErrorCode')
+
+                if code is None:
+                    continue
+
+                if code in RETRYABLE_ERRORS and attempt < self._max_retries:
+                    retries.append(entry)
+                else:
+                    self._fail(stream_name, entry, code)
+
+            if not retries:
+                return
+
+            log.debug("Resending %s of %s records to %s.",
+                      len(retries), len(entries), stream_name)
+            entries = retries
+            time.sleep(backoff_delay(attempt))
+            attempt += 1
+
+    def _fail(self, stream_name, entry, code):
+        log.error("Failed to put record to %s: %s", stream_name, code)
+
+        if self._on_failure is not None:
+            self._on_failure(stream_name, entry, code)
+        else:
+            with self._lock:
+                self._failed.append((stream_name, entry, code))
+
+
+class _LingerThread(threading.Thread):
+    def __init__(self, producer, interval):
+        super(_LingerThread, self).__init__()
+        self.daemon = True
+        self._producer = producer
+        self._interval = interval
+        self._stopped = threading.Event()
+
+    def stop(self):
+        self._stopped.set()
+
+    def run(self):
+        while not self._stopped.is_set():
+            self._stopped.wait(self._interval)
+            try:
+                self._producer._flush_expired()
+            except Exception as e:
+                log.error("Exception caught flushing: %s, msg: %s",
+                          e.__class__, e)
@@ -0,0 +1,372 @@
+# Copyright (c) 2014 Amazon.com, Inc. or its affiliates.  All Rights Reserved
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish, dis-
+# tribute, sublicense, and/or sell copies of the Software, and to permit
+# persons to whom the Software is furnished to do so, subject to the fol-
+# lowing conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABIL-
+# ITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT
+# SHALL THE AUTHOR BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+"""
+Ships log events to CloudWatch Logs in batches from a background thread.
+"""
+import logging
+import re
+import threading
+import time
+
+from boto.compat import six
+from boto.logs.exceptions import DataAlreadyAcceptedException, \
+    InvalidSequenceTokenException, ResourceAlreadyExistsException, \
+    ResourceNotFoundException
+
+
+log = logging.getLogger('boto.logs.shipper')
+
+# Limits of the ``PutLogEvents`` API. Each event counts for its message
+# (in UTF-8) plus a fixed overhead.
+MAX_BATCH_BYTES = 32768
+MAX_BATCH_COUNT = 1000
+EVENT_OVERHEAD = 26
+
+_EXPECTED_TOKEN_RE = re.compile(r'sequenceToken(?: is)?: (\S+)')
+
+
+class LogShipper(object):
+    """
+    Buffers log events per log stream & sends them with ``PutLogEvents``
+    from a background thread.
+
+    Events are sorted by timestamp & sent in batches within the API's byte
+    & count limits, either every ``flush_interval`` seconds or as soon as a
+    stream has a full batch. The sequence token of each stream is kept in
+    memory; if another writer has moved it on, the expected token is
+    picked up from the ``InvalidSequenceTokenException`` & the batch is
+    resent.
+
+    ``put`` never blocks: once ``max_buffered_events`` are waiting, further
+    events are dropped & counted in ``dropped_events``, as are events that
+    can't be sent.
+    """
+    def __init__(self, connection, flush_interval=5.0,
+                 max_batch_bytes=MAX_BATCH_BYTES,
+                 max_batch_count=MAX_BATCH_COUNT,
+                 max_buffered_events=10000, create_streams=True,
+                 max_retries=3):
+        """
+        :type connection: :class:`boto.logs.layer1.CloudWatchLogsConnection`
+        :param connection: The connection to send events with.
+
+        :type flush_interval: float
+        :param flush_interval: The longest (in seconds) an event is buffered.
+
+        :type max_batch_bytes: int
+        :param max_batch_bytes: The largest batch, counting each event's
+            message plus 26 bytes.
+
+        :type max_batch_count: int
+        :param max_batch_count: The most events per batch.
+
+        :type max_buffered_events: int
+        :param max_buffered_events: The most events waiting to be sent
+            before new ones are dropped.
+
+        :type create_streams: bool
+        :param create_streams: Whether to create log groups & streams that
+            don't exist yet.
+
+        :type max_retries: int
+        :param max_retries: How many times a batch is resent after a
+            sequence token error.
+        """
+        self.connection = connection
+        self.dropped_events = 0
+        self._flush_interval = flush_interval
+        self._max_batch_bytes = max_batch_bytes
+        self._max_batch_count = max_batch_count
+        self._max_buffered_events = max_buffered_events
+        self._create_streams = create_streams
+        self._max_retries = max_retries
+        # Buffered events & their size, by (group name, stream name).
+        self._buffers = {}
+        self._buffered_events = 0
+        self._tokens = {}
+        self._full = False
+        self._flushing = 0
+        self._sending = False
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def put(self, log_group_name, log_stream_name, message, timestamp=None):
+        """
+        Buffers a log event.
+
+        :type timestamp: int
+        :param timestamp: When the event happened, in milliseconds since the
+            epoch. Defaults to now.
+        """
+        if timestamp is None:
+            timestamp = int(time.time() * 1000)
+
+        if isinstance(message, six.binary_type):
+            message = message.decode('utf-8', 'replace')
+
+        size = len(message.encode('utf-8')) + EVENT_OVERHEAD
+
+        if size > self._max_batch_bytes:
+            message = self._truncate(message)
+            size = self._max_batch_bytes
+
+        key = (log_group_name, log_stream_name)
+
+        with self._condition:
+            if self._closed:
+                raise ValueError('Cannot put events to a closed shipper.')
+
+            if self._buffered_events >= self._max_buffered_events:
+                self.dropped_events += 1
+                return
+
+            buf = self._buffers.get(key)
+
+            if buf is None:
+                buf = self._buffers[key] = [[], 0]
+
+            buf[0].append({'timestamp': timestamp, 'message': message})
+            buf[1] += size
+            self._buffered_events += 1
+
+            if len(buf[0]) >= self._max_batch_count or \
+                    buf[1] >= self._max_batch_bytes:
+                self._full = True
+                self._condition.notify_all()
+
+    def _truncate(self, message):
+        limit = self._max_batch_bytes - EVENT_OVERHEAD
+        return message.encode('utf-8')[:limit].decode('utf-8', 'ignore')
+
+    def flush(self):
+        """
+        Sends every buffered event & waits until they've been sent.
+        """
+        with self._condition:
+            self._flushing += 1
+            self._condition.notify_all()
+            try:
+                while self._buffers or self._sending:
+                    self._condition.wait()
+            finally:
+                self._flushing -= 1
+
+    def close(self):
+        """
+        Sends any buffered events & stops the background thread.
+        """
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if not (self._closed or
+                        (self._buffers and (self._flushing or self._full))):
+                    self._condition.wait(self._flush_interval)
+
+                if self._closed and not self._buffers:
+                    return
+
+                if not self._buffers:
+                    continue
+
+                buffers, self._buffers = self._buffers, {}
+                self._buffered_events = 0
+                self._full = False
+                self._sending = True
+
+            try:
+                for key, (events, size) in buffers.items():
+                    self._send_events(key, events)
+            finally:
+                with self._condition:
+                    self._sending = False
+                    self._condition.notify_all()
+
+    def _send_events(self, key, events):
+        # Batches have to be in chronological order; the sort is stable, so
+        # events logged in the same millisecond keep their order.
+        events.sort(key=lambda event: event['timestamp'])
+        batch = []
+        size = 0
+
+        for event in events:
+            event_size = len(event['message'].encode('utf-8')) + \
+                EVENT_OVERHEAD
+
+            if batch and (len(batch) >= self._max_batch_count or
+                          size + event_size > self._max_batch_bytes):
+                self._send_batch(key, batch)
+                batch = []
+                size = 0
+
+            batch.append(event)
+            size += event_size
+
+        if batch:
+            self._send_batch(key, batch)
+
+    def _send_batch(self, key, batch):
+        try:
+            self._put_log_events(key, batch)
+        except Exception as e:
+            log.error("Exception caught sending log events to %s/%s: %s, "
+                      "msg: %s", key[0], key[1], e.__class__, e)
+            with self._condition:
+                self.dropped_events += len(batch)
+
+    def _put_log_events(self, key, batch):
+        log_group_name, log_stream_name = key
+        attempt = 0
+
+        while True:
+            try:
+                response = self.connection.put_log_events(
+                    log_group_name, log_stream_name, batch,
+                    sequence_token=self._tokens.get(key)
+                )
+            except DataAlreadyAcceptedException as e:
+                # A previous attempt got through after all.
+                self._tokens[key] = self._expected_token(key, e)
+                return
+            except InvalidSequenceTokenException as e:
+                if attempt >= self._max_retries:
+                    raise
+                self._tokens[key] = self._expected_token(key, e)
+            except ResourceNotFoundException:
+                if not self._create_streams or attempt >= self._max_retries:
+                    raise
+                self._create_stream(key)
+            else:
+                self._tokens[key] = response.get('nextSequenceToken')
+                rejected = response.get('rejectedLogEventsInfo')
+                if rejected:
+                    log.warning("Some log events sent to %s/%s were "
+                                "rejected: %s", log_group_name,
+                                log_stream_name, rejected)
+                return
+
+            attempt += 1
+
+    def _expected_token(self, key, error):
+        """
+        Finds the sequence token the service expects next, from the error
+        message if it's there, otherwise by describing the stream.
+        """
+        message = error.message
+        if not message and hasattr(error.body, 'get'):
+            message = error.body.get('message')
+
+        match = _EXPECTED_TOKEN_RE.search(message or '')
+
+        if match is not None:
+            token = match.group(1)
+            if token == 'null':
+                return None
+            return token
+
+        log_group_name, log_stream_name = key
+        response = self.connection.describe_log_streams(
+            log_group_name, log_stream_name_prefix=log_stream_name
+        )
+        for stream in response.get('logStreams', []):
+            if stream.get('logStreamName') == log_stream_name:
+                return stream.get('uploadSequenceToken')
+
+        return None
+
+    def _create_stream(self, key):
+        log_group_name, log_stream_name = key
+        self._tokens.pop(key, None)
+
+        try:
+            self.connection.create_log_stream(log_group_name,
+                                              log_stream_name)
+        except ResourceAlreadyExistsException:
+            pass
+        except ResourceNotFoundException:
+            try:
+                self.connection.create_log_group(log_group_name)
+            except ResourceAlreadyExistsException:
+                pass
+            self.connection.create_log_stream(log_group_name,
+                                              log_stream_name)
+
+
+class CloudWatchLogsHandler(logging.Handler):
+    """
+    A logging handler that sends records to a CloudWatch Logs stream
+    through a :class:`LogShipper`, so logging never waits on a request.
+
+    Example::
+
+        handler = CloudWatchLogsHandler('my-group', 'my-stream',
+                                        connection=boto.logs.connect_to_region(
+                                            'us-east-1'))
+        logging.getLogger('myapp').addHandler(handler)
+
+    """
+    def __init__(self, log_group_name, log_stream_name, connection=None,
+                 shipper=None, level=logging.NOTSET, **kwargs):
+        """
+        Either pass a ``connection`` (& any :class:`LogShipper` keyword
+        arguments) to create a shipper owned by the handler, or an existing
+        ``shipper`` to share it between handlers.
+        """
+        logging.Handler.__init__(self, level)
+        self.log_group_name = log_group_name
+        self.log_stream_name = log_stream_name
+        self._owns_shipper = shipper is None
+        if shipper is None:
+            shipper = LogShipper(connection, **kwargs)
+        self.shipper = shipper
+
+    def emit(self, record):
+        # Records logged while sending (e.g. boto's own debug logging)
+        # would otherwise be sent forever.
+        if threading.current_thread() is self.shipper._thread:
+            return
+
+        try:
+            self.shipper.put(self.log_group_name, self.log_stream_name,
+                             self.format(record), int(record.created * 1000))
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        self.shipper.flush()
+
+    def close(self):
+        try:
+            if self._owns_shipper:
+                self.shipper.close()
+        finally:
+            logging.Handler.close(self)
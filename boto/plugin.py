@@ -37,7 +37,6 @@ The actual interface is duck typed.
 """
 
 import glob
-import imp
 import os.path
 
 
@@ -67,6 +66,8 @@ def get_plugin(cls, requested_capability=None):
 
 
 def _import_module(filename):
+    import imp
+
     (path, name) = os.path.split(filename)
     (name, ext) = os.path.splitext(name)
 
@@ -0,0 +1,278 @@
+# Copyright (c) 2015 Amazon.com, Inc. or its affiliates.  All Rights Reserved
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish, dis-
+# tribute, sublicense, and/or sell copies of the Software, and to permit
+# persons to whom the Software is furnished to do so, subject to the fol-
+# lowing conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABIL-
+# ITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT
+# SHALL THE AUTHOR BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+
+"""
+Limits the rate of requests a client makes, per service & action.
+"""
+import os
+import re
+import threading
+import time
+
+import boto
+from boto.exception import BotoClientError
+
+try:
+    import fcntl
+except ImportError:
+    # Not on Windows.
+    fcntl = None
+
+
+class TokenBucket(object):
+    """
+    Lets through ``rate`` requests a second on average, with bursts of up
+    to ``capacity``, to the threads of a process.
+
+    Each request reserves its token straight away & waits until the token
+    would have been added, so waiting requests are let through in the
+    order they arrived.
+    """
+    def __init__(self, rate, capacity=None):
+        if capacity is None:
+            capacity = max(rate, 1)
+        self.rate = float(rate)
+        self.capacity = capacity
+        self.available = float(capacity)
+        self.updated_at = time.time()
+        self._lock = threading.Lock()
+
+    def _reserve(self, available, updated_at, now, tokens, timeout):
+        """
+        Returns ``(wait, available)``, the time to wait for ``tokens`` &
+        the tokens left after taking them, or ``(None, available)`` if
+        waiting would take longer than ``timeout``.
+        """
+        available = min(self.capacity,
+                        available + (now - updated_at) * self.rate)
+        wait = max(0.0, (tokens - available) / self.rate)
+        if timeout is not None and wait > timeout:
+            return None, available
+        return wait, available - tokens
+
+    def acquire(self, tokens=1, timeout=None):
+        """
+        Takes ``tokens``, waiting until they are available. Returns False
+        without waiting if that would take longer than ``timeout`` seconds.
+        """
+        with self._lock:
+            now = time.time()
+            wait, self.available = self._reserve(
+                self.available, self.updated_at, now, tokens, timeout)
+            self.updated_at = now
+
+        if wait is None:
+            return False
+        if wait > 0:
+            time.sleep(wait)
+        return True
+
+
+class FileTokenBucket(TokenBucket):
+    """
+    A :class:`TokenBucket` shared by every process on the host using the
+    same ``filename``, which holds its state under an exclusive lock.
+    Needs ``fcntl``, so it isn't available on Windows.
+    """
+    def __init__(self, filename, rate, capacity=None):
+        if fcntl is None:
+            raise BotoClientError('Sharing rate limits between processes '
+                                  'requires the fcntl module.')
+        super(FileTokenBucket, self).__init__(rate, capacity)
+        self.filename = filename
+
+    def acquire(self, tokens=1, timeout=None):
+        with self._lock:
+            fd = os.open(self.filename, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                now = time.time()
+                available, updated_at = self.capacity, now
+                state = os.read(fd, 64).split()
+                if len(state) == 2:
+                    try:
+                        available, updated_at = float(state[0]), \
+                            float(state[1])
+                    except ValueError:
+                        pass
+                wait, available = self._reserve(available, updated_at, now,
+                                                tokens, timeout)
+                os.lseek(fd, 0, os.SEEK_SET)
+                os.ftruncate(fd, 0)
+                os.write(fd, ('%r %r\n' % (available, now)).encode('ascii'))
+            finally:
+                # Closing the file releases the lock.
+                os.close(fd)
+
+        if wait is None:
+            return False
+        if wait > 0:
+            time.sleep(wait)
+        return True
+
+
+_UNSAFE_FILENAME_RE = re.compile(r'[^A-Za-z0-9_.-]')
+
+
+class RateLimiter(object):
+    """
+    Holds a :class:`TokenBucket` for each ``(service, action)`` with a
+    limit, & makes requests wait for a token before they are sent, so that
+    bursts are smoothed out instead of being throttled & retried.
+
+    The service is the first part of the endpoint's host name (e.g.
+    ``ec2`` or ``route53``) & the action is the ``Action`` parameter of a
+    query API, the operation named by ``X-Amz-Target`` for a JSON API, or
+    the HTTP method for a REST API. An action of ``*`` limits every action
+    of the service that doesn't have its own limit. Names are matched
+    without regard to case.
+
+    If ``lock_dir`` is given, each bucket's state is kept in a file there
+    so that every process on the host using the same directory shares the
+    limits.
+
+    Example::
+
+        limiter = RateLimiter(lock_dir='/var/run/boto')
+        limiter.set_limit('ec2', 'DescribeInstances', 5)
+        limiter.set_limit('route53', '*', 3, burst=1)
+        conn.rate_limiter = limiter
+
+    """
+    def __init__(self, lock_dir=None):
+        self.lock_dir = lock_dir
+        self._limits = {}
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config=None):
+        """
+        Creates a limiter from the ``[RateLimits]`` section of the config,
+        where each option is ``service.action`` & its value is
+        ``rate[, burst]``, e.g. ``ec2.DescribeInstances = 5``. The
+        ``lock_dir`` option shares the limits between processes.
+        """
+        if config is None:
+            config = boto.config
+        limiter = cls(lock_dir=config.get('RateLimits', 'lock_dir'))
+        if not config.has_section('RateLimits'):
+            return limiter
+
+        for name in config.options('RateLimits'):
+            if name == 'lock_dir' or '.' not in name:
+                continue
+            service, action = name.split('.', 1)
+            value = config.get('RateLimits', name)
+            try:
+                values = [float(v) for v in value.split(',')]
+            except ValueError:
+                values = []
+            if not 1 <= len(values) <= 2:
+                boto.log.warning('Ignoring invalid rate limit %s = %s',
+                                 name, value)
+                continue
+            limiter.set_limit(service, action, *values)
+        return limiter
+
+    def set_limit(self, service, action, rate, burst=None):
+        """
+        Limits requests for an action to ``rate`` a second, letting through
+        bursts of up to ``burst`` (by default one second's worth).
+        """
+        key = (service.lower(), action.lower())
+        with self._lock:
+            self._limits[key] = (rate, burst)
+            self._buckets.pop(key, None)
+
+    def get_bucket(self, service, action):
+        """
+        Returns the bucket limiting an action, or ``None`` if it isn't
+        limited.
+        """
+        if not self._limits:
+            return None
+        key = (service.lower(), action.lower())
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            return bucket
+
+        with self._lock:
+            limit_key = key
+            if limit_key not in self._limits:
+                limit_key = (key[0], '*')
+                if limit_key not in self._limits:
+                    return None
+            bucket = self._buckets.get(limit_key)
+            if bucket is None:
+                rate, burst = self._limits[limit_key]
+                if self.lock_dir is not None:
+                    filename = _UNSAFE_FILENAME_RE.sub(
+                        '_', '%s.%s.bucket' % limit_key)
+                    bucket = FileTokenBucket(
+                        os.path.join(self.lock_dir, filename), rate, burst)
+                else:
+                    bucket = TokenBucket(rate, burst)
+                self._buckets[limit_key] = bucket
+            # Actions sharing a wildcard limit share its bucket.
+            self._buckets[key] = bucket
+            return bucket
+
+    def acquire(self, service, action):
+        """
+        Waits until a request for an action may be sent.
+        """
+        bucket = self.get_bucket(service, action)
+        if bucket is not None:
+            bucket.acquire()
+
+
+def get_request_action(request):
+    """
+    Returns the service & action of a :class:`boto.connection.HTTPRequest`,
+    as :class:`RateLimiter` uses them.
+    """
+    service = request.host.split('.', 1)[0]
+    action = request.params.get('Action')
+    if action is None:
+        target = request.headers.get('X-Amz-Target')
+        if target:
+            action = target.rsplit('.', 1)[-1]
+        else:
+            action = request.method
+    return service, action
+
+
+_default_limiter = None
+_default_limiter_lock = threading.Lock()
+
+
+def get_default_limiter():
+    """
+    Returns the limiter used by connections that aren't given one, created
+    from the config the first time it's needed.
+    """
+    global _default_limiter
+    if _default_limiter is None:
+        with _default_limiter_lock:
+            if _default_limiter is None:
+                _default_limiter = RateLimiter.from_config()
+    return _default_limiter
@@ -21,12 +21,19 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
 # IN THE SOFTWARE.
 import os
+import threading
 
 import boto
 from boto.compat import json
 from boto.exception import BotoClientError
 
 
+# The merged endpoint data, along with the signature of the files it was
+# loaded from. See ``get_endpoints``.
+_endpoints_cache = None
+_endpoints_lock = threading.Lock()
+
+
 def load_endpoint_json(path):
     """
     Loads a given JSON file & returns it.
@@ -81,13 +88,7 @@ def load_regions():
     """
     # Load the defaults first.
     endpoints = load_endpoint_json(boto.ENDPOINTS_PATH)
-    additional_path = None
-
-    # Try the ENV var. If not, check the config file.
-    if os.environ.get('BOTO_ENDPOINTS'):
-        additional_path = os.environ['BOTO_ENDPOINTS']
-    elif boto.config.get('Boto', 'endpoints_path'):
-        additional_path = boto.config.get('Boto', 'endpoints_path')
+    additional_path = _get_additional_path()
 
     # If there's a file provided, we'll load it & additively merge it into
     # the endpoints.
@@ -98,6 +99,115 @@ def load_regions():
     return endpoints
 
 
+def _get_additional_path():
+    # Try the ENV var. If not, check the config file.
+    if os.environ.get('BOTO_ENDPOINTS'):
+        return os.environ['BOTO_ENDPOINTS']
+    return boto.config.get('Boto', 'endpoints_path') or None
+
+
+def _get_endpoints_signature():
+    """
+    Returns a value that changes whenever the endpoint data would: when
+    a different file is used, or the override file is modified.
+    """
+    additional_path = _get_additional_path()
+    if not additional_path:
+        return (boto.ENDPOINTS_PATH, None)
+    try:
+        stat = os.stat(additional_path)
+    except OSError:
+        # Let ``load_regions`` report the missing file.
+        return (boto.ENDPOINTS_PATH, additional_path, None)
+    return (boto.ENDPOINTS_PATH, additional_path, stat.st_mtime,
+            stat.st_size)
+
+
+def get_endpoints():
+    """
+    Returns the endpoint data (service name -> region name -> endpoint),
+    as ``load_regions`` does, but loads it only once per process.
+
+    The data is loaded again if a different override file is configured,
+    or if the override file has been modified since it was loaded.
+
+    The returned data is shared, so it must not be modified; use
+    ``load_regions`` for a copy of your own.
+
+    :returns: The endpoints data
+    :rtype: dict
+    """
+    global _endpoints_cache
+    signature = _get_endpoints_signature()
+    cache = _endpoints_cache
+
+    if cache is None or cache[0] != signature:
+        with _endpoints_lock:
+            cache = _endpoints_cache
+            if cache is None or cache[0] != signature:
+                cache = _endpoints_cache = (signature, load_regions())
+
+    return cache[1]
+
+
+def get_endpoint(service_name, region_name):
+    """
+    Returns the endpoint of a service in a region, or ``None`` if the
+    service isn't available there.
+
+    :param service_name: The name of the service. Ex: ``ec2``, ``s3``, etc.
+    :type service_name: string
+
+    :param region_name: The name of the region. Ex: ``us-west-2``
+    :type region_name: string
+
+    :rtype: string
+    """
+    return get_endpoints().get(service_name, {}).get(region_name)
+
+
+def get_region(service_name, region_name, region_cls=None,
+               connection_cls=None):
+    """
+    Returns a single ``RegionInfo`` object for a service in a region, or
+    ``None`` if the service isn't available there.
+
+    The ``region_cls`` & ``connection_cls`` parameters are the same as for
+    ``get_regions``.
+    """
+    endpoint = get_endpoint(service_name, region_name)
+
+    if endpoint is None:
+        return None
+
+    if region_cls is None:
+        region_cls = RegionInfo
+
+    return region_cls(
+        name=region_name,
+        endpoint=endpoint,
+        connection_cls=connection_cls
+    )
+
+
+def connect(service_name, region_name, region_cls=None,
+            connection_cls=None, **kw_params):
+    """
+    Connects to a service in a region, without building ``RegionInfo``
+    objects for the other regions. Returns ``None`` if the service isn't
+    available in the region.
+
+    Any further keyword arguments are passed on to the connection class.
+    """
+    region = get_region(service_name, region_name, region_cls=region_cls,
+                        connection_cls=connection_cls)
+
+    if region is None:
+        return None
+
+    return region.connect(**kw_params)
+
+
 def get_regions(service_name, region_cls=None, connection_cls=None):
     """
     Given a service name (like ``ec2``), returns a list of ``RegionInfo``
@@ -122,7 +232,7 @@ def get_regions(service_name, region_cls=None, connection_cls=None):
     :returns: A list of configured ``RegionInfo`` objects
     :rtype: list
     """
-    endpoints = load_regions()
+    endpoints = get_endpoints()
 
     if service_name not in endpoints:
         raise BotoClientError(
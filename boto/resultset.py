@@ -19,6 +19,7 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
 # IN THE SOFTWARE.
 
+from boto.handler import XmlHandlerWrapper
 from boto.s3.user import User
 
 
@@ -134,6 +135,62 @@ class ResultSet(list):
             setattr(self, name, value)
 
 
+class StreamingResultSet(object):
+    """
+    An iterable version of :py:class:`ResultSet` that parses the response
+    body as it is read from the socket and yields each marker object as
+    soon as its closing tag has been parsed.  Objects are not kept once
+    they have been yielded, so memory use does not grow with the size of
+    the response.
+
+    The response can only be iterated over once.  Attributes of the
+    underlying ResultSet such as ``is_truncated``, ``next_marker`` or
+    ``next_token`` are available through this object; they are only
+    guaranteed to be set once iteration has finished, since they may
+    appear anywhere in the document.
+    """
+    BufferSize = 65536
+
+    def __init__(self, response, marker_elem, connection, buffer_size=None):
+        self.response = response
+        self.connection = connection
+        self.result_set = ResultSet(marker_elem)
+        if buffer_size is not None:
+            self.BufferSize = buffer_size
+        self._consumed = False
+
+    def __getattr__(self, name):
+        if name == 'result_set':
+            raise AttributeError(name)
+        return getattr(self.result_set, name)
+
+    def __iter__(self):
+        if self._consumed:
+            return
+        self._consumed = True
+        wrapper = XmlHandlerWrapper(self.result_set, self.connection)
+        while True:
+            data = self.response.read(self.BufferSize)
+            if not data:
+                break
+            wrapper.feed(data)
+            for obj in self._completed(wrapper):
+                yield obj
+        wrapper.close()
+        for obj in self._completed(wrapper):
+            yield obj
+
+    def _completed(self, wrapper):
+        rs = self.result_set
+        count = len(rs)
+        # Only the most recently started object can still be open.
+        if count and wrapper.is_open(rs[-1]):
+            count -= 1
+        done = rs[:count]
+        del rs[:count]
+        return done
+
+
 class BooleanResult(object):
 
     def __init__(self, marker_elem=None):
@@ -0,0 +1,372 @@
+# Copyright (c) 2015 Amazon.com, Inc. or its affiliates.  All Rights Reserved
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish, dis-
+# tribute, sublicense, and/or sell copies of the Software, and to permit
+# persons to whom the Software is furnished to do so, subject to the fol-
+# lowing conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABIL-
+# ITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT
+# SHALL THE AUTHOR BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+
+"""
+Decides whether & when failed requests are retried.
+"""
+import random
+import re
+import threading
+import time
+
+import boto
+from boto.compat import json, six
+
+
+# Error codes, from any service, meaning the request was rejected because
+# too many are being made.
+THROTTLING_ERROR_CODES = frozenset([
+    'BandwidthLimitExceeded',
+    'EC2ThrottledException',
+    'LimitExceededException',
+    'PriorRequestNotComplete',
+    'ProvisionedThroughputExceededException',
+    'RequestLimitExceeded',
+    'RequestThrottled',
+    'RequestThrottledException',
+    'SlowDown',
+    'ThrottledException',
+    'Throttling',
+    'ThrottlingException',
+    'TooManyRequestsException',
+    'TransactionInProgressException',
+])
+
+# Response statuses that may carry a throttling error code.
+THROTTLING_STATUS_CODES = frozenset([400, 403, 429, 503])
+
+# The kinds of failure ``RetryPolicy.classify_*`` returns.
+THROTTLED = 'throttled'
+TRANSIENT = 'transient'
+TIMEOUT = 'timeout'
+
+_XML_CODE_RE = re.compile(br'<Code>\s*([^<\s]+)\s*</Code>')
+
+
+def get_error_code(body):
+    """
+    Returns the error code from the body of an error response: the
+    ``__type`` (or ``code``) of a JSON body, without any namespace, or the
+    first ``Code`` element of an XML one. Returns ``None`` if there isn't
+    one.
+    """
+    if not body:
+        return None
+
+    if isinstance(body, six.text_type):
+        body = body.encode('utf-8')
+
+    stripped = body.lstrip()
+
+    if stripped.startswith(b'{'):
+        try:
+            data = json.loads(stripped.decode('utf-8'))
+        except ValueError:
+            return None
+        if not isinstance(data, dict):
+            return None
+        code = data.get('__type') or data.get('code')
+        if not code:
+            return None
+        # JSON services send e.g. "com.amazonaws.dynamodb.v20120810#..."
+        return code.rsplit('#', 1)[-1]
+
+    match = _XML_CODE_RE.search(stripped)
+    if match is None:
+        return None
+    return match.group(1).decode('utf-8')
+
+
+class RetryQuota(object):
+    """
+    A token bucket limiting how many retries are made to a host.
+
+    Each retry takes tokens & each successful request puts some back, so
+    while a host is mostly failing the retries quickly stop, rather than
+    every client multiplying the load on it.
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.available = capacity
+        self._lock = threading.Lock()
+
+    def acquire(self, amount):
+        """
+        Takes ``amount`` tokens, returning False if there aren't enough.
+        """
+        with self._lock:
+            if amount > self.available:
+                return False
+            self.available -= amount
+            return True
+
+    def release(self, amount):
+        with self._lock:
+            self.available = min(self.capacity, self.available + amount)
+
+
+class CircuitBreaker(object):
+    """
+    Stops requests to a host after ``failure_threshold`` consecutive
+    attempts have failed.
+
+    Every ``reset_timeout`` seconds while it's open a single request is
+    let through; if it succeeds requests flow again.
+    """
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            now = time.time()
+            if now - self.opened_at < self.reset_timeout:
+                return False
+            # Let this request through to see if the host is back, & keep
+            # the rest out until it has had a chance to find out.
+            self.opened_at = now
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    boto.log.warning('Circuit breaker opened after %d '
+                                     'failed requests', self.failures)
+                self.opened_at = time.time()
+
+
+class RetryPolicy(object):
+    """
+    Decides whether a failed request is retried & how long to wait first.
+
+    Waits grow with "decorrelated jitter": each is picked at random between
+    ``base_delay`` & three times the last one, up to ``max_delay``, so
+    clients that failed together don't retry together.
+
+    Throttling errors are recognised by their code whatever the service
+    (see ``THROTTLING_ERROR_CODES``). Retries to each host are limited by
+    a shared :class:`RetryQuota`, & if ``failure_threshold`` is set a
+    :class:`CircuitBreaker` per host fails requests fast once that many
+    attempts in a row have failed.
+
+    A policy (& the state it keeps per host) is shared by every connection
+    it's given to; by default that's all of them. Subclass it to change any
+    of the decisions.
+    """
+    def __init__(self, base_delay=0.25, max_delay=60, quota_capacity=500,
+                 retry_cost=5, timeout_retry_cost=10, success_refund=1,
+                 failure_threshold=None, reset_timeout=30):
+        """
+        :type base_delay: float
+        :param base_delay: The shortest wait before a retry, in seconds.
+
+        :type max_delay: float
+        :param max_delay: The longest wait before a retry, in seconds.
+
+        :type quota_capacity: int
+        :param quota_capacity: The size of each host's retry quota, or
+            ``None`` for no quota.
+
+        :type retry_cost: int
+        :param retry_cost: The tokens a retry takes from the quota.
+
+        :type timeout_retry_cost: int
+        :param timeout_retry_cost: The tokens a retry after a timeout or
+            connection error takes from the quota.
+
+        :type success_refund: int
+        :param success_refund: The tokens a request that succeeds the first
+            time puts back. A retried request that succeeds puts back what
+            its last retry took.
+
+        :type failure_threshold: int
+        :param failure_threshold: How many failed attempts in a row open a
+            host's circuit breaker, or ``None`` for no circuit breaker.
+
+        :type reset_timeout: float
+        :param reset_timeout: How long, in seconds, an open circuit breaker
+            waits before letting a request through.
+        """
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.quota_capacity = quota_capacity
+        self.retry_cost = retry_cost
+        self.timeout_retry_cost = timeout_retry_cost
+        self.success_refund = success_refund
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._quotas = {}
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config=None):
+        """
+        Creates a policy from the ``[Boto]`` section of the config:
+        ``max_retry_delay``, ``retry_quota``, ``circuit_breaker_threshold``
+        & ``circuit_breaker_timeout``.
+        """
+        if config is None:
+            config = boto.config
+        threshold = config.getint('Boto', 'circuit_breaker_threshold', 0)
+        return cls(
+            max_delay=config.getfloat('Boto', 'max_retry_delay', 60),
+            quota_capacity=config.getint('Boto', 'retry_quota', 500) or None,
+            failure_threshold=threshold or None,
+            reset_timeout=config.getfloat('Boto', 'circuit_breaker_timeout',
+                                          30)
+        )
+
+    def get_quota(self, host):
+        """
+        Returns the :class:`RetryQuota` for a host, or ``None``.
+        """
+        if self.quota_capacity is None:
+            return None
+        quota = self._quotas.get(host)
+        if quota is None:
+            with self._lock:
+                quota = self._quotas.get(host)
+                if quota is None:
+                    quota = self._quotas[host] = RetryQuota(
+                        self.quota_capacity)
+        return quota
+
+    def get_breaker(self, host):
+        """
+        Returns the :class:`CircuitBreaker` for a host, or ``None``.
+        """
+        if self.failure_threshold is None:
+            return None
+        breaker = self._breakers.get(host)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.get(host)
+                if breaker is None:
+                    breaker = self._breakers[host] = CircuitBreaker(
+                        self.failure_threshold, self.reset_timeout)
+        return breaker
+
+    def compute_delay(self, attempt, last_delay):
+        """
+        Returns how long to wait before retry number ``attempt + 1``,
+        given the last wait (0 before the first retry).
+        """
+        upper = max(last_delay, self.base_delay) * 3
+        return min(random.uniform(self.base_delay, upper), self.max_delay)
+
+    def classify_response(self, response, body):
+        """
+        Returns the kind of failure a response is (``THROTTLED`` or
+        ``TRANSIENT``, which every server error is), or ``None`` if it
+        shouldn't be retried. ``body`` is ``None`` unless the status is in
+        ``THROTTLING_STATUS_CODES``.
+        """
+        if response.status in THROTTLING_STATUS_CODES and \
+                get_error_code(body) in THROTTLING_ERROR_CODES:
+            return THROTTLED
+        if response.status >= 500:
+            return TRANSIENT
+        return None
+
+    def classify_exception(self, exception):
+        """
+        Returns the kind of failure an exception raised while sending a
+        request is. Only exceptions the connection retries are passed in.
+        """
+        return TIMEOUT
+
+    def allow_request(self, host):
+        """
+        Returns False if requests to the host should fail fast.
+        """
+        breaker = self.get_breaker(host)
+        return breaker is None or breaker.allow()
+
+    def acquire_retry(self, host, kind):
+        """
+        Takes the cost of a retry from the host's quota. Returns the cost,
+        or ``None`` if the request shouldn't be retried, because there
+        weren't enough tokens or the host's circuit breaker is open.
+        """
+        if not self.allow_request(host):
+            return None
+        if kind == THROTTLED or kind == TRANSIENT:
+            cost = self.retry_cost
+        else:
+            cost = self.timeout_retry_cost
+        quota = self.get_quota(host)
+        if quota is not None and not quota.acquire(cost):
+            boto.log.debug('Retry quota for %s exhausted', host)
+            return None
+        return cost
+
+    def record_success(self, host, retry_cost=None):
+        """
+        Records a response from the host that won't be retried, error or
+        not. ``retry_cost`` is what the request's last retry took, if any.
+        """
+        quota = self.get_quota(host)
+        if quota is not None:
+            quota.release(retry_cost or self.success_refund)
+        breaker = self.get_breaker(host)
+        if breaker is not None:
+            breaker.record_success()
+
+    def record_failure(self, host, kind):
+        """
+        Records a failed attempt. Throttling doesn't count towards opening
+        the circuit breaker, as the host is up.
+        """
+        if kind == THROTTLED:
+            return
+        breaker = self.get_breaker(host)
+        if breaker is not None:
+            breaker.record_failure()
+
+
+_default_policy = None
+_default_policy_lock = threading.Lock()
+
+
+def get_default_policy():
+    """
+    Returns the policy used by connections that aren't given one, created
+    from the config the first time it's needed.
+    """
+    global _default_policy
+    if _default_policy is None:
+        with _default_policy_lock:
+            if _default_policy is None:
+                _default_policy = RetryPolicy.from_config()
+    return _default_policy
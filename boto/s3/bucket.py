@@ -23,16 +23,18 @@
 
 import boto
 from boto import handler
-from boto.resultset import ResultSet
+from boto.resultset import ResultSet, StreamingResultSet
 from boto.exception import BotoClientError
 from boto.s3.acl import Policy, CannedACLStrings, Grant
 from boto.s3.key import Key
+from boto.s3.keyrecord import KeyRecord
 from boto.s3.prefix import Prefix
 from boto.s3.deletemarker import DeleteMarker
 from boto.s3.multipart import MultiPartUpload
 from boto.s3.multipart import CompleteMultiPartUpload
 from boto.s3.multidelete import MultiDeleteResult
 from boto.s3.multidelete import Error
+from boto.s3.concurrent import ConcurrentDeleter, MAX_DELETE_OBJECTS
 from boto.s3.bucketlistresultset import BucketListResultSet
 from boto.s3.bucketlistresultset import VersionedBucketListResultSet
 from boto.s3.bucketlistresultset import MultiPartUploadListResultSet
@@ -90,6 +92,9 @@ class Bucket(object):
     VersionRE = '<Status>([A-Za-z]+)</Status>'
     MFADeleteRE = '<MfaDelete>([A-Za-z]+)</MfaDelete>'
 
+    # The class of the records returned by compact listings.
+    record_class = KeyRecord
+
     def __init__(self, connection=None, name=None, key_class=Key):
         self.name = name
         self.connection = connection
@@ -230,7 +235,7 @@ class Bucket(object):
                     response.status, response.reason, '')
 
     def list(self, prefix='', delimiter='', marker='', headers=None,
-             encoding_type=None):
+             encoding_type=None, stream=False, compact=False):
         """
         List key objects within a bucket.  This returns an instance of an
         BucketListResultSet that automatically handles all of the result
@@ -274,11 +279,22 @@ class Bucket(object):
             Valid options: ``url``
         :type encoding_type: string
 
+        :type stream: bool
+        :param stream: If True, each page of results is parsed while it
+            is being downloaded and keys are yielded as soon as they are
+            parsed, instead of after the whole page has been read.
+
+        :type compact: bool
+        :param compact: If True, yield a
+            :class:`boto.s3.keyrecord.KeyRecord` for each key instead of a
+            full Key, which uses much less memory for large listings.
+
         :rtype: :class:`boto.s3.bucketlistresultset.BucketListResultSet`
         :return: an instance of a BucketListResultSet that handles paging, etc
         """
         return BucketListResultSet(self, prefix, delimiter, marker, headers,
-                                   encoding_type=encoding_type)
+                                   encoding_type=encoding_type, stream=stream,
+                                   compact=compact)
 
     def list_versions(self, prefix='', delimiter='', key_marker='',
                       version_id_marker='', headers=None, encoding_type=None):
@@ -388,7 +404,7 @@ class Bucket(object):
         return '&'.join(pairs)
 
     def _get_all(self, element_map, initial_query_string='',
-                 headers=None, **params):
+                 headers=None, stream=False, **params):
         query_args = self._get_all_query_args(
             params,
             initial_query_string=initial_query_string
@@ -396,6 +412,8 @@ class Bucket(object):
         response = self.connection.make_request('GET', self.name,
                                                 headers=headers,
                                                 query_args=query_args)
+        if stream and response.status == 200:
+            return StreamingResultSet(response, element_map, self)
         body = response.read()
         boto.log.debug(body)
         if response.status == 200:
@@ -460,14 +478,31 @@ class Bucket(object):
             Valid options: ``url``
         :type encoding_type: string
 
+        :type stream: bool
+        :param stream: If True, parse the listing while it is being
+            downloaded and return a
+            :class:`boto.resultset.StreamingResultSet` that yields the
+            keys one at a time instead of building the whole list in
+            memory.
+
+        :type compact: bool
+        :param compact: If True, return a
+            :class:`boto.s3.keyrecord.KeyRecord` for each key instead of a
+            full Key.
+
         :rtype: ResultSet
         :return: The result from S3 listing the keys requested
 
         """
         self.validate_kwarg_names(params, ['maxkeys', 'max_keys', 'prefix',
                                            'marker', 'delimiter',
-                                           'encoding_type'])
-        return self._get_all([('Contents', self.key_class),
+                                           'encoding_type', 'stream',
+                                           'compact'])
+        if params.pop('compact', False):
+            key_class = self.record_class
+        else:
+            key_class = self.key_class
+        return self._get_all([('Contents', key_class),
                               ('CommonPrefixes', Prefix)],
                              '', headers, **params)
 
@@ -631,7 +666,8 @@ class Bucket(object):
                                             response_headers=response_headers,
                                             expires_in_absolute=expires_in_absolute)
 
-    def delete_keys(self, keys, quiet=False, mfa_token=None, headers=None):
+    def delete_keys(self, keys, quiet=False, mfa_token=None, headers=None,
+                    parallel=None):
         """
         Deletes a set of keys using S3's Multi-object delete API. If a
         VersionID is specified for that key then that version is removed.
@@ -655,78 +691,108 @@ class Bucket(object):
             required anytime you are deleting versioned objects from a
             bucket that has the MFADelete option on the bucket.
 
+        :type parallel: int
+        :param parallel: If set to more than one, keep this many delete
+            requests in flight at once and retry keys that failed with a
+            server side error.  See
+            :class:`boto.s3.concurrent.ConcurrentDeleter`, which can also
+            stream the results of very large deletes.
+
         :returns: An instance of MultiDeleteResult
         """
-        ikeys = iter(keys)
         result = MultiDeleteResult(self)
-        provider = self.connection.provider
-        query_args = 'delete'
-
-        def delete_keys2(hdrs):
-            hdrs = hdrs or {}
-            data = u"""<?xml version="1.0" encoding="UTF-8"?>"""
-            data += u"<Delete>"
-            if quiet:
-                data += u"<Quiet>true</Quiet>"
-            count = 0
-            while count < 1000:
-                try:
-                    key = next(ikeys)
-                except StopIteration:
-                    break
-                if isinstance(key, six.string_types):
-                    key_name = key
-                    version_id = None
-                elif isinstance(key, tuple) and len(key) == 2:
-                    key_name, version_id = key
-                elif (isinstance(key, Key) or isinstance(key, DeleteMarker)) and key.name:
-                    key_name = key.name
-                    version_id = key.version_id
+
+        if parallel and parallel > 1:
+            deleter = ConcurrentDeleter(self, num_threads=parallel)
+            for entry in deleter.delete(keys, quiet=quiet,
+                                        mfa_token=mfa_token,
+                                        headers=headers):
+                if isinstance(entry, Error):
+                    result.errors.append(entry)
                 else:
-                    if isinstance(key, Prefix):
-                        key_name = key.name
-                        code = 'PrefixSkipped'   # Don't delete Prefix
-                    else:
-                        key_name = repr(key)   # try get a string
-                        code = 'InvalidArgument'  # other unknown type
-                    message = 'Invalid. No delete action taken for this object.'
-                    error = Error(key_name, code=code, message=message)
-                    result.errors.append(error)
-                    continue
-                count += 1
-                data += u"<Object><Key>%s</Key>" % xml.sax.saxutils.escape(key_name)
-                if version_id:
-                    data += u"<VersionId>%s</VersionId>" % version_id
-                data += u"</Object>"
-            data += u"</Delete>"
-            if count <= 0:
-                return False  # no more
-            data = data.encode('utf-8')
-            fp = BytesIO(data)
-            md5 = boto.utils.compute_md5(fp)
-            hdrs['Content-MD5'] = md5[1]
-            hdrs['Content-Type'] = 'text/xml'
-            if mfa_token:
-                hdrs[provider.mfa_header] = ' '.join(mfa_token)
-            response = self.connection.make_request('POST', self.name,
-                                                    headers=hdrs,
-                                                    query_args=query_args,
-                                                    data=data)
-            body = response.read()
-            if response.status == 200:
-                h = handler.XmlHandler(result, self)
-                if not isinstance(body, bytes):
-                    body = body.encode('utf-8')
-                xml.sax.parseString(body, h)
-                return count >= 1000  # more?
-            else:
-                raise provider.storage_response_error(response.status,
-                                                      response.reason,
-                                                      body)
-        while delete_keys2(headers):
-            pass
+                    result.deleted.append(entry)
+            return result
+
+        objects = []
+        for key in keys:
+            obj = self._delete_object_entry(key)
+            if isinstance(obj, Error):
+                result.errors.append(obj)
+                continue
+            objects.append(obj)
+            if len(objects) >= MAX_DELETE_OBJECTS:
+                self._delete_objects(objects, quiet, mfa_token, headers,
+                                     result)
+                objects = []
+        if objects:
+            self._delete_objects(objects, quiet, mfa_token, headers, result)
         return result
 
+    def _delete_object_entry(self, key):
+        """
+        Returns the (key_name, version_id) pair to delete for one of the
+        keys passed to ``delete_keys``, or an Error if it can't be deleted.
+        """
+        if isinstance(key, six.string_types):
+            return (key, None)
+        elif isinstance(key, tuple) and len(key) == 2:
+            return key
+        elif (isinstance(key, Key) or isinstance(key, DeleteMarker)) and key.name:
+            return (key.name, key.version_id)
+        elif isinstance(key, KeyRecord) and key.name:
+            return (key.name, None)
+        if isinstance(key, Prefix):
+            key_name = key.name
+            code = 'PrefixSkipped'   # Don't delete Prefix
+        else:
+            key_name = repr(key)   # try get a string
+            code = 'InvalidArgument'  # other unknown type
+        message = 'Invalid. No delete action taken for this object.'
+        return Error(key_name, code=code, message=message)
+
+    def _delete_objects(self, objects, quiet=False, mfa_token=None,
+                        headers=None, result=None):
+        """
+        Sends a single Multi-object delete request for up to 1000
+        (key_name, version_id) pairs & adds the outcome to ``result``.
+        """
+        if result is None:
+            result = MultiDeleteResult(self)
+        provider = self.connection.provider
+        hdrs = dict(headers or {})
+        parts = [u'<?xml version="1.0" encoding="UTF-8"?><Delete>']
+        if quiet:
+            parts.append(u"<Quiet>true</Quiet>")
+        escape = xml.sax.saxutils.escape
+        for key_name, version_id in objects:
+            parts.append(u"<Object><Key>%s</Key>" % escape(key_name))
+            if version_id:
+                parts.append(u"<VersionId>%s</VersionId>" %
+                             escape(version_id))
+            parts.append(u"</Object>")
+        parts.append(u"</Delete>")
+        data = u''.join(parts).encode('utf-8')
+        md5 = boto.utils.compute_md5(BytesIO(data))
+        hdrs['Content-MD5'] = md5[1]
+        hdrs['Content-Type'] = 'text/xml'
+        if mfa_token:
+            hdrs[provider.mfa_header] = ' '.join(mfa_token)
+        response = self.connection.make_request('POST', self.name,
+                                                headers=hdrs,
+                                                query_args='delete',
+                                                data=data)
+        body = response.read()
+        if response.status == 200:
+            h = handler.XmlHandler(result, self)
+            if not isinstance(body, bytes):
+                body = body.encode('utf-8')
+            xml.sax.parseString(body, h)
+            return result
+        else:
+            raise provider.storage_response_error(response.status,
+                                                  response.reason,
+                                                  body)
+
     def delete_key(self, key_name, headers=None, version_id=None,
                    mfa_token=None):
         """
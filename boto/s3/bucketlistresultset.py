@@ -22,7 +22,7 @@
 from boto.compat import urllib, six
 
 def bucket_lister(bucket, prefix='', delimiter='', marker='', headers=None,
-                  encoding_type=None):
+                  encoding_type=None, stream=False, compact=False):
     """
     A generator function for listing keys in a bucket.
     """
@@ -31,7 +31,8 @@ def bucket_lister(bucket, prefix='', delimiter='', marker='', headers=None,
     while more_results:
         rs = bucket.get_all_keys(prefix=prefix, marker=marker,
                                  delimiter=delimiter, headers=headers,
-                                 encoding_type=encoding_type)
+                                 encoding_type=encoding_type, stream=stream,
+                                 compact=compact)
         for k in rs:
             yield k
         if k:
@@ -52,19 +53,23 @@ class BucketListResultSet(object):
     """
 
     def __init__(self, bucket=None, prefix='', delimiter='', marker='',
-                 headers=None, encoding_type=None):
+                 headers=None, encoding_type=None, stream=False,
+                 compact=False):
         self.bucket = bucket
         self.prefix = prefix
         self.delimiter = delimiter
         self.marker = marker
         self.headers = headers
         self.encoding_type = encoding_type
+        self.stream = stream
+        self.compact = compact
 
     def __iter__(self):
         return bucket_lister(self.bucket, prefix=self.prefix,
                              delimiter=self.delimiter, marker=self.marker,
                              headers=self.headers,
-                             encoding_type=self.encoding_type)
+                             encoding_type=self.encoding_type,
+                             stream=self.stream, compact=self.compact)
 
 def versioned_bucket_lister(bucket, prefix='', delimiter='',
                             key_marker='', version_id_marker='', headers=None,
@@ -0,0 +1,1032 @@
+# Copyright (c) 2015 Amazon.com, Inc. or its affiliates.  All Rights Reserved
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish, dis-
+# tribute, sublicense, and/or sell copies of the Software, and to permit
+# persons to whom the Software is furnished to do so, subject to the fol-
+# lowing conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABIL-
+# ITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT
+# SHALL THE AUTHOR BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+import errno
+import logging
+import math
+import os
+import random
+import re
+import threading
+import time
+from hashlib import md5
+
+from boto.compat import Queue, urllib
+from boto.s3.multidelete import Error
+from boto.s3.prefix import Prefix
+from boto.vendored.six.moves.queue import Empty, Full
+from boto.utils import get_utf8_value
+
+
+_END_SENTINEL = object()
+log = logging.getLogger('boto.s3.concurrent')
+
+# S3 only allows parts this small for the last part of an upload.
+MINIMUM_PART_SIZE = 5 * 1024 * 1024
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+MAXIMUM_NUMBER_OF_PARTS = 10000
+# Tracker files written by parallel downloads start with this prefix so
+# that a sequential ResumableDownloadHandler never mistakes them for its
+# own (it would otherwise treat a preallocated file as fully downloaded).
+TRACKER_PREFIX = 'parallel:'
+_MD5_ETAG_RE = re.compile(r'^[0-9a-fA-F]{32}$')
+DOWNLOAD_BUFFER_SIZE = 64 * 1024
+# The most keys a single Multi-object delete request may name.
+MAX_DELETE_OBJECTS = 1000
+# Per-key delete errors that are worth resending.
+RETRYABLE_DELETE_ERRORS = ('InternalError', 'ServiceUnavailable', 'SlowDown')
+
+
+def minimum_part_size(size_in_bytes, default_part_size=DEFAULT_PART_SIZE):
+    """Returns the smallest part size that splits ``size_in_bytes`` into
+    no more than the maximum number of parts S3 allows.
+    """
+    part_size = max(default_part_size, MINIMUM_PART_SIZE)
+    if size_in_bytes > part_size * MAXIMUM_NUMBER_OF_PARTS:
+        part_size = int(math.ceil(size_in_bytes /
+                                  float(MAXIMUM_NUMBER_OF_PARTS)))
+    return part_size
+
+
+def completion_xml(etags):
+    """Returns the body of a CompleteMultipartUpload request for parts
+    with the given ETags, in part number order.
+    """
+    # The etags are known from the part uploads, so there's no need
+    # to list the parts back as MultiPartUpload.to_xml does.
+    parts = ['<CompleteMultipartUpload>']
+    for i, etag in enumerate(etags):
+        parts.append('<Part><PartNumber>%d</PartNumber>'
+                     '<ETag>%s</ETag></Part>' % (i + 1, etag))
+    parts.append('</CompleteMultipartUpload>')
+    return get_utf8_value(''.join(parts))
+
+
+class ConcurrentTransferer(object):
+    def __init__(self, part_size=DEFAULT_PART_SIZE, num_threads=10):
+        self._part_size = part_size
+        self._num_threads = num_threads
+        self._threads = []
+
+    def _calculate_required_part_size(self, total_size):
+        part_size = minimum_part_size(total_size, self._part_size)
+        if part_size != self._part_size:
+            log.debug("The part size specified (%s) can't be used for an "
+                      "object of %s bytes.  Using a part size of: %s",
+                      self._part_size, total_size, part_size)
+        total_parts = int(math.ceil(total_size / float(part_size)))
+        return total_parts, part_size
+
+    def _start_threads(self, thread_factory):
+        log.debug("Starting threads.")
+        self._threads = []
+        for _ in range(self._num_threads):
+            thread = thread_factory()
+            thread.start()
+            self._threads.append(thread)
+
+    def _shutdown_threads(self):
+        log.debug("Shutting down threads.")
+        for thread in self._threads:
+            thread.should_continue = False
+        for thread in self._threads:
+            thread.join()
+        log.debug("Threads have exited.")
+
+    def _add_work_items_to_queue(self, total_parts, worker_queue, part_size):
+        log.debug("Adding work items to queue.")
+        for i in range(total_parts):
+            worker_queue.put((i, part_size))
+        for i in range(self._num_threads):
+            worker_queue.put(_END_SENTINEL)
+
+
+class ConcurrentUploader(ConcurrentTransferer):
+    """Concurrently upload a file to S3.
+
+    This class uses a thread pool to upload the parts of a file through
+    the multipart upload API.  Each thread reads its parts straight
+    from its own handle on the file, computes the part's MD5 and uploads
+    it, retrying failed parts individually.  All threads share the
+    bucket's connection and therefore its connection pool.
+
+    The upload is either completed with every part in place, or
+    cancelled if any part could not be uploaded.
+
+    """
+    def __init__(self, bucket, part_size=DEFAULT_PART_SIZE, num_threads=10,
+                 num_retries=5):
+        """
+        :type bucket: :class:`boto.s3.bucket.Bucket`
+        :param bucket: The bucket to upload to.
+
+        :type part_size: int
+        :param part_size: The size, in bytes, of the parts to upload.  It
+            is raised as needed to stay within the S3 limits on part size
+            and number of parts.
+
+        :type num_threads: int
+        :param num_threads: The number of threads to spawn for the thread
+            pool, which controls how many parts are uploaded concurrently.
+
+        :type num_retries: int
+        :param num_retries: The number of times a failed part is retried
+            before the whole upload is cancelled.
+
+        """
+        super(ConcurrentUploader, self).__init__(part_size, num_threads)
+        self._bucket = bucket
+        self._num_retries = num_retries
+
+    def upload(self, key_name, filename, headers=None, cb=None,
+               reduced_redundancy=False, metadata=None, encrypt_key=False,
+               policy=None):
+        """Concurrently upload a file.
+
+        :type key_name: str
+        :param key_name: The name of the key to create.
+
+        :type filename: str
+        :param filename: The name of the file to upload.
+
+        :type cb: function
+        :param cb: A callback called with the number of bytes uploaded so
+            far and the total size each time a part finishes uploading.
+
+        The ``headers``, ``reduced_redundancy``, ``metadata``,
+        ``encrypt_key`` and ``policy`` parameters are passed on to
+        :meth:`boto.s3.bucket.Bucket.initiate_multipart_upload`.
+
+        :rtype: :class:`boto.s3.multipart.CompleteMultiPartUpload`
+        :return: The completed upload.
+
+        """
+        total_size = os.stat(filename).st_size
+        total_parts, part_size = self._calculate_required_part_size(
+            total_size)
+        mp = self._bucket.initiate_multipart_upload(
+            key_name, headers=headers, reduced_redundancy=reduced_redundancy,
+            metadata=metadata, encrypt_key=encrypt_key, policy=policy)
+        worker_queue = Queue()
+        result_queue = Queue()
+        self._add_work_items_to_queue(total_parts, worker_queue, part_size)
+        self._start_threads(
+            lambda: UploadWorkerThread(mp, filename, total_size,
+                                       worker_queue, result_queue,
+                                       num_retries=self._num_retries))
+        try:
+            etags = self._wait_for_upload_threads(result_queue, total_parts,
+                                                  total_size, cb)
+            log.debug("Completing upload.")
+            return self._bucket.complete_multipart_upload(
+                key_name, mp.id, self._completion_xml(etags))
+        except:
+            log.debug("An error occurred while uploading %s, cancelling "
+                      "multipart upload.", filename)
+            mp.cancel_upload()
+            raise
+
+    def _wait_for_upload_threads(self, result_queue, total_parts,
+                                 total_size, cb):
+        etags = [None] * total_parts
+        bytes_uploaded = 0
+        try:
+            for _ in range(total_parts):
+                result = result_queue.get()
+                if isinstance(result, Exception):
+                    log.debug("An error was found in the result queue, "
+                              "terminating threads: %s", result)
+                    raise result
+                part_number, size, etag = result
+                etags[part_number] = etag
+                bytes_uploaded += size
+                if cb is not None:
+                    cb(bytes_uploaded, total_size)
+        finally:
+            self._shutdown_threads()
+        return etags
+
+    def _completion_xml(self, etags):
+        return completion_xml(etags)
+
+
+class ConcurrentDownloader(ConcurrentTransferer):
+    """Concurrently download a key from S3 or GS to a local file.
+
+    The object is split into ranges of ``part_size`` bytes, and a thread
+    pool issues one Range GET per part.  Each thread writes the bytes it
+    receives straight to their offset in a preallocated file, so nothing
+    is buffered beyond a single read.  Every request carries an
+    ``If-Match`` header so that an object overwritten mid-download fails
+    instead of producing a mix of two versions.
+
+    If a tracker file name is given, the number of each completed part is
+    recorded in it, and a later download of the same object (same ETag
+    and part size) only fetches the parts that are missing.
+
+    """
+    def __init__(self, key, part_size=DEFAULT_PART_SIZE, num_threads=10,
+                 num_retries=5):
+        """
+        :type key: :class:`boto.s3.key.Key`
+        :param key: The key to download.  Its ``size`` and ``etag`` must
+            be known, e.g. from a bucket listing or ``Bucket.get_key``.
+
+        :type part_size: int
+        :param part_size: The size, in bytes, of each ranged request.
+
+        :type num_threads: int
+        :param num_threads: The number of threads to spawn for the thread
+            pool, which controls how many ranges are fetched concurrently.
+
+        :type num_retries: int
+        :param num_retries: The number of times a failed range is retried
+            before the download is aborted.
+
+        """
+        super(ConcurrentDownloader, self).__init__(part_size, num_threads)
+        self._key = key
+        self._num_retries = num_retries
+
+    def download(self, filename, headers=None, cb=None, version_id=None,
+                 response_headers=None, tracker_file_name=None,
+                 verify_md5=True):
+        """Concurrently download the key to ``filename``.
+
+        :type filename: str
+        :param filename: The name of the file to write to.
+
+        :type cb: function
+        :param cb: A callback called with the number of bytes downloaded
+            so far and the total size each time a part finishes.
+
+        :type tracker_file_name: str
+        :param tracker_file_name: An optional file used to record the
+            completed parts so that an interrupted download can be
+            resumed.  It is removed once the download succeeds.
+
+        :type verify_md5: bool
+        :param verify_md5: If True and the key's ETag is a plain MD5 (i.e.
+            not a multipart or KMS encrypted object), the MD5 of the
+            downloaded file is checked against it.
+
+        The ``headers``, ``version_id`` and ``response_headers``
+        parameters have the same meaning as for
+        :meth:`boto.s3.key.Key.get_contents_to_filename`.
+
+        """
+        key = self._key
+        provider = key.bucket.connection.provider
+        total_size = key.size
+        etag = key.etag.strip('"\'')
+        total_parts = int(math.ceil(total_size / float(self._part_size)))
+        completed = self._load_tracker(tracker_file_name, etag,
+                                       self._part_size)
+        if completed and not (os.path.exists(filename) and
+                              os.path.getsize(filename) == total_size):
+            completed = set()
+        self._prepare_file(filename, total_size, resume=bool(completed))
+        if tracker_file_name and not completed:
+            self._write_tracker(tracker_file_name, etag, self._part_size)
+
+        headers = dict(headers or {})
+        headers['If-Match'] = key.etag
+        query_args = self._query_args(version_id, response_headers)
+        remaining = [i for i in range(total_parts) if i not in completed]
+        bytes_done = sum(self._part_length(i, total_size)
+                         for i in completed)
+        worker_queue = Queue()
+        result_queue = Queue()
+        for part_number in remaining:
+            worker_queue.put((part_number, self._part_size))
+        for _ in range(self._num_threads):
+            worker_queue.put(_END_SENTINEL)
+        self._start_threads(
+            lambda: DownloadWorkerThread(key, filename, total_size, headers,
+                                         query_args, worker_queue,
+                                         result_queue,
+                                         num_retries=self._num_retries))
+        encrypted = self._wait_for_download_threads(
+            result_queue, len(remaining), bytes_done, total_size,
+            tracker_file_name, cb)
+        if encrypted is None:
+            encrypted = key.encrypted
+        if verify_md5 and self._etag_is_md5(etag, encrypted, headers):
+            self._verify_md5(filename, etag, provider, tracker_file_name)
+        if tracker_file_name and os.path.exists(tracker_file_name):
+            os.unlink(tracker_file_name)
+
+    def _wait_for_download_threads(self, result_queue, total_parts,
+                                   bytes_done, total_size,
+                                   tracker_file_name, cb):
+        encrypted = None
+        tracker = None
+        if tracker_file_name:
+            tracker = open(tracker_file_name, 'a')
+        try:
+            for _ in range(total_parts):
+                result = result_queue.get()
+                if isinstance(result, Exception):
+                    log.debug("An error was found in the result queue, "
+                              "terminating threads: %s", result)
+                    raise result
+                part_number, size, part_encrypted = result
+                encrypted = encrypted or part_encrypted
+                if tracker is not None:
+                    tracker.write('%d\n' % part_number)
+                    tracker.flush()
+                bytes_done += size
+                if cb is not None:
+                    cb(bytes_done, total_size)
+        finally:
+            self._shutdown_threads()
+            if tracker is not None:
+                tracker.close()
+        return encrypted
+
+    def _part_length(self, part_number, total_size):
+        start = part_number * self._part_size
+        return min(self._part_size, total_size - start)
+
+    def _query_args(self, version_id, response_headers):
+        query_args = []
+        if version_id is None:
+            version_id = self._key.version_id
+        if version_id:
+            query_args.append('versionId=%s' % version_id)
+        generation = getattr(self._key, 'generation', None)
+        if generation:
+            query_args.append('generation=%s' % generation)
+        for name in response_headers or {}:
+            query_args.append('%s=%s' % (
+                name, urllib.parse.quote(response_headers[name])))
+        return '&'.join(query_args)
+
+    def _prepare_file(self, filename, total_size, resume=False):
+        flags = os.O_RDWR | os.O_CREAT | getattr(os, 'O_BINARY', 0)
+        fd = os.open(filename, flags, 0o666)
+        try:
+            if not resume:
+                os.ftruncate(fd, 0)
+            # Reserve the space up front where the platform allows it, so
+            # out-of-order writes don't fragment the file or run out of
+            # space halfway through; otherwise just extend it.
+            try:
+                os.posix_fallocate(fd, 0, total_size)
+            except (AttributeError, OSError):
+                os.ftruncate(fd, total_size)
+        finally:
+            os.close(fd)
+
+    def _load_tracker(self, tracker_file_name, etag, part_size):
+        if not tracker_file_name:
+            return set()
+        try:
+            with open(tracker_file_name, 'r') as f:
+                lines = f.read().splitlines()
+        except IOError as e:
+            if e.errno != errno.ENOENT:
+                log.warning("Couldn't read tracker file %s (%s), restarting "
+                            "download from scratch.", tracker_file_name, e)
+            return set()
+        if lines[:2] != [TRACKER_PREFIX + etag, str(part_size)]:
+            log.debug("Tracker file %s is for a different object or part "
+                      "size, restarting download.", tracker_file_name)
+            return set()
+        try:
+            return set(int(line) for line in lines[2:] if line)
+        except ValueError:
+            return set()
+
+    def _write_tracker(self, tracker_file_name, etag, part_size):
+        with open(tracker_file_name, 'w') as f:
+            f.write('%s%s\n%d\n' % (TRACKER_PREFIX, etag, part_size))
+
+    def _etag_is_md5(self, etag, encrypted, headers):
+        # Multipart uploads, KMS and customer-provided key encryption all
+        # produce ETags that aren't the MD5 of the object.
+        if not _MD5_ETAG_RE.match(etag):
+            return False
+        if encrypted == 'aws:kms':
+            return False
+        for name in headers:
+            if name.lower().startswith(
+                    'x-amz-server-side-encryption-customer'):
+                return False
+        return True
+
+    def _verify_md5(self, filename, etag, provider, tracker_file_name):
+        digester = md5()
+        with open(filename, 'rb') as f:
+            while True:
+                chunk = f.read(DOWNLOAD_BUFFER_SIZE)
+                if not chunk:
+                    break
+                digester.update(chunk)
+        if digester.hexdigest() != etag.lower():
+            if tracker_file_name and os.path.exists(tracker_file_name):
+                os.unlink(tracker_file_name)
+            raise provider.storage_data_error(
+                'MD5 of downloaded file %s (%s) does not match ETag %s' %
+                (filename, digester.hexdigest(), etag))
+        self._key.local_hashes['md5'] = digester.digest()
+
+
+class ConcurrentDeleter(ConcurrentTransferer):
+    """Concurrently delete keys from a bucket.
+
+    Keys are taken lazily from any iterable (such as ``bucket.list()``),
+    so deleting a large prefix never holds more than a few batches in
+    memory.  They are grouped into Multi-object delete requests of up to
+    1000 keys, and a thread pool keeps several of those requests in
+    flight while the next keys are being read.  Requests that fail are
+    retried as a whole; keys that fail on their own with a server side
+    error (such as ``SlowDown``) are retried in a later request, without
+    resending the keys that were deleted.
+
+    """
+    def __init__(self, bucket, num_threads=10, num_retries=5,
+                 batch_size=MAX_DELETE_OBJECTS):
+        """
+        :type bucket: :class:`boto.s3.bucket.Bucket`
+        :param bucket: The bucket to delete keys from.
+
+        :type num_threads: int
+        :param num_threads: The number of threads to spawn for the thread
+            pool, which controls how many delete requests are in flight.
+
+        :type num_retries: int
+        :param num_retries: The number of times a failed request, or a key
+            that failed with a server side error, is retried.
+
+        :type batch_size: int
+        :param batch_size: The number of keys (up to 1000) per request.
+
+        """
+        if not 0 < batch_size <= MAX_DELETE_OBJECTS:
+            raise ValueError('batch_size must be between 1 and %s.' %
+                             MAX_DELETE_OBJECTS)
+        super(ConcurrentDeleter, self).__init__(num_threads=num_threads)
+        self._bucket = bucket
+        self._num_retries = num_retries
+        self._batch_size = batch_size
+
+    def delete(self, keys, quiet=True, mfa_token=None, headers=None):
+        """Concurrently delete ``keys``, yielding the outcome for each.
+
+        :type keys: iterable
+        :param keys: Key names, (key_name, version_id) pairs, or Key
+            instances, as for :meth:`boto.s3.bucket.Bucket.delete_keys`.
+
+        :type quiet: bool
+        :param quiet: If True (the default), only keys that couldn't be
+            deleted are yielded, which keeps the responses small.
+
+        The ``mfa_token`` and ``headers`` parameters have the same meaning
+        as for :meth:`boto.s3.bucket.Bucket.delete_keys`.
+
+        :rtype: generator
+        :return: :class:`boto.s3.multidelete.Deleted` and
+            :class:`boto.s3.multidelete.Error` objects, in the order the
+            requests complete.  Raises the error of any request that still
+            fails after ``num_retries`` attempts.
+
+        """
+        bucket = self._bucket
+        ikeys = iter(keys)
+        exhausted = False
+        # Keys to resend & how many times each has been resent.
+        retries = []
+        attempts = {}
+        # Two requests per thread keep every thread busy while the next
+        # batch is read from ``keys``.
+        max_in_flight = self._num_threads * 2
+        in_flight = 0
+        batch_number = 0
+        worker_queue = Queue()
+        result_queue = Queue()
+        self._start_threads(
+            lambda: DeleteWorkerThread(bucket, quiet, mfa_token, headers,
+                                       worker_queue, result_queue,
+                                       num_retries=self._num_retries))
+        try:
+            while True:
+                skipped = []
+                while in_flight < max_in_flight and \
+                        (retries or not exhausted):
+                    objects = retries[:self._batch_size]
+                    del retries[:self._batch_size]
+                    attempt = max([attempts[obj] for obj in objects] or [0])
+                    while len(objects) < self._batch_size and not exhausted:
+                        try:
+                            key = next(ikeys)
+                        except StopIteration:
+                            exhausted = True
+                            break
+                        obj = bucket._delete_object_entry(key)
+                        if isinstance(obj, Error):
+                            skipped.append(obj)
+                        else:
+                            objects.append(obj)
+                    if objects:
+                        worker_queue.put((batch_number, objects, attempt))
+                        batch_number += 1
+                        in_flight += 1
+
+                for error in skipped:
+                    yield error
+
+                if not in_flight:
+                    return
+
+                result = result_queue.get()
+                in_flight -= 1
+                if isinstance(result, Exception):
+                    log.debug("An error was found in the result queue, "
+                              "terminating threads: %s", result)
+                    raise result
+
+                for deleted in result.deleted:
+                    attempts.pop((deleted.key, deleted.version_id), None)
+                    yield deleted
+                for error in result.errors:
+                    obj = (error.key, error.version_id)
+                    attempt = attempts.get(obj, 0)
+                    if error.code in RETRYABLE_DELETE_ERRORS and \
+                            attempt < self._num_retries:
+                        attempts[obj] = attempt + 1
+                        retries.append(obj)
+                        continue
+                    attempts.pop(obj, None)
+                    yield error
+        finally:
+            for _ in self._threads:
+                worker_queue.put(_END_SENTINEL)
+            self._shutdown_threads()
+
+
+class ConcurrentLister(ConcurrentTransferer):
+    """Concurrently list the keys in a bucket.
+
+    The keyspace is split into partitions that are listed at the same
+    time by a thread pool, each paging through its own range with
+    markers.  By default the partitions are the prefixes found by
+    listing ``prefix`` with a delimiter, so a bucket laid out in
+    "directories" needs no configuration.  That listing runs alongside
+    the partitions: each prefix is listed as soon as it's found, and the
+    keys that weren't rolled up are yielded as their pages arrive.
+
+    A flat keyspace has no prefixes to split at, so it's listed one page
+    after another, as sequentially as ``Bucket.list``.  Split it at
+    caller-supplied key names (``split_points``) instead.
+
+    Keys are yielded as :class:`boto.s3.keyrecord.KeyRecord` objects,
+    which hold only the name, size, ETag and last modified time.  At most
+    ``max_buffered_pages`` pages are held per partition, so a slow
+    consumer holds the listing back rather than filling up memory.
+
+    """
+    def __init__(self, bucket, num_threads=10, num_retries=5,
+                 max_buffered_pages=4):
+        """
+        :type bucket: :class:`boto.s3.bucket.Bucket`
+        :param bucket: The bucket to list.
+
+        :type num_threads: int
+        :param num_threads: The number of threads to spawn for the thread
+            pool, which controls how many partitions are listed at once.
+
+        :type num_retries: int
+        :param num_retries: The number of times a failed page request is
+            retried before the listing is aborted.
+
+        :type max_buffered_pages: int
+        :param max_buffered_pages: The number of pages of up to 1000 keys
+            a partition can list ahead of the consumer.
+
+        """
+        super(ConcurrentLister, self).__init__(num_threads=num_threads)
+        self._bucket = bucket
+        self._num_retries = num_retries
+        self._max_buffered_pages = max_buffered_pages
+
+    def list(self, prefix='', delimiter='/', split_points=None,
+             ordered=True, headers=None):
+        """Concurrently list the keys starting with ``prefix``.
+
+        :type delimiter: str
+        :param delimiter: The delimiter used to discover the partitions.
+            Every prefix rolled up by a listing with this delimiter is
+            listed as a partition of its own.
+
+        :type split_points: list
+        :param split_points: Key names to split the keyspace at instead.
+            Each split point is the last key of a partition, and the last
+            partition runs to the end of the keyspace.
+
+        :type ordered: bool
+        :param ordered: If True (the default), keys are yielded in the
+            same order as a sequential listing.  Otherwise they're yielded
+            in whichever order the pages arrive, which keeps every thread
+            busy even when one partition is much larger than the rest.
+
+        :rtype: generator
+        :return: A :class:`boto.s3.keyrecord.KeyRecord` for each key.
+
+        """
+        worker_queue = Queue()
+        results = None
+        if not ordered:
+            results = Queue(self._max_buffered_pages * self._num_threads)
+        self._start_threads(
+            lambda: ListWorkerThread(self._bucket, headers, worker_queue,
+                                     num_retries=self._num_retries))
+        try:
+            discovery = None
+            if split_points:
+                bounds = [None] + sorted(split_points) + [None]
+                # Each segment is (record, result queue of a partition).
+                segments = []
+                for i in range(len(bounds) - 1):
+                    result_queue = results
+                    if ordered:
+                        result_queue = Queue(self._max_buffered_pages)
+                    worker_queue.put((i, prefix, bounds[i] or '',
+                                      bounds[i + 1], result_queue))
+                    segments.append((None, result_queue))
+                for _ in range(self._num_threads):
+                    worker_queue.put(_END_SENTINEL)
+                num_partitions = len(segments)
+            else:
+                discovered = results
+                if ordered:
+                    discovered = Queue(self._max_buffered_pages)
+                discovery = DiscoverWorkerThread(
+                    self._bucket, headers, worker_queue, discovered, prefix,
+                    delimiter, ordered, self._num_threads,
+                    self._max_buffered_pages, num_retries=self._num_retries)
+                discovery.start()
+                self._threads.append(discovery)
+                segments = (segment
+                            for page in self._pages(discovered, 1)
+                            for segment in page)
+                num_partitions = None
+
+            if ordered:
+                for record, result_queue in segments:
+                    if record is not None:
+                        yield record
+                        continue
+                    for page in self._pages(result_queue, 1):
+                        for record in page:
+                            yield record
+            else:
+                for page in self._pages(results, num_partitions, discovery):
+                    for record in page:
+                        yield record
+        finally:
+            self._shutdown_threads()
+
+    def _pages(self, result_queue, partitions, discovery=None):
+        """
+        Yields pages from ``result_queue`` until ``partitions`` partitions
+        have finished.  With ``discovery`` (and ``partitions`` None), the
+        number of partitions is only known once it has finished.
+        """
+        finished = 0
+        while partitions is None or finished < partitions:
+            index, page = result_queue.get()
+            if page is _END_SENTINEL:
+                if index is None and discovery is not None:
+                    partitions = discovery.num_partitions
+                else:
+                    finished += 1
+                continue
+            if isinstance(page, Exception):
+                log.debug("An error was found in the result queue, "
+                          "terminating threads: %s", page)
+                raise page
+            yield page
+
+
+class TransferThread(threading.Thread):
+    def __init__(self, worker_queue, result_queue, num_retries=5):
+        super(TransferThread, self).__init__()
+        self.daemon = True
+        self._worker_queue = worker_queue
+        self._result_queue = result_queue
+        self._num_retries = num_retries
+        # This value can be set externally by other objects
+        # to indicate that the thread should be shut down.
+        self.should_continue = True
+
+    def run(self):
+        try:
+            while self.should_continue:
+                try:
+                    work = self._worker_queue.get(timeout=1)
+                except Empty:
+                    continue
+                if work is _END_SENTINEL:
+                    return
+                self._result_queue.put(self._process_chunk(work))
+        finally:
+            self._cleanup()
+
+    def _process_chunk(self, work):
+        result = None
+        for i in range(self._num_retries + 1):
+            if not self.should_continue:
+                break
+            try:
+                return self._transfer_chunk(work)
+            except Exception as e:
+                log.error("Exception caught transferring part number %s, "
+                          "attempt: (%s / %s), exception: %s, msg: %s",
+                          work[0], i + 1, self._num_retries + 1,
+                          e.__class__, e)
+                result = e
+                if i < self._num_retries:
+                    time.sleep(random.random() * (2 ** i))
+        return result
+
+    def _transfer_chunk(self, work):
+        pass
+
+    def _cleanup(self):
+        pass
+
+
+class UploadWorkerThread(TransferThread):
+    def __init__(self, mp, filename, total_size, worker_queue, result_queue,
+                 num_retries=5):
+        super(UploadWorkerThread, self).__init__(worker_queue, result_queue,
+                                                 num_retries)
+        self._mp = mp
+        self._filename = filename
+        self._total_size = total_size
+        self._fileobj = open(filename, 'rb')
+
+    def _transfer_chunk(self, work):
+        part_number, part_size = work
+        start_byte = part_number * part_size
+        size = min(part_size, self._total_size - start_byte)
+        self._fileobj.seek(start_byte)
+        log.debug("Uploading part %s of size %s", part_number, size)
+        # upload_part_from_file reads (and MD5s) only ``size`` bytes from
+        # the current position, so the part is never copied in memory.
+        key = self._mp.upload_part_from_file(self._fileobj, part_number + 1,
+                                             size=size)
+        return (part_number, size, key.etag)
+
+    def _cleanup(self):
+        self._fileobj.close()
+
+
+class DownloadWorkerThread(TransferThread):
+    def __init__(self, key, filename, total_size, headers, query_args,
+                 worker_queue, result_queue, num_retries=5):
+        super(DownloadWorkerThread, self).__init__(worker_queue,
+                                                   result_queue, num_retries)
+        self._key = key
+        self._total_size = total_size
+        self._headers = headers
+        self._query_args = query_args or None
+        # Each thread has its own descriptor, so seeking (where pwrite
+        # isn't available) doesn't race with the other threads.
+        self._fd = os.open(filename, os.O_WRONLY | getattr(os, 'O_BINARY', 0))
+
+    def _transfer_chunk(self, work):
+        part_number, part_size = work
+        start = part_number * part_size
+        end = min(start + part_size, self._total_size) - 1
+        headers = self._headers.copy()
+        headers['Range'] = 'bytes=%d-%d' % (start, end)
+        bucket = self._key.bucket
+        provider = bucket.connection.provider
+        log.debug("Downloading part %s, bytes %s-%s", part_number, start, end)
+        response = bucket.connection.make_request(
+            'GET', bucket.name, self._key.name, headers,
+            query_args=self._query_args)
+        try:
+            if response.status not in (200, 206):
+                raise provider.storage_response_error(
+                    response.status, response.reason, response.read())
+            offset = start
+            if response.status == 200:
+                # The server ignored the Range header and sent it all, so
+                # skip to the start of this part.
+                self._skip(response, start)
+            while offset <= end:
+                chunk = response.read(min(DOWNLOAD_BUFFER_SIZE,
+                                          end + 1 - offset))
+                if not chunk:
+                    break
+                self._write(chunk, offset)
+                offset += len(chunk)
+        finally:
+            response.close()
+        if offset != end + 1:
+            raise provider.storage_data_error(
+                'Short read downloading bytes %d-%d of %s: got %d bytes' %
+                (start, end, self._key.name, offset - start))
+        encrypted = None
+        if provider.server_side_encryption_header:
+            encrypted = response.getheader(
+                provider.server_side_encryption_header, None)
+        return (part_number, end + 1 - start, encrypted)
+
+    def _skip(self, response, nbytes):
+        while nbytes > 0:
+            chunk = response.read(min(DOWNLOAD_BUFFER_SIZE, nbytes))
+            if not chunk:
+                break
+            nbytes -= len(chunk)
+
+    def _write(self, data, offset):
+        while data:
+            if hasattr(os, 'pwrite'):
+                written = os.pwrite(self._fd, data, offset)
+            else:
+                os.lseek(self._fd, offset, os.SEEK_SET)
+                written = os.write(self._fd, data)
+            # Short writes are rare, so slicing here is cheap.
+            data = data[written:]
+            offset += written
+
+    def _cleanup(self):
+        os.close(self._fd)
+
+
+class DeleteWorkerThread(TransferThread):
+    def __init__(self, bucket, quiet, mfa_token, headers, worker_queue,
+                 result_queue, num_retries=5):
+        super(DeleteWorkerThread, self).__init__(worker_queue, result_queue,
+                                                 num_retries)
+        self._bucket = bucket
+        self._quiet = quiet
+        self._mfa_token = mfa_token
+        self._headers = headers
+
+    def _transfer_chunk(self, work):
+        batch_number, objects, attempt = work
+        if attempt:
+            # These keys failed with a server side error such as SlowDown,
+            # so back off before sending them again.
+            time.sleep(random.random() * (2 ** (attempt - 1)))
+        log.debug("Deleting batch %s of %s keys", batch_number, len(objects))
+        return self._bucket._delete_objects(objects, quiet=self._quiet,
+                                            mfa_token=self._mfa_token,
+                                            headers=self._headers)
+
+
+class ListWorkerThread(threading.Thread):
+    def __init__(self, bucket, headers, worker_queue, num_retries=5):
+        super(ListWorkerThread, self).__init__()
+        self.daemon = True
+        self._bucket = bucket
+        self._headers = headers
+        self._worker_queue = worker_queue
+        self._num_retries = num_retries
+        # This value can be set externally by other objects
+        # to indicate that the thread should be shut down.
+        self.should_continue = True
+
+    def run(self):
+        while self.should_continue:
+            try:
+                work = self._worker_queue.get(timeout=1)
+            except Empty:
+                continue
+            if work is _END_SENTINEL:
+                return
+            index, result_queue = work[0], work[-1]
+            try:
+                self._list_partition(*work)
+            except Exception as e:
+                self._put(result_queue, (index, e))
+            self._put(result_queue, (index, _END_SENTINEL))
+
+    def _list_partition(self, index, prefix, marker, end, result_queue):
+        while self.should_continue:
+            rs = self._get_page(index, prefix, marker)
+            page = [record for record in rs
+                    if end is None or record.name <= end]
+            if page:
+                self._put(result_queue, (index, page))
+            if len(page) < len(rs) or not rs.is_truncated or not len(rs):
+                return
+            marker = rs[-1].name
+
+    def _get_page(self, index, prefix, marker, delimiter=None):
+        element_map = [('Contents', self._bucket.record_class)]
+        if delimiter:
+            element_map.append(('CommonPrefixes', Prefix))
+        for i in range(self._num_retries + 1):
+            try:
+                return self._bucket._get_all(
+                    element_map, '', self._headers, prefix=prefix,
+                    delimiter=delimiter, marker=marker)
+            except Exception as e:
+                log.error("Exception caught listing partition %s of %r, "
+                          "attempt: (%s / %s), exception: %s, msg: %s",
+                          index, prefix, i + 1, self._num_retries + 1,
+                          e.__class__, e)
+                if i >= self._num_retries or not self.should_continue:
+                    raise
+                time.sleep(random.random() * (2 ** i))
+
+    def _put(self, result_queue, item):
+        # The queue is bounded, so give up if the listing is abandoned
+        # while waiting for the consumer to make room.
+        while self.should_continue:
+            try:
+                result_queue.put(item, timeout=1)
+                return
+            except Full:
+                continue
+
+
+class DiscoverWorkerThread(ListWorkerThread):
+    """
+    Lists ``prefix`` with ``delimiter``, handing every prefix that was
+    rolled up to the list threads as a partition as soon as it's found.
+
+    Each page is put on ``result_queue`` as it arrives: the keys that
+    weren't rolled up, or if ``ordered``, (record, result queue) segments
+    for the keys & partitions in the order they're listed in.
+    """
+    def __init__(self, bucket, headers, worker_queue, result_queue, prefix,
+                 delimiter, ordered, num_threads, max_buffered_pages,
+                 num_retries=5):
+        super(DiscoverWorkerThread, self).__init__(bucket, headers,
+                                                   worker_queue, num_retries)
+        self._result_queue = result_queue
+        self._prefix = prefix
+        self._delimiter = delimiter
+        self._ordered = ordered
+        self._num_threads = num_threads
+        self._max_buffered_pages = max_buffered_pages
+        self.num_partitions = 0
+
+    def run(self):
+        try:
+            self._discover()
+        except Exception as e:
+            self._put(self._result_queue, (None, e))
+        finally:
+            # The list threads stop once they've run out of partitions.
+            for _ in range(self._num_threads):
+                self._worker_queue.put(_END_SENTINEL)
+            self._put(self._result_queue, (None, _END_SENTINEL))
+
+    def _discover(self):
+        last_prefix = None
+        marker = ''
+        while self.should_continue:
+            rs = self._get_page(None, self._prefix, marker, self._delimiter)
+            segments = []
+            # S3 returns a page's keys before its prefixes.
+            for item in sorted(rs, key=lambda item: item.name):
+                if not isinstance(item, Prefix):
+                    segments.append((item, None))
+                    continue
+                # A prefix can be repeated at the top of the next page.
+                if item.name == last_prefix:
+                    continue
+                last_prefix = item.name
+                result_queue = self._result_queue
+                if self._ordered:
+                    result_queue = Queue(self._max_buffered_pages)
+                self._worker_queue.put((self.num_partitions, item.name, '',
+                                        None, result_queue))
+                self.num_partitions += 1
+                segments.append((None, result_queue))
+            if not self._ordered:
+                segments = [record for record, result_queue in segments
+                            if record is not None]
+            if segments:
+                self._put(self._result_queue, (None, segments))
+            if not rs.is_truncated or not len(rs):
+                break
+            marker = rs.next_marker or rs[-1].name
+        log.debug("Listed %s partitions under %r.", self.num_partitions,
+                  self._prefix)
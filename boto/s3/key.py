@@ -37,6 +37,8 @@ from boto.exception import BotoClientError
 from boto.exception import StorageDataError
 from boto.exception import PleaseRetryException
 from boto.provider import Provider
+from boto.s3.concurrent import ConcurrentDownloader, ConcurrentUploader
+from boto.s3.concurrent import DEFAULT_PART_SIZE
 from boto.s3.keyfile import KeyFile
 from boto.s3.user import User
 from boto import UserAgent
@@ -1297,7 +1299,8 @@ class Key(object):
     def set_contents_from_filename(self, filename, headers=None, replace=True,
                                    cb=None, num_cb=10, policy=None, md5=None,
                                    reduced_redundancy=False,
-                                   encrypt_key=False):
+                                   encrypt_key=False, parallel=None,
+                                   part_size=DEFAULT_PART_SIZE):
         """
         Store an object in S3 using the name of the Key object as the
         key in S3 and the contents of the file named by 'filename'.
@@ -1341,7 +1344,9 @@ class Key(object):
         :param md5: If you need to compute the MD5 for any reason
             prior to upload, it's silly to have to do it twice so this
             param, if present, will be used as the MD5 values of the
-            file.  Otherwise, the checksum will be computed.
+            file.  Otherwise, the checksum will be computed.  It's ignored
+            for parallel uploads, where the MD5 of each part is computed
+            as the part is uploaded.
 
         :type reduced_redundancy: bool
         :param reduced_redundancy: If True, this will set the storage
@@ -1352,9 +1357,49 @@ class Key(object):
             will be encrypted on the server-side by S3 and will be
             stored in an encrypted form while at rest in S3.
 
+        :type parallel: int
+        :param parallel: If set to more than one, files larger than
+            ``part_size`` are uploaded with a multipart upload, using
+            this many threads to upload parts concurrently.  See
+            :class:`boto.s3.concurrent.ConcurrentUploader`.  The ``md5``
+            and ``num_cb`` parameters are ignored for parallel uploads,
+            and ``cb`` is called each time a part is uploaded.
+
+        :type part_size: int
+        :param part_size: The size, in bytes, of the parts of a parallel
+            upload.
+
         :rtype: int
         :return: The number of bytes written to the key.
         """
+        if parallel and parallel > 1:
+            size = os.path.getsize(filename)
+            if size > part_size:
+                if not replace:
+                    if self.bucket.lookup(self.name):
+                        return
+                # As with a single PUT, the Content-Type is guessed from the
+                # file name unless it's given.
+                headers = dict(headers or {})
+                content_type_headers = find_matching_headers('Content-Type',
+                                                             headers)
+                if not content_type_headers:
+                    headers['Content-Type'] = \
+                        mimetypes.guess_type(filename)[0] or self.content_type
+                elif len(content_type_headers) == 1 and \
+                        headers[content_type_headers[0]] is None:
+                    del headers[content_type_headers[0]]
+                uploader = ConcurrentUploader(self.bucket, part_size,
+                                              num_threads=parallel)
+                completed = uploader.upload(
+                    self.name, filename, headers=headers, cb=cb,
+                    reduced_redundancy=reduced_redundancy,
+                    metadata=self.metadata, encrypt_key=encrypt_key,
+                    policy=policy)
+                self.size = size
+                self.etag = completed.etag
+                self.version_id = completed.version_id
+                return size
         with open(filename, 'rb') as fp:
             return self.set_contents_from_file(fp, headers, replace, cb,
                                                num_cb, policy, md5,
@@ -1654,7 +1699,8 @@ class Key(object):
                                  torrent=False,
                                  version_id=None,
                                  res_download_handler=None,
-                                 response_headers=None):
+                                 response_headers=None, parallel=None,
+                                 part_size=DEFAULT_PART_SIZE):
         """
         Retrieve an object from S3 using the name of the Key object as the
         key in S3.  Store contents of the object to a file named by 'filename'.
@@ -1702,7 +1748,26 @@ class Key(object):
             retrieving the object.  You can set the Key object's
             ``version_id`` attribute to None to always grab the latest
             version from a version-enabled bucket.
+
+        :type parallel: int
+        :param parallel: If greater than 1 and the object is larger than
+            ``part_size``, download it with this many concurrent Range
+            GETs using :class:`boto.s3.concurrent.ConcurrentDownloader`.
+            If ``res_download_handler`` has a tracker file, it is used to
+            resume the download part by part.  The progress callback is
+            called once per completed part.
+
+        :type part_size: int
+        :param part_size: The size, in bytes, of each ranged request of a
+            parallel download.
         """
+        if parallel is not None and parallel > 1 and not torrent:
+            if self._get_contents_parallel(filename, headers, cb,
+                                           version_id, res_download_handler,
+                                           response_headers, parallel,
+                                           part_size):
+                self._set_file_mtime(filename)
+                return
         try:
             with open(filename, 'wb') as fp:
                 self.get_contents_to_file(fp, headers, cb, num_cb,
@@ -1713,15 +1778,62 @@ class Key(object):
         except Exception:
             os.remove(filename)
             raise
+        self._set_file_mtime(filename)
+
+    def _set_file_mtime(self, filename):
         # if last_modified date was sent from s3, try to set file's timestamp
         if self.last_modified is not None:
             try:
                 modified_tuple = email.utils.parsedate_tz(self.last_modified)
                 modified_stamp = int(email.utils.mktime_tz(modified_tuple))
-                os.utime(fp.name, (modified_stamp, modified_stamp))
+                os.utime(filename, (modified_stamp, modified_stamp))
             except Exception:
                 pass
 
+    def _get_contents_parallel(self, filename, headers, cb, version_id,
+                               res_download_handler, response_headers,
+                               parallel, part_size):
+        """
+        Download the object with concurrent Range GETs.  Returns False,
+        without downloading anything, if the object is too small to be
+        worth splitting.
+        """
+        if self.size is None or self.etag is None:
+            key = self.bucket.get_key(self.name, headers,
+                                      version_id=version_id or
+                                      self.version_id)
+            if key is None:
+                raise self.provider.storage_response_error(
+                    404, 'Not Found', '')
+            self.size = key.size
+            self.etag = key.etag
+            self.last_modified = key.last_modified
+            self.encrypted = key.encrypted
+        if self.size <= part_size:
+            return False
+        tracker_file_name = None
+        num_retries = 5
+        if res_download_handler is not None:
+            tracker_file_name = res_download_handler.tracker_file_name
+            if res_download_handler.num_retries is not None:
+                num_retries = res_download_handler.num_retries
+        downloader = ConcurrentDownloader(self, part_size=part_size,
+                                          num_threads=parallel,
+                                          num_retries=num_retries)
+        try:
+            downloader.download(filename, headers=headers, cb=cb,
+                                version_id=version_id,
+                                response_headers=response_headers,
+                                tracker_file_name=tracker_file_name)
+        except Exception:
+            # Keep the partial file around if it can be resumed.
+            if not (tracker_file_name and
+                    os.path.exists(tracker_file_name)) and \
+                    os.path.exists(filename):
+                os.remove(filename)
+            raise
+        return True
+
     def get_contents_as_string(self, headers=None,
                                cb=None, num_cb=10,
                                torrent=False,
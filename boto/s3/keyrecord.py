@@ -0,0 +1,102 @@
+# Copyright (c) 2015 Amazon.com, Inc. or its affiliates.  All Rights Reserved
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish, dis-
+# tribute, sublicense, and/or sell copies of the Software, and to permit
+# persons to whom the Software is furnished to do so, subject to the fol-
+# lowing conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABIL-
+# ITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT
+# SHALL THE AUTHOR BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+
+import boto.utils
+from boto.compat import six
+
+
+class KeyRecord(object):
+    """
+    A lightweight record of a key in a bucket listing.
+
+    Only the name, size, ETag, last modified time and storage class of the
+    key are kept, and the record has no ``__dict__``, so listing millions
+    of keys costs a fraction of the memory and allocations of full
+    :class:`boto.s3.key.Key` objects.  The size is kept as the text from
+    the listing until it's first read.
+
+    Records are returned by ``Bucket.list(compact=True)`` and
+    ``Bucket.get_all_keys(compact=True)``.  Call :meth:`to_key` to get a
+    full Key for the same object.
+    """
+    __slots__ = ('bucket', 'name', '_size', 'etag', 'last_modified',
+                 'storage_class')
+
+    def __init__(self, bucket=None, name=None, size=None, etag=None,
+                 last_modified=None, storage_class=None):
+        self.bucket = bucket
+        self.name = name
+        self._size = size
+        self.etag = etag
+        self.last_modified = last_modified
+        self.storage_class = storage_class
+
+    def __repr__(self):
+        return '<KeyRecord: %s,%s>' % (getattr(self.bucket, 'name', None),
+                                       self.name)
+
+    def _get_size(self):
+        size = self._size
+        if isinstance(size, six.string_types):
+            size = self._size = int(size)
+        return size
+
+    def _set_size(self, value):
+        self._size = value
+
+    size = property(_get_size, _set_size)
+
+    @property
+    def last_modified_datetime(self):
+        """
+        The last modified time as a :class:`datetime.datetime`.
+        """
+        if self.last_modified is None:
+            return None
+        return boto.utils.parse_ts(self.last_modified)
+
+    def startElement(self, name, attrs, connection):
+        return None
+
+    def endElement(self, name, value, connection):
+        if name == 'Key':
+            self.name = value
+        elif name == 'Size':
+            self._size = value
+        elif name == 'ETag':
+            self.etag = value
+        elif name == 'LastModified':
+            self.last_modified = value
+        elif name == 'StorageClass':
+            self.storage_class = value
+
+    def to_key(self):
+        """
+        Returns a full Key of the bucket's key class with the attributes
+        known from the listing.  No request is made.
+        """
+        key = self.bucket.new_key(self.name)
+        key.size = self.size
+        key.etag = self.etag
+        key.last_modified = self.last_modified
+        if self.storage_class is not None:
+            key.storage_class = self.storage_class
+        return key
@@ -0,0 +1,639 @@
+# Copyright (c) 2015 Amazon.com, Inc. or its affiliates.  All Rights Reserved
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish, dis-
+# tribute, sublicense, and/or sell copies of the Software, and to permit
+# persons to whom the Software is furnished to do so, subject to the fol-
+# lowing conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABIL-
+# ITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT
+# SHALL THE AUTHOR BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+"""
+Incrementally mirrors a local directory to an S3 prefix, or the other way
+around.
+"""
+import errno
+import logging
+import math
+import mimetypes
+import os
+import tempfile
+import threading
+from hashlib import md5
+
+from boto.compat import json, Queue
+from boto.exception import BotoClientError
+from boto.s3.concurrent import ConcurrentLister, DEFAULT_PART_SIZE
+from boto.s3.concurrent import MAX_DELETE_OBJECTS, completion_xml
+from boto.s3.concurrent import minimum_part_size
+from boto.s3.key import Key
+
+
+_END_SENTINEL = object()
+log = logging.getLogger('boto.s3.sync')
+
+# The name of the index file kept in the local directory by default, &
+# the prefix of temporary files written next to the files being synced.
+INDEX_FILE_NAME = '.botosync'
+TEMP_FILE_PREFIX = '.botosync-'
+# Files at least this large are uploaded in parts.
+DEFAULT_MULTIPART_THRESHOLD = 2 * DEFAULT_PART_SIZE
+HASH_BUFFER_SIZE = 64 * 1024
+
+
+def _hash_file(filename, part_size=None):
+    """
+    Returns the MD5 hex digest of a file, or if ``part_size`` is given,
+    the ETag S3 would give it if it were uploaded in parts of that size.
+    """
+    whole = md5()
+    parts = []
+    part = md5()
+    part_bytes = 0
+    with open(filename, 'rb') as f:
+        while True:
+            chunk = f.read(HASH_BUFFER_SIZE)
+            if not chunk:
+                break
+            whole.update(chunk)
+            if part_size is None:
+                continue
+            while chunk:
+                piece = chunk[:part_size - part_bytes]
+                chunk = chunk[len(piece):]
+                part.update(piece)
+                part_bytes += len(piece)
+                if part_bytes == part_size:
+                    parts.append(part.digest())
+                    part = md5()
+                    part_bytes = 0
+    if part_size is None:
+        return whole.hexdigest()
+    if part_bytes or not parts:
+        parts.append(part.digest())
+    return '%s-%d' % (md5(b''.join(parts)).hexdigest(), len(parts))
+
+
+def _is_md5_etag(etag):
+    return etag is not None and '-' not in etag and len(etag) == 32
+
+
+def _local_filename(local_dir, path):
+    """
+    Returns the name of the file under ``local_dir`` for the relative key
+    path ``path``, or None if it would be outside ``local_dir`` (e.g.
+    because of ``..`` segments or a drive).
+    """
+    filename = os.path.join(local_dir, *path.split('/'))
+    root = os.path.join(os.path.abspath(local_dir), '')
+    if not os.path.abspath(filename).startswith(root):
+        return None
+    return filename
+
+
+class SyncIndex(object):
+    """
+    Remembers the size, modification time, MD5 & last synced ETag of each
+    local file, so that files which haven't changed are never hashed
+    again.
+
+    Entries are keyed by the path of the file relative to the synced
+    directory.  The index is kept in memory & written to ``filename``
+    as JSON by :meth:`save`.
+    """
+    def __init__(self, filename=None):
+        self.filename = filename
+        self._entries = {}
+        self._lock = threading.Lock()
+        if filename is not None:
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.filename, 'r') as f:
+                self._entries = json.load(f)
+        except (IOError, OSError) as e:
+            if e.errno != errno.ENOENT:
+                log.warning("Couldn't read sync index %s (%s), starting "
+                            "with an empty one.", self.filename, e)
+        except ValueError as e:
+            log.warning("Sync index %s is corrupt (%s), starting with an "
+                        "empty one.", self.filename, e)
+
+    def save(self):
+        """
+        Writes the index to its file, replacing it atomically.
+        """
+        if self.filename is None:
+            return
+        with self._lock:
+            data = json.dumps(self._entries)
+        directory = os.path.dirname(os.path.abspath(self.filename))
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=TEMP_FILE_PREFIX)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(data)
+            _replace(tmp, self.filename)
+        except:
+            os.remove(tmp)
+            raise
+
+    def get(self, path, stat):
+        """
+        Returns the (md5, etag) recorded for ``path``, or (None, None) if
+        the file has changed since, judging by its size & modification
+        time.
+        """
+        with self._lock:
+            entry = self._entries.get(path)
+        if entry is None or entry[0] != stat.st_size or \
+                entry[1] != stat.st_mtime:
+            return None, None
+        return entry[2], entry[3]
+
+    def set(self, path, stat, md5_hex=None, etag=None):
+        with self._lock:
+            self._entries[path] = [stat.st_size, stat.st_mtime, md5_hex, etag]
+
+    def discard(self, path):
+        with self._lock:
+            self._entries.pop(path, None)
+
+    def md5(self, path, filename, stat):
+        """
+        Returns the MD5 hex digest of ``filename``, hashing it only if it
+        has changed since it was last hashed.
+        """
+        md5_hex, etag = self.get(path, stat)
+        if md5_hex is None:
+            md5_hex = _hash_file(filename)
+            self.set(path, stat, md5_hex, etag)
+        return md5_hex
+
+
+def _replace(src, dst):
+    try:
+        os.rename(src, dst)
+    except OSError:
+        # Windows won't rename over an existing file.
+        if not os.path.exists(dst):
+            raise
+        os.remove(dst)
+        os.rename(src, dst)
+
+
+class SyncResult(object):
+    """
+    What a sync did.
+
+    :ivar uploaded: The paths of the files that were uploaded.
+    :ivar downloaded: The paths of the files that were downloaded.
+    :ivar deleted: The key names or paths that were deleted.
+    :ivar skipped: The number of files that were already up to date.
+    :ivar errors: (path, exception) pairs for the transfers that failed.
+    """
+    def __init__(self):
+        self.uploaded = []
+        self.downloaded = []
+        self.deleted = []
+        self.skipped = 0
+        self.errors = []
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<SyncResult: %d uploaded, %d downloaded, %d deleted, ' \
+            '%d skipped, %d errors>' % (len(self.uploaded),
+                                        len(self.downloaded),
+                                        len(self.deleted), self.skipped,
+                                        len(self.errors))
+
+    def _add(self, name, value):
+        with self._lock:
+            getattr(self, name).append(value)
+
+    def _skip(self):
+        with self._lock:
+            self.skipped += 1
+
+
+class _MultipartState(object):
+    """
+    Tracks the parts of a multipart upload running on the worker pool.
+    """
+    def __init__(self, mp, total_parts):
+        self.mp = mp
+        self.etags = [None] * total_parts
+        self.remaining = total_parts
+        self.failed = False
+        self._lock = threading.Lock()
+
+    def part_done(self, part_number, etag):
+        """Returns True once every part has been uploaded."""
+        with self._lock:
+            self.etags[part_number] = etag
+            self.remaining -= 1
+            return self.remaining == 0
+
+    def fail(self):
+        """Returns True for the first failure only."""
+        with self._lock:
+            first = not self.failed
+            self.failed = True
+            return first
+
+
+class S3Sync(object):
+    """
+    Mirrors a local directory to a prefix in a bucket, or a prefix to a
+    local directory, transferring only what has changed.
+
+    The remote prefix is listed with a :class:`ConcurrentLister` while the
+    local tree is walked.  Files are compared by size first, then by
+    content: an index of each file's size, modification time, MD5 & the
+    ETag it was last synced with is kept in the local directory, so a
+    file that hasn't changed is matched against its key without being
+    hashed again.  Objects uploaded in parts are compared by computing
+    their multipart ETag with the same part size.
+
+    Uploads, downloads & deletes all run on one pool of ``num_threads``
+    threads.  Files larger than ``multipart_threshold`` are uploaded in
+    parts, each part being a task on the same pool.
+
+    Example::
+
+        sync = S3Sync(bucket, num_threads=16)
+        result = sync.upload('/var/www/static', 'static/', delete=True)
+        for path, error in result.errors:
+            print(path, error)
+
+    """
+    def __init__(self, bucket, num_threads=10, part_size=DEFAULT_PART_SIZE,
+                 multipart_threshold=DEFAULT_MULTIPART_THRESHOLD,
+                 index_file=None):
+        """
+        :type bucket: :class:`boto.s3.bucket.Bucket`
+        :param bucket: The bucket to sync with.
+
+        :type num_threads: int
+        :param num_threads: The number of threads transferring files.
+
+        :type part_size: int
+        :param part_size: The size, in bytes, of the parts of multipart
+            uploads.
+
+        :type multipart_threshold: int
+        :param multipart_threshold: The size, in bytes, from which files
+            are uploaded in parts.
+
+        :type index_file: str
+        :param index_file: Where to keep the index of local files.
+            Defaults to a ``.botosync`` file in the synced directory, which
+            is never synced itself.
+
+        """
+        self.bucket = bucket
+        self._num_threads = num_threads
+        self._part_size = part_size
+        self._multipart_threshold = multipart_threshold
+        self._index_file = index_file
+
+    def upload(self, local_dir, prefix='', delete=False):
+        """
+        Uploads the files under ``local_dir`` that are missing or differ
+        under ``prefix``.
+
+        :type delete: bool
+        :param delete: If True, also delete the keys under ``prefix`` that
+            have no local file.
+
+        :rtype: :class:`SyncResult`
+        """
+        return self._sync(local_dir, prefix, delete, upload=True)
+
+    def download(self, prefix, local_dir, delete=False):
+        """
+        Downloads the keys under ``prefix`` that are missing or differ
+        under ``local_dir``.
+
+        :type delete: bool
+        :param delete: If True, also delete the local files that have no
+            key under ``prefix``.
+
+        :rtype: :class:`SyncResult`
+        """
+        return self._sync(local_dir, prefix, delete, upload=False)
+
+    def _sync(self, local_dir, prefix, delete, upload):
+        if prefix and not prefix.endswith('/'):
+            prefix += '/'
+        if not upload and not os.path.isdir(local_dir):
+            os.makedirs(local_dir)
+        index_file = self._index_file or os.path.join(local_dir,
+                                                      INDEX_FILE_NAME)
+        index = SyncIndex(index_file)
+        result = SyncResult()
+
+        remote = {}
+        listing_error = []
+        lister = threading.Thread(target=self._list_remote,
+                                  args=(prefix, remote, listing_error))
+        lister.daemon = True
+        lister.start()
+        local = self._walk(local_dir, index_file)
+        lister.join()
+        if listing_error:
+            raise listing_error[0]
+
+        pool = _WorkerPool(self._num_threads)
+        try:
+            if upload:
+                self._plan_uploads(pool, index, result, local_dir, prefix,
+                                   local, remote, delete)
+            else:
+                self._plan_downloads(pool, index, result, local_dir, prefix,
+                                     local, remote, delete)
+            pool.wait()
+        finally:
+            pool.shutdown()
+            index.save()
+        return result
+
+    def _list_remote(self, prefix, remote, errors):
+        try:
+            lister = ConcurrentLister(self.bucket,
+                                      num_threads=self._num_threads)
+            for record in lister.list(prefix=prefix, ordered=False):
+                path = record.name[len(prefix):]
+                # Skip "directory" placeholder keys.
+                if path and not path.endswith('/'):
+                    remote[path] = record
+        except Exception as e:
+            errors.append(e)
+
+    def _walk(self, local_dir, index_file):
+        """
+        Returns the stat of every file under ``local_dir``, keyed by its
+        relative path with ``/`` separators.
+        """
+        local = {}
+        index_file = os.path.abspath(index_file)
+        for dirpath, dirnames, filenames in os.walk(local_dir):
+            for filename in filenames:
+                if filename.startswith(TEMP_FILE_PREFIX):
+                    continue
+                full = os.path.join(dirpath, filename)
+                if os.path.abspath(full) == index_file:
+                    continue
+                try:
+                    stat = os.stat(full)
+                except OSError:
+                    # Removed while walking, or a dangling symlink.
+                    continue
+                path = os.path.relpath(full, local_dir)
+                local[path.replace(os.sep, '/')] = stat
+        return local
+
+    def _plan_uploads(self, pool, index, result, local_dir, prefix, local,
+                      remote, delete):
+        for path in sorted(local):
+            pool.submit(self._check_upload, pool, index, result,
+                        os.path.join(local_dir, *path.split('/')),
+                        path, prefix + path, local[path], remote.get(path))
+        if delete:
+            names = [prefix + path for path in sorted(remote)
+                     if path not in local]
+            for i in range(0, len(names), MAX_DELETE_OBJECTS):
+                pool.submit(self._delete_keys, result,
+                            names[i:i + MAX_DELETE_OBJECTS])
+
+    def _plan_downloads(self, pool, index, result, local_dir, prefix, local,
+                        remote, delete):
+        for path in sorted(remote):
+            filename = _local_filename(local_dir, path)
+            if filename is None:
+                log.error("Not downloading %s: it is outside %s",
+                          remote[path].name, local_dir)
+                result._add('errors', (path, BotoClientError(
+                    'Key %s is outside %s' % (remote[path].name,
+                                              local_dir))))
+                continue
+            pool.submit(self._check_download, index, result, filename,
+                        path, remote[path], local.get(path))
+        if delete:
+            # Local paths come from walking local_dir, so only remote
+            # paths need checking; keys outside it never match a file.
+            for path in sorted(local):
+                if path not in remote:
+                    pool.submit(self._delete_file, index, result,
+                                os.path.join(local_dir, *path.split('/')),
+                                path)
+
+    def _matches(self, index, filename, path, stat, record):
+        """
+        Returns True if the local file has the same content as the key.
+        """
+        if record.size != stat.st_size:
+            return False
+        md5_hex, etag = index.get(path, stat)
+        if etag is not None and etag == record.etag:
+            return True
+        remote_etag = record.etag.strip('"\'')
+        if _is_md5_etag(remote_etag):
+            return index.md5(path, filename, stat) == remote_etag.lower()
+        # A multipart ETag can only be reproduced with the same part size.
+        total_parts = remote_etag.rsplit('-', 1)[-1]
+        part_size = minimum_part_size(stat.st_size, self._part_size)
+        if total_parts != str(int(math.ceil(stat.st_size /
+                                            float(part_size)))):
+            return False
+        return _hash_file(filename, part_size) == remote_etag.lower()
+
+    def _check_upload(self, pool, index, result, filename, path, name, stat,
+                      record):
+        try:
+            if record is not None and \
+                    self._matches(index, filename, path, stat, record):
+                index.set(path, stat, index.get(path, stat)[0], record.etag)
+                result._skip()
+                return
+            if stat.st_size >= self._multipart_threshold:
+                self._start_multipart(pool, index, result, filename, path,
+                                      name, stat)
+                return
+            md5_hex = index.md5(path, filename, stat)
+            key = self.bucket.new_key(name)
+            key.set_contents_from_filename(
+                filename, md5=key.get_md5_from_hexdigest(md5_hex))
+            index.set(path, stat, md5_hex, key.etag)
+            result._add('uploaded', path)
+        except Exception as e:
+            log.error("Exception caught uploading %s: %s, msg: %s",
+                      filename, e.__class__, e)
+            result._add('errors', (path, e))
+
+    def _start_multipart(self, pool, index, result, filename, path, name,
+                         stat):
+        part_size = minimum_part_size(stat.st_size, self._part_size)
+        total_parts = int(math.ceil(stat.st_size / float(part_size)))
+        content_type = mimetypes.guess_type(filename)[0] or \
+            Key.DefaultContentType
+        mp = self.bucket.initiate_multipart_upload(
+            name, headers={'Content-Type': content_type})
+        state = _MultipartState(mp, total_parts)
+        for part_number in range(total_parts):
+            pool.submit(self._upload_part, index, result, state, filename,
+                        path, name, stat, part_number, part_size)
+
+    def _upload_part(self, index, result, state, filename, path, name, stat,
+                     part_number, part_size):
+        if state.failed:
+            return
+        try:
+            start = part_number * part_size
+            size = min(part_size, stat.st_size - start)
+            with open(filename, 'rb') as f:
+                f.seek(start)
+                part = state.mp.upload_part_from_file(f, part_number + 1,
+                                                      size=size)
+            if not state.part_done(part_number, part.etag):
+                return
+            completed = self.bucket.complete_multipart_upload(
+                name, state.mp.id, completion_xml(state.etags))
+            index.set(path, stat, index.get(path, stat)[0], completed.etag)
+            result._add('uploaded', path)
+        except Exception as e:
+            if not state.fail():
+                return
+            log.error("Exception caught uploading %s, cancelling multipart "
+                      "upload: %s, msg: %s", filename, e.__class__, e)
+            result._add('errors', (path, e))
+            try:
+                state.mp.cancel_upload()
+            except Exception as e:
+                log.error("Exception caught cancelling upload of %s: %s, "
+                          "msg: %s", filename, e.__class__, e)
+
+    def _check_download(self, index, result, filename, path, record, stat):
+        try:
+            if stat is not None and \
+                    self._matches(index, filename, path, stat, record):
+                index.set(path, stat, index.get(path, stat)[0], record.etag)
+                result._skip()
+                return
+            directory = os.path.dirname(filename)
+            try:
+                os.makedirs(directory)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+            # Download next to the file & move it into place once
+            # complete, so an interrupted download never leaves a
+            # truncated file behind.
+            fd, tmp = tempfile.mkstemp(dir=directory, prefix=TEMP_FILE_PREFIX)
+            os.close(fd)
+            try:
+                record.to_key().get_contents_to_filename(tmp)
+                _replace(tmp, filename)
+            except:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                raise
+            etag = record.etag.strip('"\'')
+            md5_hex = None
+            if _is_md5_etag(etag):
+                md5_hex = etag.lower()
+            index.set(path, os.stat(filename), md5_hex, record.etag)
+            result._add('downloaded', path)
+        except Exception as e:
+            log.error("Exception caught downloading %s: %s, msg: %s",
+                      record.name, e.__class__, e)
+            result._add('errors', (path, e))
+
+    def _delete_keys(self, result, names):
+        try:
+            response = self.bucket.delete_keys(names, quiet=True)
+        except Exception as e:
+            log.error("Exception caught deleting keys: %s, msg: %s",
+                      e.__class__, e)
+            for name in names:
+                result._add('errors', (name, e))
+            return
+        failed = set()
+        for error in response.errors:
+            failed.add(error.key)
+            result._add('errors', (error.key, error))
+        for name in names:
+            if name not in failed:
+                result._add('deleted', name)
+
+    def _delete_file(self, index, result, filename, path):
+        try:
+            os.remove(filename)
+            index.discard(path)
+            result._add('deleted', path)
+        except Exception as e:
+            log.error("Exception caught deleting %s: %s, msg: %s",
+                      filename, e.__class__, e)
+            result._add('errors', (path, e))
+
+
+class _WorkerPool(object):
+    """
+    A pool of threads running submitted tasks, which may submit further
+    tasks themselves.
+    """
+    def __init__(self, num_threads):
+        self._queue = Queue()
+        self._pending = 0
+        self._condition = threading.Condition()
+        self._threads = []
+        for _ in range(num_threads):
+            thread = threading.Thread(target=self._run)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, func, *args):
+        with self._condition:
+            self._pending += 1
+        self._queue.put((func, args))
+
+    def wait(self):
+        """Waits until every task, including those they submitted, is
+        done."""
+        with self._condition:
+            while self._pending:
+                self._condition.wait()
+
+    def shutdown(self):
+        for _ in self._threads:
+            self._queue.put(_END_SENTINEL)
+        for thread in self._threads:
+            thread.join()
+
+    def _run(self):
+        while True:
+            work = self._queue.get()
+            if work is _END_SENTINEL:
+                return
+            func, args = work
+            try:
+                func(*args)
+            except Exception as e:
+                log.error("Exception caught in sync task: %s, msg: %s",
+                          e.__class__, e)
+            finally:
+                with self._condition:
+                    self._pending -= 1
+                    self._condition.notify_all()
@@ -0,0 +1,518 @@
+# Copyright (c) 2013 Amazon.com, Inc. or its affiliates.  All Rights Reserved
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish, dis-
+# tribute, sublicense, and/or sell copies of the Software, and to permit
+# persons to whom the Software is furnished to do so, subject to the fol-
+# lowing conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABIL-
+# ITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT
+# SHALL THE AUTHOR BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+
+"""
+Consumes messages from an SQS queue with several long-polling receivers,
+batched deletes & automatic visibility extension.
+"""
+import logging
+import threading
+import time
+
+from boto.compat import Queue
+from boto.vendored.six.moves.queue import Empty, Full
+
+
+_END_SENTINEL = object()
+log = logging.getLogger('boto.sqs.consumer')
+
+# The most entries a batch request may contain.
+MAX_BATCH_SIZE = 10
+
+# The longest a message's visibility timeout can be extended to, counted
+# from when it was received.
+MAX_VISIBILITY_TIMEOUT = 12 * 60 * 60
+
+# How long, by default, a message that's neither deleted nor released is
+# kept invisible, counted from when it was received.
+DEFAULT_MAX_EXTENSION = 15 * 60
+
+
+class _BatchEntry(object):
+    """
+    Stands in for a message in batch requests, which only need an ID that's
+    unique within the batch & the receipt handle.
+    """
+    def __init__(self, id, receipt_handle):
+        self.id = id
+        self.receipt_handle = receipt_handle
+
+
+class ConsumerStats(object):
+    """
+    Counters kept by a :class:`QueueConsumer`.
+
+    :ivar receives: The number of ``ReceiveMessage`` calls.
+    :ivar empty_receives: How many of them returned no messages.
+    :ivar messages_received: The number of messages received.
+    :ivar receive_time: The total time spent receiving, in seconds.
+    :ivar max_receive_latency: The slowest receive, in seconds.
+    :ivar delete_batches: The number of ``DeleteMessageBatch`` calls.
+    :ivar messages_deleted: The number of messages deleted.
+    :ivar delete_errors: The number of messages that couldn't be deleted.
+    :ivar visibility_extensions: The number of visibility timeouts
+        extended.
+    """
+    def __init__(self, batch_size=MAX_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.receives = 0
+        self.empty_receives = 0
+        self.messages_received = 0
+        self.receive_time = 0.0
+        self.max_receive_latency = 0.0
+        self.delete_batches = 0
+        self.messages_deleted = 0
+        self.delete_errors = 0
+        self.visibility_extensions = 0
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return ('ConsumerStats(receives=%s, empty_receives=%s, '
+                'average_receive_latency=%.3f, batch_fill_ratio=%.2f, '
+                'messages_deleted=%s)' % (
+                    self.receives, self.empty_receives,
+                    self.average_receive_latency, self.batch_fill_ratio,
+                    self.messages_deleted))
+
+    def add_receive(self, latency, count):
+        with self._lock:
+            self.receives += 1
+            self.messages_received += count
+            self.receive_time += latency
+            self.max_receive_latency = max(self.max_receive_latency, latency)
+            if not count:
+                self.empty_receives += 1
+
+    def add_delete(self, deleted, errors):
+        with self._lock:
+            self.delete_batches += 1
+            self.messages_deleted += deleted
+            self.delete_errors += errors
+
+    def add_extensions(self, count):
+        with self._lock:
+            self.visibility_extensions += count
+
+    @property
+    def average_receive_latency(self):
+        """The mean time a receive took, in seconds."""
+        if not self.receives:
+            return 0.0
+        return self.receive_time / self.receives
+
+    @property
+    def batch_fill_ratio(self):
+        """
+        The average number of messages per receive, as a fraction of the
+        number asked for.
+        """
+        if not self.receives:
+            return 0.0
+        return self.messages_received / float(self.receives * self.batch_size)
+
+    @property
+    def delete_fill_ratio(self):
+        """The average size of a delete batch, as a fraction of 10."""
+        if not self.delete_batches:
+            return 0.0
+        return (self.messages_deleted + self.delete_errors) / \
+            float(self.delete_batches * MAX_BATCH_SIZE)
+
+
+class QueueConsumer(object):
+    """
+    Receives messages from a queue in the background & hands them out one
+    at a time.
+
+    ``num_receivers`` threads long-poll the queue for up to ``num_messages``
+    messages at a time & put them on a local queue holding at most
+    ``max_buffered`` messages. Messages passed to ``delete`` are deleted in
+    batches of up to 10, at least every ``delete_interval`` seconds.
+    Messages passed to ``release`` are made visible again straight away, so
+    they can be received again or moved to a dead letter queue. Until
+    then, a message's visibility timeout is extended shortly before it
+    expires, including while it's waiting in the local queue, for up to
+    ``max_extension`` seconds after it was received.
+
+    Counters are kept in ``stats`` (a :class:`ConsumerStats`).
+
+    Example::
+
+        consumer = QueueConsumer(queue)
+        try:
+            for message in consumer:
+                try:
+                    process(message)
+                except Exception:
+                    consumer.release(message)
+                else:
+                    consumer.delete(message)
+        finally:
+            consumer.close()
+
+    """
+    def __init__(self, queue, num_receivers=2, num_messages=MAX_BATCH_SIZE,
+                 wait_time_seconds=20, visibility_timeout=30,
+                 max_buffered=None, delete_interval=1.0,
+                 extend_visibility=True, attributes=None,
+                 message_attributes=None,
+                 max_extension=DEFAULT_MAX_EXTENSION):
+        """
+        :type queue: :class:`boto.sqs.queue.Queue`
+        :param queue: The queue to read from.
+
+        :type num_receivers: int
+        :param num_receivers: The number of receiving threads.
+
+        :type num_messages: int
+        :param num_messages: The most messages to ask for per receive.
+
+        :type wait_time_seconds: int
+        :param wait_time_seconds: How long each receive waits for messages.
+
+        :type visibility_timeout: int
+        :param visibility_timeout: The visibility timeout to receive
+            messages with & to extend it by.
+
+        :type max_buffered: int
+        :param max_buffered: The most received messages waiting to be
+            handed out. Defaults to one full receive per receiver.
+
+        :type delete_interval: float
+        :param delete_interval: The longest (in seconds) a deleted message
+            waits to be sent in a batch.
+
+        :type extend_visibility: bool
+        :param extend_visibility: Whether to extend the visibility timeout
+            of messages that haven't been deleted yet.
+
+        :type attributes: str
+        :param attributes: The additional attributes to receive. See
+            :meth:`boto.sqs.queue.Queue.get_messages`.
+
+        :type message_attributes: list
+        :param message_attributes: The message attributes to receive.
+
+        :type max_extension: int
+        :param max_extension: The longest (in seconds, from when it was
+            received) a message that's neither deleted nor released is
+            kept invisible, or ``None`` for as long as SQS allows (12
+            hours).
+        """
+        self.queue = queue
+        self.stats = ConsumerStats(num_messages)
+        self._num_messages = num_messages
+        self._wait_time_seconds = wait_time_seconds
+        self._visibility_timeout = visibility_timeout
+        self._delete_interval = delete_interval
+        self._extend_visibility = extend_visibility
+        if max_extension is None:
+            max_extension = MAX_VISIBILITY_TIMEOUT
+        self._max_extension = min(max_extension, MAX_VISIBILITY_TIMEOUT)
+        self._attributes = attributes
+        self._message_attributes = message_attributes
+        if max_buffered is None:
+            max_buffered = num_receivers * num_messages
+        self._messages = Queue(maxsize=max_buffered)
+        self._deletes = Queue()
+        self._stopped = threading.Event()
+        self._closed = False
+        # Messages that have been received but not deleted, by receipt
+        # handle, along with when they were received & their visibility
+        # deadline.
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._receivers = []
+
+        for i in range(num_receivers):
+            thread = _ReceiverThread(self)
+            thread.start()
+            self._receivers.append(thread)
+
+        self._ack_thread = _AckThread(self)
+        self._ack_thread.start()
+
+    def __iter__(self):
+        while not self._closed:
+            message = self.get(timeout=1)
+            if message is not None:
+                yield message
+
+    def get(self, timeout=None):
+        """
+        Returns the next message, or ``None`` if there wasn't one within
+        ``timeout`` seconds.
+
+        Raises any exception hit while receiving.
+        """
+        try:
+            item = self._messages.get(timeout=timeout)
+        except Empty:
+            return None
+
+        if isinstance(item, Exception):
+            raise item
+
+        return item
+
+    def delete(self, message):
+        """
+        Queues ``message`` to be deleted in the next batch & stops
+        extending its visibility timeout.
+        """
+        with self._lock:
+            self._in_flight.pop(message.receipt_handle, None)
+        self._deletes.put(message)
+
+    def release(self, message):
+        """
+        Makes ``message`` visible again straight away, e.g. because it
+        couldn't be processed, & stops extending its visibility timeout.
+        """
+        self._release([message])
+
+    def close(self):
+        """
+        Stops receiving, deletes any messages queued for deletion & makes
+        any messages that were never handed out visible again.
+
+        This can take up to ``wait_time_seconds`` while the receivers
+        finish their current requests.
+        """
+        if self._closed:
+            return
+
+        self._closed = True
+        self._stopped.set()
+
+        self._deletes.put(_END_SENTINEL)
+
+        for thread in self._receivers:
+            thread.join()
+
+        unused = []
+        while True:
+            try:
+                item = self._messages.get_nowait()
+            except Empty:
+                break
+            if not isinstance(item, Exception):
+                unused.append(item)
+
+        self._ack_thread.join()
+        self._flush_deletes()
+        self._release(unused)
+
+    def _add_in_flight(self, messages):
+        now = time.time()
+        with self._lock:
+            for message in messages:
+                self._in_flight[message.receipt_handle] = [
+                    message, now, now + self._visibility_timeout
+                ]
+
+    def _put(self, item):
+        while not self._stopped.is_set():
+            try:
+                self._messages.put(item, timeout=1)
+                return True
+            except Full:
+                continue
+
+        return False
+
+    def _receive(self):
+        start = time.time()
+        messages = self.queue.get_messages(
+            self._num_messages, visibility_timeout=self._visibility_timeout,
+            attributes=self._attributes,
+            wait_time_seconds=self._wait_time_seconds,
+            message_attributes=self._message_attributes
+        )
+        self.stats.add_receive(time.time() - start, len(messages))
+        self._add_in_flight(messages)
+        return messages
+
+    def _flush_deletes(self, block=False):
+        """
+        Deletes queued messages in batches. With ``block``, waits up to
+        ``delete_interval`` for a full batch.
+        """
+        deadline = time.time() + self._delete_interval
+
+        while True:
+            batch = {}
+
+            while len(batch) < MAX_BATCH_SIZE:
+                timeout = deadline - time.time()
+                try:
+                    if block and timeout > 0:
+                        message = self._deletes.get(timeout=timeout)
+                    else:
+                        message = self._deletes.get_nowait()
+                except Empty:
+                    break
+                if message is _END_SENTINEL:
+                    # Woken up by ``close``.
+                    block = False
+                    break
+                # Entry IDs have to be unique within a batch.
+                batch[message.receipt_handle] = message
+
+            if not batch:
+                return
+
+            self._delete_batch(list(batch.values()))
+
+            if len(batch) < MAX_BATCH_SIZE:
+                return
+
+    def _delete_batch(self, messages):
+        # Message IDs can repeat if a message was received twice, so number
+        # the entries instead.
+        entries = []
+        for i, message in enumerate(messages):
+            entries.append(_BatchEntry(str(i), message.receipt_handle))
+
+        try:
+            results = self.queue.delete_message_batch(entries)
+        except Exception as e:
+            log.error("Exception caught deleting messages: %s, msg: %s",
+                      e.__class__, e)
+            self.stats.add_delete(0, len(messages))
+            return
+
+        for error in results.errors:
+            log.error("Failed to delete message: %s",
+                      error.get('error_message'))
+        self.stats.add_delete(len(results.results), len(results.errors))
+
+    def _extend_expiring(self):
+        """
+        Extends the visibility timeout of messages that would otherwise
+        become visible before the next check.
+        """
+        now = time.time()
+        # Leave enough time for a slow batch call.
+        margin = max(self._visibility_timeout / 3.0,
+                     self._delete_interval * 2)
+        expiring = []
+
+        with self._lock:
+            for receipt_handle, state in list(self._in_flight.items()):
+                message, received, deadline = state
+
+                if deadline - now > margin:
+                    continue
+
+                if now - received + self._visibility_timeout > \
+                        self._max_extension:
+                    # It can't be extended any further.
+                    del self._in_flight[receipt_handle]
+                    continue
+
+                state[2] = now + self._visibility_timeout
+                expiring.append(message)
+
+        self._change_visibility(expiring, self._visibility_timeout)
+
+    def _release(self, messages):
+        with self._lock:
+            for message in messages:
+                self._in_flight.pop(message.receipt_handle, None)
+        self._change_visibility(messages, 0)
+
+    def _change_visibility(self, messages, visibility_timeout):
+        for i in range(0, len(messages), MAX_BATCH_SIZE):
+            batch = messages[i:i + MAX_BATCH_SIZE]
+            entries = []
+
+            for j, message in enumerate(batch):
+                entry = _BatchEntry(str(j), message.receipt_handle)
+                entries.append((entry, visibility_timeout))
+
+            try:
+                results = self.queue.change_message_visibility_batch(entries)
+            except Exception as e:
+                log.error("Exception caught changing visibility: %s, "
+                          "msg: %s", e.__class__, e)
+                continue
+
+            if visibility_timeout:
+                self.stats.add_extensions(len(results.results))
+
+            for error in results.errors:
+                # Usually the message was deleted by someone else, so stop
+                # tracking it.
+                message = batch[int(error['id'])]
+                log.debug("Failed to change visibility of %s: %s",
+                          message.id, error.get('error_message'))
+                with self._lock:
+                    self._in_flight.pop(message.receipt_handle, None)
+
+
+class _ReceiverThread(threading.Thread):
+    def __init__(self, consumer):
+        super(_ReceiverThread, self).__init__()
+        self.daemon = True
+        self._consumer = consumer
+
+    def run(self):
+        consumer = self._consumer
+
+        while not consumer._stopped.is_set():
+            try:
+                messages = consumer._receive()
+            except Exception as e:
+                log.error("Exception caught receiving: %s, msg: %s",
+                          e.__class__, e)
+                consumer._put(e)
+                # Don't spin if the queue keeps failing.
+                consumer._stopped.wait(1)
+                continue
+
+            for i, message in enumerate(messages):
+                if not consumer._put(message):
+                    # Closing; let the rest be received again.
+                    consumer._release(messages[i:])
+                    return
+
+
+class _AckThread(threading.Thread):
+    """
+    Sends batched deletes & visibility extensions.
+    """
+    def __init__(self, consumer):
+        super(_AckThread, self).__init__()
+        self.daemon = True
+        self._consumer = consumer
+
+    def run(self):
+        consumer = self._consumer
+
+        while not consumer._stopped.is_set():
+            try:
+                consumer._flush_deletes(block=True)
+                if consumer._extend_visibility:
+                    consumer._extend_expiring()
+            except Exception as e:
+                log.error("Exception caught acknowledging: %s, msg: %s",
+                          e.__class__, e)
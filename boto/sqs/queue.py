@@ -24,6 +24,7 @@ Represents an SQS Queue
 """
 from boto.compat import urllib
 from boto.sqs.message import Message
+from boto.sqs.sendbuffer import SendBuffer
 
 
 class Queue(object):
@@ -246,6 +247,20 @@ class Queue(object):
         """
         return self.connection.send_message_batch(self, messages)
 
+    def send_buffer(self, **kwargs):
+        """
+        Returns a buffer that writes messages to this queue in batches of
+        up to 10, from a background thread.
+
+        Keyword arguments are passed to
+        :class:`boto.sqs.sendbuffer.SendBuffer`.
+
+        :rtype: :class:`boto.sqs.sendbuffer.SendBuffer`
+        :return: A buffer whose ``write`` method takes a message & returns
+            a future for its result. Close it once you're done with it.
+        """
+        return SendBuffer(self, **kwargs)
+
     def new_message(self, body='', **kwargs):
         """
         Create new message of appropriate class.
@@ -0,0 +1,367 @@
+# Copyright (c) 2013 Amazon.com, Inc. or its affiliates.  All Rights Reserved
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish, dis-
+# tribute, sublicense, and/or sell copies of the Software, and to permit
+# persons to whom the Software is furnished to do so, subject to the fol-
+# lowing conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABIL-
+# ITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT
+# SHALL THE AUTHOR BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+
+"""
+Buffers messages written to an SQS queue & sends them in batches.
+"""
+import logging
+import random
+import threading
+import time
+
+from boto.compat import six
+from boto.exception import SQSError
+
+
+log = logging.getLogger('boto.sqs.sendbuffer')
+
+# Limits of the ``SendMessageBatch`` API.
+MAX_BATCH_SIZE = 10
+MAX_BATCH_BYTES = 256 * 1024
+
+# The base & cap (in seconds) for the backoff between retries.
+BACKOFF_BASE = 0.05
+BACKOFF_CAP = 5
+
+
+def _size(value):
+    if isinstance(value, six.text_type):
+        value = value.encode('utf-8')
+    return len(value)
+
+
+def message_size(body, message_attributes=None):
+    """
+    Returns how many bytes a message counts for towards the payload limit:
+    its body plus the names, types & values of its attributes.
+    """
+    size = _size(body)
+
+    for name, attribute in (message_attributes or {}).items():
+        size += _size(name)
+        for key in ('data_type', 'string_value', 'binary_value'):
+            if key in attribute:
+                size += _size(attribute[key])
+
+    return size
+
+
+class SendFuture(object):
+    """
+    The pending result of a message written to a :class:`SendBuffer`.
+
+    ``result`` returns the message, with its ``id`` & ``md5`` set, once it
+    has been sent, or raises the reason it couldn't be.
+    """
+    def __init__(self, message):
+        self.message = message
+        self._exception = None
+        self._done = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def done(self):
+        return self._done.is_set()
+
+    def result(self, timeout=None):
+        """
+        Waits up to ``timeout`` seconds for the message to be sent &
+        returns it. Raises the error if it couldn't be sent.
+        """
+        self._wait(timeout)
+
+        if self._exception is not None:
+            raise self._exception
+
+        return self.message
+
+    def exception(self, timeout=None):
+        """
+        Waits up to ``timeout`` seconds & returns the error the message
+        couldn't be sent because of, or ``None``.
+        """
+        self._wait(timeout)
+        return self._exception
+
+    def add_done_callback(self, callback):
+        """
+        Calls ``callback(future)`` once the message has been sent or has
+        failed; straight away if that has already happened.
+        """
+        with self._lock:
+            if not self.done():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def _wait(self, timeout):
+        self._done.wait(timeout)
+        if not self.done():
+            raise RuntimeError('Timed out waiting for the message to be '
+                               'sent.')
+
+    def _finish(self, exception=None):
+        with self._lock:
+            self._exception = exception
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception as e:
+                log.error("Exception caught in callback: %s, msg: %s",
+                          e.__class__, e)
+
+
+class SendBuffer(object):
+    """
+    Collects messages written to a queue & sends them with
+    ``SendMessageBatch``.
+
+    A batch holds up to ``max_batch_size`` messages & ``max_batch_bytes``
+    of payload. A background thread sends a batch as soon as one is full,
+    or once the oldest waiting message has been buffered for
+    ``flush_interval`` seconds. Entries that fail because of a server side
+    error are resent on their own, up to ``max_retries`` times.
+
+    Each ``write`` returns a :class:`SendFuture` for that message.
+
+    Example::
+
+        with queue.send_buffer() as buf:
+            futures = [buf.write(queue.new_message(body)) for body in bodies]
+        for future in futures:
+            print(future.result().id)
+
+    """
+    def __init__(self, queue, max_batch_size=MAX_BATCH_SIZE,
+                 max_batch_bytes=MAX_BATCH_BYTES, flush_interval=0.1,
+                 max_retries=3, max_pending=1000):
+        """
+        :type queue: :class:`boto.sqs.queue.Queue`
+        :param queue: The queue to send messages to.
+
+        :type max_batch_size: int
+        :param max_batch_size: The most messages (up to 10) per request.
+
+        :type max_batch_bytes: int
+        :param max_batch_bytes: The largest payload (up to 256KB) per
+            request.
+
+        :type flush_interval: float
+        :param flush_interval: The longest (in seconds) a message waits to be
+            sent.
+
+        :type max_retries: int
+        :param max_retries: How many times a failed entry is resent.
+
+        :type max_pending: int
+        :param max_pending: How many messages can wait to be sent before
+            ``write`` blocks.
+        """
+        if not 0 < max_batch_size <= MAX_BATCH_SIZE:
+            raise ValueError('max_batch_size must be between 1 & %s.' %
+                             MAX_BATCH_SIZE)
+        if not 0 < max_batch_bytes <= MAX_BATCH_BYTES:
+            raise ValueError('max_batch_bytes must be between 1 & %s.' %
+                             MAX_BATCH_BYTES)
+
+        self.queue = queue
+        self._max_batch_size = max_batch_size
+        self._max_batch_bytes = max_batch_bytes
+        self._flush_interval = flush_interval
+        self._max_retries = max_retries
+        self._max_pending = max_pending
+        # Each entry is [future, body, delay_seconds, size, time written].
+        self._pending = []
+        self._pending_bytes = 0
+        self._sending = 0
+        self._flushing = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def write(self, message, delay_seconds=None):
+        """
+        Buffers ``message`` to be sent & returns a :class:`SendFuture`.
+
+        This blocks while ``max_pending`` messages are waiting to be sent.
+        """
+        body = message.get_body_encoded()
+        size = message_size(body, message.message_attributes)
+
+        if size > MAX_BATCH_BYTES:
+            raise ValueError('Messages can be at most %s bytes.' %
+                             MAX_BATCH_BYTES)
+
+        future = SendFuture(message)
+
+        with self._condition:
+            if self._closed:
+                raise ValueError('Cannot write to a closed send buffer.')
+
+            while len(self._pending) >= self._max_pending:
+                self._condition.wait()
+
+            self._pending.append([future, body, delay_seconds or 0, size,
+                                  time.time()])
+            self._pending_bytes += size
+            self._condition.notify_all()
+
+        return future
+
+    def flush(self):
+        """
+        Sends every buffered message & waits until they've all been sent
+        or have failed.
+        """
+        with self._condition:
+            self._flushing += 1
+            self._condition.notify_all()
+            try:
+                while self._pending or self._sending:
+                    self._condition.wait()
+            finally:
+                self._flushing -= 1
+
+    def close(self):
+        """
+        Sends any buffered messages & stops the background thread.
+        """
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+
+        self._thread.join()
+
+    def _is_ready(self, now):
+        if not self._pending:
+            return False
+
+        return self._closed or self._flushing or \
+            len(self._pending) >= self._max_batch_size or \
+            self._pending_bytes >= self._max_batch_bytes or \
+            now - self._pending[0][4] >= self._flush_interval
+
+    def _take_batch(self):
+        batch = []
+        size = 0
+
+        for entry in self._pending:
+            if len(batch) >= self._max_batch_size:
+                break
+            if batch and size + entry[3] > self._max_batch_bytes:
+                break
+            batch.append(entry)
+            size += entry[3]
+
+        del self._pending[:len(batch)]
+        self._pending_bytes -= size
+        return batch
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._is_ready(time.time()):
+                    if self._closed and not self._pending:
+                        return
+
+                    if self._pending:
+                        timeout = self._pending[0][4] + \
+                            self._flush_interval - time.time()
+                        self._condition.wait(max(timeout, 0.001))
+                    else:
+                        self._condition.wait()
+
+                batch = self._take_batch()
+                self._sending += 1
+                # Wake any writers waiting for room.
+                self._condition.notify_all()
+
+            try:
+                self._send_batch(batch)
+            except Exception as e:
+                log.error("Exception caught sending messages: %s, msg: %s",
+                          e.__class__, e)
+                for entry in batch:
+                    if not entry[0].done():
+                        entry[0]._finish(e)
+            finally:
+                with self._condition:
+                    self._sending -= 1
+                    self._condition.notify_all()
+
+    def _send_batch(self, batch):
+        attempt = 0
+
+        while batch:
+            messages = []
+            for i, entry in enumerate(batch):
+                message = entry[0].message
+                if message.message_attributes:
+                    messages.append((str(i), entry[1], entry[2],
+                                     message.message_attributes))
+                else:
+                    messages.append((str(i), entry[1], entry[2]))
+
+            results = self.queue.write_batch(messages)
+
+            for result in results.results:
+                message = batch[int(result['id'])][0].message
+                message.id = result.get('message_id')
+                message.md5 = result.get('message_md5')
+                batch[int(result['id'])][0]._finish()
+
+            retries = []
+
+            for error in results.errors:
+                entry = batch[int(error['id'])]
+
+                # Only errors on the service's side are worth retrying.
+                if error.get('sender_fault') == 'false' and \
+                        attempt < self._max_retries:
+                    retries.append(entry)
+                    continue
+
+                exception = SQSError(400, error.get('error_code'))
+                exception.error_code = error.get('error_code')
+                exception.message = error.get('error_message')
+                entry[0]._finish(exception)
+
+            if retries:
+                log.debug("Resending %s of %s messages.",
+                          len(retries), len(batch))
+                time.sleep(random.uniform(
+                    0, min(BACKOFF_CAP, BACKOFF_BASE * (2 ** attempt))))
+                attempt += 1
+
+            batch = retries
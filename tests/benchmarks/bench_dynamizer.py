@@ -0,0 +1,123 @@
+# Copyright (c) 2015 Amazon.com, Inc. or its affiliates.  All Rights Reserved
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish, dis-
+# tribute, sublicense, and/or sell copies of the Software, and to permit
+# persons to whom the Software is furnished to do so, subject to the fol-
+# lowing conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABIL-
+# ITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT
+# SHALL THE AUTHOR BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+"""
+Measures DynamoDB item encoding & decoding throughput in items/sec.
+
+Compares the dispatch-table ``Dynamizer`` with the original per-value
+lookups for a few typical item shapes.  Run from the top of the source
+tree::
+
+    python -m tests.benchmarks.bench_dynamizer [--seconds N]
+
+"""
+from __future__ import print_function
+
+import argparse
+import time
+from decimal import Decimal
+
+from boto.dynamodb.types import Binary, Dynamizer, get_dynamodb_type
+
+
+class LegacyDynamizer(Dynamizer):
+    """The original lookups: type checks & ``getattr`` on every value."""
+    def _get_dynamodb_type(self, attr):
+        return get_dynamodb_type(attr)
+
+    def encode(self, attr):
+        dynamodb_type = self._get_dynamodb_type(attr)
+        encoder = getattr(self, '_encode_%s' % dynamodb_type.lower())
+        return {dynamodb_type: encoder(attr)}
+
+    def decode(self, attr):
+        if len(attr) > 1 or not attr:
+            return attr
+        dynamodb_type = list(attr.keys())[0]
+        decoder = getattr(self, '_decode_%s' % dynamodb_type.lower())
+        return decoder(attr[dynamodb_type])
+
+    def encode_item(self, item):
+        raw = {}
+        for key, value in item.items():
+            raw[key] = self.encode(value)
+        return raw
+
+    def decode_item(self, item):
+        data = {}
+        for key, value in item.items():
+            data[key] = self.decode(value)
+        return data
+
+
+SCHEMAS = [
+    ('flat', {
+        'username': 'johndoe',
+        'first_name': 'John',
+        'last_name': 'Doe',
+        'date_joined': 1370000000,
+        'friend_count': 42,
+        'active': True,
+    }),
+    ('sets', {
+        'username': 'johndoe',
+        'tags': set(['admin', 'staff', 'beta']),
+        'scores': set([1, 2, 3, 5, 8]),
+        'avatar': Binary(b'\x89PNG' * 8),
+    }),
+    ('nested', {
+        'username': 'johndoe',
+        'balance': Decimal('1024.25'),
+        'address': {'street': '1 Main St', 'zip': '12345'},
+        'history': [{'at': 1, 'amount': 10}, {'at': 2, 'amount': -5}],
+        'nickname': None,
+    }),
+]
+
+
+def run(func, item, seconds):
+    count = 0
+    start = time.time()
+    deadline = start + seconds
+    while time.time() < deadline:
+        for _ in range(100):
+            func(item)
+        count += 100
+    return count / (time.time() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--seconds', type=float, default=1.0,
+                        help='How long to run each benchmark for.')
+    args = parser.parse_args()
+    for name, item in SCHEMAS:
+        for label, dynamizer in (('legacy', LegacyDynamizer()),
+                                 ('dispatch', Dynamizer())):
+            raw = dynamizer.encode_item(item)
+            encode = run(dynamizer.encode_item, item, args.seconds)
+            decode = run(dynamizer.decode_item, raw, args.seconds)
+            print('%-8s %-10s encode %10.0f items/sec  decode %10.0f '
+                  'items/sec' % (name, label, encode, decode))
+
+
+if __name__ == '__main__':
+    main()
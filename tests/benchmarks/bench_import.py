@@ -0,0 +1,111 @@
+# Copyright (c) 2015 Amazon.com, Inc. or its affiliates.  All Rights Reserved
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish, dis-
+# tribute, sublicense, and/or sell copies of the Software, and to permit
+# persons to whom the Software is furnished to do so, subject to the fol-
+# lowing conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABIL-
+# ITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT
+# SHALL THE AUTHOR BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+"""
+Measures how long ``import boto`` takes, using ``python -X importtime``
+(Python 3.7+) in a fresh interpreter for each run.
+
+Run from the top of the source tree::
+
+    python -m tests.benchmarks.bench_import [--runs N] [--module NAME]
+
+"""
+from __future__ import print_function
+
+import argparse
+import os
+import subprocess
+import sys
+
+
+def import_times(module):
+    """
+    Imports ``module`` in a new interpreter & returns a dict of the self &
+    cumulative import times (in microseconds) of every module imported.
+    """
+    env = dict(os.environ)
+    # Otherwise the first run includes compiling the modules.
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    process = subprocess.Popen(
+        [sys.executable, '-X', 'importtime', '-c', 'import %s' % module],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
+    stdout, stderr = process.communicate()
+    if process.returncode != 0:
+        raise RuntimeError(stderr.decode('utf-8', 'replace'))
+
+    times = {}
+    for line in stderr.decode('utf-8').splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        try:
+            self_us, cumulative_us = int(fields[0]), int(fields[1])
+        except ValueError:
+            # The header line.
+            continue
+        times[fields[2].strip()] = (self_us, cumulative_us)
+    return times
+
+
+def median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--runs', type=int, default=10,
+                        help='How many interpreters to time the import in.')
+    parser.add_argument('--module', default='boto',
+                        help='The module to import.')
+    parser.add_argument('--top', type=int, default=15,
+                        help='How many of the slowest modules to show.')
+    args = parser.parse_args()
+
+    if sys.version_info < (3, 7):
+        parser.error('-X importtime needs Python 3.7 or later.')
+
+    # Warm up the bytecode cache.
+    import_times(args.module)
+    runs = [import_times(args.module) for _ in range(args.runs)]
+
+    total = median([run[args.module][1] for run in runs])
+    print('%-40s %10.1f ms' % ('import %s' % args.module, total / 1000.0))
+    print()
+
+    names = set()
+    for run in runs:
+        names.update(run)
+    self_times = []
+    for name in names:
+        self_times.append((median([run.get(name, (0, 0))[0]
+                                   for run in runs]), name))
+    self_times.sort(reverse=True)
+    print('Slowest modules (self time):')
+    for self_us, name in self_times[:args.top]:
+        print('%-40s %10.1f ms' % (name, self_us / 1000.0))
+
+
+if __name__ == '__main__':
+    main()
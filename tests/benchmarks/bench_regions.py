@@ -0,0 +1,91 @@
+# Copyright (c) 2015 Amazon.com, Inc. or its affiliates.  All Rights Reserved
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish, dis-
+# tribute, sublicense, and/or sell copies of the Software, and to permit
+# persons to whom the Software is furnished to do so, subject to the fol-
+# lowing conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABIL-
+# ITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT
+# SHALL THE AUTHOR BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+"""
+Measures the cost of looking up regions & connecting to one.
+
+Run from the top of the source tree::
+
+    python -m tests.benchmarks.bench_regions [--seconds N]
+
+"""
+from __future__ import print_function
+
+import argparse
+import time
+
+import boto.sqs
+from boto.regioninfo import RegionInfo, connect, get_regions, load_regions
+from boto.sqs.connection import SQSConnection
+from boto.sqs.regioninfo import SQSRegionInfo
+
+
+def load_and_build():
+    # What ``get_regions`` did before the endpoints were cached.
+    endpoints = load_regions()
+    return [RegionInfo(name=name, endpoint=endpoint)
+            for name, endpoint in endpoints['sqs'].items()]
+
+
+def get_all_regions():
+    return get_regions('sqs')
+
+
+def connect_to_region():
+    return boto.sqs.connect_to_region('us-west-2', aws_access_key_id='a',
+                                      aws_secret_access_key='b')
+
+
+def connect_directly():
+    return connect('sqs', 'us-west-2', region_cls=SQSRegionInfo,
+                   connection_cls=SQSConnection, aws_access_key_id='a',
+                   aws_secret_access_key='b')
+
+
+def run(func, seconds):
+    count = 0
+    start = time.time()
+    deadline = start + seconds
+    while time.time() < deadline:
+        for _ in range(10):
+            func()
+        count += 10
+    return count / (time.time() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--seconds', type=float, default=2.0,
+                        help='How long to run each benchmark for.')
+    args = parser.parse_args()
+    benchmarks = [
+        ('load_regions', load_and_build),
+        ('get_regions', get_all_regions),
+        ('connect_to_region', connect_to_region),
+        ('regioninfo.connect', connect_directly),
+    ]
+    for name, func in benchmarks:
+        rate = run(func, args.seconds)
+        print('%-20s %10.0f calls/sec' % (name, rate))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+# Copyright (c) 2015 Amazon.com, Inc. or its affiliates.  All Rights Reserved
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish, dis-
+# tribute, sublicense, and/or sell copies of the Software, and to permit
+# persons to whom the Software is furnished to do so, subject to the fol-
+# lowing conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABIL-
+# ITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT
+# SHALL THE AUTHOR BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+"""
+Measures SigV4 signing throughput.
+
+Run from the top of the source tree::
+
+    python -m tests.benchmarks.bench_sigv4 [--seconds N]
+
+"""
+from __future__ import print_function
+
+import argparse
+import time
+
+from boto.auth import HmacAuthV4Handler, S3HmacAuthV4Handler
+from boto.connection import HTTPRequest
+from boto.provider import Provider
+
+
+def make_query_request():
+    return HTTPRequest(
+        'POST', 'https', 'sqs.us-west-2.amazonaws.com', 443, '/', None,
+        {'Action': 'SendMessage', 'MessageBody': 'x' * 256,
+         'QueueUrl': 'https://sqs.us-west-2.amazonaws.com/123/queue',
+         'Version': '2012-11-05'},
+        {}, '')
+
+
+def make_s3_request():
+    return HTTPRequest(
+        'GET', 'https', 'bucket.s3-us-west-2.amazonaws.com', 443,
+        '/some/key/name.txt', None, {},
+        {'User-Agent': 'Boto', 'x-amz-meta-foo': 'bar'}, '')
+
+
+def run(handler, make_request, seconds):
+    count = 0
+    start = time.time()
+    deadline = start + seconds
+    while time.time() < deadline:
+        for _ in range(100):
+            handler.add_auth(make_request())
+        count += 100
+    return count / (time.time() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--seconds', type=float, default=2.0,
+                        help='How long to run each benchmark for.')
+    args = parser.parse_args()
+    provider = Provider('aws', access_key='access_key',
+                        secret_key='secret_key')
+    handlers = [
+        ('HmacAuthV4Handler',
+         HmacAuthV4Handler('sqs.us-west-2.amazonaws.com', None, provider),
+         make_query_request),
+        ('S3HmacAuthV4Handler',
+         S3HmacAuthV4Handler('bucket.s3-us-west-2.amazonaws.com', None,
+                             provider),
+         make_s3_request),
+    ]
+    for name, handler, make_request in handlers:
+        rate = run(handler, make_request, args.seconds)
+        print('%-20s %10.0f signatures/sec' % (name, rate))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+# Copyright (c) 2015 Amazon.com, Inc. or its affiliates.  All Rights Reserved
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish, dis-
+# tribute, sublicense, and/or sell copies of the Software, and to permit
+# persons to whom the Software is furnished to do so, subject to the fol-
+# lowing conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABIL-
+# ITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT
+# SHALL THE AUTHOR BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+"""
+Measures Glacier tree hash throughput in GB/s.
+
+Compares the original implementation (list.pop(0) tree building and a
+serial read of the file) with the mapped and threaded paths of
+``compute_hashes_from_fileobj``.  Run from the top of the source tree::
+
+    python -m tests.benchmarks.bench_tree_hash [--size-mb N] [--threads N]
+
+"""
+from __future__ import print_function
+
+import argparse
+import hashlib
+import os
+import tempfile
+import time
+
+from boto.glacier.utils import compute_hashes_from_fileobj
+
+
+_MEGABYTE = 1024 * 1024
+
+
+def legacy_tree_hash(fo):
+    hashes = []
+    hashes.extend(fo)
+    while len(hashes) > 1:
+        new_hashes = []
+        while True:
+            if len(hashes) > 1:
+                first = hashes.pop(0)
+                second = hashes.pop(0)
+                new_hashes.append(hashlib.sha256(first + second).digest())
+            elif len(hashes) == 1:
+                new_hashes.append(hashes.pop(0))
+            else:
+                break
+        hashes.extend(new_hashes)
+    return hashes[0]
+
+
+def legacy_compute_hashes(fileobj, chunk_size=_MEGABYTE):
+    linear_hash = hashlib.sha256()
+    chunks = []
+    chunk = fileobj.read(chunk_size)
+    while chunk:
+        linear_hash.update(chunk)
+        chunks.append(hashlib.sha256(chunk).digest())
+        chunk = fileobj.read(chunk_size)
+    return linear_hash.hexdigest(), legacy_tree_hash(chunks)
+
+
+def timed(func, filename, size):
+    with open(filename, 'rb') as f:
+        start = time.time()
+        func(f)
+        elapsed = time.time() - start
+    return size / elapsed / 1024 ** 3
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--size-mb', type=int, default=512,
+                        help='Size of the file to hash.')
+    parser.add_argument('--threads', type=int, default=4,
+                        help='Threads for the threaded run.')
+    args = parser.parse_args()
+    size = args.size_mb * _MEGABYTE
+    fd, filename = tempfile.mkstemp()
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            block = os.urandom(_MEGABYTE)
+            for _ in range(args.size_mb):
+                f.write(block)
+        runs = [
+            ('legacy', legacy_compute_hashes),
+            ('mapped', compute_hashes_from_fileobj),
+            ('mapped, %d threads' % args.threads,
+             lambda f: compute_hashes_from_fileobj(
+                 f, num_threads=args.threads)),
+        ]
+        for name, func in runs:
+            print('%-20s %6.2f GB/s' % (name, timed(func, filename, size)))
+    finally:
+        os.remove(filename)
+
+
+if __name__ == '__main__':
+    main()
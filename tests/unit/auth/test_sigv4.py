@@ -80,6 +80,20 @@ class TestSigV4Handler(unittest.TestCase):
         query_string = auth.canonical_query_string(request)
         self.assertEqual(query_string, 'Foo.1=aaa&Foo.10=zzz')
 
+    def test_canonical_query_string_is_reused_until_params_change(self):
+        auth = HmacAuthV4Handler('glacier.us-east-1.amazonaws.com',
+                                 mock.Mock(), self.provider)
+        request = HTTPRequest(
+            'GET', 'https', 'glacier.us-east-1.amazonaws.com', 443,
+            '/-/vaults/foo/archives', None, {'b': '2', 'a': '1'}, {}, '')
+        self.assertEqual(auth.canonical_query_string(request), 'a=1&b=2')
+        with mock.patch('boto.auth.urllib.parse.quote') as quote:
+            self.assertEqual(auth.canonical_query_string(request), 'a=1&b=2')
+            self.assertFalse(quote.called)
+        request.params['c'] = 'x y'
+        self.assertEqual(auth.canonical_query_string(request),
+                         'a=1&b=2&c=x%20y')
+
     def test_query_string(self):
         auth = HmacAuthV4Handler('sns.us-east-1.amazonaws.com',
                                  mock.Mock(), self.provider)
@@ -262,6 +276,34 @@ class TestSigV4Handler(unittest.TestCase):
 
         self.assertIn('f00', canonical)
 
+    def test_signing_key_is_cached(self):
+        auth = HmacAuthV4Handler('glacier.us-east-1.amazonaws.com',
+                                 mock.Mock(), self.provider)
+        key = auth.signing_key('20121121', 'us-east-1', 'glacier')
+        with mock.patch.object(auth, '_sign') as _sign:
+            self.assertEqual(
+                auth.signing_key('20121121', 'us-east-1', 'glacier'), key)
+            self.assertFalse(_sign.called)
+
+    def test_signing_key_cache_follows_credential_rotation(self):
+        auth = HmacAuthV4Handler('glacier.us-east-1.amazonaws.com',
+                                 mock.Mock(), self.provider)
+        key = auth.signing_key('20121121', 'us-east-1', 'glacier')
+        self.provider.secret_key = 'rotated_secret_key'
+        self.assertNotEqual(
+            auth.signing_key('20121121', 'us-east-1', 'glacier'), key)
+
+    def test_signature_is_stable_across_resigning(self):
+        auth = HmacAuthV4Handler('glacier.us-east-1.amazonaws.com',
+                                 mock.Mock(), self.provider)
+        self.request.headers['X-Amz-Date'] = '20121121T000000Z'
+        canonical_request = auth.canonical_request(self.request)
+        sts = auth.string_to_sign(self.request, canonical_request)
+        first = auth.signature(self.request, sts)
+        self.assertEqual(auth.signature(self.request, sts), first)
+        self.assertEqual(self.request.signed_headers,
+                         'host;x-amz-date;x-amz-glacier-version')
+
 
 class TestS3HmacAuthV4Handler(unittest.TestCase):
     def setUp(self):
@@ -95,6 +95,65 @@ class TestDynamizer(unittest.TestCase):
         self.assertEqual(dynamizer.decode({'NS': ['1.1', '2.2', '3.3']}),
                          set([1.1, 2.2, 3.3]))
 
+    def test_large_integers(self):
+        dynamizer = types.Dynamizer()
+        self.assertEqual(dynamizer.encode(-12345), {'N': '-12345'})
+        self.assertEqual(dynamizer.encode(10 ** 37), {'N': str(10 ** 37)})
+        # Too many digits to be stored exactly.
+        with self.assertRaises(DynamoDBNumberError):
+            dynamizer.encode(10 ** 38 + 1)
+
+    def test_subclasses_of_simple_types(self):
+        class MyString(six.text_type):
+            pass
+
+        class MyDict(dict):
+            pass
+
+        dynamizer = types.Dynamizer()
+        self.assertEqual(dynamizer.encode(MyString('foo')), {'S': 'foo'})
+        self.assertEqual(dynamizer.encode(MyDict(foo=1)),
+                         {'M': {'foo': {'N': '1'}}})
+
+    def test_overridden_encoders_and_decoders(self):
+        class UpperDynamizer(types.Dynamizer):
+            def _encode_s(self, attr):
+                return attr.upper()
+
+            def _decode_s(self, attr):
+                return attr.lower()
+
+        dynamizer = UpperDynamizer()
+        self.assertEqual(dynamizer.encode('foo'), {'S': 'FOO'})
+        self.assertEqual(dynamizer.decode({'S': 'FOO'}), 'foo')
+        self.assertEqual(dynamizer.decode({'s': 'FOO'}), {'s': 'FOO'})
+
+    def test_encode_decode_item(self):
+        dynamizer = types.Dynamizer()
+        item = {
+            'username': 'johndoe',
+            'age': 42,
+            'tags': set(['a']),
+            'active': True,
+            'profile': {'score': Decimal('1.5')},
+        }
+        encoded = dynamizer.encode_item(item)
+        self.assertEqual(encoded, {
+            'username': {'S': 'johndoe'},
+            'age': {'N': '42'},
+            'tags': {'SS': ['a']},
+            'active': {'BOOL': True},
+            'profile': {'M': {'score': {'N': '1.5'}}},
+        })
+        self.assertEqual(dynamizer.decode_item(encoded), item)
+
+    def test_dispatch_tables_are_not_pickled(self):
+        dynamizer = types.Dynamizer()
+        dynamizer.encode('foo')
+        dynamizer.decode({'S': 'foo'})
+        self.assertNotIn('_encoders', dynamizer.__getstate__())
+        self.assertNotIn('_decoders', dynamizer.__getstate__())
+
 
 class TestBinary(unittest.TestCase):
     def test_good_input(self):
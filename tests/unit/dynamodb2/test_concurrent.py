@@ -0,0 +1,54 @@
+from tests.compat import mock, unittest
+from boto.dynamodb2.concurrent import (CapacityLimiter, backoff_delay,
+                                       consumed_capacity_units)
+
+
+class BackoffTestCase(unittest.TestCase):
+    def test_backoff_delay_is_capped(self):
+        for attempt in range(20):
+            delay = backoff_delay(attempt, base=0.1, cap=1)
+            self.assertTrue(0 <= delay <= min(1, 0.1 * 2 ** attempt))
+
+
+class CapacityLimiterTestCase(unittest.TestCase):
+    def test_no_wait_within_burst(self):
+        limiter = CapacityLimiter(10)
+
+        with mock.patch('time.sleep') as mock_sleep:
+            limiter.consume(10)
+
+        self.assertFalse(mock_sleep.called)
+
+    def test_waits_to_repay_debt(self):
+        limiter = CapacityLimiter(10)
+
+        with mock.patch('time.time', return_value=100.0):
+            limiter._last = 100.0
+            limiter.adjust(10)
+
+            with mock.patch('time.sleep') as mock_sleep:
+                limiter.consume(5)
+
+        mock_sleep.assert_called_once_with(0.5)
+
+    def test_rejects_bad_rate(self):
+        with self.assertRaises(ValueError):
+            CapacityLimiter(0)
+
+
+class ConsumedCapacityTestCase(unittest.TestCase):
+    def test_sums_units_for_table(self):
+        response = {'ConsumedCapacity': [
+            {'TableName': 'users', 'CapacityUnits': 2.0},
+            {'TableName': 'other', 'CapacityUnits': 5.0},
+            {'TableName': 'users', 'CapacityUnits': 1.5},
+        ]}
+        self.assertEqual(consumed_capacity_units(response, 'users'), 3.5)
+
+    def test_single_entry(self):
+        response = {'ConsumedCapacity': {'TableName': 'users',
+                                         'CapacityUnits': 3.0}}
+        self.assertEqual(consumed_capacity_units(response, 'users'), 3.0)
+
+    def test_missing(self):
+        self.assertEqual(consumed_capacity_units({}, 'users'), None)
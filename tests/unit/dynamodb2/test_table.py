@@ -1,3 +1,5 @@
+import gc
+
 from tests.compat import mock, unittest
 from boto.dynamodb2 import exceptions
 from boto.dynamodb2.fields import (HashKey, RangeKey,
@@ -6,7 +8,8 @@ from boto.dynamodb2.fields import (HashKey, RangeKey,
                                    GlobalIncludeIndex)
 from boto.dynamodb2.items import Item
 from boto.dynamodb2.layer1 import DynamoDBConnection
-from boto.dynamodb2.results import ResultSet, BatchGetResultSet
+from boto.dynamodb2.results import (ResultSet, BatchGetResultSet,
+                                    ParallelScanResultSet)
 from boto.dynamodb2.table import Table
 from boto.dynamodb2.types import (STRING, NUMBER, BINARY,
                                   FILTER_OPERATORS, QUERY_OPERATORS)
@@ -1072,6 +1075,67 @@ class ResultSetTestCase(unittest.TestCase):
         ])
 
 
+class PrefetchResultSetTestCase(unittest.TestCase):
+    def test_list(self):
+        results = ResultSet(prefetch=2)
+        results.to_call(fake_results, 'john', greeting='Hello', limit=20)
+        self.assertEqual(list(results), [
+            'Hello john #%s' % i for i in range(13)
+        ])
+        self.assertEqual(results._fetches, 3)
+
+    def test_limit_greater_than_page(self):
+        results = ResultSet(prefetch=2)
+        results.to_call(fake_results, 'john', greeting='Hello', limit=6)
+        self.assertEqual(list(results), [
+            'Hello john #%s' % i for i in range(6)
+        ])
+
+    def test_max_page_size(self):
+        the_callable = mock.MagicMock(side_effect=fake_results)
+        results = ResultSet(max_page_size=10, prefetch=1)
+        results.to_call(the_callable, 'john', greeting='Hello', limit=3)
+        self.assertEqual(len(list(results)), 3)
+        the_callable.assert_called_once_with('john', greeting='Hello',
+                                             limit=3)
+
+    def test_pages_are_fetched_ahead(self):
+        the_callable = mock.MagicMock(side_effect=fake_results)
+        results = ResultSet(prefetch=5)
+        results.to_call(the_callable, 'john', greeting='Hello', limit=20)
+        self.assertEqual(next(results), 'Hello john #0')
+        # The remaining pages are fetched without further iteration.
+        results._prefetcher.join(5)
+        self.assertEqual(the_callable.call_count, 3)
+        self.assertEqual(len(list(results)), 12)
+
+    def test_errors_are_raised(self):
+        def failing(limit=None, exclusive_start_key=None):
+            if exclusive_start_key:
+                raise JSONResponseError(400, 'Bad Request')
+            return {'results': ['Result #0'], 'last_key': 'page-1'}
+
+        results = ResultSet(prefetch=2)
+        results.to_call(failing)
+        self.assertEqual(next(results), 'Result #0')
+        self.assertRaises(JSONResponseError, results.next)
+
+    def test_abandoned_results_stop_the_thread(self):
+        def endless(limit=None, exclusive_start_key=None):
+            page = exclusive_start_key or 0
+            return {'results': ['Result #%s' % page], 'last_key': page + 1}
+
+        results = ResultSet(prefetch=1)
+        results.to_call(endless)
+        self.assertEqual(next(results), 'Result #0')
+        thread = results._prefetcher
+        del results
+        gc.collect()
+
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+
+
 def fake_batch_results(keys):
     results = []
     simulate_unprocessed = True
@@ -1145,6 +1209,149 @@ class BatchGetResultSetTestCase(unittest.TestCase):
         self.assertEqual(next(self.results), 'hello johndoe')
         self.assertRaises(StopIteration, self.results.next)
 
+    def test_prefetch(self):
+        unprocessed = ['johndoe']
+
+        def batch_results(keys):
+            # Leave ``johndoe`` unprocessed the first time around.
+            retval = {'results': [], 'last_key': None}
+
+            for key in keys:
+                if key in unprocessed:
+                    unprocessed.remove(key)
+                    retval['unprocessed_keys'] = [key]
+                else:
+                    retval['results'].append('hello %s' % key)
+
+            return retval
+
+        results = BatchGetResultSet(keys=[
+            'alice',
+            'bob',
+            'jane',
+            'johndoe',
+        ], max_batch_get=1, prefetch=3)
+        results.to_call(batch_results)
+        self.assertEqual(sorted(results), [
+            'hello alice',
+            'hello bob',
+            'hello jane',
+            'hello johndoe',
+        ])
+        self.assertEqual(results._workers, [])
+
+    def test_prefetch_keeps_batches_in_flight(self):
+        the_callable = mock.MagicMock(side_effect=lambda keys: {
+            'results': ['hello %s' % key for key in keys],
+        })
+        results = BatchGetResultSet(keys=['user%s' % i for i in range(10)],
+                                    max_batch_get=2, prefetch=3)
+        results.to_call(the_callable)
+        self.assertEqual(len(list(results)), 10)
+        self.assertEqual(the_callable.call_count, 5)
+
+    def test_prefetch_raises_errors(self):
+        def failing(keys):
+            raise JSONResponseError(400, 'Bad Request')
+
+        results = BatchGetResultSet(keys=['alice', 'bob'], max_batch_get=1,
+                                    prefetch=2)
+        results.to_call(failing)
+        self.assertRaises(JSONResponseError, results.next)
+
+    def test_abandoned_results_stop_the_workers(self):
+        results = BatchGetResultSet(keys=['user%s' % i for i in range(10)],
+                                    max_batch_get=1, prefetch=2)
+        results.to_call(fake_batch_results)
+        next(results)
+        workers = results._workers
+        del results
+        gc.collect()
+
+        for worker in workers:
+            worker.join(5)
+            self.assertFalse(worker.is_alive())
+
+
+def fake_segment_results(segment, total_segments, exclusive_start_key=None,
+                         limit=None, **kwargs):
+    # Each segment has three pages of two items.
+    page = exclusive_start_key or 0
+    last_key = page + 1 if page < 2 else None
+    return {
+        'results': ['s%d p%d i%d' % (segment, page, i) for i in range(2)],
+        'last_key': last_key,
+    }
+
+
+class ParallelScanResultSetTestCase(unittest.TestCase):
+    def test_iteration(self):
+        the_callable = mock.Mock(side_effect=fake_segment_results)
+        results = ParallelScanResultSet(the_callable, total_segments=4,
+                                        workers=2, greeting='Hello')
+        items = list(results)
+
+        self.assertEqual(len(items), 24)
+        self.assertEqual(set(items), set(
+            's%d p%d i%d' % (s, p, i)
+            for s in range(4) for p in range(3) for i in range(2)
+        ))
+        self.assertEqual(the_callable.call_count, 12)
+        self.assertEqual(results._fetches, 12)
+
+        for call in the_callable.call_args_list:
+            self.assertEqual(call[1]['greeting'], 'Hello')
+            self.assertEqual(call[1]['total_segments'], 4)
+
+    def test_pages_are_in_order_within_a_segment(self):
+        results = ParallelScanResultSet(fake_segment_results,
+                                        total_segments=3)
+        items = [item for item in results if item.startswith('s1 ')]
+        self.assertEqual(items, [
+            's1 p0 i0', 's1 p0 i1',
+            's1 p1 i0', 's1 p1 i1',
+            's1 p2 i0', 's1 p2 i1',
+        ])
+
+    def test_limit(self):
+        results = ParallelScanResultSet(fake_segment_results,
+                                        total_segments=4, limit=5,
+                                        max_page_size=2)
+        self.assertEqual(len(list(results)), 5)
+        self.assertTrue(results._closed)
+
+    def test_errors_are_raised(self):
+        def failing(segment, **kwargs):
+            if segment == 1:
+                raise JSONResponseError(400, 'Bad Request')
+            return fake_segment_results(segment, **kwargs)
+
+        results = ParallelScanResultSet(failing, total_segments=2)
+
+        with self.assertRaises(JSONResponseError):
+            list(results)
+
+    def test_abandoned_results_stop_the_threads(self):
+        def endless(segment, exclusive_start_key=None, **kwargs):
+            page = exclusive_start_key or 0
+            return {'results': ['s%d p%d' % (segment, page)],
+                    'last_key': page + 1}
+
+        results = ParallelScanResultSet(endless, total_segments=4,
+                                        workers=2, max_buffered_pages=1)
+        next(results)
+        threads = results._threads
+        del results
+        gc.collect()
+
+        for thread in threads:
+            thread.join(5)
+            self.assertFalse(thread.is_alive())
+
+    def test_bad_total_segments(self):
+        with self.assertRaises(ValueError):
+            ParallelScanResultSet(fake_segment_results, total_segments=0)
+
 
 class TableTestCase(unittest.TestCase):
     def setUp(self):
@@ -1884,6 +2091,34 @@ class TableTestCase(unittest.TestCase):
 
         mock_describe.assert_called_once_with('users')
 
+    def test_parallel_scan(self):
+        items_1 = {
+            'Items': [
+                {'username': {'S': 'johndoe'}},
+            ],
+        }
+
+        with mock.patch.object(
+                self.users.connection,
+                'scan',
+                return_value=items_1) as mock_scan:
+            results = self.users.parallel_scan(total_segments=2,
+                                               first_name__eq='John')
+            usernames = [res['username'] for res in results]
+
+        self.assertEqual(usernames, ['johndoe', 'johndoe'])
+        self.assertEqual(mock_scan.call_count, 2)
+        segments = sorted(
+            call[1]['segment'] for call in mock_scan.call_args_list
+        )
+        self.assertEqual(segments, [0, 1])
+        self.assertEqual(mock_scan.call_args[1]['scan_filter'], {
+            'first_name': {
+                'AttributeValueList': [{'S': 'John'}],
+                'ComparisonOperator': 'EQ',
+            },
+        })
+
     def test_batch_write_no_writes(self):
         with mock.patch.object(
                 self.users.connection,
@@ -2082,6 +2317,138 @@ class TableTestCase(unittest.TestCase):
             # Post-exit, this should be emptied.
             self.assertEqual(len(batch._unprocessed), 0)
 
+    def test_batch_write_resend_backs_off(self):
+        unprocessed = {
+            'UnprocessedItems': {
+                'users': [
+                    {'DeleteRequest': {'Key': {'username': {'S': 'jane'}}}},
+                ],
+            },
+        }
+
+        with mock.patch.object(
+                self.users.connection,
+                'batch_write_item',
+                side_effect=[unprocessed, unprocessed, {}]) as mock_batch:
+            with mock.patch('time.sleep') as mock_sleep:
+                batch = self.users.batch_write()
+                batch._unprocessed = list(
+                    unprocessed['UnprocessedItems']['users'])
+                batch.resend_unprocessed()
+
+        self.assertEqual(mock_batch.call_count, 3)
+        self.assertEqual(mock_sleep.call_count, 2)
+        self.assertEqual(batch._unprocessed, [])
+
+    def test_batch_write_workers(self):
+        self.users.schema = [HashKey('username')]
+
+        with mock.patch.object(
+                self.users.connection,
+                'batch_write_item',
+                return_value={}) as mock_batch:
+            with self.users.batch_write(workers=3) as batch:
+                for i in range(60):
+                    batch.put_item(data={'username': 'user%d' % i})
+
+        self.assertEqual(mock_batch.call_count, 3)
+        written = set()
+
+        for call in mock_batch.call_args_list:
+            for request in call[0][0]['users']:
+                written.add(request['PutRequest']['Item']['username']['S'])
+
+        self.assertEqual(written, set('user%d' % i for i in range(60)))
+
+    def test_batch_write_workers_dedupes_keys(self):
+        self.users.schema = [HashKey('username')]
+
+        with mock.patch.object(
+                self.users.connection,
+                'batch_write_item',
+                return_value={}) as mock_batch:
+            with self.users.batch_write(workers=1) as batch:
+                batch.put_item(data={'username': 'jane', 'age': 1})
+                batch.put_item(data={'username': 'jane', 'age': 2})
+                batch.delete_item(username='bob')
+
+        self.assertEqual(mock_batch.call_count, 1)
+        requests = mock_batch.call_args[0][0]['users']
+        # Order within a batch doesn't matter to DynamoDB.
+        requests.sort(key=lambda request: list(request.keys()))
+        self.assertEqual(requests, [
+            {
+                'DeleteRequest': {
+                    'Key': {
+                        'username': {'S': 'bob'},
+                    }
+                }
+            },
+            {
+                'PutRequest': {
+                    'Item': {
+                        'username': {'S': 'jane'},
+                        'age': {'N': '2'},
+                    }
+                }
+            },
+        ])
+
+    def test_batch_write_workers_retry_unprocessed(self):
+        self.users.schema = [HashKey('username')]
+        unprocessed = {
+            'UnprocessedItems': {
+                'users': [
+                    {'DeleteRequest': {'Key': {'username': {'S': 'jane'}}}},
+                ],
+            },
+        }
+
+        with mock.patch.object(
+                self.users.connection,
+                'batch_write_item',
+                side_effect=[unprocessed, {}]) as mock_batch:
+            with mock.patch('time.sleep') as mock_sleep:
+                with self.users.batch_write(workers=1) as batch:
+                    batch.delete_item(username='jane')
+                    batch.delete_item(username='bob')
+
+        self.assertEqual(mock_batch.call_count, 2)
+        self.assertEqual(mock_sleep.call_count, 1)
+        self.assertEqual(mock_batch.call_args[0][0], {
+            'users': unprocessed['UnprocessedItems']['users'],
+        })
+        self.assertEqual(batch._unprocessed, [])
+
+    def test_batch_write_workers_raise_errors(self):
+        self.users.schema = [HashKey('username')]
+
+        with mock.patch.object(
+                self.users.connection,
+                'batch_write_item',
+                side_effect=JSONResponseError(400, 'Bad Request')):
+            with self.assertRaises(JSONResponseError):
+                with self.users.batch_write(workers=2) as batch:
+                    batch.delete_item(username='jane')
+
+    def test_batch_write_workers_write_capacity(self):
+        self.users.schema = [HashKey('username')]
+
+        with mock.patch.object(
+                self.users.connection,
+                'batch_write_item',
+                return_value={'ConsumedCapacity': [
+                    {'TableName': 'users', 'CapacityUnits': 1.0},
+                ]}) as mock_batch:
+            with self.users.batch_write(workers=1,
+                                        write_capacity=100) as batch:
+                batch.delete_item(username='jane')
+
+        self.assertEqual(
+            mock_batch.call_args[1],
+            {'return_consumed_capacity': 'TOTAL'}
+        )
+
     def test__build_filters(self):
         filters = self.users._build_filters({
             'username__eq': 'johndoe',
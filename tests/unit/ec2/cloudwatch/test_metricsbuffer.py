@@ -0,0 +1,161 @@
+import os
+import shutil
+import tempfile
+
+from tests.compat import mock, unittest
+
+from boto.ec2.cloudwatch import CloudWatchConnection
+from boto.ec2.cloudwatch.metricsbuffer import MetricsBuffer
+from tests.unit import AWSMockServiceTestCase
+
+
+class TestMetricsBuffer(unittest.TestCase):
+    def setUp(self):
+        self.connection = mock.Mock()
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+
+    def create_buffer(self, **kwargs):
+        kwargs.setdefault('flush_interval', 3600)
+        metrics = MetricsBuffer(self.connection, **kwargs)
+        self.addCleanup(metrics._stopped.set)
+        return metrics
+
+    def sent(self):
+        calls = []
+        for call in self.connection.put_metric_data.call_args_list:
+            args, kwargs = call
+            for i, name in enumerate(args[1]):
+                calls.append((args[0], name, kwargs['unit'][i],
+                              kwargs['dimensions'][i],
+                              kwargs['statistics'][i]))
+        return sorted(calls, key=lambda call: (call[0], call[1],
+                                               sorted(call[3].items())))
+
+    def test_aggregates_observations(self):
+        metrics = self.create_buffer()
+        for value in (3, 1, 5):
+            metrics.put('App', 'Latency', value, unit='Milliseconds',
+                        dimensions={'Operation': 'Get'})
+        metrics.put('App', 'Latency', 10, unit='Milliseconds',
+                    dimensions={'Operation': 'Put'})
+        metrics.put('App', 'Errors', 1)
+        metrics.flush()
+
+        self.assertEqual(self.sent(), [
+            ('App', 'Errors', 'None', {},
+             {'minimum': 1, 'maximum': 1, 'sum': 1, 'samplecount': 1}),
+            ('App', 'Latency', 'Milliseconds', {'Operation': 'Get'},
+             {'minimum': 1, 'maximum': 5, 'sum': 9, 'samplecount': 3}),
+            ('App', 'Latency', 'Milliseconds', {'Operation': 'Put'},
+             {'minimum': 10, 'maximum': 10, 'sum': 10, 'samplecount': 1}),
+        ])
+        self.assertEqual(self.connection.put_metric_data.call_count, 1)
+
+        # Nothing is sent when nothing was observed.
+        metrics.flush()
+        self.assertEqual(self.connection.put_metric_data.call_count, 1)
+
+    def test_dimension_order_does_not_matter(self):
+        metrics = self.create_buffer()
+        metrics.put('App', 'Latency', 1, dimensions={'a': '1', 'b': '2'})
+        metrics.put('App', 'Latency', 2, dimensions={'b': '2', 'a': '1'})
+        metrics.flush()
+        [sent] = self.sent()
+        self.assertEqual(sent[4]['samplecount'], 2)
+
+    def test_packs_datums_per_call(self):
+        metrics = self.create_buffer()
+        for i in range(45):
+            metrics.put('App', 'Metric%s' % i, i)
+        metrics.put('Other', 'Metric', 1)
+        metrics.flush()
+
+        sizes = sorted(len(call[0][1]) for call in
+                       self.connection.put_metric_data.call_args_list)
+        self.assertEqual(sizes, [1, 5, 20, 20])
+
+    def test_retries_failed_calls(self):
+        metrics = self.create_buffer()
+        self.connection.put_metric_data.side_effect = [IOError('Broken'),
+                                                       True]
+        metrics.put('App', 'Metric', 1)
+        metrics.flush()
+        self.assertEqual(len(metrics._pending), 1)
+        metrics.flush()
+        self.assertEqual(len(metrics._pending), 0)
+        self.assertEqual(self.connection.put_metric_data.call_count, 2)
+
+    def test_drops_calls_when_backlogged(self):
+        metrics = self.create_buffer(max_pending_calls=1)
+        self.connection.put_metric_data.side_effect = IOError('Broken')
+        metrics.put('App', 'Metric', 1)
+        metrics.flush()
+        metrics.put('App', 'Metric', 2)
+        metrics.put('App', 'Other', 2)
+        metrics.flush()
+        self.assertEqual(metrics.dropped_datums, 2)
+        self.assertEqual(len(metrics._pending), 1)
+
+    def test_spills_calls_to_disk(self):
+        spill_file = os.path.join(self.tempdir, 'spill')
+        metrics = self.create_buffer(max_pending_calls=1,
+                                     spill_file=spill_file)
+        self.connection.put_metric_data.side_effect = IOError('Broken')
+        metrics.put('App', 'First', 1)
+        metrics.flush()
+        metrics.put('App', 'Second', 2, dimensions={'Host': ['a', 'b']})
+        metrics.flush()
+        self.assertEqual(metrics.spilled_datums, 1)
+        self.assertTrue(os.path.exists(spill_file))
+
+        self.connection.put_metric_data.reset_mock()
+        self.connection.put_metric_data.side_effect = None
+        metrics.flush()
+        self.assertFalse(os.path.exists(spill_file))
+        self.assertEqual([call[1] for call in self.sent()],
+                         ['First', 'Second'])
+        self.assertIn(('App', 'Second', 'None', {'Host': ['a', 'b']},
+                       {'minimum': 2, 'maximum': 2, 'sum': 2,
+                        'samplecount': 1}), self.sent())
+
+    def test_close_publishes_remaining_metrics(self):
+        metrics = MetricsBuffer(self.connection, flush_interval=3600)
+        metrics.put('App', 'Metric', 1)
+        metrics.close()
+        self.assertEqual(self.connection.put_metric_data.call_count, 1)
+
+
+class TestMetricsBufferRequest(AWSMockServiceTestCase):
+    connection_class = CloudWatchConnection
+
+    def default_body(self):
+        return b'<PutMetricDataResponse></PutMetricDataResponse>'
+
+    def test_request_parameters(self):
+        self.set_http_response(status_code=200)
+        metrics = MetricsBuffer(self.service_connection, flush_interval=3600)
+        metrics.put('App', 'Latency', 2, unit='Seconds',
+                    dimensions={'Host': 'a'})
+        metrics.put('App', 'Errors', 1)
+        metrics.close()
+
+        params = self.actual_request.params
+        self.assertEqual(params['Namespace'], 'App')
+        members = sorted(
+            (params['MetricData.member.%s.MetricName' % i], i)
+            for i in (1, 2))
+        errors, latency = members[0][1], members[1][1]
+        self.assertEqual(params['MetricData.member.%s.Unit' % latency],
+                         'Seconds')
+        self.assertEqual(
+            params['MetricData.member.%s.Dimensions.member.1.Value' %
+                   latency], 'a')
+        self.assertEqual(
+            params['MetricData.member.%s.StatisticValues.SampleCount' %
+                   errors], 1)
+        self.assertIn('MetricData.member.%s.Timestamp' % errors, params)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -76,6 +76,11 @@ class TestChunking(unittest.TestCase):
         self.assertEqual(chunks[1], sha256(b'a' * 1024 * 1024).digest())
         self.assertEqual(chunks[2], sha256(b'a' * 20).digest())
 
+    def test_threaded_chunk_hashes_match_serial(self):
+        bytestring = os.urandom(5 * 1024 + 20)
+        self.assertEqual(chunk_hashes(bytestring, 1024, num_threads=3),
+                         chunk_hashes(bytestring, 1024))
+
     def test_less_than_one_chunk(self):
         chunks = chunk_hashes(b'aaaa')
         self.assertEqual(len(chunks), 1)
@@ -113,6 +118,12 @@ class TestTreeHash(unittest.TestCase):
             self.calculate_tree_hash(bigger_bytestring),
             b'12f3cbd6101b981cde074039f6f728071da8879d6f632de8afc7cdf00661b08f')
 
+    def test_odd_number_of_hashes(self):
+        hashes = [sha256(c).digest() for c in (b'a', b'b', b'c')]
+        first = sha256(hashes[0] + hashes[1]).digest()
+        self.assertEqual(tree_hash(hashes),
+                         sha256(first + hashes[2]).digest())
+
     def test_empty_tree_hash(self):
         self.assertEqual(
             self.calculate_tree_hash(''),
@@ -163,3 +174,25 @@ class TestFileHash(unittest.TestCase):
         # Compute a hash from a file-like BytesIO object.
         f = BytesIO(self._gen_data())
         compute_hashes_from_fileobj(f, chunk_size=512)
+
+    def test_mapped_file_matches_stream(self):
+        data = self._gen_data()
+        expected = compute_hashes_from_fileobj(BytesIO(data[100:]),
+                                               chunk_size=512)
+        with tempfile.TemporaryFile(mode='wb+') as f:
+            f.write(data)
+            f.seek(100)
+            self.assertEqual(compute_hashes_from_fileobj(f, chunk_size=512),
+                             expected)
+            self.assertEqual(f.tell(), len(data))
+            f.seek(100)
+            self.assertEqual(
+                compute_hashes_from_fileobj(f, chunk_size=512,
+                                            num_threads=4),
+                expected)
+
+    def test_empty_file(self):
+        with tempfile.TemporaryFile(mode='wb+') as f:
+            self.assertEqual(
+                compute_hashes_from_fileobj(f, chunk_size=512),
+                compute_hashes_from_fileobj(BytesIO(b''), chunk_size=512))
@@ -0,0 +1,224 @@
+import base64
+import threading
+
+from tests.compat import mock, unittest
+
+from boto.kinesis.consumer import KinesisConsumer, SHARD_END, \
+                                  describe_shards
+from boto.kinesis.exceptions import ExpiredIteratorException, \
+                                    ProvisionedThroughputExceededException
+from boto.kinesis.producer import aggregate
+
+
+def record(data, sequence_number, partition_key='key'):
+    return {
+        'Data': base64.b64encode(data).decode('ascii'),
+        'PartitionKey': partition_key,
+        'SequenceNumber': sequence_number,
+    }
+
+
+class FakeKinesis(object):
+    """
+    Serves ``GetRecords`` pages for each shard. A shard whose last page is
+    ``None`` is closed once the pages before it have been read.
+    """
+    def __init__(self, shards, pages, page_size=None):
+        self.shards = shards
+        self.pages = pages
+        self.page_size = page_size
+        self.errors = {}
+        self.iterator_requests = []
+        self.lock = threading.Lock()
+
+    def describe_stream(self, stream_name, exclusive_start_shard_id=None):
+        shards = self.shards
+        if exclusive_start_shard_id is not None:
+            ids = [shard['ShardId'] for shard in shards]
+            shards = shards[ids.index(exclusive_start_shard_id) + 1:]
+        page_size = self.page_size or len(shards)
+        return {'StreamDescription': {
+            'Shards': shards[:page_size],
+            'HasMoreShards': len(shards) > page_size,
+        }}
+
+    def get_shard_iterator(self, stream_name, shard_id, iterator_type,
+                           starting_sequence_number=None):
+        with self.lock:
+            self.iterator_requests.append(
+                (shard_id, iterator_type, starting_sequence_number))
+        return {'ShardIterator': '%s:0' % shard_id}
+
+    def get_records(self, shard_iterator, limit=None, b64_decode=True):
+        shard_id, index = shard_iterator.rsplit(':', 1)
+        index = int(index)
+        with self.lock:
+            errors = self.errors.get(shard_iterator)
+            if errors:
+                raise errors.pop(0)
+        pages = self.pages[shard_id]
+        if index >= len(pages):
+            # An open shard with nothing new.
+            return {'Records': [], 'NextShardIterator': shard_iterator}
+        next_iterator = '%s:%s' % (shard_id, index + 1)
+        if index + 1 < len(pages) and pages[index + 1] is None:
+            next_iterator = None
+        return {'Records': list(pages[index]),
+                'NextShardIterator': next_iterator}
+
+
+def shard(shard_id, parent=None, adjacent_parent=None, closed=True):
+    description = {'ShardId': shard_id, 'SequenceNumberRange': {
+        'StartingSequenceNumber': '0'}}
+    if closed:
+        description['SequenceNumberRange']['EndingSequenceNumber'] = '9'
+    if parent is not None:
+        description['ParentShardId'] = parent
+    if adjacent_parent is not None:
+        description['AdjacentParentShardId'] = adjacent_parent
+    return description
+
+
+class TestDescribeShards(unittest.TestCase):
+    def test_follows_has_more_shards(self):
+        connection = FakeKinesis([shard('s%s' % i) for i in range(5)], {},
+                                 page_size=2)
+        connection.describe_stream = mock.Mock(
+            side_effect=connection.describe_stream)
+        shards = describe_shards(connection, 'stream')
+        self.assertEqual([s['ShardId'] for s in shards],
+                         ['s0', 's1', 's2', 's3', 's4'])
+        self.assertEqual(connection.describe_stream.call_count, 3)
+
+
+class TestKinesisConsumer(unittest.TestCase):
+    def setUp(self):
+        self.sleep = mock.patch('threading.Event.wait').start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_reads_all_shards(self):
+        connection = FakeKinesis([shard('a'), shard('b')], {
+            'a': [[record(b'a1', '1'), record(b'a2', '2')], [], None],
+            'b': [[record(b'b1', '3')], [record(b'b2', '4')], None],
+        })
+        checkpoint = mock.Mock()
+        consumer = KinesisConsumer(connection, 'stream',
+                                   checkpoint=checkpoint)
+        records = list(consumer)
+
+        self.assertEqual(sorted(r['Data'] for r in records),
+                         [b'a1', b'a2', b'b1', b'b2'])
+        self.assertEqual(records[0]['ShardId'],
+                         'a' if records[0]['Data'].startswith(b'a') else 'b')
+        self.assertEqual(consumer.checkpoints, {'a': SHARD_END,
+                                                'b': SHARD_END})
+        self.assertIn(mock.call('a', '2'), checkpoint.call_args_list)
+        self.assertIn(mock.call('b', '4'), checkpoint.call_args_list)
+        self.assertEqual(checkpoint.call_args_list[-1][0][1], SHARD_END)
+
+    def test_reads_parents_before_children(self):
+        connection = FakeKinesis([
+            shard('parent'),
+            shard('child1', parent='parent', closed=True),
+            shard('child2', parent='parent', closed=True),
+            shard('merged', parent='child1', adjacent_parent='child2',
+                  closed=True),
+        ], {
+            'parent': [[record(b'p', '1')], None],
+            'child1': [[record(b'c1', '2')], None],
+            'child2': [[record(b'c2', '3')], None],
+            'merged': [[record(b'm', '4')], None],
+        })
+        data = [r['Data'] for r in KinesisConsumer(connection, 'stream')]
+
+        self.assertEqual(data[0], b'p')
+        self.assertEqual(sorted(data[1:3]), [b'c1', b'c2'])
+        self.assertEqual(data[3], b'm')
+        # Children are read from the start.
+        self.assertIn(('child1', 'TRIM_HORIZON', None),
+                      connection.iterator_requests)
+
+    def test_parents_that_expired_are_ignored(self):
+        connection = FakeKinesis([shard('child', parent='gone')], {
+            'child': [[record(b'c', '1')], None],
+        })
+        data = [r['Data'] for r in KinesisConsumer(connection, 'stream')]
+        self.assertEqual(data, [b'c'])
+
+    def test_resumes_from_checkpoints(self):
+        connection = FakeKinesis([shard('a'), shard('b')], {
+            'a': [[record(b'a1', '1')], None],
+            'b': [[record(b'b1', '2')], None],
+        })
+        consumer = KinesisConsumer(connection, 'stream', checkpoints={
+            'a': SHARD_END, 'b': '1'})
+        data = [r['Data'] for r in consumer]
+        self.assertEqual(data, [b'b1'])
+        self.assertEqual(connection.iterator_requests,
+                         [('b', 'AFTER_SEQUENCE_NUMBER', '1')])
+
+    def test_latest_skips_closed_shards(self):
+        connection = FakeKinesis([shard('a'), shard('b', closed=False)], {
+            'a': [[record(b'a1', '1')], None],
+            'b': [[record(b'b1', '2')], None],
+        })
+        data = [r['Data'] for r in KinesisConsumer(
+            connection, 'stream', iterator_type='LATEST')]
+        self.assertEqual(data, [b'b1'])
+        self.assertEqual(connection.iterator_requests,
+                         [('b', 'LATEST', None)])
+
+    def test_backs_off_when_throttled(self):
+        connection = FakeKinesis([shard('a')], {
+            'a': [[record(b'a1', '1')], None],
+        })
+        connection.errors['a:0'] = [
+            ProvisionedThroughputExceededException(400, 'Bad Request'),
+            ProvisionedThroughputExceededException(400, 'Bad Request'),
+        ]
+        data = [r['Data'] for r in KinesisConsumer(connection, 'stream')]
+        self.assertEqual(data, [b'a1'])
+        self.assertTrue(self.sleep.call_count >= 2)
+
+    def test_expired_iterators_are_renewed(self):
+        connection = FakeKinesis([shard('a')], {
+            'a': [[record(b'a1', '1')], None],
+        })
+        connection.errors['a:0'] = [
+            ExpiredIteratorException(400, 'Bad Request')]
+        data = [r['Data'] for r in KinesisConsumer(connection, 'stream')]
+        self.assertEqual(data, [b'a1'])
+        self.assertEqual(len(connection.iterator_requests), 2)
+
+    def test_errors_are_raised(self):
+        connection = FakeKinesis([shard('a')], {'a': [[], None]})
+        connection.errors['a:0'] = [ValueError('Broken')]
+        with self.assertRaises(ValueError):
+            list(KinesisConsumer(connection, 'stream'))
+
+    def test_deaggregates_records(self):
+        connection = FakeKinesis([shard('a')], {
+            'a': [[record(aggregate([b'one', b'two']), '1'),
+                   record(b'three', '2')], None],
+        })
+        consumer = KinesisConsumer(connection, 'stream', deaggregate=True)
+        records = list(consumer)
+        self.assertEqual([r['Data'] for r in records],
+                         [b'one', b'two', b'three'])
+        self.assertEqual([r['SequenceNumber'] for r in records],
+                         ['1', '1', '2'])
+
+    def test_close_stops_open_shards(self):
+        connection = FakeKinesis([shard('a', closed=False)], {
+            'a': [[record(b'a1', '1')], [record(b'a2', '2')]],
+        })
+        consumer = KinesisConsumer(connection, 'stream')
+        records = iter(consumer)
+        self.assertEqual(next(records)['Data'], b'a1')
+        self.assertEqual(next(records)['Data'], b'a2')
+        records.close()
+        self.assertEqual(consumer._pollers, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
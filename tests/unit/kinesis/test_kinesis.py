@@ -0,0 +1,40 @@
+from boto.compat import json
+from boto.kinesis.layer1 import KinesisConnection
+from tests.unit import AWSMockServiceTestCase
+
+
+class TestKinesis(AWSMockServiceTestCase):
+    connection_class = KinesisConnection
+
+    def default_body(self):
+        return b'{}'
+
+    def test_put_records(self):
+        self.set_http_response(status_code=200)
+        records = [
+            {'Data': b'\x00\x01\x02\x03\x04\x05', 'PartitionKey': 'k1'},
+            {'Data': u'hello', 'PartitionKey': 'k2',
+             'ExplicitHashKey': '123'},
+        ]
+        self.service_connection.put_records(records, 'stream-name')
+
+        body = json.loads(self.actual_request.body)
+        self.assertEqual(body['StreamName'], 'stream-name')
+        self.assertEqual(body['Records'], [
+            {'Data': 'AAECAwQF', 'PartitionKey': 'k1'},
+            {'Data': 'aGVsbG8=', 'PartitionKey': 'k2',
+             'ExplicitHashKey': '123'},
+        ])
+        target = self.actual_request.headers['X-Amz-Target']
+        self.assertTrue(target.endswith('.PutRecords'))
+        # The caller's records aren't modified.
+        self.assertEqual(records[1]['Data'], u'hello')
+
+    def test_put_records_already_encoded(self):
+        self.set_http_response(status_code=200)
+        records = [{'Data': 'AAECAwQF', 'PartitionKey': 'k1'}]
+        self.service_connection.put_records(records, 'stream-name',
+                                            b64_encode=False)
+
+        body = json.loads(self.actual_request.body)
+        self.assertEqual(body['Records'], records)
@@ -0,0 +1,208 @@
+import base64
+
+from tests.compat import mock, unittest
+
+from boto.kinesis.exceptions import ProvisionedThroughputExceededException, \
+                                    PutRecordsError
+from boto.kinesis.producer import KinesisProducer, aggregate, deaggregate
+
+
+def decode(entries):
+    return [base64.b64decode(entry['Data'].encode('ascii'))
+            for entry in entries]
+
+
+def success(entries, stream_name, b64_encode=True):
+    return {
+        'FailedRecordCount': 0,
+        'Records': [{'ShardId': 'shardId-000000000000',
+                     'SequenceNumber': str(i)}
+                    for i in range(len(entries))],
+    }
+
+
+class TestAggregation(unittest.TestCase):
+    def test_round_trip(self):
+        payloads = [b'one', b'', b'three' * 100]
+        self.assertEqual(deaggregate(aggregate(payloads)), payloads)
+
+    def test_plain_data(self):
+        self.assertEqual(deaggregate(b'plain'), [b'plain'])
+
+    def test_truncated_data_is_not_split(self):
+        data = aggregate([b'payload'])[:-1]
+        self.assertEqual(deaggregate(data), [data])
+
+
+class TestKinesisProducer(unittest.TestCase):
+    def setUp(self):
+        self.connection = mock.Mock()
+        self.connection.put_records.side_effect = success
+        self.sleep = mock.patch('time.sleep').start()
+        self.addCleanup(mock.patch.stopall)
+
+    def create_producer(self, **kwargs):
+        kwargs.setdefault('linger', None)
+        kwargs.setdefault('num_threads', 1)
+        producer = KinesisProducer(self.connection, **kwargs)
+        self.addCleanup(producer.close)
+        return producer
+
+    def sent(self):
+        return [(call[0][1], decode(call[0][0]))
+                for call in self.connection.put_records.call_args_list]
+
+    def test_flush_puts_buffered_records(self):
+        producer = self.create_producer()
+        producer.put('stream', b'one', 'a')
+        producer.put('stream', u'two', 'b')
+        producer.put('other', b'three', 'c')
+        self.assertFalse(self.connection.put_records.called)
+
+        producer.flush()
+        self.assertEqual(sorted(self.sent()), [
+            ('other', [b'three']),
+            ('stream', [b'one', b'two']),
+        ])
+        entries = self.connection.put_records.call_args_list[0][0][0]
+        self.assertEqual(entries[0]['PartitionKey'], 'a')
+        self.assertEqual(
+            self.connection.put_records.call_args[1], {'b64_encode': False})
+
+    def test_flushes_by_count(self):
+        producer = self.create_producer(max_batch_records=2)
+        for i in range(5):
+            producer.put('stream', str(i), 'key')
+        producer.flush()
+        self.assertEqual(self.sent(), [
+            ('stream', [b'0', b'1']),
+            ('stream', [b'2', b'3']),
+            ('stream', [b'4']),
+        ])
+
+    def test_flushes_by_size(self):
+        producer = self.create_producer(max_batch_bytes=30)
+        for i in range(3):
+            producer.put('stream', b'x' * 10, 'key')
+        producer.flush()
+        self.assertEqual(self.sent(), [
+            ('stream', [b'x' * 10, b'x' * 10]),
+            ('stream', [b'x' * 10]),
+        ])
+
+    def test_record_too_large(self):
+        producer = self.create_producer()
+        with self.assertRaises(ValueError):
+            producer.put('stream', b'x' * 1024 * 1024, 'key')
+
+    def test_flushes_after_linger(self):
+        producer = self.create_producer(linger=0)
+        producer.put('stream', b'one', 'key')
+        producer._flush_expired()
+        producer._batch_queue.join()
+        self.assertEqual(self.sent(), [('stream', [b'one'])])
+
+    def test_resends_only_failed_records(self):
+        responses = [
+            {'FailedRecordCount': 1, 'Records': [
+                {'ShardId': 'shardId-000000000000', 'SequenceNumber': '1'},
+                {'ErrorCode': 'ProvisionedThroughputExceededException',
+                 'ErrorMessage': 'Rate exceeded'},
+                {'ShardId': 'shardId-000000000000', 'SequenceNumber': '2'},
+            ]},
+        ]
+
+        def put_records(entries, stream_name, b64_encode=True):
+            if responses:
+                return responses.pop(0)
+            return success(entries, stream_name)
+
+        self.connection.put_records.side_effect = put_records
+        producer = self.create_producer()
+        for data in (b'one', b'two', b'three'):
+            producer.put('stream', data, 'key')
+        producer.flush()
+        self.assertEqual(self.sent(), [
+            ('stream', [b'one', b'two', b'three']),
+            ('stream', [b'two']),
+        ])
+        self.assertEqual(self.sleep.call_count, 1)
+
+    def test_retries_throttled_requests(self):
+        self.connection.put_records.side_effect = [
+            ProvisionedThroughputExceededException(400, 'Bad Request'),
+            success([None], 'stream'),
+        ]
+        producer = self.create_producer()
+        producer.put('stream', b'one', 'key')
+        producer.flush()
+        self.assertEqual(self.connection.put_records.call_count, 2)
+
+    def test_raises_records_that_cannot_be_put(self):
+        self.connection.put_records.side_effect = None
+        self.connection.put_records.return_value = {
+            'FailedRecordCount': 1, 'Records': [
+                {'ErrorCode': 'InternalFailure', 'ErrorMessage': 'Oops'},
+            ]}
+        producer = self.create_producer(max_retries=2)
+        producer.put('stream', b'one', 'key')
+
+        with self.assertRaises(PutRecordsError) as cm:
+            producer.flush()
+
+        self.assertEqual(self.connection.put_records.call_count, 3)
+        [(stream_name, entry, code)] = cm.exception.failed_records
+        self.assertEqual(stream_name, 'stream')
+        self.assertEqual(decode([entry]), [b'one'])
+        self.assertEqual(code, 'InternalFailure')
+
+    def test_on_failure_callback(self):
+        self.connection.put_records.side_effect = None
+        self.connection.put_records.return_value = {
+            'FailedRecordCount': 1, 'Records': [
+                {'ErrorCode': 'ValidationError', 'ErrorMessage': 'Bad'},
+            ]}
+        on_failure = mock.Mock()
+        producer = self.create_producer(on_failure=on_failure)
+        producer.put('stream', b'one', 'key')
+        producer.flush()
+        self.assertEqual(self.connection.put_records.call_count, 1)
+        self.assertEqual(on_failure.call_args[0][2], 'ValidationError')
+
+    def test_worker_exceptions_are_raised(self):
+        self.connection.put_records.side_effect = IOError('Broken')
+        producer = self.create_producer()
+        producer.put('stream', b'one', 'key')
+        with self.assertRaises(IOError):
+            producer.flush()
+
+    def test_aggregates_records_by_partition_key(self):
+        producer = self.create_producer(aggregate=True)
+        producer.put('stream', b'one', 'a')
+        producer.put('stream', b'two', 'b')
+        producer.put('stream', b'three', 'a')
+        producer.put('stream', b'x' * 100 * 1024, 'a')
+        producer.put('stream', b'four', 'a')
+        producer.flush()
+
+        [(stream_name, data)] = self.sent()
+        self.assertEqual([deaggregate(d) for d in data], [
+            [b'one', b'three'],
+            [b'two'],
+            [b'x' * 100 * 1024],
+            [b'four'],
+        ])
+        # Single payloads are sent as they are.
+        self.assertEqual(data[1], b'two')
+
+    def test_close(self):
+        producer = self.create_producer(linger=10)
+        producer.put('stream', b'one', 'key')
+        producer.close()
+        self.assertEqual(self.sent(), [('stream', [b'one'])])
+        with self.assertRaises(ValueError):
+            producer.put('stream', b'two', 'key')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,197 @@
+import logging
+
+from tests.compat import mock, unittest
+
+from boto.logs.exceptions import DataAlreadyAcceptedException, \
+    InvalidSequenceTokenException, ResourceNotFoundException
+from boto.logs.shipper import CloudWatchLogsHandler, LogShipper
+
+
+def token_error(cls, token):
+    return cls(400, 'Bad Request', body={
+        '__type': cls.__name__,
+        'message': 'The given sequenceToken is invalid. The next expected '
+                   'sequenceToken is: %s' % token,
+    })
+
+
+class TestLogShipper(unittest.TestCase):
+    def setUp(self):
+        self.connection = mock.Mock()
+        self.responses = []
+        self.connection.put_log_events.side_effect = self.put_log_events
+        self.tokens = iter(range(1, 1000))
+
+    def put_log_events(self, group, stream, events, sequence_token=None):
+        if self.responses:
+            response = self.responses.pop(0)
+            if isinstance(response, Exception):
+                raise response
+            return response
+        return {'nextSequenceToken': 'token-%s' % next(self.tokens)}
+
+    def create_shipper(self, **kwargs):
+        kwargs.setdefault('flush_interval', 3600)
+        shipper = LogShipper(self.connection, **kwargs)
+        self.addCleanup(shipper.close)
+        return shipper
+
+    def calls(self):
+        return [(call[0][0], call[0][1],
+                 [event['message'] for event in call[0][2]],
+                 call[1]['sequence_token'])
+                for call in self.connection.put_log_events.call_args_list]
+
+    def test_sorts_events_and_tracks_tokens(self):
+        shipper = self.create_shipper()
+        shipper.put('group', 'stream', 'second', timestamp=2000)
+        shipper.put('group', 'stream', 'first', timestamp=1000)
+        shipper.put('group', 'stream', u'also second', timestamp=2000)
+        shipper.flush()
+        shipper.put('group', 'stream', 'third', timestamp=3000)
+        shipper.flush()
+
+        self.assertEqual(self.calls(), [
+            ('group', 'stream', ['first', 'second', 'also second'], None),
+            ('group', 'stream', ['third'], 'token-1'),
+        ])
+
+    def test_buffers_per_stream(self):
+        shipper = self.create_shipper()
+        shipper.put('group', 'a', 'one', timestamp=1)
+        shipper.put('group', 'b', 'two', timestamp=1)
+        shipper.put('group', 'a', 'three', timestamp=2)
+        shipper.flush()
+        self.assertEqual(sorted(self.calls()), [
+            ('group', 'a', ['one', 'three'], None),
+            ('group', 'b', ['two'], None),
+        ])
+
+    def test_batches_by_count_and_size(self):
+        shipper = self.create_shipper(max_batch_count=3, max_batch_bytes=100)
+        for i in range(4):
+            shipper.put('group', 'stream', 'm%s' % i, timestamp=i)
+        shipper.put('group', 'stream', 'x' * 60, timestamp=10)
+        shipper.flush()
+        self.assertEqual([len(call[2]) for call in self.calls()], [3, 1, 1])
+
+    def test_full_batches_are_sent_without_waiting(self):
+        shipper = self.create_shipper(max_batch_count=2)
+        shipper.put('group', 'stream', 'one')
+        shipper.put('group', 'stream', 'two')
+        for i in range(100):
+            if self.connection.put_log_events.called:
+                break
+            shipper._thread.join(0.01)
+        self.assertTrue(self.connection.put_log_events.called)
+
+    def test_truncates_large_events(self):
+        shipper = self.create_shipper(max_batch_bytes=50)
+        shipper.put('group', 'stream', u'\xe9' * 40)
+        shipper.flush()
+        [message] = self.calls()[0][2]
+        self.assertEqual(message, u'\xe9' * 12)
+
+    def test_recovers_from_invalid_sequence_token(self):
+        self.responses = [
+            token_error(InvalidSequenceTokenException, 'expected-token')]
+        shipper = self.create_shipper()
+        shipper.put('group', 'stream', 'one')
+        shipper.flush()
+        self.assertEqual([call[3] for call in self.calls()],
+                         [None, 'expected-token'])
+        self.assertEqual(shipper._tokens[('group', 'stream')], 'token-1')
+
+    def test_looks_up_the_token_if_it_is_not_in_the_error(self):
+        self.responses = [InvalidSequenceTokenException(
+            400, 'Bad Request', body={'message': 'Invalid token'})]
+        self.connection.describe_log_streams.return_value = {'logStreams': [
+            {'logStreamName': 'stream-2', 'uploadSequenceToken': 'wrong'},
+            {'logStreamName': 'stream', 'uploadSequenceToken': 'right'},
+        ]}
+        shipper = self.create_shipper()
+        shipper.put('group', 'stream', 'one')
+        shipper.flush()
+        self.assertEqual(self.calls()[-1][3], 'right')
+
+    def test_data_already_accepted(self):
+        self.responses = [
+            token_error(DataAlreadyAcceptedException, 'next-token')]
+        shipper = self.create_shipper()
+        shipper.put('group', 'stream', 'one')
+        shipper.flush()
+        shipper.put('group', 'stream', 'two')
+        shipper.flush()
+        self.assertEqual([call[3] for call in self.calls()],
+                         [None, 'next-token'])
+
+    def test_creates_missing_streams(self):
+        self.responses = [ResourceNotFoundException(400, 'Bad Request')]
+        self.connection.create_log_stream.side_effect = [
+            ResourceNotFoundException(400, 'Bad Request'), None]
+        shipper = self.create_shipper()
+        shipper.put('group', 'stream', 'one')
+        shipper.flush()
+        self.connection.create_log_group.assert_called_with('group')
+        self.assertEqual(self.connection.create_log_stream.call_count, 2)
+        self.assertEqual(len(self.calls()), 2)
+        self.assertEqual(shipper.dropped_events, 0)
+
+    def test_failed_batches_are_dropped(self):
+        self.responses = [IOError('Broken')]
+        shipper = self.create_shipper()
+        shipper.put('group', 'stream', 'one')
+        shipper.put('group', 'stream', 'two')
+        shipper.flush()
+        self.assertEqual(shipper.dropped_events, 2)
+
+    def test_drops_events_when_too_many_are_buffered(self):
+        shipper = self.create_shipper(max_buffered_events=2)
+        for i in range(3):
+            shipper.put('group', 'stream', 'm%s' % i)
+        self.assertEqual(shipper.dropped_events, 1)
+        shipper.flush()
+        self.assertEqual(self.calls()[0][2], ['m0', 'm1'])
+
+    def test_close_sends_buffered_events(self):
+        shipper = LogShipper(self.connection, flush_interval=3600)
+        shipper.put('group', 'stream', 'one')
+        shipper.close()
+        self.assertEqual(len(self.calls()), 1)
+        with self.assertRaises(ValueError):
+            shipper.put('group', 'stream', 'two')
+
+
+class TestCloudWatchLogsHandler(unittest.TestCase):
+    def test_emit(self):
+        shipper = mock.Mock()
+        handler = CloudWatchLogsHandler('group', 'stream', shipper=shipper)
+        handler.setFormatter(logging.Formatter('%(levelname)s %(message)s'))
+        logger = logging.getLogger('tests.unit.logs.test_shipper')
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+
+        logger.error('Something %s', 'happened')
+        args = shipper.put.call_args[0]
+        self.assertEqual(args[:3], ('group', 'stream', 'ERROR Something '
+                                                       'happened'))
+        self.assertTrue(isinstance(args[3], int))
+
+        handler.close()
+        self.assertFalse(shipper.close.called)
+
+    def test_owns_its_shipper(self):
+        connection = mock.Mock()
+        connection.put_log_events.return_value = {}
+        handler = CloudWatchLogsHandler('group', 'stream',
+                                        connection=connection,
+                                        flush_interval=3600)
+        handler.emit(logging.LogRecord('name', logging.INFO, 'path', 1,
+                                       'message', (), None))
+        handler.close()
+        self.assertEqual(connection.put_log_events.call_count, 1)
+        self.assertTrue(handler.shipper._closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,6 +2,8 @@
 from mock import patch
 import xml.dom.minidom
 
+from boto.compat import BytesIO
+
 from tests.unit import unittest
 from tests.unit import AWSMockServiceTestCase
 
@@ -10,8 +12,10 @@ from boto.s3.connection import S3Connection
 from boto.s3.bucket import Bucket
 from boto.s3.deletemarker import DeleteMarker
 from boto.s3.key import Key
+from boto.s3.keyrecord import KeyRecord
 from boto.s3.multipart import MultiPartUpload
 from boto.s3.prefix import Prefix
+from boto.resultset import StreamingResultSet
 
 
 class TestS3Bucket(AWSMockServiceTestCase):
@@ -181,6 +185,89 @@ class TestS3Bucket(AWSMockServiceTestCase):
             encoding_type='url'
         )
 
+    @patch.object(StreamingResultSet, 'BufferSize', 64)
+    def test_get_all_keys_stream(self):
+        contents = ''.join(
+            '<Contents><Key>key%d</Key><Size>%d</Size></Contents>' % (i, i)
+            for i in range(3))
+        body = ('<?xml version="1.0" encoding="UTF-8"?>'
+                '<ListBucketResult><Name>mybucket</Name>'
+                '<IsTruncated>true</IsTruncated>%s'
+                '<NextMarker>key2</NextMarker>'
+                '</ListBucketResult>' % contents).encode('utf-8')
+        self.set_http_response(status_code=200)
+        bucket = self.service_connection.get_bucket('mybucket',
+                                                    validate=False)
+        response = self.create_response(200)
+        response.read.side_effect = BytesIO(body).read
+        self.https_connection.getresponse.return_value = response
+
+        rs = bucket.get_all_keys(stream=True)
+        self.assertIsInstance(rs, StreamingResultSet)
+        keys = iter(rs)
+        first = next(keys)
+        self.assertEqual(first.name, 'key0')
+        self.assertEqual(first.bucket, bucket)
+        # The first key is available before the body has been read.
+        self.assertLess(response.read.call_count,
+                        len(body) // StreamingResultSet.BufferSize)
+        self.assertEqual([k.name for k in keys], ['key1', 'key2'])
+        self.assertEqual(len(rs.result_set), 0)
+        self.assertTrue(rs.is_truncated)
+        self.assertEqual(rs.next_marker, 'key2')
+
+    def test_list_compact(self):
+        self.set_http_response(status_code=200)
+        bucket = self.service_connection.get_bucket('mybucket',
+                                                    validate=False)
+        self.set_http_response(status_code=200, body=(
+            b'<?xml version="1.0" encoding="UTF-8"?><ListBucketResult>'
+            b'<IsTruncated>false</IsTruncated>'
+            b'<Contents><Key>a</Key><Size>3</Size></Contents>'
+            b'<Contents><Key>b</Key><Size>4</Size></Contents>'
+            b'</ListBucketResult>'))
+
+        records = list(bucket.list(compact=True))
+        self.assertEqual([type(r) for r in records], [KeyRecord, KeyRecord])
+        self.assertEqual([(r.name, r.size) for r in records],
+                         [('a', 3), ('b', 4)])
+        self.assertNotIn('compact', self.actual_request.path)
+
+        rs = bucket.get_all_keys(compact=True)
+        self.assertEqual([type(r) for r in rs], [KeyRecord, KeyRecord])
+        self.assertEqual(bucket._delete_object_entry(records[0]), ('a', None))
+
+
+        self.set_http_response(status_code=200)
+        bucket = self.service_connection.get_bucket('mybucket',
+                                                    validate=False)
+        self.set_http_response(status_code=200, body=(
+            b'<?xml version="1.0" encoding="UTF-8"?><DeleteResult>'
+            b'<Deleted><Key>a&amp;b</Key></Deleted>'
+            b'<Error><Key>c</Key><Code>AccessDenied</Code></Error>'
+            b'</DeleteResult>'))
+
+        result = bucket.delete_keys(['a&b', ('c', 'v1'), Prefix(name='d/')],
+                                    quiet=True)
+
+        self.assertEqual(self.actual_request.method, 'POST')
+        self.assertEqual(self.actual_request.body, (
+            b'<?xml version="1.0" encoding="UTF-8"?><Delete>'
+            b'<Quiet>true</Quiet>'
+            b'<Object><Key>a&amp;b</Key></Object>'
+            b'<Object><Key>c</Key><VersionId>v1</VersionId></Object>'
+            b'</Delete>'))
+        self.assertEqual([d.key for d in result.deleted], ['a&b'])
+        self.assertEqual([(e.key, e.code) for e in result.errors],
+                         [('d/', 'PrefixSkipped'), ('c', 'AccessDenied')])
+
+    @patch.object(Bucket, '_delete_objects')
+    def test_delete_keys_batches(self, mock_delete_objects):
+        bucket = Bucket(self.service_connection, 'mybucket')
+        bucket.delete_keys('key%d' % i for i in range(2500))
+        self.assertEqual([len(c[0][0]) for c in mock_delete_objects.call_args_list],
+                         [1000, 1000, 500])
+
     @patch.object(Bucket, 'get_all_keys')
     @patch.object(Bucket, '_get_key_internal')
     def test_bucket_get_key_no_validate(self, mock_gki, mock_gak):
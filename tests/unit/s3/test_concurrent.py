@@ -0,0 +1,553 @@
+# Copyright (c) 2015 Amazon.com, Inc. or its affiliates.  All Rights Reserved
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish, dis-
+# tribute, sublicense, and/or sell copies of the Software, and to permit
+# persons to whom the Software is furnished to do so, subject to the fol-
+# lowing conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABIL-
+# ITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT
+# SHALL THE AUTHOR BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+import os
+import re
+import tempfile
+import threading
+from hashlib import md5
+
+from tests.compat import mock, unittest
+
+from boto.compat import BytesIO
+from boto.exception import S3ResponseError, S3DataError
+from boto.provider import Provider
+from boto.s3.bucket import Bucket
+from boto.resultset import ResultSet
+from boto.s3.concurrent import ConcurrentDeleter, ConcurrentLister
+from boto.s3.concurrent import ConcurrentDownloader, ConcurrentUploader
+from boto.s3.concurrent import minimum_part_size
+from boto.s3.concurrent import MINIMUM_PART_SIZE, MAXIMUM_NUMBER_OF_PARTS
+from boto.s3.key import Key
+from boto.s3.keyrecord import KeyRecord
+from boto.s3.multidelete import Deleted, Error, MultiDeleteResult
+from boto.s3.prefix import Prefix
+
+
+class TestMinimumPartSize(unittest.TestCase):
+    def test_small_part_sizes_are_raised_to_the_minimum(self):
+        self.assertEqual(minimum_part_size(1024, 1024), MINIMUM_PART_SIZE)
+
+    def test_part_size_grows_to_stay_under_part_limit(self):
+        size = MINIMUM_PART_SIZE * MAXIMUM_NUMBER_OF_PARTS * 2
+        part_size = minimum_part_size(size, MINIMUM_PART_SIZE)
+        self.assertTrue(part_size * MAXIMUM_NUMBER_OF_PARTS >= size)
+
+
+class TestConcurrentUploader(unittest.TestCase):
+    def setUp(self):
+        self.tempfile = tempfile.NamedTemporaryFile(delete=False)
+        self.addCleanup(os.remove, self.tempfile.name)
+        # Two full parts and a short one.
+        self.parts = [b'a' * MINIMUM_PART_SIZE, b'b' * MINIMUM_PART_SIZE,
+                      b'c' * 10]
+        self.tempfile.write(b''.join(self.parts))
+        self.tempfile.close()
+        self.bucket = mock.Mock()
+        self.mp = self.bucket.initiate_multipart_upload.return_value
+        self.mp.id = 'upload-id'
+        self.uploaded = {}
+
+        def upload_part(fp, part_num, size=None):
+            self.uploaded[part_num] = fp.read(size)
+            part = mock.Mock()
+            part.etag = '"etag-%d"' % part_num
+            return part
+        self.mp.upload_part_from_file.side_effect = upload_part
+
+    def test_upload(self):
+        uploader = ConcurrentUploader(self.bucket, MINIMUM_PART_SIZE,
+                                      num_threads=2)
+        cb = mock.Mock()
+        uploader.upload('mykey', self.tempfile.name, cb=cb)
+
+        self.assertEqual(self.uploaded,
+                         {1: self.parts[0], 2: self.parts[1],
+                          3: self.parts[2]})
+        self.bucket.complete_multipart_upload.assert_called_with(
+            'mykey', 'upload-id',
+            b'<CompleteMultipartUpload>'
+            b'<Part><PartNumber>1</PartNumber><ETag>"etag-1"</ETag></Part>'
+            b'<Part><PartNumber>2</PartNumber><ETag>"etag-2"</ETag></Part>'
+            b'<Part><PartNumber>3</PartNumber><ETag>"etag-3"</ETag></Part>'
+            b'</CompleteMultipartUpload>')
+        total = MINIMUM_PART_SIZE * 2 + 10
+        cb.assert_called_with(total, total)
+        self.assertFalse(self.mp.cancel_upload.called)
+
+    def test_failed_part_is_retried(self):
+        upload_part = self.mp.upload_part_from_file.side_effect
+        failures = []
+
+        def flaky_upload_part(fp, part_num, size=None):
+            if part_num == 2 and not failures:
+                failures.append(part_num)
+                raise S3ResponseError(500, 'Internal Server Error')
+            return upload_part(fp, part_num, size)
+        self.mp.upload_part_from_file.side_effect = flaky_upload_part
+
+        uploader = ConcurrentUploader(self.bucket, MINIMUM_PART_SIZE,
+                                      num_threads=2, num_retries=1)
+        with mock.patch('time.sleep'):
+            uploader.upload('mykey', self.tempfile.name)
+
+        self.assertEqual(self.uploaded[2], self.parts[1])
+        self.assertTrue(self.bucket.complete_multipart_upload.called)
+
+    def test_upload_cancelled_when_a_part_fails(self):
+        self.mp.upload_part_from_file.side_effect = S3ResponseError(
+            403, 'Forbidden')
+        uploader = ConcurrentUploader(self.bucket, MINIMUM_PART_SIZE,
+                                      num_threads=2, num_retries=0)
+
+        with self.assertRaises(S3ResponseError):
+            uploader.upload('mykey', self.tempfile.name)
+        self.mp.cancel_upload.assert_called_with()
+        self.assertFalse(self.bucket.complete_multipart_upload.called)
+
+
+class TestKeyParallelUpload(unittest.TestCase):
+    def test_small_files_use_a_single_put(self):
+        key = Key(mock.Mock(), 'mykey')
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(b'data')
+            f.flush()
+            with mock.patch.object(Key, 'set_contents_from_file') as put:
+                put.return_value = 4
+                key.set_contents_from_filename(f.name, parallel=4)
+            self.assertTrue(put.called)
+
+    def test_large_files_use_the_concurrent_uploader(self):
+        bucket = mock.Mock()
+        key = Key(bucket, 'mykey')
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(b'x' * (MINIMUM_PART_SIZE + 1))
+            f.flush()
+            with mock.patch('boto.s3.key.ConcurrentUploader') as uploader:
+                uploader.return_value.upload.return_value.etag = '"etag"'
+                size = key.set_contents_from_filename(
+                    f.name, parallel=4, part_size=MINIMUM_PART_SIZE)
+            uploader.assert_called_with(bucket, MINIMUM_PART_SIZE,
+                                        num_threads=4)
+        self.assertEqual(size, MINIMUM_PART_SIZE + 1)
+        self.assertEqual(key.etag, '"etag"')
+
+    def upload_headers(self, suffix, headers=None):
+        key = Key(mock.Mock(), 'mykey')
+        with tempfile.NamedTemporaryFile(suffix=suffix) as f:
+            f.write(b'x' * (MINIMUM_PART_SIZE + 1))
+            f.flush()
+            with mock.patch('boto.s3.key.ConcurrentUploader') as uploader:
+                key.set_contents_from_filename(
+                    f.name, headers=headers, parallel=4,
+                    part_size=MINIMUM_PART_SIZE)
+        return uploader.return_value.upload.call_args[1]['headers']
+
+    def test_content_type_is_guessed_from_the_file_name(self):
+        self.assertEqual(self.upload_headers('.html'),
+                         {'Content-Type': 'text/html'})
+        self.assertEqual(self.upload_headers('.unknown-type'),
+                         {'Content-Type': Key.DefaultContentType})
+
+    def test_content_type_header_is_kept(self):
+        headers = {'content-type': 'text/plain'}
+        self.assertEqual(self.upload_headers('.html', headers), headers)
+        self.assertEqual(self.upload_headers('.html', {'Content-Type': None}),
+                         {})
+
+
+class FakeRangeConnection(object):
+    """Serves Range GETs out of an in-memory object."""
+    def __init__(self, data, fail_parts=()):
+        self.data = data
+        self.provider = Provider('aws')
+        self.fail_parts = list(fail_parts)
+        self.ranges = []
+
+    def make_request(self, method, bucket, key, headers=None,
+                     query_args=None):
+        start, end = map(int, re.match(r'bytes=(\d+)-(\d+)',
+                                       headers['Range']).groups())
+        self.ranges.append((start, end))
+        response = mock.Mock()
+        response.getheader.return_value = None
+        if start in self.fail_parts:
+            self.fail_parts.remove(start)
+            response.status = 500
+            response.reason = 'Internal Server Error'
+            response.read.return_value = b''
+            return response
+        response.status = 206
+        response.read.side_effect = BytesIO(self.data[start:end + 1]).read
+        return response
+
+
+class TestConcurrentDownloader(unittest.TestCase):
+    def setUp(self):
+        self.data = b''.join(
+            bytes(bytearray([i])) * 1000 for i in range(10)) + b'tail'
+        self.connection = FakeRangeConnection(self.data)
+        self.bucket = mock.Mock()
+        self.bucket.name = 'mybucket'
+        self.bucket.connection = self.connection
+        self.key = Key(self.bucket, 'mykey')
+        self.key.size = len(self.data)
+        self.key.etag = '"%s"' % md5(self.data).hexdigest()
+        fd, self.filename = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(os.remove, self.filename)
+        self.tracker = self.filename + '.tracker'
+        self.addCleanup(
+            lambda: os.path.exists(self.tracker) and os.remove(self.tracker))
+
+    def read_file(self):
+        with open(self.filename, 'rb') as f:
+            return f.read()
+
+    def test_download(self):
+        downloader = ConcurrentDownloader(self.key, part_size=1000,
+                                          num_threads=3)
+        cb = mock.Mock()
+        downloader.download(self.filename, cb=cb)
+
+        self.assertEqual(self.read_file(), self.data)
+        self.assertEqual(len(self.connection.ranges), 11)
+        self.assertIn((10000, 10003), self.connection.ranges)
+        cb.assert_called_with(len(self.data), len(self.data))
+        self.assertEqual(self.key.local_hashes['md5'],
+                         md5(self.data).digest())
+
+    def test_failed_range_is_retried(self):
+        self.connection.fail_parts = [3000]
+        downloader = ConcurrentDownloader(self.key, part_size=1000,
+                                          num_threads=3, num_retries=1)
+        with mock.patch('time.sleep'):
+            downloader.download(self.filename)
+        self.assertEqual(self.read_file(), self.data)
+
+    def test_md5_mismatch_raises(self):
+        self.key.etag = '"%s"' % md5(b'other').hexdigest()
+        downloader = ConcurrentDownloader(self.key, part_size=1000,
+                                          num_threads=3)
+        with self.assertRaises(S3DataError):
+            downloader.download(self.filename)
+
+    def test_multipart_etag_is_not_verified(self):
+        self.key.etag = '"%s-3"' % md5(b'other').hexdigest()
+        downloader = ConcurrentDownloader(self.key, part_size=1000,
+                                          num_threads=3)
+        downloader.download(self.filename)
+        self.assertEqual(self.read_file(), self.data)
+
+    def test_resume_only_fetches_missing_parts(self):
+        self.connection.fail_parts = [5000, 5000]
+        downloader = ConcurrentDownloader(self.key, part_size=1000,
+                                          num_threads=1, num_retries=1)
+        with mock.patch('time.sleep'):
+            with self.assertRaises(S3ResponseError):
+                downloader.download(self.filename,
+                                    tracker_file_name=self.tracker)
+        self.assertTrue(os.path.exists(self.tracker))
+
+        self.connection.ranges = []
+        downloader.download(self.filename, tracker_file_name=self.tracker)
+        self.assertEqual(self.read_file(), self.data)
+        self.assertNotIn((0, 999), self.connection.ranges)
+        self.assertIn((5000, 5999), self.connection.ranges)
+        self.assertFalse(os.path.exists(self.tracker))
+
+    def test_tracker_for_other_etag_is_ignored(self):
+        with open(self.tracker, 'w') as f:
+            f.write('parallel:otheretag\n1000\n0\n1\n')
+        downloader = ConcurrentDownloader(self.key, part_size=1000,
+                                          num_threads=3)
+        downloader.download(self.filename, tracker_file_name=self.tracker)
+        self.assertEqual(self.read_file(), self.data)
+        self.assertEqual(len(self.connection.ranges), 11)
+
+
+class TestKeyParallelDownload(unittest.TestCase):
+    def setUp(self):
+        fd, self.filename = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(
+            lambda: os.path.exists(self.filename) and
+            os.remove(self.filename))
+
+    def test_small_objects_use_a_single_get(self):
+        key = Key(mock.Mock(), 'mykey')
+        key.size = 10
+        key.etag = '"etag"'
+        with mock.patch.object(Key, 'get_contents_to_file') as get:
+            key.get_contents_to_filename(self.filename, parallel=4)
+        self.assertTrue(get.called)
+
+    def test_large_objects_use_the_concurrent_downloader(self):
+        key = Key(mock.Mock(), 'mykey')
+        key.size = MINIMUM_PART_SIZE + 1
+        key.etag = '"etag"'
+        with mock.patch('boto.s3.key.ConcurrentDownloader') as downloader:
+            key.get_contents_to_filename(self.filename, parallel=4,
+                                         part_size=MINIMUM_PART_SIZE)
+        downloader.assert_called_with(key, part_size=MINIMUM_PART_SIZE,
+                                      num_threads=4, num_retries=5)
+        self.assertTrue(downloader.return_value.download.called)
+
+    def test_size_is_looked_up_when_unknown(self):
+        bucket = mock.Mock()
+        bucket.get_key.return_value.size = 10
+        key = Key(bucket, 'mykey')
+        with mock.patch.object(Key, 'get_contents_to_file'):
+            key.get_contents_to_filename(self.filename, parallel=4)
+        self.assertEqual(key.size, 10)
+
+    def test_partial_file_removed_without_tracker(self):
+        key = Key(mock.Mock(), 'mykey')
+        key.size = MINIMUM_PART_SIZE + 1
+        key.etag = '"etag"'
+        with mock.patch('boto.s3.key.ConcurrentDownloader') as downloader:
+            downloader.return_value.download.side_effect = IOError()
+            with self.assertRaises(IOError):
+                key.get_contents_to_filename(self.filename, parallel=4,
+                                             part_size=MINIMUM_PART_SIZE)
+        self.assertFalse(os.path.exists(self.filename))
+
+
+class TestConcurrentDeleter(unittest.TestCase):
+    def setUp(self):
+        self.bucket = Bucket(mock.Mock(), 'mybucket')
+        self.requests = []
+        # Maps a key name to the error codes it fails with, in turn.
+        self.failures = {}
+        patcher = mock.patch.object(self.bucket, '_delete_objects',
+                                    side_effect=self.delete_objects)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        sleep = mock.patch('time.sleep')
+        sleep.start()
+        self.addCleanup(sleep.stop)
+
+    def delete_objects(self, objects, quiet=False, mfa_token=None,
+                       headers=None):
+        self.requests.append([name for name, version_id in objects])
+        result = MultiDeleteResult(self.bucket)
+        for name, version_id in objects:
+            codes = self.failures.get(name)
+            if codes:
+                result.errors.append(Error(name, version_id,
+                                           code=codes.pop(0)))
+            elif not quiet:
+                result.deleted.append(Deleted(name, version_id))
+        return result
+
+    def test_consumes_keys_lazily(self):
+        consumed = []
+
+        def keys():
+            for i in range(10):
+                consumed.append(i)
+                yield 'key%d' % i
+
+        deleter = ConcurrentDeleter(self.bucket, num_threads=1, batch_size=2)
+        results = deleter.delete(keys(), quiet=False)
+        next(results)
+        # At most two requests per thread are queued ahead.
+        self.assertTrue(len(consumed) <= 5)
+        names = sorted([d.key for d in results] + ['key0'])
+        self.assertEqual(len(names), 10)
+        self.assertEqual(sorted(sum(self.requests, [])),
+                         sorted('key%d' % i for i in range(10)))
+
+    def test_retries_only_failed_keys(self):
+        self.failures['key1'] = ['SlowDown', 'InternalError']
+        self.failures['key2'] = ['AccessDenied']
+        deleter = ConcurrentDeleter(self.bucket, num_threads=2)
+        keys = ['key0', 'key1', 'key2', Prefix(name='dir/')]
+        errors = list(deleter.delete(keys))
+
+        self.assertEqual(sorted((e.key, e.code) for e in errors),
+                         [('dir/', 'PrefixSkipped'),
+                          ('key2', 'AccessDenied')])
+        self.assertEqual(self.requests,
+                         [['key0', 'key1', 'key2'], ['key1'], ['key1']])
+
+    def test_gives_up_on_keys_after_retries(self):
+        self.failures['key0'] = ['SlowDown'] * 3
+        deleter = ConcurrentDeleter(self.bucket, num_threads=1,
+                                    num_retries=2)
+        errors = list(deleter.delete(['key0']))
+        self.assertEqual([(e.key, e.code) for e in errors],
+                         [('key0', 'SlowDown')])
+        self.assertEqual(len(self.requests), 3)
+
+    def test_request_errors_are_raised(self):
+        self.bucket._delete_objects.side_effect = S3ResponseError(500,
+                                                                  'Error')
+        deleter = ConcurrentDeleter(self.bucket, num_threads=2,
+                                    num_retries=1)
+        with self.assertRaises(S3ResponseError):
+            list(deleter.delete(['key%d' % i for i in range(5)]))
+
+    def test_bucket_delete_keys_in_parallel(self):
+        self.failures['key3'] = ['AccessDenied']
+        result = self.bucket.delete_keys(
+            ['key%d' % i for i in range(5)], parallel=3)
+        self.assertEqual(sorted(d.key for d in result.deleted),
+                         ['key0', 'key1', 'key2', 'key4'])
+        self.assertEqual([e.key for e in result.errors], ['key3'])
+
+
+class FakeListingBucket(object):
+    """
+    Answers listing requests from a sorted list of key names, three keys
+    to a page.
+    """
+    page_size = 3
+    record_class = KeyRecord
+
+    def __init__(self, names):
+        self.name = 'mybucket'
+        self.names = sorted(names)
+        self.requests = []
+        self.failures = 0
+        self.lock = threading.Lock()
+
+    def _get_all(self, element_map, initial_query_string='', headers=None,
+                 prefix='', delimiter=None, marker=''):
+        with self.lock:
+            self.requests.append((prefix, delimiter, marker))
+            if self.failures:
+                self.failures -= 1
+                raise S3ResponseError(500, 'Error')
+        rs = ResultSet(element_map)
+        seen = set()
+        for name in self.names:
+            if not name.startswith(prefix) or name <= marker:
+                continue
+            # Like S3, skip the keys rolled up into the marker.
+            if delimiter and marker.endswith(delimiter) and \
+                    name.startswith(marker):
+                continue
+            if len(rs) == self.page_size:
+                rs.is_truncated = True
+                break
+            rest = name[len(prefix):]
+            if delimiter and delimiter in rest:
+                common = prefix + rest[:rest.index(delimiter) + 1]
+                if common not in seen:
+                    seen.add(common)
+                    rs.append(Prefix(self, common))
+                    rs.next_marker = common
+                continue
+            rs.append(KeyRecord(self, name, size=len(name)))
+            rs.next_marker = name
+        return rs
+
+
+class TestConcurrentLister(unittest.TestCase):
+    def setUp(self):
+        self.names = ['a', 'a/1', 'a/2', 'a/3', 'a/4', 'b', 'c/1', 'c/2',
+                      'c0', 'd/x/1', 'd/y/2', 'e']
+        self.bucket = FakeListingBucket(self.names)
+
+    def test_lists_prefixes_in_order(self):
+        lister = ConcurrentLister(self.bucket, num_threads=3,
+                                  max_buffered_pages=1)
+        records = list(lister.list())
+        self.assertEqual([r.name for r in records], self.names)
+        self.assertEqual(records[1].size, 3)
+        self.assertIn(('a/', None, 'a/3'), self.bucket.requests)
+        self.assertIn(('d/', None, ''), self.bucket.requests)
+
+    def test_unordered(self):
+        lister = ConcurrentLister(self.bucket, num_threads=2)
+        names = [r.name for r in lister.list(ordered=False)]
+        self.assertEqual(sorted(names), self.names)
+
+    def test_prefix(self):
+        lister = ConcurrentLister(self.bucket, num_threads=2)
+        names = [r.name for r in lister.list(prefix='d/')]
+        self.assertEqual(names, ['d/x/1', 'd/y/2'])
+
+    def test_keys_before_prefixes_in_a_page(self):
+        get_all = self.bucket._get_all
+
+        def keys_first(*args, **kwargs):
+            rs = get_all(*args, **kwargs)
+            rs.sort(key=lambda item: isinstance(item, Prefix))
+            return rs
+
+        self.bucket._get_all = keys_first
+        lister = ConcurrentLister(self.bucket, num_threads=2)
+        names = [r.name for r in lister.list()]
+        self.assertEqual(names, self.names)
+
+    def test_flat_keyspace_is_streamed(self):
+        self.bucket.names = ['key%03d' % i for i in range(100)]
+        lister = ConcurrentLister(self.bucket, num_threads=2,
+                                  max_buffered_pages=1)
+        results = lister.list()
+        self.assertEqual(next(results).name, 'key000')
+        # Discovery is at most a couple of pages ahead of the consumer.
+        self.assertTrue(len(self.bucket.requests) <= 4)
+        results.close()
+        self.assertFalse(any(t.is_alive() for t in lister._threads))
+
+    def test_discovery_errors_are_raised(self):
+        lister = ConcurrentLister(self.bucket, num_threads=2, num_retries=0)
+        self.bucket.failures = 1
+        with self.assertRaises(S3ResponseError):
+            list(lister.list(ordered=False))
+
+    def test_split_points(self):
+        lister = ConcurrentLister(self.bucket, num_threads=2)
+        names = [r.name for r in lister.list(split_points=['c0', 'a/2'])]
+        self.assertEqual(names, self.names)
+        markers = set(request[2] for request in self.bucket.requests)
+        self.assertTrue(set(['', 'a/2', 'c0']) <= markers)
+        self.assertFalse(any(request[1] for request in self.bucket.requests))
+
+    def test_retries_failed_pages(self):
+        self.bucket.failures = 1
+        with mock.patch('time.sleep'):
+            lister = ConcurrentLister(self.bucket, num_threads=2)
+            names = [r.name for r in lister.list(split_points=['b'])]
+        self.assertEqual(names, self.names)
+
+    def test_errors_are_raised(self):
+        lister = ConcurrentLister(self.bucket, num_threads=2, num_retries=0)
+        results = lister.list(split_points=['b'])
+        self.bucket.failures = 1
+        with self.assertRaises(S3ResponseError):
+            list(results)
+
+    def test_abandoned_listing_stops_threads(self):
+        self.bucket.names = ['key%03d' % i for i in range(100)]
+        lister = ConcurrentLister(self.bucket, num_threads=2,
+                                  max_buffered_pages=1)
+        results = lister.list(split_points=['key050'])
+        next(results)
+        results.close()
+        self.assertFalse(any(t.is_alive() for t in lister._threads))
+
+
+if __name__ == '__main__':
+    unittest.main()
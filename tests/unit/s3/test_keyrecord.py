@@ -0,0 +1,86 @@
+import datetime
+import xml.sax
+
+from tests.compat import mock, unittest
+
+from boto import handler
+from boto.gs.bucket import Bucket as GSBucket
+from boto.gs.key import Key as GSKey
+from boto.gs.keyrecord import KeyRecord as GSKeyRecord
+from boto.resultset import ResultSet
+from boto.s3.bucket import Bucket
+from boto.s3.key import Key
+from boto.s3.keyrecord import KeyRecord
+from boto.s3.prefix import Prefix
+
+
+LISTING = b"""<?xml version="1.0" encoding="UTF-8"?>
+<ListBucketResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">
+  <Name>mybucket</Name>
+  <IsTruncated>false</IsTruncated>
+  <Contents>
+    <Key>photos/1.jpg</Key>
+    <LastModified>2015-01-02T03:04:05.000Z</LastModified>
+    <ETag>&quot;abc&quot;</ETag>
+    <Size>1234</Size>
+    <Owner><ID>owner</ID><DisplayName>name</DisplayName></Owner>
+    <StorageClass>STANDARD</StorageClass>
+    <Generation>1360887759327000</Generation>
+    <MetaGeneration>1</MetaGeneration>
+  </Contents>
+  <CommonPrefixes><Prefix>videos/</Prefix></CommonPrefixes>
+</ListBucketResult>"""
+
+
+def parse(record_class, bucket):
+    rs = ResultSet([('Contents', record_class), ('CommonPrefixes', Prefix)])
+    xml.sax.parseString(LISTING, handler.XmlHandler(rs, bucket))
+    return rs
+
+
+class TestKeyRecord(unittest.TestCase):
+    def test_parse_listing(self):
+        record, prefix = parse(KeyRecord, 'bucket')
+        self.assertEqual(record.bucket, 'bucket')
+        self.assertEqual(record.name, 'photos/1.jpg')
+        self.assertEqual(record.etag, '"abc"')
+        self.assertEqual(record.last_modified, '2015-01-02T03:04:05.000Z')
+        self.assertEqual(record.storage_class, 'STANDARD')
+        self.assertFalse(hasattr(record, '__dict__'))
+        self.assertEqual(prefix.name, 'videos/')
+
+    def test_fields_are_parsed_lazily(self):
+        record = parse(KeyRecord, 'bucket')[0]
+        self.assertEqual(record._size, '1234')
+        self.assertEqual(record.size, 1234)
+        self.assertEqual(record._size, 1234)
+        self.assertEqual(record.last_modified_datetime,
+                         datetime.datetime(2015, 1, 2, 3, 4, 5))
+        self.assertEqual(KeyRecord().last_modified_datetime, None)
+
+    def test_to_key(self):
+        bucket = Bucket(mock.Mock(), 'mybucket')
+        key = parse(KeyRecord, bucket)[0].to_key()
+        self.assertTrue(isinstance(key, Key))
+        self.assertEqual(key.bucket, bucket)
+        self.assertEqual(key.name, 'photos/1.jpg')
+        self.assertEqual(key.size, 1234)
+        self.assertEqual(key.etag, '"abc"')
+        self.assertEqual(key.last_modified, '2015-01-02T03:04:05.000Z')
+        self.assertEqual(key.storage_class, 'STANDARD')
+
+    def test_gs_record(self):
+        bucket = GSBucket(mock.Mock(), 'mybucket')
+        self.assertIs(bucket.record_class, GSKeyRecord)
+        record = parse(bucket.record_class, bucket)[0]
+        self.assertFalse(hasattr(record, '__dict__'))
+        self.assertEqual(record.generation, '1360887759327000')
+        key = record.to_key()
+        self.assertTrue(isinstance(key, GSKey))
+        self.assertEqual(key.generation, '1360887759327000')
+        self.assertEqual(key.metageneration, '1')
+        self.assertEqual(key.size, 1234)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,307 @@
+import os
+import shutil
+import tempfile
+import threading
+from hashlib import md5
+
+from tests.compat import mock, unittest
+
+from boto.resultset import ResultSet
+from boto.s3.keyrecord import KeyRecord
+from boto.s3.multidelete import MultiDeleteResult
+from boto.s3.prefix import Prefix
+from boto.s3.sync import S3Sync, SyncIndex, INDEX_FILE_NAME, _hash_file
+
+
+class FakeKey(object):
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        self.etag = None
+
+    def get_md5_from_hexdigest(self, md5_hex):
+        return (md5_hex, 'base64')
+
+    def set_contents_from_filename(self, filename, md5=None):
+        with open(filename, 'rb') as f:
+            data = f.read()
+        assert md5[0] == md5_etag(data)
+        self.etag = self.bucket.put(self.name, data)
+
+    def get_contents_to_filename(self, filename):
+        with open(filename, 'wb') as f:
+            f.write(self.bucket.objects[self.name][0])
+
+
+class FakeMultipartUpload(object):
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        self.id = 'upload-%s' % name
+        self.parts = {}
+
+    def upload_part_from_file(self, fp, part_num, size=None):
+        data = fp.read(size)
+        with self.bucket.lock:
+            self.parts[part_num] = data
+        part = mock.Mock()
+        part.etag = '"%s"' % md5_etag(data)
+        return part
+
+    def cancel_upload(self):
+        self.bucket.cancelled.append(self.name)
+
+
+def md5_etag(data):
+    return md5(data).hexdigest()
+
+
+class FakeBucket(object):
+    """
+    Keeps objects in memory & answers listings in a single page.
+    """
+    record_class = KeyRecord
+
+    def __init__(self):
+        self.name = 'mybucket'
+        self.objects = {}
+        self.uploads = {}
+        self.cancelled = []
+        self.puts = []
+        self.mp_headers = {}
+        self.lock = threading.Lock()
+
+    def put(self, name, data, etag=None):
+        etag = etag or '"%s"' % md5_etag(data)
+        with self.lock:
+            self.objects[name] = (data, etag)
+            self.puts.append(name)
+        return etag
+
+    def new_key(self, name):
+        return FakeKey(self, name)
+
+    def _get_all(self, element_map, initial_query_string='', headers=None,
+                 prefix='', delimiter=None, marker=''):
+        rs = ResultSet(element_map)
+        seen = set()
+        for name in sorted(self.objects):
+            if not name.startswith(prefix) or name <= marker:
+                continue
+            rest = name[len(prefix):]
+            if delimiter and delimiter in rest:
+                common = prefix + rest[:rest.index(delimiter) + 1]
+                if common not in seen:
+                    seen.add(common)
+                    rs.append(Prefix(self, common))
+                continue
+            data, etag = self.objects[name]
+            rs.append(KeyRecord(self, name, size=str(len(data)), etag=etag))
+        return rs
+
+    def initiate_multipart_upload(self, name, headers=None):
+        mp = FakeMultipartUpload(self, name)
+        self.mp_headers[name] = headers
+        self.uploads[mp.id] = mp
+        return mp
+
+    def complete_multipart_upload(self, name, upload_id, xml_body):
+        mp = self.uploads.pop(upload_id)
+        data = b''.join(mp.parts[i] for i in sorted(mp.parts))
+        digests = b''.join(md5(mp.parts[i]).digest() for i in sorted(mp.parts))
+        etag = '"%s-%d"' % (md5(digests).hexdigest(), len(mp.parts))
+        self.put(name, data, etag)
+        completed = mock.Mock()
+        completed.etag = etag
+        return completed
+
+    def delete_keys(self, names, quiet=False):
+        result = MultiDeleteResult(self)
+        for name in names:
+            del self.objects[name]
+        return result
+
+
+class SyncTestCase(unittest.TestCase):
+    def setUp(self):
+        self.local_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.local_dir)
+        self.bucket = FakeBucket()
+
+    def write(self, path, data):
+        filename = os.path.join(self.local_dir, *path.split('/'))
+        if not os.path.isdir(os.path.dirname(filename)):
+            os.makedirs(os.path.dirname(filename))
+        with open(filename, 'wb') as f:
+            f.write(data)
+        return filename
+
+    def read(self, path):
+        with open(os.path.join(self.local_dir, *path.split('/')), 'rb') as f:
+            return f.read()
+
+
+class TestHashFile(SyncTestCase):
+    def test_multipart_etag(self):
+        filename = self.write('file', b'a' * 10 + b'b' * 5)
+        expected = md5(md5(b'a' * 10).digest() +
+                       md5(b'b' * 5).digest()).hexdigest()
+        self.assertEqual(_hash_file(filename, 10), expected + '-2')
+        self.assertEqual(_hash_file(filename), md5_etag(b'a' * 10 + b'b' * 5))
+
+
+class TestSyncIndex(SyncTestCase):
+    def test_hashes_only_changed_files(self):
+        filename = self.write('file', b'data')
+        index_file = os.path.join(self.local_dir, INDEX_FILE_NAME)
+        index = SyncIndex(index_file)
+        stat = os.stat(filename)
+        self.assertEqual(index.md5('file', filename, stat), md5_etag(b'data'))
+        index.save()
+
+        index = SyncIndex(index_file)
+        with mock.patch('boto.s3.sync._hash_file') as hash_file:
+            self.assertEqual(index.md5('file', filename, stat),
+                             md5_etag(b'data'))
+            self.assertFalse(hash_file.called)
+
+        changed = os.stat_result(stat[:6] + (stat.st_mtime + 1,) +
+                                 stat[7:])
+        self.assertEqual(index.get('file', changed), (None, None))
+
+    def test_corrupt_index_is_ignored(self):
+        index_file = self.write(INDEX_FILE_NAME, b'{not json')
+        self.assertEqual(SyncIndex(index_file).get('file', None),
+                         (None, None))
+
+
+class TestS3SyncUpload(SyncTestCase):
+    def test_uploads_only_changes(self):
+        self.write('a.txt', b'alpha')
+        self.write('dir/b.txt', b'beta')
+        self.write('dir/sub/c.txt', b'gamma')
+        self.bucket.put('prefix/a.txt', b'alpha')
+        self.bucket.put('prefix/dir/b.txt', b'BETA')
+        self.bucket.put('prefix/old.txt', b'old')
+
+        sync = S3Sync(self.bucket, num_threads=3)
+        result = sync.upload(self.local_dir, 'prefix')
+
+        self.assertEqual(sorted(result.uploaded),
+                         ['dir/b.txt', 'dir/sub/c.txt'])
+        self.assertEqual(result.skipped, 1)
+        self.assertEqual(result.errors, [])
+        self.assertEqual(self.bucket.objects['prefix/dir/b.txt'][0], b'beta')
+        self.assertIn('prefix/old.txt', self.bucket.objects)
+        self.assertNotIn('prefix/' + INDEX_FILE_NAME, self.bucket.objects)
+
+        # Nothing has changed, so nothing is hashed or uploaded again.
+        with mock.patch('boto.s3.sync._hash_file') as hash_file:
+            result = sync.upload(self.local_dir, 'prefix')
+            self.assertFalse(hash_file.called)
+        self.assertEqual(result.uploaded, [])
+        self.assertEqual(result.skipped, 3)
+
+    def test_delete(self):
+        self.write('a.txt', b'alpha')
+        self.bucket.put('old.txt', b'old')
+        result = S3Sync(self.bucket).upload(self.local_dir, delete=True)
+        self.assertEqual(result.deleted, ['old.txt'])
+        self.assertEqual(sorted(self.bucket.objects), ['a.txt'])
+
+    def test_multipart_upload(self):
+        data = b''.join(chr(65 + i % 26).encode('ascii') * 1000
+                        for i in range(25))
+        self.write('big', data)
+        sync = S3Sync(self.bucket, num_threads=4, part_size=10000,
+                      multipart_threshold=20000)
+        with mock.patch('boto.s3.sync.minimum_part_size',
+                        lambda size, part_size: part_size):
+            result = sync.upload(self.local_dir)
+            self.assertEqual(result.uploaded, ['big'])
+            self.assertEqual(self.bucket.objects['big'][0], data)
+            self.assertTrue(self.bucket.objects['big'][1].endswith('-3"'))
+            self.assertEqual(self.bucket.mp_headers['big'],
+                             {'Content-Type': 'application/octet-stream'})
+
+            # The multipart ETag is matched without uploading again, even
+            # without the index.
+            os.remove(os.path.join(self.local_dir, INDEX_FILE_NAME))
+            result = sync.upload(self.local_dir)
+        self.assertEqual(result.skipped, 1)
+        self.assertEqual(self.bucket.puts, ['big'])
+
+    def test_multipart_upload_guesses_content_type(self):
+        self.write('page.html', b'x' * 30)
+        sync = S3Sync(self.bucket, part_size=10, multipart_threshold=20)
+        with mock.patch('boto.s3.sync.minimum_part_size',
+                        lambda size, part_size: part_size):
+            result = sync.upload(self.local_dir)
+        self.assertEqual(result.uploaded, ['page.html'])
+        self.assertEqual(self.bucket.mp_headers['page.html'],
+                         {'Content-Type': 'text/html'})
+
+    def test_failed_parts_cancel_the_upload(self):
+        self.write('big', b'x' * 30)
+        sync = S3Sync(self.bucket, part_size=10, multipart_threshold=20)
+        with mock.patch('boto.s3.sync.minimum_part_size',
+                        lambda size, part_size: part_size):
+            with mock.patch.object(FakeMultipartUpload,
+                                   'upload_part_from_file',
+                                   side_effect=IOError('Broken')):
+                result = sync.upload(self.local_dir)
+        self.assertEqual([path for path, e in result.errors], ['big'])
+        self.assertEqual(self.bucket.cancelled, ['big'])
+        self.assertEqual(self.bucket.objects, {})
+
+
+class TestS3SyncDownload(SyncTestCase):
+    def test_downloads_only_changes(self):
+        self.bucket.put('p/a.txt', b'alpha')
+        self.bucket.put('p/dir/b.txt', b'beta')
+        self.bucket.put('p/dir/', b'')
+        self.write('a.txt', b'alpha')
+        self.write('stale.txt', b'stale')
+
+        sync = S3Sync(self.bucket)
+        result = sync.download('p/', self.local_dir, delete=True)
+
+        self.assertEqual(result.downloaded, ['dir/b.txt'])
+        self.assertEqual(result.skipped, 1)
+        self.assertEqual(result.deleted, ['stale.txt'])
+        self.assertEqual(self.read('dir/b.txt'), b'beta')
+        self.assertFalse(os.path.exists(
+            os.path.join(self.local_dir, 'stale.txt')))
+        leftovers = [name for name in os.listdir(self.local_dir)
+                     if name.startswith('.botosync-')]
+        self.assertEqual(leftovers, [])
+
+        self.bucket.put('p/a.txt', b'ALPHA')
+        result = sync.download('p', self.local_dir)
+        self.assertEqual(result.downloaded, ['a.txt'])
+        self.assertEqual(self.read('a.txt'), b'ALPHA')
+
+    def test_keys_outside_local_dir_are_refused(self):
+        local_dir = os.path.join(self.local_dir, 'sync')
+        self.bucket.put('p/a.txt', b'alpha')
+        self.bucket.put('p/../escaped.txt', b'evil')
+        self.bucket.put('p/dir/../../../escaped.txt', b'evil')
+
+        result = S3Sync(self.bucket).download('p', local_dir, delete=True)
+
+        self.assertEqual(result.downloaded, ['a.txt'])
+        self.assertEqual(sorted(path for path, e in result.errors),
+                         ['../escaped.txt', 'dir/../../../escaped.txt'])
+        self.assertEqual(sorted(os.listdir(self.local_dir)), ['sync'])
+        self.assertFalse(os.path.exists(
+            os.path.join(os.path.dirname(self.local_dir), 'escaped.txt')))
+
+    def test_creates_local_dir(self):
+        self.bucket.put('a.txt', b'alpha')
+        local_dir = os.path.join(self.local_dir, 'new')
+        S3Sync(self.bucket).download('', local_dir)
+        self.assertEqual(self.read('new/a.txt'), b'alpha')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,215 @@
+import threading
+import time
+
+from tests.compat import mock, unittest
+
+from boto.sqs.batchresults import BatchResults, ResultEntry
+from boto.sqs.consumer import ConsumerStats, QueueConsumer
+from boto.sqs.message import Message
+
+
+def make_message(i):
+    message = Message(body='message %s' % i)
+    message.id = 'id-%s' % i
+    message.receipt_handle = 'handle-%s' % i
+    return message
+
+
+def batch_results(entries, failed=()):
+    results = BatchResults(None)
+    for entry in entries:
+        if isinstance(entry, tuple):
+            entry = entry[0]
+        result = ResultEntry(id=entry.id)
+        if entry.id in failed:
+            result['error_message'] = 'Failed'
+            results.errors.append(result)
+        else:
+            results.results.append(result)
+    return results
+
+
+class FakeQueue(object):
+    def __init__(self, batches):
+        self.batches = list(batches)
+        self.lock = threading.Lock()
+        self.receive_calls = []
+        self.deleted = []
+        self.delete_calls = 0
+        self.visibility_calls = []
+
+    def get_messages(self, num_messages=1, visibility_timeout=None,
+                     attributes=None, wait_time_seconds=None,
+                     message_attributes=None):
+        with self.lock:
+            self.receive_calls.append((num_messages, visibility_timeout,
+                                       wait_time_seconds))
+            if self.batches:
+                return self.batches.pop(0)
+        # Pretend to long poll an empty queue.
+        time.sleep(0.01)
+        return []
+
+    def delete_message_batch(self, entries):
+        with self.lock:
+            self.delete_calls += 1
+            self.deleted.extend(entry.receipt_handle for entry in entries)
+        return batch_results(entries)
+
+    def change_message_visibility_batch(self, entries):
+        with self.lock:
+            self.visibility_calls.append(
+                [(entry.receipt_handle, timeout)
+                 for entry, timeout in entries])
+        return batch_results(entries)
+
+
+class TestConsumerStats(unittest.TestCase):
+    def test_ratios(self):
+        stats = ConsumerStats(batch_size=10)
+        self.assertEqual(stats.batch_fill_ratio, 0.0)
+        stats.add_receive(0.5, 10)
+        stats.add_receive(1.5, 0)
+        stats.add_delete(4, 1)
+        self.assertEqual(stats.receives, 2)
+        self.assertEqual(stats.empty_receives, 1)
+        self.assertEqual(stats.average_receive_latency, 1.0)
+        self.assertEqual(stats.max_receive_latency, 1.5)
+        self.assertEqual(stats.batch_fill_ratio, 0.5)
+        self.assertEqual(stats.delete_fill_ratio, 0.5)
+
+
+class TestQueueConsumer(unittest.TestCase):
+    def create_consumer(self, queue, **kwargs):
+        kwargs.setdefault('num_receivers', 1)
+        kwargs.setdefault('delete_interval', 0.01)
+        consumer = QueueConsumer(queue, **kwargs)
+        self.addCleanup(consumer.close)
+        return consumer
+
+    def test_receives_messages(self):
+        messages = [make_message(i) for i in range(15)]
+        queue = FakeQueue([messages[:10], messages[10:]])
+        consumer = self.create_consumer(queue, num_receivers=2,
+                                        visibility_timeout=45)
+        received = [consumer.get(timeout=1) for i in range(15)]
+
+        self.assertEqual(sorted(m.id for m in received),
+                         sorted(m.id for m in messages))
+        self.assertEqual(queue.receive_calls[0], (10, 45, 20))
+        self.assertEqual(consumer.stats.messages_received, 15)
+        self.assertEqual(consumer.get(timeout=0.01), None)
+
+    def test_batches_deletes(self):
+        messages = [make_message(i) for i in range(12)]
+        queue = FakeQueue([messages[:10], messages[10:]])
+        consumer = self.create_consumer(queue, delete_interval=10)
+        for i in range(12):
+            consumer.delete(consumer.get(timeout=1))
+        consumer.close()
+
+        self.assertEqual(sorted(queue.deleted),
+                         sorted(m.receipt_handle for m in messages))
+        self.assertEqual(queue.delete_calls, 2)
+        self.assertEqual(consumer.stats.messages_deleted, 12)
+        self.assertEqual(consumer.stats.delete_batches, 2)
+
+    def test_delete_entries_are_unique(self):
+        message = make_message(1)
+        duplicate = make_message(1)
+        duplicate.receipt_handle = 'handle-other'
+        consumer = self.create_consumer(FakeQueue([]))
+        queue = consumer.queue = mock.Mock()
+        queue.delete_message_batch.side_effect = batch_results
+        consumer._delete_batch([message, duplicate])
+        entries = queue.delete_message_batch.call_args[0][0]
+        self.assertEqual([e.id for e in entries], ['0', '1'])
+        self.assertEqual([e.receipt_handle for e in entries],
+                         ['handle-1', 'handle-other'])
+
+    def test_extends_visibility_of_unfinished_messages(self):
+        messages = [make_message(i) for i in range(3)]
+        queue = FakeQueue([messages])
+        consumer = self.create_consumer(queue, visibility_timeout=30)
+        first = consumer.get(timeout=1)
+        consumer.delete(first)
+
+        with consumer._lock:
+            for state in consumer._in_flight.values():
+                # Expiring in 5 seconds.
+                state[2] = time.time() + 5
+        consumer._extend_expiring()
+
+        extended = queue.visibility_calls[-1]
+        self.assertEqual(sorted(extended), [
+            ('handle-1', 30), ('handle-2', 30)])
+        self.assertEqual(consumer.stats.visibility_extensions, 2)
+
+        # They're not extended again until they're about to expire.
+        calls = len(queue.visibility_calls)
+        consumer._extend_expiring()
+        self.assertEqual(len(queue.visibility_calls), calls)
+
+    def test_stops_tracking_messages_it_cannot_extend(self):
+        message = make_message(1)
+        queue = FakeQueue([])
+        queue.change_message_visibility_batch = mock.Mock(
+            side_effect=lambda entries: batch_results(entries, failed=['0']))
+        consumer = self.create_consumer(queue, extend_visibility=False)
+        consumer._add_in_flight([message])
+        consumer._in_flight['handle-1'][2] = time.time()
+        consumer._extend_expiring()
+        self.assertEqual(consumer._in_flight, {})
+
+    def test_stops_extending_after_max_extension(self):
+        messages = [make_message(i) for i in range(2)]
+        queue = FakeQueue([])
+        consumer = self.create_consumer(queue, extend_visibility=False,
+                                        visibility_timeout=30,
+                                        max_extension=60)
+        consumer._add_in_flight(messages)
+        now = time.time()
+        consumer._in_flight['handle-0'][1:] = [now - 20, now]
+        consumer._in_flight['handle-1'][1:] = [now - 40, now]
+        consumer._extend_expiring()
+
+        self.assertEqual(queue.visibility_calls, [[('handle-0', 30)]])
+        self.assertEqual(list(consumer._in_flight), ['handle-0'])
+
+    def test_release(self):
+        messages = [make_message(i) for i in range(2)]
+        queue = FakeQueue([messages])
+        consumer = self.create_consumer(queue, extend_visibility=False)
+        message = consumer.get(timeout=1)
+        consumer.release(message)
+
+        self.assertIn([(message.receipt_handle, 0)], queue.visibility_calls)
+        self.assertNotIn(message.receipt_handle, consumer._in_flight)
+
+    def test_close_releases_unused_messages(self):
+        messages = [make_message(i) for i in range(3)]
+        queue = FakeQueue([messages])
+        consumer = self.create_consumer(queue)
+        consumer.get(timeout=1)
+        # Give the receiver time to buffer the rest.
+        for i in range(100):
+            if consumer._messages.qsize() == 2:
+                break
+            time.sleep(0.01)
+        consumer.close()
+
+        released = [call for call in queue.visibility_calls
+                    if call[0][1] == 0]
+        self.assertEqual(sorted(released[0]), [
+            ('handle-1', 0), ('handle-2', 0)])
+
+    def test_receive_errors_are_raised(self):
+        queue = FakeQueue([])
+        queue.get_messages = mock.Mock(side_effect=IOError('Broken'))
+        consumer = self.create_consumer(queue)
+        with self.assertRaises(IOError):
+            consumer.get(timeout=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,169 @@
+import threading
+
+from tests.compat import mock, unittest
+
+from boto.exception import SQSError
+from boto.sqs.batchresults import BatchResults, ResultEntry
+from boto.sqs.message import RawMessage
+from boto.sqs.queue import Queue
+from boto.sqs.sendbuffer import SendBuffer, SendFuture, message_size
+
+
+class FakeQueue(object):
+    """
+    Records ``write_batch`` calls. ``failures`` maps a message body to the
+    (sender_fault, code) it fails with, once per entry in the list.
+    """
+    def __init__(self):
+        self.batches = []
+        self.failures = {}
+        self.lock = threading.Lock()
+
+    def write_batch(self, messages):
+        with self.lock:
+            self.batches.append([message[1] for message in messages])
+        results = BatchResults(None)
+        for message in messages:
+            failures = self.failures.get(message[1])
+            if failures:
+                sender_fault, code = failures.pop(0)
+                results.errors.append(ResultEntry(
+                    id=message[0], sender_fault=sender_fault,
+                    error_code=code, error_message='Failed'))
+            else:
+                results.results.append(ResultEntry(
+                    id=message[0], message_id='msg-%s' % message[1],
+                    message_md5='md5'))
+        return results
+
+
+def message(body):
+    return RawMessage(body=body)
+
+
+class TestMessageSize(unittest.TestCase):
+    def test_counts_body_and_attributes(self):
+        self.assertEqual(message_size(u'caf\xe9'), 5)
+        self.assertEqual(message_size('body', {
+            'name': {'data_type': 'String', 'string_value': 'value'}}),
+            4 + 4 + 6 + 5)
+
+
+class TestSendFuture(unittest.TestCase):
+    def test_callbacks(self):
+        future = SendFuture('message')
+        callback = mock.Mock()
+        future.add_done_callback(callback)
+        self.assertFalse(callback.called)
+        future._finish()
+        callback.assert_called_with(future)
+
+        later = mock.Mock()
+        future.add_done_callback(later)
+        later.assert_called_with(future)
+
+    def test_exception(self):
+        future = SendFuture('message')
+        error = ValueError('Nope')
+        future._finish(error)
+        self.assertIs(future.exception(), error)
+        with self.assertRaises(ValueError):
+            future.result()
+
+    def test_timeout(self):
+        future = SendFuture('message')
+        with self.assertRaises(RuntimeError):
+            future.result(timeout=0.01)
+
+
+class TestSendBuffer(unittest.TestCase):
+    def setUp(self):
+        self.queue = FakeQueue()
+        self.sleep = mock.patch('time.sleep').start()
+        self.addCleanup(mock.patch.stopall)
+
+    def create_buffer(self, **kwargs):
+        kwargs.setdefault('flush_interval', 10)
+        buf = SendBuffer(self.queue, **kwargs)
+        self.addCleanup(buf.close)
+        return buf
+
+    def test_batches_by_count(self):
+        buf = self.create_buffer()
+        futures = [buf.write(message('m%s' % i)) for i in range(25)]
+        buf.flush()
+
+        self.assertEqual([len(batch) for batch in self.queue.batches],
+                         [10, 10, 5])
+        sent = futures[3].result(timeout=1)
+        self.assertEqual(sent.id, 'msg-m3')
+        self.assertEqual(sent.md5, 'md5')
+
+    def test_batches_by_size(self):
+        buf = self.create_buffer(max_batch_bytes=250)
+        for i in range(5):
+            buf.write(message('%s' % i * 100))
+        buf.close()
+        self.assertEqual([len(batch) for batch in self.queue.batches],
+                         [2, 2, 1])
+
+    def test_message_too_large(self):
+        buf = self.create_buffer()
+        with self.assertRaises(ValueError):
+            buf.write(message('x' * (256 * 1024 + 1)))
+
+    def test_flushes_on_a_timer(self):
+        buf = self.create_buffer(flush_interval=0.01)
+        future = buf.write(message('m'))
+        self.assertEqual(future.result(timeout=5).id, 'msg-m')
+        self.assertEqual(self.queue.batches, [['m']])
+
+    def test_resends_only_failed_entries(self):
+        self.queue.failures['m1'] = [('false', 'InternalError')]
+        buf = self.create_buffer()
+        futures = [buf.write(message('m%s' % i)) for i in range(3)]
+        buf.flush()
+
+        self.assertEqual(self.queue.batches, [['m0', 'm1', 'm2'], ['m1']])
+        self.assertEqual([f.result().id for f in futures],
+                         ['msg-m0', 'msg-m1', 'msg-m2'])
+
+    def test_reports_entries_that_cannot_be_sent(self):
+        self.queue.failures['bad'] = [('true', 'InvalidMessageContents')]
+        self.queue.failures['flaky'] = [('false', 'InternalError')] * 3
+        buf = self.create_buffer(max_retries=2)
+        bad = buf.write(message('bad'))
+        flaky = buf.write(message('flaky'))
+        good = buf.write(message('good'))
+        buf.flush()
+
+        self.assertEqual(bad.exception().error_code,
+                         'InvalidMessageContents')
+        self.assertIsInstance(flaky.exception(), SQSError)
+        self.assertEqual(good.result().id, 'msg-good')
+        self.assertEqual(len(self.queue.batches), 3)
+
+    def test_request_errors_fail_the_batch(self):
+        self.queue.write_batch = mock.Mock(side_effect=IOError('Broken'))
+        buf = self.create_buffer()
+        future = buf.write(message('m'))
+        buf.flush()
+        self.assertIsInstance(future.exception(), IOError)
+
+    def test_close_sends_pending_messages(self):
+        buf = self.create_buffer()
+        future = buf.write(message('m'))
+        buf.close()
+        self.assertTrue(future.done())
+        with self.assertRaises(ValueError):
+            buf.write(message('late'))
+
+    def test_queue_send_buffer(self):
+        queue = Queue(connection=mock.Mock(), url='http://example/1/q')
+        with queue.send_buffer(flush_interval=10) as buf:
+            self.assertIs(buf.queue, queue)
+            self.assertEqual(buf._flush_interval, 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -28,8 +28,12 @@ from httpretty import HTTPretty
 from boto import UserAgent
 from boto.compat import json, parse_qs
 from boto.connection import AWSQueryConnection, AWSAuthConnection, HTTPRequest
-from boto.exception import BotoServerError
+from boto.connection import ConnectionPool, HostConnectionPool
+from boto.exception import BotoServerError, CircuitOpenError
+from boto.exception import ConnectionPoolTimeoutError
+from boto.instrumentation import Instrumentation
 from boto.regioninfo import RegionInfo
+from boto.retry import RetryPolicy
 
 
 class TestListParamsSerialization(unittest.TestCase):
@@ -98,6 +102,18 @@ class MockAWSService(AWSQueryConnection):
                                     profile_name=profile_name)
 
 
+class MockListItem(object):
+    def __init__(self, connection=None):
+        self.name = None
+
+    def startElement(self, name, attrs, connection):
+        return None
+
+    def endElement(self, name, value, connection):
+        if name == 'name':
+            self.name = value
+
+
 class TestAWSAuthConnection(unittest.TestCase):
     def test_get_path(self):
         conn = AWSAuthConnection(
@@ -458,6 +474,196 @@ class TestAWSQueryConnectionSimple(TestAWSQueryConnection):
         self.assertNotEqual(con1, con3)
 
 
+class TestAWSQueryRetries(TestAWSQueryConnection):
+    throttled_body = ('<ErrorResponse><Error><Type>Sender</Type>'
+                      '<Code>Throttling</Code><Message>Rate exceeded'
+                      '</Message></Error></ErrorResponse>')
+
+    def make_request(self, statuses, **kwargs):
+        responses = []
+        for status in statuses:
+            body = "{'test': 'success'}"
+            if status == 400:
+                body = self.throttled_body
+            responses.append(HTTPretty.Response(body=body, status=status))
+        HTTPretty.register_uri(HTTPretty.POST,
+                               'https://%s/' % self.region.endpoint,
+                               responses=responses)
+        kwargs.setdefault('base_delay', 0)
+        conn = self.region.connect(aws_access_key_id='access_key',
+                                   aws_secret_access_key='secret')
+        conn.retry_policy = RetryPolicy(**kwargs)
+        return conn
+
+    def test_throttling_is_retried(self):
+        conn = self.make_request([400, 200])
+        resp = conn.make_request('myCmd1', {}, '/', 'POST')
+        self.assertEqual(resp.status, 200)
+
+    def test_throttling_is_returned_when_out_of_retries(self):
+        conn = self.make_request([400, 400])
+        conn.num_retries = 1
+        resp = conn.make_request('myCmd1', {}, '/', 'POST')
+        self.assertEqual(resp.status, 400)
+        self.assertEqual(resp.read().decode('utf-8'), self.throttled_body)
+
+    def test_retry_quota(self):
+        conn = self.make_request([500, 500, 200], quota_capacity=5)
+        with self.assertRaises(BotoServerError):
+            conn.make_request('myCmd1', {}, '/', 'POST')
+        self.assertEqual(
+            conn.retry_policy.get_quota(self.region.endpoint).available, 0)
+
+    def test_circuit_breaker(self):
+        conn = self.make_request([500, 500, 200], failure_threshold=2)
+        conn.num_retries = 3
+        with self.assertRaises(BotoServerError):
+            conn.make_request('myCmd1', {}, '/', 'POST')
+        with self.assertRaises(CircuitOpenError):
+            conn.make_request('myCmd1', {}, '/', 'POST')
+
+    def test_any_server_error_is_retried(self):
+        conn = self.make_request([501, 200])
+        resp = conn.make_request('myCmd1', {}, '/', 'POST')
+        self.assertEqual(resp.status, 200)
+
+    def test_throttling_out_of_retries_refunds_nothing(self):
+        conn = self.make_request([400, 400], quota_capacity=10)
+        conn.num_retries = 1
+        resp = conn.make_request('myCmd1', {}, '/', 'POST')
+        self.assertEqual(resp.status, 400)
+        self.assertEqual(
+            conn.retry_policy.get_quota(self.region.endpoint).available, 5)
+
+    def test_retry_handler_failures_open_the_circuit(self):
+        conn = self.make_request([500, 500, 200], failure_threshold=2)
+
+        def retry_handler(response, i, next_sleep):
+            if response.status >= 500:
+                return '', i + 1, 0
+
+        request = conn.build_base_http_request('POST', '/', None)
+        with self.assertRaises(BotoServerError):
+            conn._mexe(request, retry_handler=retry_handler)
+
+
+class TestAWSQueryRateLimit(TestAWSQueryConnection):
+    def test_requests_wait_for_the_rate_limiter(self):
+        HTTPretty.register_uri(HTTPretty.POST,
+                               'https://%s/' % self.region.endpoint,
+                               responses=[
+                                   HTTPretty.Response(body='', status=500),
+                                   HTTPretty.Response(body='', status=200)])
+        conn = self.region.connect(aws_access_key_id='access_key',
+                                   aws_secret_access_key='secret')
+        conn.retry_policy = RetryPolicy(base_delay=0)
+        conn.rate_limiter = mock.Mock()
+        conn.make_request('myCmd1', {}, '/', 'POST')
+        self.assertEqual(conn.rate_limiter.acquire.call_args_list,
+                         [mock.call('mockservice', 'myCmd1')] * 2)
+
+
+class TestAWSQueryInstrumentation(TestAWSQueryConnection):
+    def test_request_metrics(self):
+        HTTPretty.register_uri(HTTPretty.POST,
+                               'https://%s/' % self.region.endpoint,
+                               responses=[
+                                   HTTPretty.Response(body='', status=500),
+                                   HTTPretty.Response(body='0123456789',
+                                                      status=200)])
+        conn = self.region.connect(aws_access_key_id='access_key',
+                                   aws_secret_access_key='secret')
+        conn.retry_policy = RetryPolicy(base_delay=0)
+        sink = mock.Mock()
+        conn.set_instrumentation(Instrumentation([sink]))
+        resp = conn.make_request('myCmd1', {}, '/', 'POST')
+        # The metrics are only finished once the body has been read.
+        self.assertFalse(sink.record.called)
+        self.assertEqual(resp.read(), b'0123456789')
+
+        metrics = sink.record.call_args[0][0]
+        self.assertEqual((metrics.service, metrics.action, metrics.status),
+                         ('mockservice', 'myCmd1', 200))
+        self.assertEqual(metrics.attempts, 2)
+        self.assertEqual(metrics.retry_reasons, ['500'])
+        self.assertEqual(metrics.bytes_in, 10)
+        self.assertTrue(metrics.bytes_out > 0)
+        for phase in ('pool_wait', 'signing', 'ttfb', 'body', 'total'):
+            self.assertTrue(getattr(metrics, phase) >= 0, phase)
+        self.assertEqual(metrics.error, None)
+
+    def test_failed_request_metrics(self):
+        HTTPretty.register_uri(HTTPretty.POST,
+                               'https://%s/' % self.region.endpoint,
+                               responses=[
+                                   HTTPretty.Response(body='', status=500)])
+        conn = self.region.connect(aws_access_key_id='access_key',
+                                   aws_secret_access_key='secret')
+        conn.num_retries = 0
+        sink = mock.Mock()
+        conn.set_instrumentation(Instrumentation([sink]))
+        with self.assertRaises(BotoServerError):
+            conn.make_request('myCmd1', {}, '/', 'POST')
+        metrics = sink.record.call_args[0][0]
+        self.assertEqual((metrics.status, metrics.attempts), (500, 1))
+        self.assertEqual(metrics.error, 'BotoServerError')
+
+
+class TestAWSQueryPoolSlots(TestAWSQueryConnection):
+    def make_connection(self):
+        HTTPretty.register_uri(HTTPretty.POST,
+                               'https://%s/' % self.region.endpoint,
+                               "{'test': 'success'}")
+        conn = self.region.connect(aws_access_key_id='access_key',
+                                   aws_secret_access_key='secret')
+        conn._pool = ConnectionPool(max_connections_per_host=1, timeout=0.01)
+        return conn
+
+    def test_slot_is_released_when_the_sender_raises(self):
+        conn = self.make_connection()
+
+        def sender(*args):
+            raise ValueError('Broken')
+
+        request = conn.build_base_http_request('POST', '/', None)
+        with self.assertRaises(ValueError):
+            conn._mexe(request, sender=sender)
+        resp = conn.make_request('myCmd1', {}, '/', 'POST')
+        self.assertEqual(resp.status, 200)
+
+    def test_slot_is_released_when_the_retry_handler_raises(self):
+        conn = self.make_connection()
+        retry_handler = mock.Mock(side_effect=BotoServerError(400, 'Bad'))
+        request = conn.build_base_http_request('POST', '/', None)
+        with self.assertRaises(BotoServerError):
+            conn._mexe(request, retry_handler=retry_handler)
+        self.assertEqual(conn.get_pool_stats()['checked_out'], 0)
+
+    def test_connection_property_does_not_hold_a_slot(self):
+        conn = self.make_connection()
+        conn.make_request('myCmd1', {}, '/', 'POST')
+        self.assertTrue(conn.connection is not None)
+        self.assertTrue(conn.connection is not None)
+        self.assertEqual(conn.get_pool_stats()['checked_out'], 0)
+
+    def test_redirect_to_another_scheme(self):
+        HTTPretty.register_uri(
+            HTTPretty.POST, 'https://%s/' % self.region.endpoint,
+            status=301, location='http://other.example.com/next')
+        HTTPretty.register_uri(HTTPretty.POST,
+                               'http://other.example.com:443/next',
+                               "{'test': 'success'}")
+        conn = self.region.connect(aws_access_key_id='access_key',
+                                   aws_secret_access_key='secret')
+        conn._pool = ConnectionPool(max_connections_per_host=1, timeout=0.01)
+        resp = conn.make_request('myCmd1', {}, '/', 'POST')
+        self.assertEqual(resp.status, 200)
+        for pool in conn._pool.host_to_pool.values():
+            self.assertEqual(pool.checked_out, 0)
+        self.assertTrue(
+            ('other.example.com', 443, False) in conn._pool.host_to_pool)
+
+
 class TestAWSQueryStatus(TestAWSQueryConnection):
 
     def test_get_status(self):
@@ -474,6 +680,22 @@ class TestAWSQueryStatus(TestAWSQueryConnection):
 
         self.assertEqual(resp, "ok")
 
+    def test_get_list_stream(self):
+        HTTPretty.register_uri(HTTPretty.GET,
+                               'https://%s/list' % self.region.endpoint,
+                               '<result><item><name>a</name></item>'
+                               '<item><name>b</name></item>'
+                               '<nextToken>c</nextToken></result>',
+                               content_type='text/xml')
+
+        conn = self.region.connect(aws_access_key_id='access_key',
+                                   aws_secret_access_key='secret')
+        rs = conn.get_list('getList', {}, [('item', MockListItem)], 'list',
+                           stream=True)
+
+        self.assertEqual([item.name for item in rs], ['a', 'b'])
+        self.assertEqual(rs.next_token, 'c')
+
     def test_get_status_blank_error(self):
         HTTPretty.register_uri(HTTPretty.GET,
                                'https://%s/status' % self.region.endpoint,
@@ -525,5 +747,95 @@ class TestHTTPRequest(unittest.TestCase):
                           'User-Agent': UserAgent})
 
 
+class TestHostConnectionPool(unittest.TestCase):
+    def ready_conn(self):
+        conn = mock.Mock()
+        conn._HTTPConnection__response = None
+        return conn
+
+    def busy_conn(self):
+        conn = mock.Mock()
+        conn._HTTPConnection__response.isclosed.return_value = False
+        return conn
+
+    def test_most_recently_used_connection_is_reused(self):
+        pool = HostConnectionPool()
+        first, second = self.ready_conn(), self.ready_conn()
+        pool.put(first)
+        pool.put(second)
+        self.assertIs(pool.get(), second)
+        self.assertIs(pool.get(), first)
+        self.assertIsNone(pool.get())
+
+    def test_pending_connection_promoted_once_ready(self):
+        pool = HostConnectionPool()
+        conn = self.busy_conn()
+        pool.put(conn)
+        self.assertIsNone(pool.get())
+        conn._HTTPConnection__response.isclosed.return_value = True
+        self.assertIs(pool.get(), conn)
+
+    def test_stats(self):
+        pool = HostConnectionPool()
+        self.assertIsNone(pool.get())
+        pool.put(self.ready_conn())
+        pool.get()
+        stats = pool.get_stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['checked_out'], 1)
+
+    def test_full_pool_times_out(self):
+        pool = HostConnectionPool(max_size=1)
+        self.assertIsNone(pool.get())
+        with self.assertRaises(ConnectionPoolTimeoutError):
+            pool.get(timeout=0.01)
+        self.assertEqual(pool.get_stats()['timeouts'], 1)
+
+    def test_release_frees_a_slot(self):
+        pool = HostConnectionPool(max_size=1)
+        self.assertIsNone(pool.get())
+        pool.release()
+        self.assertIsNone(pool.get(timeout=0.01))
+
+    def test_overflow_evicts_least_recently_used(self):
+        pool = HostConnectionPool(max_size=2)
+        conns = [self.ready_conn() for i in range(3)]
+        for conn in conns:
+            pool.put(conn)
+        self.assertEqual(pool.size(), 2)
+        conns[0].close.assert_called_with()
+        self.assertEqual(pool.get_stats()['evictions'], 1)
+
+    def test_clean_closes_stale_ready_connections(self):
+        pool = HostConnectionPool()
+        conn = self.ready_conn()
+        pool.put(conn)
+        with mock.patch('time.time', return_value=10 ** 10):
+            pool.clean()
+        self.assertEqual(pool.size(), 0)
+        conn.close.assert_called_with()
+
+
+class TestConnectionPool(unittest.TestCase):
+    def test_pools_are_per_host(self):
+        pool = ConnectionPool()
+        conn = mock.Mock()
+        conn._HTTPConnection__response = None
+        pool.put_http_connection('a.example.com', 443, True, conn)
+        self.assertIsNone(
+            pool.get_http_connection('b.example.com', 443, True))
+        self.assertIs(
+            pool.get_http_connection('a.example.com', 443, True), conn)
+        self.assertEqual(pool.get_stats()['hits'], 1)
+        self.assertEqual(pool.get_stats()['misses'], 1)
+
+    def test_clean_removes_idle_host_pools(self):
+        pool = ConnectionPool()
+        pool.host_to_pool[('a.example.com', 443, True)] = HostConnectionPool()
+        pool.clean()
+        self.assertEqual(pool.host_to_pool, {})
+
+
 if __name__ == '__main__':
     unittest.main()
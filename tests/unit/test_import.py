@@ -0,0 +1,65 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from tests.compat import unittest
+
+import boto
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+
+
+def modules_imported_by(module, env=None):
+    """
+    Imports ``module`` in a new interpreter & returns the names of the
+    modules that were imported as a result.
+    """
+    code = ('import sys\n'
+            'before = set(sys.modules)\n'
+            'import %s\n'
+            'print("\\n".join(set(sys.modules) - before))\n' % module)
+    process_env = dict(os.environ)
+    process_env.pop('BOTO_CONFIG', None)
+    process_env['BOTO_PATH'] = os.devnull
+    process_env.update(env or {})
+    process = subprocess.Popen([sys.executable, '-c', code],
+                               stdout=subprocess.PIPE, cwd=ROOT_DIR,
+                               env=process_env)
+    stdout = process.communicate()[0]
+    return set(stdout.decode('utf-8').split())
+
+
+class TestImportBoto(unittest.TestCase):
+    def test_deferred_modules(self):
+        modules = modules_imported_by('boto')
+        self.assertIn('boto', modules)
+        self.assertNotIn('logging.config', modules)
+        self.assertNotIn('imp', modules)
+        if hasattr(os, 'uname'):
+            self.assertNotIn('platform', modules)
+
+    def test_logging_config(self):
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+        config_path = os.path.join(tempdir, 'boto.cfg')
+        with open(config_path, 'w') as f:
+            f.write('[loggers]\nkeys=root\n'
+                    '[handlers]\nkeys=null\n'
+                    '[formatters]\nkeys=\n'
+                    '[logger_root]\nhandlers=null\n'
+                    '[handler_null]\nclass=NullHandler\nargs=()\n')
+        modules = modules_imported_by('boto', {'BOTO_CONFIG': config_path})
+        self.assertIn('logging.config', modules)
+
+    def test_user_agent(self):
+        self.assertTrue(boto.UserAgent.startswith(
+            'Boto/%s Python/%s.%s.%s ' % ((boto.__version__,) +
+                                          tuple(sys.version_info[:3]))))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,245 @@
+import socket
+
+from tests.compat import mock, unittest
+
+from boto.instrumentation import Histogram, HistogramRegistry, \
+    Instrumentation, RequestMetrics, StatsdSink, time_connect
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+class InstrumentationTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch('boto.instrumentation.time.time',
+                             self.clock.time)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_metrics(self, instrumentation=None):
+        return RequestMetrics('ec2', 'DescribeInstances', 'ec2.example.com',
+                              'POST', instrumentation)
+
+
+class TestRequestMetrics(InstrumentationTestCase):
+    def test_phases(self):
+        sink = mock.Mock()
+        metrics = self.make_metrics(Instrumentation([sink]))
+        connection = mock.Mock()
+        connection._boto_connect_times = (0.05, 0.1)
+
+        metrics.attempt_started(100)
+        self.clock.now += 0.2
+        metrics.request_sent()
+        self.clock.now += 0.3
+        metrics.response_received(connection, 503)
+        metrics.retrying('SlowDown')
+        metrics.add('backoff', 1.0)
+
+        self.clock.now += 1.0
+        connection._boto_connect_times = None
+        metrics.attempt_started(100)
+        metrics.request_sent()
+        self.clock.now += 0.1
+        metrics.response_received(connection, 200)
+        metrics.body_read(0.5, 2048)
+        self.clock.now += 0.5
+        metrics.finish()
+        metrics.finish()
+
+        sink.record.assert_called_once_with(metrics)
+        self.assertEqual(metrics.status, 200)
+        self.assertEqual((metrics.attempts, metrics.retries), (2, 1))
+        self.assertEqual(metrics.retry_reasons, ['SlowDown'])
+        self.assertAlmostEqual(metrics.connect, 0.05)
+        self.assertAlmostEqual(metrics.tls, 0.1)
+        # The last attempt's times.
+        self.assertAlmostEqual(metrics.send, 0)
+        self.assertAlmostEqual(metrics.ttfb, 0.1)
+        self.assertAlmostEqual(metrics.body, 0.5)
+        self.assertAlmostEqual(metrics.total, 2.1)
+        self.assertEqual((metrics.bytes_out, metrics.bytes_in), (200, 2048))
+        self.assertEqual(metrics.pool_wait, None)
+
+    def test_ttfb_without_request_sent(self):
+        metrics = self.make_metrics()
+        connection = mock.Mock(_boto_connect_times=(0.1, None))
+        metrics.attempt_started()
+        self.clock.now += 0.3
+        metrics.response_received(connection, 200)
+        self.assertAlmostEqual(metrics.ttfb, 0.2)
+        self.assertEqual((metrics.send, metrics.tls), (None, None))
+
+    def test_error(self):
+        metrics = self.make_metrics()
+        metrics.finish(ValueError('Broken'))
+        self.assertEqual(metrics.error, 'ValueError')
+
+
+class TestInstrumentation(unittest.TestCase):
+    def test_sink_errors_are_logged(self):
+        broken = mock.Mock()
+        broken.record.side_effect = ValueError('Broken')
+        sink = mock.Mock()
+        instrumentation = Instrumentation([broken])
+        instrumentation.add_sink(sink)
+        metrics = instrumentation.start('s3', 'GET', 'host', 'GET')
+        with mock.patch('boto.instrumentation.log') as log:
+            metrics.finish()
+        self.assertTrue(log.error.called)
+        sink.record.assert_called_once_with(metrics)
+
+
+class TestTimeConnect(InstrumentationTestCase):
+    def make_connection(self, connect_time, handshake_time):
+        clock = self.clock
+
+        class FakeConnection(object):
+            def _create_connection(self, address, timeout=None):
+                clock.now += connect_time
+                return mock.Mock()
+
+            def connect(self):
+                self.sock = self._create_connection(('host', 443))
+                clock.now += handshake_time
+
+        return FakeConnection()
+
+    def test_splits_connect_and_tls(self):
+        connection = self.make_connection(0.1, 0.25)
+        time_connect(connection, True)
+        connection.connect()
+        connect_time, tls_time = connection._boto_connect_times
+        self.assertAlmostEqual(connect_time, 0.1)
+        self.assertAlmostEqual(tls_time, 0.25)
+
+    def test_plain_connection(self):
+        connection = self.make_connection(0.1, 0)
+        time_connect(connection, False)
+        connection.connect()
+        self.assertEqual(connection._boto_connect_times[1], None)
+
+    def test_connection_without_create_connection(self):
+        clock = self.clock
+
+        class FakeConnection(object):
+            def connect(self):
+                clock.now += 0.3
+
+        connection = FakeConnection()
+        time_connect(connection, True)
+        connection.connect()
+        connect_time, tls_time = connection._boto_connect_times
+        self.assertAlmostEqual(connect_time, 0.3)
+        self.assertEqual(tls_time, None)
+
+
+class TestHistogram(unittest.TestCase):
+    def test_percentiles(self):
+        histogram = Histogram([10, 100, 1000])
+        for value in [5] * 50 + [50] * 40 + [500] * 9 + [5000]:
+            histogram.add(value)
+        self.assertEqual(histogram.count, 100)
+        self.assertEqual((histogram.min, histogram.max), (5, 5000))
+        self.assertEqual(histogram.percentile(50), 10)
+        self.assertEqual(histogram.percentile(90), 100)
+        self.assertEqual(histogram.percentile(99), 1000)
+        self.assertEqual(histogram.percentile(100), 5000)
+        self.assertAlmostEqual(histogram.mean(), 117.5)
+
+    def test_empty(self):
+        histogram = Histogram()
+        self.assertEqual(histogram.percentile(50), None)
+        self.assertEqual(histogram.mean(), None)
+
+
+class TestHistogramRegistry(unittest.TestCase):
+    def make_metrics(self, ttfb, retry_reasons=()):
+        metrics = RequestMetrics('s3', 'GET', 'host', 'GET')
+        metrics.ttfb = ttfb
+        metrics.total = ttfb * 2
+        metrics.attempts = len(retry_reasons) + 1
+        metrics.retry_reasons = list(retry_reasons)
+        metrics.bytes_in = 10
+        return metrics
+
+    def test_record(self):
+        registry = HistogramRegistry()
+        registry.record(self.make_metrics(0.004))
+        registry.record(self.make_metrics(0.04, ['SlowDown', 'SlowDown']))
+
+        ttfb = registry.get_histogram('s3', 'GET', 'ttfb')
+        self.assertEqual(ttfb.count, 2)
+        self.assertAlmostEqual(ttfb.max, 40)
+        self.assertEqual(registry.get_histogram('s3', 'GET', 'connect'), None)
+        self.assertEqual(registry.get_counters('s3', 'GET'), {
+            'requests': 2, 'errors': 0, 'retries': 2, 'bytes_in': 20,
+            'bytes_out': 0, 'retry_reasons': {'SlowDown': 2},
+        })
+
+        summary = registry.summary(percentiles=(50,))
+        self.assertEqual(summary[('s3', 'GET', 'total')]['count'], 2)
+        self.assertEqual(summary[('s3', 'GET', 'ttfb')]['p50'], 5)
+
+        registry.reset()
+        self.assertEqual(registry.summary(), {})
+
+
+class TestStatsdSink(unittest.TestCase):
+    def setUp(self):
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.addCleanup(self.server.close)
+        self.server.bind(('127.0.0.1', 0))
+        self.server.settimeout(5)
+        self.sink = StatsdSink(*self.server.getsockname())
+        self.addCleanup(self.sink.close)
+
+    def make_metrics(self):
+        metrics = RequestMetrics('dynamodb', 'Get.Item', 'host', 'POST')
+        metrics.attempts = 2
+        metrics.retry_reasons = ['ProvisionedThroughputExceededException']
+        metrics.ttfb = 0.0125
+        metrics.bytes_out = 50
+        return metrics
+
+    def test_format(self):
+        self.assertEqual(self.sink.format(self.make_metrics()), [
+            'boto.dynamodb.Get_Item.requests:1|c',
+            'boto.dynamodb.Get_Item.ttfb:12.500|ms',
+            'boto.dynamodb.Get_Item.retries:1|c',
+            'boto.dynamodb.Get_Item.retry_reasons.'
+            'ProvisionedThroughputExceededException:1|c',
+            'boto.dynamodb.Get_Item.bytes_out:50|c',
+        ])
+
+    def test_record(self):
+        self.sink.record(self.make_metrics())
+        packet = self.server.recv(65536).decode('utf-8')
+        self.assertEqual(packet.split('\n'),
+                         self.sink.format(self.make_metrics()))
+
+    def test_large_packets_are_split(self):
+        self.sink.MAX_PACKET_SIZE = 100
+        self.sink.record(self.make_metrics())
+        expected = self.sink.format(self.make_metrics())
+        lines = []
+        while len(lines) < len(expected):
+            packet = self.server.recv(65536).decode('utf-8')
+            self.assertTrue(len(packet) <= 100 or '\n' not in packet)
+            lines.extend(packet.split('\n'))
+        self.assertEqual(lines, expected)
+
+    def test_send_errors_are_ignored(self):
+        self.sink._socket = mock.Mock()
+        self.sink._socket.sendto.side_effect = socket.error('Unreachable')
+        self.sink.record(self.make_metrics())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+import os
+import shutil
+import tempfile
+import threading
+
+from tests.compat import mock, unittest
+
+from boto.connection import HTTPRequest
+from boto.ratelimit import FileTokenBucket, RateLimiter, TokenBucket, \
+    fcntl, get_request_action
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TokenBucketTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        for name in ('time', 'sleep'):
+            patcher = mock.patch('time.%s' % name,
+                                 getattr(self.clock, name))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def assert_rate(self, bucket):
+        # The burst goes straight through, then one request every 0.5s.
+        for i in range(3):
+            self.assertTrue(bucket.acquire())
+        self.assertEqual(self.clock.sleeps, [])
+        self.assertTrue(bucket.acquire())
+        self.assertTrue(bucket.acquire())
+        self.assertEqual(self.clock.sleeps, [0.5, 0.5])
+
+        # Tokens build up again, but only to the capacity.
+        self.clock.now += 60
+        self.assertFalse(bucket.acquire(tokens=4, timeout=0.4))
+        self.assertTrue(bucket.acquire(tokens=4, timeout=0.5))
+        self.assertEqual(self.clock.sleeps, [0.5, 0.5, 0.5])
+
+
+class TestTokenBucket(TokenBucketTestCase):
+    def test_rate(self):
+        self.assert_rate(TokenBucket(2, capacity=3))
+
+    def test_default_capacity(self):
+        self.assertEqual(TokenBucket(5).capacity, 5)
+        self.assertEqual(TokenBucket(0.1).capacity, 1)
+
+
+@unittest.skipIf(fcntl is None, 'fcntl is not available')
+class TestFileTokenBucket(TokenBucketTestCase):
+    def setUp(self):
+        super(TestFileTokenBucket, self).setUp()
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+        self.filename = os.path.join(self.tempdir, 'bucket')
+
+    def test_rate(self):
+        self.assert_rate(FileTokenBucket(self.filename, 2, capacity=3))
+
+    def test_shared_between_buckets(self):
+        first = FileTokenBucket(self.filename, 2, capacity=2)
+        second = FileTokenBucket(self.filename, 2, capacity=2)
+        first.acquire()
+        second.acquire()
+        first.acquire()
+        self.assertEqual(self.clock.sleeps, [0.5])
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_limits_by_service_and_action(self):
+        limiter = RateLimiter()
+        self.assertEqual(limiter.get_bucket('ec2', 'DescribeInstances'), None)
+        limiter.set_limit('ec2', 'DescribeInstances', 5)
+        limiter.set_limit('EC2', '*', 20, burst=40)
+
+        bucket = limiter.get_bucket('ec2', 'describeinstances')
+        self.assertEqual((bucket.rate, bucket.capacity), (5, 5))
+        self.assertTrue(bucket is limiter.get_bucket('ec2',
+                                                     'DescribeInstances'))
+
+        # Actions without a limit of their own share the wildcard bucket.
+        other = limiter.get_bucket('ec2', 'RunInstances')
+        self.assertEqual((other.rate, other.capacity), (20, 40))
+        self.assertTrue(other is limiter.get_bucket('ec2', 'StopInstances'))
+        self.assertEqual(limiter.get_bucket('iam', 'ListUsers'), None)
+
+    def test_shared_between_threads(self):
+        limiter = RateLimiter()
+        limiter.set_limit('ec2', '*', 1000)
+        buckets = []
+        threads = [threading.Thread(target=lambda: buckets.append(
+            limiter.get_bucket('ec2', 'DescribeImages'))) for i in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(set(id(bucket) for bucket in buckets)), 1)
+
+    def test_from_config(self):
+        values = {
+            'ec2.describeinstances': '5',
+            'route53.*': '3, 1',
+            'iam.listusers': 'fast',
+            'lock_dir': '/var/run/boto',
+            'debug': '0',
+        }
+        config = mock.Mock()
+        config.has_section.return_value = True
+        config.options.return_value = list(values)
+        config.get.side_effect = lambda section, name, default=None: \
+            values.get(name, default)
+        limiter = RateLimiter.from_config(config)
+        self.assertEqual(limiter.lock_dir, '/var/run/boto')
+        self.assertEqual(limiter._limits, {
+            ('ec2', 'describeinstances'): (5.0, None),
+            ('route53', '*'): (3.0, 1.0),
+        })
+
+        config.has_section.return_value = False
+        self.assertEqual(RateLimiter.from_config(config)._limits, {})
+
+    @unittest.skipIf(fcntl is None, 'fcntl is not available')
+    def test_lock_dir(self):
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+        limiter = RateLimiter(lock_dir=tempdir)
+        limiter.set_limit('route53', '*', 3)
+        bucket = limiter.get_bucket('route53', 'POST')
+        self.assertTrue(isinstance(bucket, FileTokenBucket))
+        bucket.acquire()
+        self.assertEqual(os.listdir(tempdir), ['route53._.bucket'])
+
+
+class TestGetRequestAction(unittest.TestCase):
+    def request(self, host, params=None, headers=None, method='POST'):
+        return HTTPRequest(method, 'https', host, 443, '/', None,
+                           params or {}, headers or {}, '')
+
+    def test_query_api(self):
+        self.assertEqual(get_request_action(self.request(
+            'ec2.us-west-2.amazonaws.com', {'Action': 'DescribeInstances'})),
+            ('ec2', 'DescribeInstances'))
+
+    def test_json_api(self):
+        self.assertEqual(get_request_action(self.request(
+            'dynamodb.us-east-1.amazonaws.com',
+            headers={'X-Amz-Target': 'DynamoDB_20120810.PutItem'})),
+            ('dynamodb', 'PutItem'))
+
+    def test_rest_api(self):
+        self.assertEqual(get_request_action(self.request(
+            'route53.amazonaws.com', method='GET')), ('route53', 'GET'))
+
+
+if __name__ == '__main__':
+    unittest.main()
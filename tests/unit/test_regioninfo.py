@@ -19,12 +19,17 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
 # IN THE SOFTWARE.
 #
+import json
 import os
+import shutil
+import tempfile
+from tests.compat import mock
 from tests.unit import unittest
 
 import boto
 from boto.regioninfo import RegionInfo, load_endpoint_json, merge_endpoints
-from boto.regioninfo import load_regions, get_regions
+from boto.regioninfo import load_regions, get_regions, get_endpoints
+from boto.regioninfo import get_endpoint, get_region, connect
 
 
 class TestRegionInfo(object):
@@ -140,5 +145,74 @@ class TestEndpointLoading(unittest.TestCase):
         self.assertEqual(west_2.connection_cls, FakeConn)
 
 
+class TestCachedEndpoints(unittest.TestCase):
+    def setUp(self):
+        super(TestCachedEndpoints, self).setUp()
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+        self.override_path = os.path.join(self.tempdir, 'endpoints.json')
+        self.write_override('ec2.test-1.amazonaws.com')
+        os.environ['BOTO_ENDPOINTS'] = self.override_path
+        self.addCleanup(os.environ.pop, 'BOTO_ENDPOINTS')
+
+    def write_override(self, endpoint, mtime=None):
+        with open(self.override_path, 'w') as f:
+            json.dump({'ec2': {'test-1': endpoint}}, f)
+        if mtime is not None:
+            os.utime(self.override_path, (mtime, mtime))
+
+    def test_loaded_once(self):
+        get_endpoints()
+        with mock.patch('boto.regioninfo.load_regions') as load:
+            endpoints = get_endpoints()
+            self.assertFalse(load.called)
+        self.assertEqual(endpoints['ec2']['test-1'],
+                         'ec2.test-1.amazonaws.com')
+
+    def test_reloaded_when_the_override_changes(self):
+        mtime = os.stat(self.override_path).st_mtime
+        self.assertEqual(get_endpoint('ec2', 'test-1'),
+                         'ec2.test-1.amazonaws.com')
+        self.write_override('ec2.test-2.amazonaws.com', mtime=mtime + 10)
+        self.assertEqual(get_endpoint('ec2', 'test-1'),
+                         'ec2.test-2.amazonaws.com')
+
+        os.environ['BOTO_ENDPOINTS'] = os.path.join(
+            os.path.dirname(__file__),
+            'test_endpoints.json'
+        )
+        self.assertEqual(get_endpoint('ec2', 'test-1'),
+                         'ec2.test-1.amazonaws.com')
+
+        del os.environ['BOTO_ENDPOINTS']
+        self.assertEqual(get_endpoint('ec2', 'test-1'), None)
+        os.environ['BOTO_ENDPOINTS'] = self.override_path
+
+    def test_get_endpoint(self):
+        self.assertEqual(get_endpoint('ec2', 'us-west-2'),
+                         'ec2.us-west-2.amazonaws.com')
+        self.assertEqual(get_endpoint('ec2', 'no-such-region'), None)
+        self.assertEqual(get_endpoint('no-such-service', 'us-west-2'), None)
+
+    def test_get_region(self):
+        region = get_region('ec2', 'us-west-2', region_cls=TestRegionInfo,
+                            connection_cls=FakeConn)
+        self.assertTrue(isinstance(region, TestRegionInfo))
+        self.assertEqual(region.name, 'us-west-2')
+        self.assertEqual(region.endpoint, 'ec2.us-west-2.amazonaws.com')
+        self.assertEqual(region.connection_cls, FakeConn)
+        self.assertEqual(get_region('ec2', 'no-such-region'), None)
+
+    def test_connect(self):
+        connection_cls = mock.Mock()
+        connect('ec2', 'test-1', connection_cls=connection_cls,
+                is_secure=False)
+        region = connection_cls.call_args[1]['region']
+        self.assertEqual(region.endpoint, 'ec2.test-1.amazonaws.com')
+        self.assertFalse(connection_cls.call_args[1]['is_secure'])
+        self.assertEqual(connect('ec2', 'no-such-region',
+                                 connection_cls=connection_cls), None)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,124 @@
+from tests.compat import mock, unittest
+
+from boto.retry import CircuitBreaker, RetryPolicy, RetryQuota, \
+    THROTTLED, TIMEOUT, TRANSIENT, get_error_code
+
+
+def response(status):
+    return mock.Mock(status=status)
+
+
+class TestGetErrorCode(unittest.TestCase):
+    def test_json(self):
+        self.assertEqual(get_error_code(
+            b'{"__type": "com.amazonaws.dynamodb.v20120810#'
+            b'ProvisionedThroughputExceededException", "message": "x"}'),
+            'ProvisionedThroughputExceededException')
+        self.assertEqual(get_error_code(u'{"code": "Throttling"}'),
+                         'Throttling')
+        self.assertEqual(get_error_code(b'["Throttling"]'), None)
+        self.assertEqual(get_error_code(b'{not json'), None)
+
+    def test_xml(self):
+        self.assertEqual(get_error_code(
+            b'<?xml version="1.0"?><Response><Errors><Error>'
+            b'<Code>RequestLimitExceeded</Code></Error></Errors></Response>'),
+            'RequestLimitExceeded')
+        self.assertEqual(get_error_code(b'<Error><Message>x</Message>'), None)
+        self.assertEqual(get_error_code(b''), None)
+        self.assertEqual(get_error_code(None), None)
+
+
+class TestRetryQuota(unittest.TestCase):
+    def test_acquire_and_release(self):
+        quota = RetryQuota(10)
+        self.assertTrue(quota.acquire(5))
+        self.assertTrue(quota.acquire(5))
+        self.assertFalse(quota.acquire(1))
+        quota.release(3)
+        self.assertEqual(quota.available, 3)
+        quota.release(100)
+        self.assertEqual(quota.available, 10)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    @mock.patch('time.time')
+    def test_opens_and_probes(self, time_mock):
+        time_mock.return_value = 100
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+
+        # One request is let through once the timeout has passed.
+        time_mock.return_value = 131
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+
+        breaker.record_success()
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.failures, 0)
+
+
+class TestRetryPolicy(unittest.TestCase):
+    def test_compute_delay(self):
+        policy = RetryPolicy(base_delay=1, max_delay=5)
+        for last_delay in (0, 1, 2, 4):
+            delay = policy.compute_delay(3, last_delay)
+            self.assertTrue(1 <= delay <= min(max(last_delay, 1) * 3, 5))
+
+    def test_classify_response(self):
+        policy = RetryPolicy()
+        self.assertEqual(policy.classify_response(
+            response(400), b'<Code>Throttling</Code>'), THROTTLED)
+        self.assertEqual(policy.classify_response(
+            response(503), b'<Code>SlowDown</Code>'), THROTTLED)
+        self.assertEqual(policy.classify_response(
+            response(503), b''), TRANSIENT)
+        self.assertEqual(policy.classify_response(
+            response(501), None), TRANSIENT)
+        self.assertEqual(policy.classify_response(
+            response(400), b'<Code>InvalidParameterValue</Code>'), None)
+        self.assertEqual(policy.classify_response(response(404), None), None)
+
+    def test_retry_quota_per_host(self):
+        policy = RetryPolicy(quota_capacity=10, retry_cost=5,
+                             timeout_retry_cost=10)
+        self.assertEqual(policy.acquire_retry('a', THROTTLED), 5)
+        self.assertEqual(policy.acquire_retry('a', TIMEOUT), None)
+        self.assertEqual(policy.acquire_retry('b', TIMEOUT), 10)
+
+        # A retried request that succeeds gives back its cost.
+        policy.record_success('a', 5)
+        self.assertEqual(policy.get_quota('a').available, 10)
+
+    def test_no_quota(self):
+        policy = RetryPolicy(quota_capacity=None)
+        for i in range(100):
+            self.assertEqual(policy.acquire_retry('a', TIMEOUT), 10)
+
+    def test_throttling_does_not_open_the_circuit(self):
+        policy = RetryPolicy(failure_threshold=1)
+        policy.record_failure('a', THROTTLED)
+        self.assertTrue(policy.allow_request('a'))
+        policy.record_failure('a', TRANSIENT)
+        self.assertFalse(policy.allow_request('a'))
+        self.assertEqual(policy.acquire_retry('a', TRANSIENT), None)
+        self.assertTrue(policy.allow_request('b'))
+
+    def test_from_config(self):
+        config = mock.Mock()
+        values = {'max_retry_delay': 10, 'retry_quota': 0,
+                  'circuit_breaker_threshold': 5}
+        config.getint.side_effect = config.getfloat.side_effect = \
+            lambda section, name, default: values.get(name, default)
+        policy = RetryPolicy.from_config(config)
+        self.assertEqual(policy.max_delay, 10)
+        self.assertEqual(policy.quota_capacity, None)
+        self.assertEqual(policy.failure_threshold, 5)
+        self.assertEqual(policy.reset_timeout, 30)
+
+
+if __name__ == '__main__':
+    unittest.main()